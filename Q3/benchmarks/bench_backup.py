@@ -0,0 +1,124 @@
+"""Online backup throughput and its impact on checkout latency
+
+Run from the Q3 folder:
+    python benchmarks/bench_backup.py --users 50000 --orders 400000
+
+Builds a database with datagen, then for WAL and rollback-journal mode:
+  - times an idle snapshot (online copy, then gzip) and a restore
+  - runs checkouts (run_write + insert_order) in a thread and reports
+    their latency with no backup running, during the online copy with
+    different page batch sizes and sleeps, and during a whole snapshot
+    (the copy, then gzip of the copy, which competes only for CPU)
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import backup
+import datagen
+import dollmart
+
+CART = {1: {"name": "Item", "price": 100, "quantity": 1}, 2: {"name": "Item", "price": 100, "quantity": 1}}
+
+
+def populate(users, orders):
+    dollmart.setup_database(seed=False)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    datagen.generate(conn, users=users, products=5000, orders=orders)
+    conn.execute("UPDATE products SET stock = 1000000000")
+    conn.commit()
+    conn.close()
+
+
+class Checkouts:
+    """Places orders back to back in a thread, recording (finished at, latency) pairs"""
+
+    def __init__(self):
+        self.samples = []
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+
+    def run(self):
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            dollmart.run_write(dollmart.insert_order, 1, CART, 200)
+            end = time.perf_counter()
+            self.samples.append((end, end - start))
+
+    def between(self, start, end):
+        return [latency * 1000 for finished, latency in self.samples if start <= finished <= end]
+
+
+def describe(latencies):
+    if not latencies:
+        return "no checkouts completed"
+    latencies.sort()
+    return (f"{len(latencies):5d} checkouts  p50 {statistics.median(latencies):6.2f} ms  "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms  max {latencies[-1]:7.1f} ms")
+
+
+def run_mode(mode, directory, baseline_seconds, settings):
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.execute(f"PRAGMA journal_mode = {mode}")
+    conn.close()
+    size = os.path.getsize(dollmart.DB_PATH) / 1e6
+    print(f"== journal_mode={mode}, {size:.0f} MB ==")
+
+    start = time.perf_counter()
+    pages, _ = backup.copy_database(dollmart.DB_PATH, os.path.join(directory, "copy.db"), pages=-1)
+    copy_seconds = time.perf_counter() - start
+    os.remove(os.path.join(directory, "copy.db"))
+    result = backup.take_snapshot(dollmart.DB_PATH, os.path.join(directory, "snapshots"))
+    print(f"idle copy only (one step)      {copy_seconds:6.2f} s  {size / copy_seconds:6.0f} MB/s")
+    print(f"idle snapshot (copy + gzip)    {result.seconds:6.2f} s  {size / result.seconds:6.0f} MB/s  "
+          f"-> {result.snapshot_bytes / 1e6:.0f} MB")
+    start = time.perf_counter()
+    backup.restore(result.path, os.path.join(directory, "restored.db"))
+    restore_seconds = time.perf_counter() - start
+    print(f"restore (gunzip + check)       {restore_seconds:6.2f} s  {size / restore_seconds:6.0f} MB/s")
+
+    checkouts = Checkouts()
+    checkouts.thread.start()
+    try:
+        start = time.perf_counter()
+        time.sleep(baseline_seconds)
+        print(f"no backup                      {describe(checkouts.between(start, time.perf_counter()))}")
+        copy_path = os.path.join(directory, "copy.db")
+        for pages, sleep in settings:
+            start = time.perf_counter()
+            _, restarts = backup.copy_database(dollmart.DB_PATH, copy_path, pages=pages, sleep=sleep)
+            end = time.perf_counter()
+            os.remove(copy_path)
+            label = f"{pages} pages, {sleep * 1000:g} ms sleep" if pages > 0 else "one step"
+            print(f"copy {label:25s} {describe(checkouts.between(start, end))}  ({end - start:.2f} s, {restarts} restarts)")
+
+        start = time.perf_counter()
+        result = backup.take_snapshot(dollmart.DB_PATH, os.path.join(directory, "snapshots"))
+        print(f"full snapshot (copy + gzip)    {describe(checkouts.between(start, time.perf_counter()))}  ({result.seconds:.1f} s)")
+    finally:
+        checkouts.stop.set()
+        checkouts.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=400000)
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    settings = [(-1, 0), (1024, 0.002), (256, 0.005), (backup.PAGES_PER_STEP, backup.STEP_SLEEP)]
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.users, args.orders)
+        for mode in ("wal", "delete"):
+            run_mode(mode, directory, args.baseline_seconds, settings)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Lines per second for a large retail order sheet, bulk path vs one statement per line
+
+Run from the Q3 folder:
+    python benchmarks/bench_bulk_order.py --lines 10000 --runs 3
+
+Each run loads a fresh catalog of --lines products and orders every one of
+them. The bulk path is parse_order_sheet, bulk_order_cart (one json_each
+query), quote_cart and place_bulk_order (executemany, one transaction).
+The per-line path looks each product up with product_for_cart and writes
+each item and stock decrement with its own execute, also in one
+transaction, which is what place_order did before.
+"""
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import queries
+from bulkorder import parse_order_sheet
+
+
+def populate(lines):
+    dollmart.setup_database(seed=False)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
+        [(f"Item {i}", f"Category {i % 50}", 100 + i % 5000, 1000000, 0.05) for i in range(lines)]
+    )
+    conn.commit()
+    conn.close()
+    dollmart.invalidate_price_book()
+    user_id = dollmart.run_write(dollmart.create_customer, "bigstore", "x", 1)[0]
+
+    sheet = io.StringIO()
+    sheet.write("product_id,quantity\n")
+    for product_id in range(1, lines + 1):
+        sheet.write(f"{product_id},{1 + product_id % 12}\n")
+    return user_id, sheet.getvalue()
+
+
+def bulk_path(user_id, sheet):
+    timings = {}
+    start = time.perf_counter()
+    quantities = parse_order_sheet(io.StringIO(sheet))
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cart, problems = dollmart.bulk_order_cart(quantities)
+    timings["validate"] = time.perf_counter() - start
+    assert not problems
+
+    start = time.perf_counter()
+    quote = dollmart.quote_cart(cart, True)
+    timings["quote"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dollmart.place_bulk_order(user_id, cart, quote)
+    timings["write"] = time.perf_counter() - start
+    return timings
+
+
+def per_line_path(user_id, sheet):
+    timings = {}
+    start = time.perf_counter()
+    quantities = parse_order_sheet(io.StringIO(sheet))
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    conn = dollmart.connect_db()
+    cart = {}
+    for product_id, quantity in quantities.items():
+        product = queries.fetch_one(conn, "product_for_cart", (product_id,))
+        cart[product_id] = {"name": product.name, "price": product.price, "quantity": quantity}
+    conn.close()
+    timings["validate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quote = dollmart.quote_cart(cart, True)
+    timings["quote"] = time.perf_counter() - start
+
+    def write(conn):
+        order_id = queries.run(conn, "insert_order", (user_id, "2024-01-01 00:00:00", "Processing", quote.total, None)).lastrowid
+        for line in quote.lines:
+            queries.run(conn, "insert_order_item", (order_id, line.product_id, line.quantity, line.unit_price))
+            queries.run(conn, "decrement_stock", (line.quantity, line.product_id))
+
+    start = time.perf_counter()
+    dollmart.run_write(write)
+    timings["write"] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    saved = dollmart.DB_PATH
+    for name, path in (("per-line", per_line_path), ("bulk", bulk_path)):
+        best = None
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as directory:
+                dollmart.DB_PATH = os.path.join(directory, "bench.db")
+                user_id, sheet = populate(args.lines)
+                timings = path(user_id, sheet)
+                if best is None or sum(timings.values()) < sum(best.values()):
+                    best = timings
+        dollmart.DB_PATH = saved
+
+        total = sum(best.values())
+        steps = "  ".join(f"{step} {seconds * 1000:7.1f} ms" for step, seconds in best.items())
+        print(f"{name:9s} {args.lines} lines  {steps}  total {total * 1000:7.1f} ms  "
+              f"{args.lines / total:9.0f} lines/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Category browsing cost with 100k products in one category
+
+Run from the Q3 folder:
+    python benchmarks/bench_categories.py --products 100000 --runs 200
+
+Times the category tree with counts, the facet counts, the first and the
+500th keyset page, filtered first pages (a price band sorted by name is
+not a range of either index), and the old path (SELECT DISTINCT category plus every
+product in the category) for comparison. Also times 10,000 stock
+decrements with and without the facet triggers.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import queries
+from categories import category_tree, category_page, facets
+
+
+def populate(products, seed):
+    rng = random.Random(seed)
+    dollmart.setup_database()
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, 0)",
+        [(f"Item {rng.randint(0, 10 ** 9):09d}", "Warehouse" if i % 10 else f"Aisle {i % 40}",
+          rng.randint(50, 100000), rng.choice([0, 5, 50])) for i in range(products)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def median_us(function, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000000)
+    return statistics.median(samples)
+
+
+def deep_key(conn, pages):
+    after = None
+    for _ in range(pages):
+        after = category_page(conn, "Warehouse", "price", after).next_key
+    return after
+
+
+def time_decrements(conn, count):
+    ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE stock >= 50 LIMIT ?", (count,))]
+    start = time.perf_counter()
+    queries.run_many(conn, "decrement_stock", [(1, product_id) for product_id in ids])
+    elapsed = time.perf_counter() - start
+    conn.rollback()
+    return elapsed * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.products, args.seed)
+        conn = dollmart.connect_db()
+        size = facets(conn, "Warehouse")["products"]
+        after = deep_key(conn, 499)
+
+        print(f"'Warehouse' holds {size} of {args.products} products")
+        print(f"category tree with counts     {median_us(lambda: category_tree(conn), args.runs):9.0f} us")
+        print(f"facet counts                  {median_us(lambda: facets(conn, 'Warehouse'), args.runs):9.0f} us")
+        print(f"first page (by price)         {median_us(lambda: category_page(conn, 'Warehouse'), args.runs):9.0f} us")
+        print(f"first page (by name)          {median_us(lambda: category_page(conn, 'Warehouse', 'name'), args.runs):9.0f} us")
+        print(f"first page (in stock, band 3) {median_us(lambda: category_page(conn, 'Warehouse', 'price', None, True, 3), args.runs):9.0f} us")
+        print(f"first page (by name, band 0)  {median_us(lambda: category_page(conn, 'Warehouse', 'name', None, False, 0), args.runs):9.0f} us")
+        print(f"first page (by name, in stock, band 0) {median_us(lambda: category_page(conn, 'Warehouse', 'name', None, True, 0), args.runs):0.0f} us")
+        print(f"page 500 (by price)           {median_us(lambda: category_page(conn, 'Warehouse', 'price', after), args.runs):9.0f} us")
+
+        def old_path():
+            conn.execute("SELECT DISTINCT category FROM products").fetchall()
+            conn.execute("SELECT id, name, price, stock FROM products WHERE category = ?", ("Warehouse",)).fetchall()
+
+        print(f"old: DISTINCT + whole category {median_us(old_path, max(3, args.runs // 20)):8.0f} us")
+
+        with_triggers = time_decrements(conn, 10000)
+        conn.executescript("DROP TRIGGER products_facets_update; DROP TRIGGER products_facets_insert; DROP TRIGGER products_facets_delete;")
+        without_triggers = time_decrements(conn, 10000)
+        print(f"10,000 stock decrements: {with_triggers:.1f} ms with facet triggers, {without_triggers:.1f} ms without")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Admin dashboard render time from the KPI cache, against recounting on every view
+
+Run from the Q3 folder:
+    python benchmarks/bench_dashboard.py --orders 10000000 --users 1000000 --products 50000 [--db big.db]
+
+Fills a database with datagen (or reuses --db if it already has orders),
+times one full recount (load_kpi_snapshot(), what a dashboard without the
+cache would run on every view), then times Admin.view_dashboard() served
+from the cache: while idle, while a rebuild runs in the background, and
+with checkouts' events arriving between views.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import datagen
+
+
+def render_times(admin, renders, between=None):
+    """Milliseconds for each of `renders` dashboard views, output discarded"""
+    times = []
+    for i in range(renders):
+        if between is not None:
+            between(i)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            admin.view_dashboard()
+            times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summary(name, times):
+    times = sorted(times)
+    print(f"{name:38s} median {statistics.median(times):6.2f} ms   p99 {times[int(len(times) * 0.99)]:6.2f} ms   "
+          f"max {times[-1]:6.2f} ms   ({len(times):,} views)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10000000)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--renders", type=int, default=1000)
+    parser.add_argument("--db", help="database to use, filled first if it has no orders (default: a temporary file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = args.db or os.path.join(directory, "bench.db")
+        dollmart.setup_database()
+        conn = sqlite3.connect(dollmart.DB_PATH)
+        if conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0:
+            start = time.perf_counter()
+            datagen.generate(conn, users=args.users, products=args.products, categories=200, orders=args.orders)
+            print(f"Generated {args.orders:,} orders in {time.perf_counter() - start:.0f} s")
+        orders = conn.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+        conn.execute("UPDATE products SET stock = 1000000000 WHERE id = 1")
+        conn.commit()
+        conn.close()
+        print(f"{orders:,} orders, {os.path.getsize(dollmart.DB_PATH) / 1e9:.1f} GB")
+
+        today = datetime.date.today()
+        start = time.perf_counter()
+        snapshot = dollmart.load_kpi_snapshot(today.isoformat(), (today - datetime.timedelta(days=29)).isoformat())
+        print(f"Full recount (every view without the cache) {time.perf_counter() - start:8.2f} s")
+        print(f"  {len(snapshot.today):,} orders today, {len(snapshot.open_orders):,} open, "
+              f"{snapshot.delivered:,} delivered, {len(snapshot.stock):,} products, "
+              f"{len(snapshot.last_order_day):,} customers active in 30 days")
+
+        dollmart.configure_dashboard()
+        admin = dollmart.Admin(1, "admin")
+        start = time.perf_counter()
+        render_times(admin, 1)
+        print(f"First view (loads the cache)               {time.perf_counter() - start:8.2f} s")
+
+        summary("Cached view", render_times(admin, args.renders))
+
+        # Views keep coming, a few a second, until the background rebuild is done
+        cache = dollmart.get_kpi_cache()
+        refreshed_at = cache.refreshed_at
+        cache.expire()
+        during = []
+        start = time.perf_counter()
+        while cache.refreshed_at == refreshed_at:
+            during += render_times(admin, 1)
+            time.sleep(0.05)
+        print(f"Background rebuild                         {time.perf_counter() - start:8.2f} s")
+        summary("Cached view during the rebuild", during)
+
+        user_id = 2
+        cart = {1: {"name": "Item", "price": 100, "quantity": 1}}
+        checkouts = []
+
+        def checkout(i):
+            start = time.perf_counter()
+            quote = dollmart.quote_cart(cart, False)
+            dollmart.place_bulk_order(user_id, cart, quote)
+            checkouts.append(time.perf_counter() - start)
+
+        before = cache.kpis().orders_today
+        summary("Cached view, a checkout between each", render_times(admin, min(args.renders, 200), checkout))
+        assert cache.kpis().orders_today == before + len(checkouts)
+
+        print(f"  (checkout itself: median {statistics.median(checkouts) * 1000:.2f} ms)")
+
+        events = 100000
+        order_date = time.strftime("%Y-%m-%d %H:%M:%S")
+        items = [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 1}]
+        start = time.perf_counter()
+        for i in range(events):
+            dollmart.update_dashboard("order_placed", order_id=-i - 1, user_id=i, order_date=order_date,
+                                      total_amount=100, items=items)
+        print(f"order_placed events applied          {events / (time.perf_counter() - start):10,.0f} /s")
+
+
+if __name__ == "__main__":
+    main()
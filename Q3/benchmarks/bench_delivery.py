@@ -0,0 +1,86 @@
+"""Delivery slot booking throughput
+
+Run from the Q3 folder:
+    python benchmarks/bench_delivery.py --bookings 1000000 --orders 2000
+
+Books orders into 2-hour slots of 50 with the planner's disjoint-set
+structure and with a linear scan from the first eligible slot, for a burst
+of orders placed at the same moment (every booking has to skip all the
+slots already full) and for orders arriving over 30 days. Then times
+checkouts through run_write(insert_order) with slots on and off.
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from delivery import DeliveryPlanner
+
+
+CAPACITY = 50
+START = datetime.datetime(2025, 6, 1, 6, 0)
+
+
+class LinearPlanner(DeliveryPlanner):
+    """Checks each slot in turn from the first eligible one"""
+
+    def book(self, placed_at):
+        index = self.first_slot(placed_at)
+        while self._booked.get(index, 0) >= self.slot_capacity:
+            index += 1
+        self._booked[index] = self._booked.get(index, 0) + 1
+        return index
+
+
+def bookings_per_second(planner, times):
+    start = time.perf_counter()
+    for placed_at in times:
+        planner.book(placed_at)
+    return len(times) / (time.perf_counter() - start)
+
+
+def checkouts_per_second(orders):
+    cart = {1: {"name": "Rice", "price": 299, "quantity": 1}, 2: {"name": "Milk", "price": 199, "quantity": 1}}
+    start = time.perf_counter()
+    for _ in range(orders):
+        dollmart.run_write(dollmart.insert_order, 2, cart, 498)
+    return orders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=1000000)
+    parser.add_argument("--linear-bookings", type=int, default=50000, help="the linear scan is quadratic in a burst")
+    parser.add_argument("--orders", type=int, default=2000)
+    args = parser.parse_args()
+
+    burst = [START] * args.bookings
+    spread = [START + datetime.timedelta(seconds=i * 30 * 86400 / args.bookings) for i in range(args.bookings)]
+    for name, times in (("burst", burst), ("30 days", spread)):
+        fast = bookings_per_second(DeliveryPlanner(slot_capacity=CAPACITY), times)
+        linear = bookings_per_second(LinearPlanner(slot_capacity=CAPACITY), times[:args.linear_bookings])
+        print(f"{name:8s} disjoint-set {fast:12,.0f} bookings/s ({len(times):,})   "
+              f"linear scan {linear:12,.0f} bookings/s ({min(len(times), args.linear_bookings):,})")
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        dollmart.setup_database()
+        conn = sqlite3.connect(dollmart.DB_PATH)
+        conn.execute("UPDATE products SET stock = 1000000000")
+        conn.execute("INSERT INTO users (username, password_hash, role, is_retail) VALUES ('shopper', 'x', 'customer', 0)")
+        conn.commit()
+        conn.close()
+
+        for enabled in (False, True):
+            dollmart.configure_delivery(enabled, **({"slot_capacity": CAPACITY} if enabled else {}))
+            checkouts_per_second(100)
+            print(f"checkout, slots {'on ' if enabled else 'off'}  {checkouts_per_second(args.orders):8,.0f} orders/s")
+
+
+if __name__ == "__main__":
+    main()
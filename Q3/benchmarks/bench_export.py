@@ -0,0 +1,86 @@
+"""Order export throughput, file size and memory
+
+Run from the Q3 folder:
+    python benchmarks/bench_export.py --users 50000 --orders 500000
+
+Builds an order history with datagen, then times a full export as JSON
+Lines and as the columnar format, measures peak Python memory (tracemalloc)
+of a streaming export against reading every row with fetchall(), and times
+an incremental export after 1,000 more orders (from 100 new customers) are appended.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datagen
+import dollmart
+import queries
+from export import FIELDS, read_columnar
+
+
+def populate(users, orders):
+    dollmart.setup_database(seed=False)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    datagen.generate(conn, users=users, products=5000, orders=orders)
+    conn.close()
+
+
+def peak_mb(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def fetchall_export(path):
+    """The naive version: every row in memory, then written out"""
+    conn = dollmart.connect_db()
+    rows = conn.execute(queries.sql("order_lines_after"), (0, "", "9999")).fetchall()
+    conn.close()
+    with open(path, "w") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(FIELDS, row)), separators=(",", ":")) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.users, args.orders)
+        out = os.path.join(directory, "orders")
+        state = os.path.join(directory, "state.json")
+
+        for fmt in ("jsonl", "columnar"):
+            result = dollmart.export_orders(f"{out}.{fmt}", fmt, state_path=state if fmt == "jsonl" else None)
+            print(f"{fmt:9s} {result.orders} orders, {result.lines} lines in {result.seconds:.2f} s "
+                  f"({result.lines / result.seconds:,.0f} lines/s), {result.bytes / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        read = sum(1 for _ in read_columnar(f"{out}.columnar"))
+        print(f"read back {read} columnar rows in {time.perf_counter() - start:.2f} s")
+
+        print(f"peak memory, streaming jsonl   {peak_mb(lambda: dollmart.export_orders(f'{out}.jsonl')):8.1f} MB")
+        print(f"peak memory, streaming columnar {peak_mb(lambda: dollmart.export_orders(f'{out}.columnar', 'columnar')):7.1f} MB")
+        print(f"peak memory, fetchall() jsonl  {peak_mb(lambda: fetchall_export(f'{out}.naive')):8.1f} MB")
+
+        conn = sqlite3.connect(dollmart.DB_PATH)
+        datagen.generate(conn, users=100, products=10, categories=1, orders=1000, seed=2)
+        conn.close()
+        result = dollmart.export_orders(f"{out}-incremental.jsonl", state_path=state)
+        print(f"incremental: {result.orders} new orders, {result.lines} lines in {result.seconds * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Checkout throughput: per-transaction commits vs. the group-commit queue
+
+Run from the Q3 folder:
+    python benchmarks/bench_group_commit.py --orders 2000 --threads 16
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+
+
+CART = {
+    1: {"name": "Rice", "price": 299, "quantity": 1},
+    2: {"name": "Milk", "price": 199, "quantity": 1},
+}
+
+
+def run_checkouts(orders, threads):
+    per_thread = orders // threads
+
+    def worker():
+        for _ in range(per_thread):
+            dollmart.run_write(dollmart.insert_order, 1, CART, 498)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def fresh_database(directory, name):
+    dollmart.DB_PATH = os.path.join(directory, name)
+    dollmart.setup_database()
+    # Plenty of stock so the benchmark never runs products negative
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.execute("UPDATE products SET stock = 1000000000")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-delay", type=float, default=0.005)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        fresh_database(directory, "per_txn.db")
+        per_txn = run_checkouts(args.orders, args.threads)
+
+        fresh_database(directory, "group.db")
+        dollmart.configure_write_queue(True, args.max_batch, args.max_delay)
+        grouped = run_checkouts(args.orders, args.threads)
+        batches = dollmart.WRITE_QUEUE.batches_committed
+        dollmart.configure_write_queue(False)
+
+    print(f"per-transaction commit: {per_txn:10.0f} orders/sec")
+    print(f"group commit:           {grouped:10.0f} orders/sec ({batches} commits)")
+    print(f"speedup:                {grouped / per_txn:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Cost of checked and refused login attempts during a credential-stuffing burst
+
+Run from the Q3 folder:
+    python benchmarks/bench_login.py --users 1000 --attempts 20000 --clients 50
+
+Creates `--users` customers, then replays `--attempts` wrong-password
+attempts cycling over those usernames from `--clients` addresses, first
+with login limits off and then on, then once more while every username is
+locked out. Reports attempts per second and the credential queries and
+lockout writes issued (counted by the instrument module). Finally fills a
+limiter with 100,000 distinct usernames to show its memory stays bounded.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+from ratelimit import LoginLimiter, LoginRateLimited
+
+
+def populate(users):
+    dollmart.setup_database(seed=False)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.executemany(
+        "INSERT INTO users (username, password_hash, role, is_retail, registration_date) "
+        "VALUES (?, 'x', 'customer', 0, '2024-01-01 00:00:00')",
+        [(f"customer{i:05d}",) for i in range(users)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def burst(users, attempts, clients):
+    refused = 0
+    for i in range(attempts):
+        try:
+            dollmart.authenticate(f"customer{i % users:05d}", "guess", client=f"10.0.{i % clients}.1")
+        except LoginRateLimited:
+            refused += 1
+    return refused
+
+
+def run(label, users, attempts, clients):
+    instrument.reset()
+    instrument.enable()
+    start = time.perf_counter()
+    refused = burst(users, attempts, clients)
+    elapsed = time.perf_counter() - start
+    instrument.disable()
+
+    queries = instrument.metrics()["queries"]
+    selects = sum(stats["count"] for sql, stats in queries.items() if sql.lstrip().upper().startswith("SELECT"))
+    writes = sum(stats["count"] for sql, stats in queries.items() if not sql.lstrip().upper().startswith("SELECT"))
+    print(f"{label:11s} {attempts / elapsed:9.0f} attempts/s  {refused:6d} refused  "
+          f"{selects:6d} credential queries  {writes:5d} lockout writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--attempts", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.users)
+
+        dollmart.configure_login_limits(False)
+        run("limits off", args.users, args.attempts, args.clients)
+
+        dollmart.configure_login_limits()
+        run("limits on", args.users, args.attempts, args.clients)
+        run("locked out", args.users, args.attempts, args.clients)
+
+    tracemalloc.start()
+    limiter = LoginLimiter()
+    for i in range(100000):
+        limiter.check_failure(f"sprayed{i:06d}", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}")
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"after 100,000 distinct usernames and clients: {len(limiter.users)} username and "
+          f"{len(limiter.clients)} client buckets kept, {memory / 1024:.0f} KiB")
+
+if __name__ == "__main__":
+    main()
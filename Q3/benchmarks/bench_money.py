@@ -0,0 +1,119 @@
+"""Cart arithmetic in float dollars, integer cents and Decimal, plus checkout throughput
+
+Run from the Q3 folder:
+    python benchmarks/bench_money.py --lines 1000 --runs 200 --checkouts 1500
+
+The arithmetic part totals the same cart three ways (line subtotals, a 10%
+bulk discount per line and a 10% coupon) and reports how far the float
+total drifts from the exact cent total. The checkout part prices a
+four-line cart and writes the order with run_write against a fresh
+database, the same path place_order takes.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import money
+
+
+def total_float(lines):
+    subtotal = 0.0
+    discount = 0.0
+    for price, quantity in lines:
+        line = price * quantity
+        subtotal += line
+        discount += round(line * 0.1, 2)
+    rest = subtotal - discount
+    return rest - round(rest * 0.1, 2)
+
+
+def total_cents(lines):
+    subtotal = 0
+    discount = 0
+    for price, quantity in lines:
+        line = price * quantity
+        subtotal += line
+        discount += (line * 1000 + 5000) // 10000
+    return subtotal - discount - money.apply_bp(subtotal - discount, 1000)
+
+
+CENT = Decimal("0.01")
+TENTH = Decimal("0.1")
+
+
+def total_decimal(lines):
+    subtotal = Decimal(0)
+    discount = Decimal(0)
+    for price, quantity in lines:
+        line = price * quantity
+        subtotal += line
+        discount += (line * TENTH).quantize(CENT, rounding=ROUND_HALF_UP)
+    rest = subtotal - discount
+    return rest - (rest * TENTH).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def best_ms(function, lines, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(lines)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def checkouts_per_second(count):
+    with tempfile.TemporaryDirectory() as directory:
+        saved = dollmart.DB_PATH
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        try:
+            dollmart.setup_database()
+            conn = sqlite3.connect(dollmart.DB_PATH)
+            conn.execute("UPDATE products SET stock = 1000000000")
+            conn.commit()
+            conn.close()
+
+            cart = {pid: {"name": str(pid), "price": price, "quantity": quantity}
+                    for pid, price, quantity in ((1, 299, 20), (2, 199, 20), (3, 149, 15), (6, 499, 3))}
+            start = time.perf_counter()
+            for _ in range(count):
+                quote = dollmart.quote_cart(cart, True, 10)
+                dollmart.run_write(dollmart.insert_order, 1, cart, quote.total)
+            return count / (time.perf_counter() - start)
+        finally:
+            dollmart.DB_PATH = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--checkouts", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cents = [(rng.randint(1, 50000), rng.randint(1, 200)) for _ in range(args.lines)]
+    dollars = [(price / 100, quantity) for price, quantity in cents]
+    decimals = [(Decimal(price) / 100, quantity) for price, quantity in cents]
+
+    exact = total_cents(cents)
+    print(f"{args.lines}-line cart total: {money.format_cents(exact)}")
+    for name, function, lines in (("float", total_float, dollars), ("int cents", total_cents, cents),
+                                  ("Decimal", total_decimal, decimals)):
+        print(f"  {name:10s} best: {best_ms(function, lines, args.runs):7.3f} ms")
+    # round() on a float rounds its binary value, so half-cent discounts can go either way
+    drift = total_float(dollars) * 100 - exact
+    print(f"  float total is off by {drift:+.6f} cents")
+
+    print(f"checkout (quote + insert_order): {checkouts_per_second(args.checkouts):.0f} checkouts/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time to price a large retail cart with PriceBook.quote
+
+Run from the Q3 folder:
+    python benchmarks/bench_pricing.py --lines 1000 --runs 500
+
+The catalog gets product tiers on a third of its products, category tiers
+on every category and a retail price list on one product in seven, so
+every line takes the slowest path through the pricing pass. The budget is
+judged on the quote (totals); reading its lines, which builds them in
+product ID order, is timed on its own line.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+from pricing import PriceBook
+
+
+BUDGET_MS = 1.0
+
+
+def build(products, lines, seed):
+    rng = random.Random(seed)
+    catalog = [(pid, f"category{pid % 20}", rng.randint(100, 10000), rng.choice([0, 0.05, 0.1]))
+               for pid in range(1, products + 1)]
+    tiers = [(pid, None, "all", quantity, rate)
+             for pid in range(1, products + 1, 3) for quantity, rate in ((10, 0.02), (100, 0.05))]
+    tiers += [(None, f"category{c}", "retail", 500, 0.08) for c in range(20)]
+    price_lists = [("retail", pid, rng.randint(100, 10000)) for pid in range(1, products + 1, 7)]
+
+    start = time.perf_counter()
+    book = PriceBook(catalog, tiers, price_lists)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    cart = {pid: {"name": str(pid), "price": price, "quantity": rng.randint(1, 200)}
+            for pid, _, price, _ in rng.sample(catalog, lines)}
+    return book, cart, build_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    book, cart, build_ms = build(args.products, args.lines, args.seed)
+    book.quote(cart, True, 10)
+
+    samples, with_lines = [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        quote = book.quote(cart, True, 10)
+        quoted = time.perf_counter()
+        len(quote.lines)
+        samples.append((quoted - start) * 1000)
+        with_lines.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+
+    median = statistics.median(samples)
+    print(f"price book build ({args.products} products): {build_ms:8.2f} ms")
+    print(f"quote {args.lines}-line cart  best: {samples[0]:8.3f} ms  median: {median:8.3f} ms  "
+          f"p95: {samples[int(len(samples) * 0.95)]:8.3f} ms")
+    print(f"quote and read its lines    median: {statistics.median(with_lines):8.3f} ms")
+    print(f"budget {BUDGET_MS} ms (median): {'ok' if median <= BUDGET_MS else 'OVER'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Per-statement latency of the query registry, with and without the statement cache
+
+Run from the Q3 folder:
+    python benchmarks/bench_queries.py --customers 500 --runs 2000 [--explain]
+
+Every read statement in queries.STATEMENTS is run `--runs` times on one
+connection with the registry-sized statement cache, then again with
+cached_statements=0 so every execution re-prepares its SQL.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import queries
+
+
+# Parameters for each read statement, against the data built by populate()
+READ_PARAMS = {
+    "admin_count": (),
+    "user_by_credentials": ("customer0001", "x"),
+    "active_login_lockouts": (0,),
+    "user_id_by_username": ("customer0001",),
+    "user_orders_count": (2,),
+    "customers_by_username_range": ("customer00", "customer01", 20),
+    "customers_by_username": (20,),
+    "customer_profile": (2,),
+    "all_customers": (),
+    "product_count": (),
+    "all_products": (),
+    "catalog_products": (),
+    "product_by_id": (1,),
+    "products_by_name": ("%e%",),
+    "products_in_category": ("Electronics",),
+    "product_categories": (),
+    "all_categories": (),
+    "category_id": ("Groceries",),
+    "category_parent": (1,),
+    "category_counts": (),
+    "category_facet_counts": ("Groceries",),
+    "category_subtree": ("Groceries",),
+    "category_page_by_price": ("Groceries", 0, 2 ** 62, 0, -1, 0, 11),
+    "category_page_by_name": ("Groceries", "", 0, 2 ** 62, 0, "", 0, 11),
+    "product_stock": (),
+    "product_for_cart": (1,),
+    "products_for_order_sheet": ("[1, 2, 3, 6]",),
+    "product_order_item_count": (1,),
+    "pricing_products": (),
+    "discount_tiers": (),
+    "all_discount_tiers": (),
+    "price_list_prices": (),
+    "co_purchase_counts": (50,),
+    "product_neighbors": (1,),
+    "open_orders": (),
+    "orders_placed_since": ("2025-01-01",),
+    "customers_ordering_since": ("2025-01-01",),
+    "delivered_order_count": (),
+    "delivery_slots_from": ("2000-01-01 00:00",),
+    "order_exists": (1,),
+    "customer_order_exists": (1, 2),
+    "customer_orders": (2,),
+    "order_item_lines": (1,),
+    "orders_between": ("", "9999"),
+    "order_lines_after": (0, "", "9999"),
+    "customer_orders_page": (2, 10, 0),
+    "all_orders": (),
+    "order_item_details": (1,),
+    "checkout_request": (2, "retry-key"),
+    "available_coupon": (1, 2),
+    "available_coupons": (2,),
+    "customer_coupons": (2,),
+    "table_versions": (),
+}
+
+
+def populate(customers, orders_per_customer):
+    dollmart.setup_database()
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    conn.execute("UPDATE products SET stock = 1000000000")
+    conn.commit()
+    conn.close()
+
+    cart = {1: {"name": "Rice", "price": 299, "quantity": 2}, 2: {"name": "Milk", "price": 199, "quantity": 1}}
+    for i in range(customers):
+        user_id = dollmart.run_write(dollmart.create_customer, f"customer{i:04d}", "x", i % 2)[0]
+        for _ in range(orders_per_customer):
+            dollmart.run_write(dollmart.insert_order, user_id, cart, 797)
+
+
+def time_statements(conn, runs):
+    results = {}
+    for name, params in READ_PARAMS.items():
+        start = time.perf_counter()
+        for _ in range(runs):
+            queries.fetch_all(conn, name, params)
+        results[name] = (time.perf_counter() - start) / runs * 1000000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--orders-per-customer", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--explain", action="store_true", help="print EXPLAIN QUERY PLAN for every statement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.customers, args.orders_per_customer)
+
+        cached = sqlite3.connect(dollmart.DB_PATH, cached_statements=queries.STATEMENT_CACHE_SIZE)
+        uncached = sqlite3.connect(dollmart.DB_PATH, cached_statements=0)
+        with_cache = time_statements(cached, args.runs)
+        without_cache = time_statements(uncached, args.runs)
+        plans = queries.explain_all(cached) if args.explain else {}
+        cached.close()
+        uncached.close()
+
+    print(f"{'statement':30s} {'cached':>10s} {'re-prepared':>12s}")
+    for name in READ_PARAMS:
+        print(f"{name:30s} {with_cache[name]:8.1f}us {without_cache[name]:10.1f}us")
+    print(f"{'total':30s} {sum(with_cache.values()):8.1f}us {sum(without_cache.values()):10.1f}us")
+
+    for name, plan in plans.items():
+        print(f"\n{name}: {queries.sql(name)}")
+        for line in plan:
+            print(f"    {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Admin listings served from the query cache, against re-running their queries
+
+Run from the Q3 folder:
+    python benchmarks/bench_query_cache.py --users 100000 --orders 1000000 [--db big.db]
+
+Builds a database with datagen (or reuses --db), then for the product,
+customer and order listings times the read as Admin.view_all_* does it,
+with the cache off, on a miss and on a hit, and how close the cache's size
+estimate is to the memory tracemalloc sees the rows take. Then times what
+the write counters behind the cache cost: checkouts (run_write +
+insert_order) and a datagen load, with and without their triggers.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datagen
+import dollmart
+import queries
+from querycache import VERSIONED_TABLES, estimate_size
+
+CART = {1: {"name": "Item", "price": 100, "quantity": 1}, 2: {"name": "Item", "price": 100, "quantity": 1}}
+
+LISTINGS = {
+    "products": lambda: read_listing("all_products", ("products",)),
+    "customers": lambda: read_listing("all_customers", ("users",)),
+    "orders": lambda: dollmart.query_customer_data(queries.sql("all_orders"), sort_key=lambda order: order[2],
+                                                   reverse=True, reporting=True, tables=("orders", "users")),
+}
+
+
+def read_listing(name, tables):
+    conn = dollmart.connect_db()
+    try:
+        return dollmart.fetch_listing(conn, name, tables)
+    finally:
+        conn.close()
+
+
+def median_ms(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def drop_version_triggers(path):
+    conn = sqlite3.connect(path)
+    for table in VERSIONED_TABLES:
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event}")
+    conn.commit()
+    conn.close()
+
+
+def checkout_ms(checkouts):
+    return median_ms(lambda: dollmart.run_write(dollmart.insert_order, 2, CART, 200), checkouts)
+
+
+def load_seconds(directory, name, orders, triggers):
+    dollmart.DB_PATH = os.path.join(directory, name)
+    dollmart.setup_database(seed=False)
+    if not triggers:
+        drop_version_triggers(dollmart.DB_PATH)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    start = time.perf_counter()
+    datagen.generate(conn, users=orders // 10, products=5000, orders=orders)
+    seconds = time.perf_counter() - start
+    conn.close()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--checkouts", type=int, default=2000)
+    parser.add_argument("--load-orders", type=int, default=200000)
+    parser.add_argument("--db", help="database to use, filled first if it has no orders (default: a temporary file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = args.db or os.path.join(directory, "bench.db")
+        dollmart.setup_database(seed=False)
+        conn = sqlite3.connect(dollmart.DB_PATH)
+        if conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0:
+            datagen.generate(conn, users=args.users, products=5000, orders=args.orders)
+        conn.execute("UPDATE products SET stock = 1000000000 WHERE id IN (1, 2)")
+        conn.commit()
+        conn.close()
+
+        for name, read in LISTINGS.items():
+            dollmart.configure_query_cache(0)
+            off = median_ms(read, args.runs)
+            dollmart.configure_query_cache(1024 * 1024 * 1024)
+            cache = dollmart.get_query_cache()
+
+            tracemalloc.start()
+            rows = read()
+            allocated = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            cache.clear()
+            miss = median_ms(lambda: (cache.clear(), read()), args.runs)
+            hit = median_ms(read, args.runs * 20)
+            print(f"{name:9s} {len(rows):9,} rows  cache off {off:8.1f} ms  miss {miss:8.1f} ms  hit {hit:6.3f} ms   "
+                  f"estimated {estimate_size(rows) / 1e6:6.1f} MB, measured {allocated / 1e6:6.1f} MB")
+
+        dollmart.configure_query_cache()
+        with_triggers = checkout_ms(args.checkouts)
+        drop_version_triggers(dollmart.DB_PATH)
+        without = checkout_ms(args.checkouts)
+        dollmart.setup_database(seed=False)
+        print(f"checkout  with write counters {with_triggers:.2f} ms, without {without:.2f} ms (median of {args.checkouts:,})")
+
+        loaded = load_seconds(directory, "load.db", args.load_orders, True)
+        bare = load_seconds(directory, "load-bare.db", args.load_orders, False)
+        print(f"datagen   {args.load_orders:,} orders with write counters {loaded:.1f} s, without {bare:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Batch rebuild, incremental update and serving cost of "customers also bought"
+
+Run from the Q3 folder:
+    python benchmarks/bench_recommend.py --products 2000 --orders 100000
+
+Loads a synthetic order history with datagen (basket sizes 1-8, Zipf
+product popularity), then times:
+  - rebuild_recommendations() over the whole history
+  - recommend.record_order() for one more order, as run inside checkout
+  - also_bought() for a single product and for a 20-line cart
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datagen
+import dollmart
+import recommend
+
+
+def populate(products, orders, seed):
+    dollmart.setup_database(seed=False)
+    conn = sqlite3.connect(dollmart.DB_PATH)
+    stats = datagen.generate(conn, users=max(1, orders // 10), products=products, orders=orders, seed=seed)
+    conn.close()
+    return random.Random(seed), {entry.table: entry.rows for entry in stats}["order_items"]
+
+
+def percentiles(samples):
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        rng, items = populate(args.products, args.orders, args.seed)
+
+        start = time.perf_counter()
+        pairs = dollmart.rebuild_recommendations()
+        rebuild = time.perf_counter() - start
+        print(f"rebuild: {args.orders} orders, {items} items -> {pairs} pairs in {rebuild * 1000:.0f} ms")
+
+        conn = dollmart.connect_db()
+        samples = []
+        for _ in range(args.samples):
+            basket = rng.sample(range(1, args.products + 1), 5)
+            start = time.perf_counter()
+            recommend.record_order(conn, basket)
+            samples.append((time.perf_counter() - start) * 1000000)
+        conn.rollback()
+        conn.close()
+        median, p95 = percentiles(samples)
+        print(f"record_order (5-product basket): median {median:7.0f} us  p95 {p95:7.0f} us")
+
+        for label, size in (("1 product", 1), ("20-line cart", 20)):
+            samples = []
+            for _ in range(args.samples):
+                product_ids = rng.sample(range(1, 200), size)
+                start = time.perf_counter()
+                dollmart.also_bought(product_ids)
+                samples.append((time.perf_counter() - start) * 1000000)
+            median, p95 = percentiles(samples)
+            print(f"also_bought ({label}): median {median:7.0f} us  p95 {p95:7.0f} us")
+
+if __name__ == "__main__":
+    main()
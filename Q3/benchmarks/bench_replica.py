@@ -0,0 +1,143 @@
+"""Checkout latency while admin reports run against dollmart.db or its read replica
+
+Run from the Q3 folder:
+    python benchmarks/bench_replica.py --users 100000 --orders 1000000 [--db big.db]
+
+Builds a database with datagen (or reuses --db), times one replica refresh
+(online copy) while idle, then for WAL and rollback-journal mode runs
+checkouts (run_write + insert_order) in a thread while a second process
+loops over the admin listings (every order, every customer) the way
+Admin.view_all_orders/view_all_customers read them: with no reports
+running, with the reports reading dollmart.db, and with them reading a
+replica refreshed in that process's background.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import datagen
+import dollmart
+import queries
+from replica import ReadReplica
+
+CART = {1: {"name": "Item", "price": 100, "quantity": 1}, 2: {"name": "Item", "price": 100, "quantity": 1}}
+
+
+class Checkouts:
+    """Places orders back to back in a thread, recording their latencies and lock timeouts"""
+
+    def __init__(self):
+        self.latencies = []
+        self.locked = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+
+    def run(self):
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            try:
+                dollmart.run_write(dollmart.insert_order, 1, CART, 200)
+            except sqlite3.OperationalError:
+                self.locked += 1
+                continue
+            self.latencies.append((time.perf_counter() - start) * 1000)
+
+
+def describe(latencies, locked):
+    latencies = sorted(latencies) or [float("nan")]
+    return (f"{len(latencies):6d} checkouts  p50 {statistics.median(latencies):6.2f} ms  "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms  max {latencies[-1]:7.1f} ms  "
+            f"{locked:3d} timed out")
+
+
+def report(stop, done, counts, max_staleness):
+    """Run admin listings until `stop` is set (in a separate process)"""
+    if max_staleness:
+        dollmart.configure_replica(max_staleness)
+    while not stop.is_set():
+        conn = dollmart.connect_reporting_db()
+        conn.execute(queries.sql("all_orders")).fetchall()
+        queries.fetch_all(conn, "all_customers")
+        conn.close()
+        done.value += 1
+    if max_staleness:
+        counts[:] = [dollmart.REPLICA.copies, dollmart.REPLICA.primary_reads]
+    dollmart.configure_replica(None)
+
+
+def run(seconds, max_staleness=None):
+    """Checkout latencies over `seconds`, with reports running unless max_staleness is None"""
+    stop, done, counts = multiprocessing.Event(), multiprocessing.Value("i", 0), multiprocessing.Array("i", 2)
+    reader = None
+    if max_staleness is not None:
+        reader = multiprocessing.Process(target=report, args=(stop, done, counts, max_staleness))
+        reader.start()
+
+    checkouts = Checkouts()
+    checkouts.thread.start()
+    time.sleep(seconds)
+    checkouts.stop.set()
+    checkouts.thread.join()
+    if reader is not None:
+        stop.set()
+        reader.join()
+    return checkouts.latencies, checkouts.locked, done.value, list(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--max-staleness", type=float, default=10.0)
+    parser.add_argument("--db", help="database to use, filled first if it has no orders (default: a temporary file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = args.db or os.path.join(directory, "bench.db")
+        dollmart.setup_database(seed=False)
+        conn = sqlite3.connect(dollmart.DB_PATH)
+        if conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0:
+            datagen.generate(conn, users=args.users, products=5000, orders=args.orders)
+        conn.execute("UPDATE products SET stock = 1000000000 WHERE id IN (1, 2)")
+        conn.commit()
+        orders = conn.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+        conn.close()
+
+        replica = ReadReplica(dollmart.DB_PATH, replica_path=os.path.join(directory, "replica.db"))
+        start = time.perf_counter()
+        replica.refresh()
+        print(f"{orders:,} orders, {os.path.getsize(dollmart.DB_PATH) / 1e6:.0f} MB; "
+              f"idle refresh {time.perf_counter() - start:.2f} s")
+        start = time.perf_counter()
+        replica.refresh()
+        print(f"refresh with the primary unchanged {(time.perf_counter() - start) * 1000:.2f} ms")
+        replica.close()
+        os.remove(replica.replica_path)
+
+        for mode in ("wal", "delete"):
+            conn = sqlite3.connect(dollmart.DB_PATH)
+            conn.execute(f"PRAGMA journal_mode = {mode}")
+            conn.close()
+            print(f"== journal_mode={mode} ==")
+            for label, max_staleness in (("no reports", None), ("reports on dollmart.db", 0),
+                                         (f"reports on replica ({args.max_staleness:g} s)", args.max_staleness)):
+                latencies, locked, reports, (copies, primary_reads) = run(args.seconds, max_staleness)
+                extra = "" if max_staleness is None else f"  ({reports} reports, {copies} refreshes)"
+                if max_staleness:
+                    extra += f", {primary_reads} read dollmart.db"
+                print(f"{label:30s} {describe(latencies, locked)}{extra}")
+            replica_path = os.path.splitext(dollmart.DB_PATH)[0] + "-replica.db"
+            if os.path.exists(replica_path):
+                os.remove(replica_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Startup time of the DollMart CLI, checked against a committed budget
+
+Run from the Q3 folder:
+    python benchmarks/bench_startup.py --runs 10
+
+Exits with status 1 if any measurement is over budget.
+"""
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+
+# Budgets in milliseconds; raise them only with a reason in the commit message
+IMPORT_BUDGET_MS = 25
+LAUNCH_TO_EXIT_BUDGET_MS = 120
+SCRIPTED_COMMAND_BUDGET_MS = 120
+
+
+def import_time_ms():
+    """Cumulative `-X importtime` figure for `import dollmart`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import dollmart"],
+        cwd=SRC, capture_output=True, text=True, check=True
+    )
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "dollmart":
+            return int(fields[1]) / 1000
+    raise RuntimeError("dollmart not found in -X importtime output")
+
+
+def launch_to_exit_ms(directory):
+    """Wall time of starting the interactive app and choosing Exit"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(SRC, "dollmart.py")],
+        cwd=directory, input="3\n", capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def scripted_command_ms(directory):
+    """Wall time of `dollmart.py products list`, a one-shot command for scripts"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(SRC, "dollmart.py"), "products", "list"],
+        cwd=directory, capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # Measure an installed app, not one paying for byte-compilation on every start
+    compileall.compile_dir(SRC, quiet=1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, os.path.join(SRC, "dollmart.py"), "init"], cwd=directory, check=True, capture_output=True)
+
+        imports = statistics.median(import_time_ms() for _ in range(args.runs))
+        launches = statistics.median(launch_to_exit_ms(directory) for _ in range(args.runs))
+        commands = statistics.median(scripted_command_ms(directory) for _ in range(args.runs))
+
+    over_budget = False
+    for label, value, budget in [
+        ("import dollmart", imports, IMPORT_BUDGET_MS),
+        ("launch to exit", launches, LAUNCH_TO_EXIT_BUDGET_MS),
+        ("products list", commands, SCRIPTED_COMMAND_BUDGET_MS),
+    ]:
+        status = "ok" if value <= budget else "OVER BUDGET"
+        over_budget = over_budget or value > budget
+        print(f"{label:16s} {value:8.1f} ms  (budget {budget} ms)  {status}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
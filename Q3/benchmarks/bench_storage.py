@@ -0,0 +1,115 @@
+"""Per-operation cost of the SQLite and in-memory storage backends
+
+Run from the Q3 folder:
+    python benchmarks/bench_storage.py --products 10000 --customers 1000 --runs 2000
+
+Runs the same service calls (registration, login, product lookup and
+search, checkout, coupon redemption, order history) against dollmart.db
+and against MemoryStorage loaded from it, and prints the median cost of
+each on both.
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+
+
+def populate(products, customers, seed):
+    rng = random.Random(seed)
+    dollmart.setup_database(seed=False)
+
+    def load(conn):
+        repos = dollmart.repositories(conn)
+        for i in range(products):
+            repos.products.add(f"Item {rng.randint(0, 10 ** 9):09d}", f"Aisle {i % 40}", rng.randint(50, 100000), 10 ** 6)
+
+    dollmart.run_write(load)
+    for i in range(customers):
+        dollmart.run_write(dollmart.create_customer, f"customer{i:06d}", password_hash("pw"), i % 2)
+
+
+def password_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def median_us(function, runs):
+    samples = []
+    for i in range(runs):
+        start = time.perf_counter()
+        function(i)
+        samples.append((time.perf_counter() - start) * 1000000)
+    return statistics.median(samples)
+
+
+def measure(args, rng):
+    """Median microseconds per operation on the configured backend"""
+    product_ids = range(1, args.products + 1)
+    # Customer user IDs start at 2, after the admin
+    user_ids = range(2, args.customers + 2)
+    carts = [
+        {product_id: {"name": "", "price": 100, "quantity": 1} for product_id in rng.sample(product_ids, 3)}
+        for _ in range(args.runs)
+    ]
+    customers = [rng.choice(user_ids) for _ in range(args.runs)]
+    coupons = [dollmart.create_coupon(user_id, 5)[0] for user_id in customers]
+
+    def checkout(i):
+        dollmart.run_write(dollmart.insert_order, customers[i], carts[i], 300, None, True)
+
+    def history(i):
+        with dollmart.open_storage() as repos:
+            repos.orders.for_user(customers[i])
+
+    def cart_lookup(i):
+        with dollmart.open_storage() as repos:
+            repos.products.for_cart(rng.choice(product_ids))
+
+    return {
+        "register": median_us(lambda i: dollmart.run_write(
+            dollmart.create_customer, f"new{i:07d}", password_hash("pw"), 0), args.runs),
+        "login": median_us(lambda i: dollmart.authenticate(f"customer{i % args.customers:06d}", "pw"), args.runs),
+        "add to cart lookup": median_us(cart_lookup, args.runs),
+        "search by name": median_us(lambda i: dollmart.find_products(f"{i % 1000:03d}"), max(3, args.runs // 20)),
+        "checkout (3 lines)": median_us(checkout, args.runs),
+        "redeem coupon": median_us(lambda i: dollmart.apply_coupon(customers[i], coupons[i], 10000), args.runs),
+        "order history": median_us(history, args.runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    dollmart.configure_login_limits(False)
+    with tempfile.TemporaryDirectory() as directory:
+        dollmart.DB_PATH = os.path.join(directory, "bench.db")
+        populate(args.products, args.customers, args.seed)
+
+        start = time.perf_counter()
+        dollmart.configure_storage("memory", load=True)
+        load_ms = (time.perf_counter() - start) * 1000
+        memory = measure(args, random.Random(args.seed))
+
+        dollmart.configure_storage("sqlite")
+        sqlite = measure(args, random.Random(args.seed))
+
+    print(f"{args.products} products, {args.customers} customers; memory backend loaded in {load_ms:.0f} ms")
+    print(f"{'operation':22} {'sqlite us':>10} {'memory us':>10} {'ratio':>7}")
+    for operation in sqlite:
+        print(f"{operation:22} {sqlite[operation]:10.1f} {memory[operation]:10.1f} "
+              f"{sqlite[operation] / memory[operation]:6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
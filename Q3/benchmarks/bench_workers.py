@@ -0,0 +1,66 @@
+"""Read throughput of the multi-process worker mode as workers are added
+
+Run from the Q3 folder:
+    python benchmarks/bench_workers.py --products 20000 --requests 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from workers import Supervisor
+
+
+def build_database(db_path, products):
+    dollmart.DB_PATH = db_path
+    dollmart.setup_database()
+    conn = sqlite3.connect(db_path)
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
+        [(f"product-{i}-{rng.randint(0, 10**6)}", f"category-{i % 50}", 100 + i % 100 * 100, 100, 0) for i in range(products)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(db_path, workers, requests):
+    rng = random.Random(7)
+    terms = [str(rng.randint(0, 999)) for _ in range(requests)]
+
+    with Supervisor(num_workers=workers, db_path=db_path) as supervisor:
+        supervisor.call("search_products", "warmup")
+        start = time.perf_counter()
+        futures = [supervisor.submit("search_products", term) for term in terms]
+        for future in futures:
+            future.result()
+        return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "dollmart.db")
+        build_database(db_path, args.products)
+
+        workers = 1
+        baseline = None
+        while workers <= args.max_workers:
+            throughput = measure(db_path, workers, args.requests)
+            baseline = baseline or throughput
+            print(f"{workers:3d} workers: {throughput:10.0f} searches/sec ({throughput / baseline:.2f}x)")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
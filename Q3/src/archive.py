@@ -0,0 +1,198 @@
+import os
+import json
+import gzip
+import sqlite3
+
+import money
+
+
+INDEX_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS archived_orders (
+        order_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        order_date TEXT NOT NULL,
+        partition TEXT NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_archived_user_date ON archived_orders (user_id, order_date)",
+]
+
+
+class OrderArchive:
+    """Cold storage for delivered orders
+
+    Orders are appended to one gzip-compressed JSONL partition per month
+    (`orders-2025-03.jsonl.gz`). Every archiving run appends a new gzip
+    member, so partitions are never rewritten. A small SQLite index maps
+    order IDs and user IDs to partitions for lookups.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.db")
+        self._cached_partition = None
+        self._cached_records = None
+
+    def partition_path(self, partition):
+        return os.path.join(self.directory, f"orders-{partition}.jsonl.gz")
+
+    def _connect_index(self, create=False):
+        if not create and not os.path.exists(self.index_path):
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.index_path)
+        for statement in INDEX_SCHEMA:
+            conn.execute(statement)
+        return conn
+
+    def archive(self, conn, cutoff):
+        """Move delivered orders placed on or before `cutoff` out of `conn`
+
+        The partitions and index are written and synced before the rows are
+        deleted from the hot tables, and orders already in the index are only
+        deleted, so a run interrupted at any point can simply be repeated.
+
+        Args:
+            conn: Connection to the database holding the orders
+            cutoff: Latest order_date ("%Y-%m-%d %H:%M:%S") to archive
+
+        Returns:
+            Number of orders archived
+        """
+        cursor = conn.cursor()
+
+        # orders.id is a plain INTEGER PRIMARY KEY, which reuses MAX(id) + 1;
+        # the newest order always stays hot so archived IDs are never handed out again.
+        cursor.execute(
+            """
+            SELECT id, user_id, order_date, status, total_amount, estimated_delivery
+            FROM orders
+            WHERE status = 'Delivered' AND order_date <= ?
+              AND id < (SELECT MAX(id) FROM orders)
+            ORDER BY id
+            """,
+            (cutoff,)
+        )
+        orders = cursor.fetchall()
+        if not orders:
+            return 0
+
+        index = self._connect_index(create=True)
+        already_archived = set()
+        for order in orders:
+            if index.execute("SELECT 1 FROM archived_orders WHERE order_id = ?", (order[0],)).fetchone():
+                already_archived.add(order[0])
+
+        partitions = {}
+        for order_id, user_id, order_date, status, total_amount, estimated_delivery in orders:
+            if order_id in already_archived:
+                continue
+
+            cursor.execute(
+                """
+                SELECT oi.product_id, p.name, oi.quantity, oi.price
+                FROM order_items oi
+                LEFT JOIN products p ON oi.product_id = p.id
+                WHERE oi.order_id = ?
+                """,
+                (order_id,)
+            )
+            items = [
+                {"product_id": product_id, "name": name, "quantity": quantity, "price": price}
+                for product_id, name, quantity, price in cursor.fetchall()
+            ]
+            partitions.setdefault(order_date[:7], []).append({
+                "id": order_id,
+                "user_id": user_id,
+                "order_date": order_date,
+                "status": status,
+                "total_amount": total_amount,
+                "estimated_delivery": estimated_delivery,
+                "items": items,
+            })
+
+        for partition, records in partitions.items():
+            with open(self.partition_path(partition), "ab") as f:
+                with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                    for record in records:
+                        gz.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            index.executemany(
+                "INSERT OR IGNORE INTO archived_orders (order_id, user_id, order_date, partition) VALUES (?, ?, ?, ?)",
+                [(record["id"], record["user_id"], record["order_date"], partition) for record in records]
+            )
+        index.commit()
+        index.close()
+        self._cached_partition = None
+
+        order_ids = [(order[0],) for order in orders]
+        cursor.executemany("DELETE FROM order_items WHERE order_id = ?", order_ids)
+        cursor.executemany("DELETE FROM orders WHERE id = ?", order_ids)
+        conn.commit()
+
+        return len(orders)
+
+    @staticmethod
+    def _to_cents(record):
+        # Partitions written before schema version 3 hold REAL dollars, which
+        # JSON always decodes as floats; cents are always ints.
+        if isinstance(record["total_amount"], float):
+            record["total_amount"] = money.to_cents(record["total_amount"])
+        for item in record["items"]:
+            if isinstance(item["price"], float):
+                item["price"] = money.to_cents(item["price"])
+        return record
+
+    def _load_partition(self, partition, order_id=None):
+        # Another process may have appended to the cached partition since it was read
+        path = os.path.abspath(self.partition_path(partition))
+        stale = order_id is not None and self._cached_records is not None and order_id not in self._cached_records
+        if path != self._cached_partition or stale:
+            records = {}
+            with gzip.open(path, "rb") as gz:
+                for line in gz:
+                    record = self._to_cents(json.loads(line))
+                    records[record["id"]] = record
+            self._cached_partition = path
+            self._cached_records = records
+        return self._cached_records
+
+    def find(self, order_id):
+        """Return the archived order record for `order_id`, or None"""
+        index = self._connect_index()
+        if index is None:
+            return None
+
+        row = index.execute("SELECT partition FROM archived_orders WHERE order_id = ?", (order_id,)).fetchone()
+        index.close()
+        if not row:
+            return None
+
+        return self._load_partition(row[0], order_id).get(order_id)
+
+    def count_for_user(self, user_id):
+        index = self._connect_index()
+        if index is None:
+            return 0
+
+        count = index.execute("SELECT COUNT(*) FROM archived_orders WHERE user_id = ?", (user_id,)).fetchone()[0]
+        index.close()
+        return count
+
+    def orders_for_user(self, user_id):
+        """Return a user's archived order records, newest first"""
+        index = self._connect_index()
+        if index is None:
+            return []
+
+        rows = index.execute(
+            "SELECT order_id, partition FROM archived_orders WHERE user_id = ? ORDER BY order_date DESC, order_id DESC",
+            (user_id,)
+        ).fetchall()
+        index.close()
+
+        return [self._load_partition(partition, order_id)[order_id] for order_id, partition in rows]
@@ -0,0 +1,242 @@
+"""Online backups of dollmart.db as compressed snapshots, and restore
+
+Run from the src folder:
+    python backup.py backup [--dir backups] [--keep 14]
+    python backup.py list [--dir backups]
+    python backup.py restore [SNAPSHOT | --at "2025-06-01 12:00:00"] [--dir backups]
+
+`backup` is safe while the app is running. `restore` replaces the
+database file, so stop the app first.
+"""
+import argparse
+import datetime
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from collections import namedtuple
+
+
+# Pages copied per backup step and the pause between steps, so writers get the database in between
+PAGES_PER_STEP = 64
+STEP_SLEEP = 0.005
+
+# In rollback-journal mode a write between steps restarts the copy; after
+# this many restarts the rest is copied in one step
+MAX_RESTARTS = 3
+
+COMPRESS_LEVEL = 1
+TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+SNAPSHOT_SUFFIX = ".db.gz"
+
+BackupResult = namedtuple("BackupResult", ["path", "pages", "database_bytes", "snapshot_bytes", "seconds", "restarts"])
+Snapshot = namedtuple("Snapshot", ["taken_at", "path"])
+
+
+class _Restart(Exception):
+    pass
+
+
+class CopyCancelled(Exception):
+    """Raised by copy_database() when its `stop` event is set mid-copy"""
+
+
+def copy_database(source_path, target_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, max_restarts=MAX_RESTARTS,
+                  stop=None):
+    """Copy a live database with SQLite's online backup API
+
+    The copy runs `pages` pages at a time, sleeping `sleep` seconds between
+    steps. In WAL mode the source connection holds one read transaction
+    for the whole copy, so the copy is a consistent snapshot and writers
+    carry on committing to the WAL. In rollback-journal mode each step only
+    holds the read lock while it runs, and any commit in between makes
+    SQLite restart the copy; after `max_restarts` restarts the remainder
+    is copied in a single step, holding off writers until it finishes.
+
+    `stop` is an optional threading.Event; setting it abandons the copy
+    after the current step with CopyCancelled, leaving `target_path` partial.
+
+    Returns:
+        tuple: (pages copied, restarts)
+    """
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    state = {"remaining": None, "restarts": 0, "total": 0}
+
+    def progress(status, remaining, total):
+        if stop is not None and stop.is_set():
+            raise CopyCancelled()
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise _Restart()
+        state["remaining"] = remaining
+        state["total"] = total
+        # Connection.backup() only sleeps after a busy step, so the pause between steps is taken here
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=STEP_SLEEP)
+        except _Restart:
+            source.backup(target, pages=-1)
+        if wal:
+            source.execute("COMMIT")
+        pages_copied = target.execute("PRAGMA page_count").fetchone()[0]
+        return pages_copied, state["restarts"]
+    finally:
+        target.close()
+        source.close()
+
+
+def snapshot_path(directory, stem, taken_at):
+    return os.path.join(directory, f"{stem}-{taken_at.strftime(TIMESTAMP_FORMAT)}{SNAPSHOT_SUFFIX}")
+
+
+def take_snapshot(source_path, directory, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, compress_level=COMPRESS_LEVEL):
+    """Back up one database file into a gzip-compressed snapshot in `directory`
+
+    The online copy is written next to the snapshot first, checked with
+    PRAGMA quick_check, compressed, and only then renamed into place, so a
+    snapshot file is never partial.
+
+    Returns:
+        BackupResult
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    taken_at = datetime.datetime.now()
+    path = snapshot_path(directory, stem, taken_at)
+    copy_path = path + ".copy"
+
+    start = time.perf_counter()
+    try:
+        pages, restarts = copy_database(source_path, copy_path, pages, sleep)
+        _check(copy_path)
+        with open(copy_path, "rb") as copy, gzip.open(path + ".partial", "wb", compresslevel=compress_level) as snapshot:
+            shutil.copyfileobj(copy, snapshot, 1024 * 1024)
+        os.replace(path + ".partial", path)
+        database_bytes = os.path.getsize(copy_path)
+    finally:
+        for leftover in (copy_path, path + ".partial"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    return BackupResult(path, pages, database_bytes, os.path.getsize(path), time.perf_counter() - start, restarts)
+
+
+def _check(path):
+    conn = sqlite3.connect(path)
+    result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    conn.close()
+    if result != "ok":
+        raise ValueError(f"{path} failed its integrity check: {result}")
+
+
+def list_snapshots(directory, stem="dollmart"):
+    """Snapshots of one database in `directory`, oldest first
+
+    Returns:
+        list of Snapshot(taken_at, path)
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    prefix = f"{stem}-"
+    snapshots = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(SNAPSHOT_SUFFIX):
+            try:
+                taken_at = datetime.datetime.strptime(name[len(prefix):-len(SNAPSHOT_SUFFIX)], TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            snapshots.append(Snapshot(taken_at, os.path.join(directory, name)))
+    return sorted(snapshots)
+
+
+def snapshot_at(directory, at, stem="dollmart"):
+    """The latest snapshot taken at or before `at`, or None"""
+    earlier = [snapshot for snapshot in list_snapshots(directory, stem) if snapshot.taken_at <= at]
+    return earlier[-1] if earlier else None
+
+
+def prune(directory, keep, stem="dollmart"):
+    """Delete all but the newest `keep` snapshots; returns the paths removed"""
+    snapshots = list_snapshots(directory, stem)
+    removed = [snapshot.path for snapshot in snapshots[:max(0, len(snapshots) - keep)]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def restore(snapshot, target_path):
+    """Replace `target_path` with the database in a snapshot
+
+    The snapshot is decompressed next to the target and checked before
+    anything is touched. The current file and its -wal/-shm/-journal files
+    are moved aside to `<target>.pre-restore*` (SQLite would otherwise apply
+    a leftover WAL to the restored file). The app must not be running.
+
+    Returns:
+        Bytes restored
+    """
+    restoring = target_path + ".restoring"
+    try:
+        with gzip.open(snapshot, "rb") as source, open(restoring, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        _check(restoring)
+    except (OSError, ValueError, sqlite3.DatabaseError):
+        if os.path.exists(restoring):
+            os.remove(restoring)
+        raise
+
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(target_path + suffix):
+            os.replace(target_path + suffix, target_path + ".pre-restore" + suffix)
+    os.replace(restoring, target_path)
+    return os.path.getsize(target_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["backup", "list", "restore"])
+    parser.add_argument("snapshot", nargs="?", help="snapshot file to restore (default: the latest)")
+    parser.add_argument("--db", default="dollmart.db")
+    parser.add_argument("--dir", default="backups", help="snapshot folder")
+    parser.add_argument("--at", help="restore the latest snapshot taken at or before YYYY-MM-DD HH:MM:SS")
+    parser.add_argument("--keep", type=int, help="after a backup, delete all but this many snapshots")
+    args = parser.parse_args(argv)
+    stem = os.path.splitext(os.path.basename(args.db))[0]
+
+    if args.command == "backup":
+        result = take_snapshot(args.db, args.dir)
+        print(f"{result.path}: {result.pages} pages, {result.database_bytes / 1e6:.1f} MB -> "
+              f"{result.snapshot_bytes / 1e6:.1f} MB in {result.seconds:.2f} s "
+              f"({result.database_bytes / 1e6 / result.seconds:.0f} MB/s, {result.restarts} restarts)")
+        if args.keep:
+            for path in prune(args.dir, args.keep, stem):
+                print(f"removed {path}")
+    elif args.command == "list":
+        for snapshot in list_snapshots(args.dir, stem):
+            print(f"{snapshot.taken_at:%Y-%m-%d %H:%M:%S}  {os.path.getsize(snapshot.path) / 1e6:8.1f} MB  {snapshot.path}")
+    else:
+        if args.snapshot:
+            path = args.snapshot
+        else:
+            at = datetime.datetime.strptime(args.at, "%Y-%m-%d %H:%M:%S") if args.at else datetime.datetime.now()
+            found = snapshot_at(args.dir, at, stem)
+            if found is None:
+                parser.error(f"no snapshot of {args.db} in {args.dir} taken at or before {at}")
+            path = found.path
+        restored = restore(path, args.db)
+        print(f"restored {args.db} ({restored / 1e6:.1f} MB) from {path}; the previous file is {args.db}.pre-restore")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import csv
+
+
+# Order sheets are for retail stores; anything larger is split into several orders
+MAX_SHEET_LINES = 10000
+
+
+def parse_order_sheet(lines):
+    """Parse a CSV order sheet of `product_id,quantity` rows
+
+    A header row, blank lines and `#` comments are skipped. A product listed
+    more than once has its quantities added up.
+
+    Args:
+        lines: Iterable of text lines (an open file works)
+
+    Returns:
+        dict: Product ID -> quantity, in sheet order
+
+    Raises:
+        ValueError: On a malformed row, naming its line number
+    """
+    quantities = {}
+    first_row = True
+    for line_number, row in enumerate(csv.reader(lines), 1):
+        if not row or not "".join(row).strip() or row[0].lstrip().startswith("#"):
+            continue
+        if len(row) != 2:
+            raise ValueError(f"Line {line_number}: expected product_id,quantity")
+
+        try:
+            product_id, quantity = int(row[0]), int(row[1])
+        except ValueError:
+            if first_row:
+                first_row = False
+                continue
+            raise ValueError(f"Line {line_number}: product_id and quantity must be whole numbers") from None
+        first_row = False
+
+        if quantity <= 0:
+            raise ValueError(f"Line {line_number}: quantity must be positive")
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if len(quantities) > MAX_SHEET_LINES:
+            raise ValueError(f"Order sheets are limited to {MAX_SHEET_LINES} products")
+
+    return quantities
+
+
+def read_order_sheet(path):
+    with open(path, newline="") as f:
+        return parse_order_sheet(f)
+
+
+def build_cart(products, quantities):
+    """Look up every product on a sheet at once and build a cart from it
+
+    On SQLite the lookup is one statement, however long the sheet (see
+    storage.SQLiteProducts.for_order_sheet).
+
+    Args:
+        products: The catalog's storage.ProductRepository
+        quantities: Product ID -> quantity, as returned by parse_order_sheet
+
+    Returns:
+        tuple: (cart, problems) where cart maps product ID to
+        {"name", "price", "quantity"} for the lines that can be filled and
+        problems lists a message for each line that cannot
+    """
+    found = {row.id: row for row in products.for_order_sheet(quantities)}
+
+    cart = {}
+    problems = []
+    for product_id, quantity in quantities.items():
+        product = found.get(product_id)
+        if product is None:
+            problems.append(f"Product {product_id} not found.")
+        elif product.stock < quantity:
+            problems.append(f"Product {product_id} ({product.name}): only {product.stock} units available.")
+        else:
+            cart[product_id] = {"name": product.name, "price": product.price, "quantity": quantity}
+    return cart, problems
@@ -0,0 +1,264 @@
+from collections import namedtuple
+
+import queries
+from money import format_cents
+
+
+# Price facets, in cents: [low, high) with None for no upper bound
+PRICE_BANDS = [(0, 500), (500, 2000), (2000, 10000), (10000, 50000), (50000, None)]
+
+PAGE_SIZE = 10
+SORTS = ("price", "name")
+
+# Upper bound used for the open-ended last band in listing queries
+_NO_CEILING = 2 ** 62
+
+CategoryNode = namedtuple(
+    "CategoryNode", ["id", "name", "parent_id", "depth", "product_count", "in_stock_count"]
+)
+Page = namedtuple("Page", ["products", "next_key", "total"])
+
+
+def band_label(band):
+    """A band as the half-open range it is, e.g. "$5.00 to under $20.00" """
+    low, high = PRICE_BANDS[band]
+    if high is None:
+        return f"{format_cents(low)} and up"
+    return f"{format_cents(low)} to under {format_cents(high)}"
+
+
+def price_band_sql(column):
+    """SQL expression giving the PRICE_BANDS index of a price column"""
+    cases = " ".join(f"WHEN {column} < {high} THEN {band}" for band, (_, high) in enumerate(PRICE_BANDS) if high is not None)
+    return f"(CASE {cases} ELSE {len(PRICE_BANDS) - 1} END)"
+
+
+def create_schema(cursor):
+    """Create the category tables, listing indexes and the triggers that keep the counts
+
+    category_facets holds one count per (category, price band, in stock),
+    so every count browsing shows is a sum over at most a handful of rows.
+    Triggers on products keep it exact for every write path: admin product
+    changes, checkout stock decrements and direct SQL alike. Updates only
+    touch it when a product changes category or price or crosses zero
+    stock, so an ordinary stock decrement costs one cheap WHEN check (a
+    price change within a band moves the count out and back in).
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL,
+        parent_id INTEGER,
+        FOREIGN KEY (parent_id) REFERENCES categories (id)
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS category_facets (
+        category TEXT NOT NULL,
+        price_band INTEGER NOT NULL,
+        in_stock INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (category, price_band, in_stock)
+    ) WITHOUT ROWID
+    ''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category, price)")
+    # Carries the price, so a band listed by name is filtered on index entries rather than table
+    # rows. Stock is left out of both: every checkout decrement would have to move their entries.
+    cursor.execute("DROP INDEX IF EXISTS idx_products_category_name")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_category_name_price ON products (category, name, id, price)")
+
+    old_band, new_band = price_band_sql("OLD.price"), price_band_sql("NEW.price")
+    add_new = f'''
+        INSERT OR IGNORE INTO categories (name) VALUES (NEW.category);
+        INSERT INTO category_facets (category, price_band, in_stock, count)
+        VALUES (NEW.category, {new_band}, NEW.stock > 0, 1)
+        ON CONFLICT (category, price_band, in_stock) DO UPDATE SET count = count + 1;
+    '''
+    remove_old = f'''
+        UPDATE category_facets SET count = count - 1
+        WHERE category = OLD.category AND price_band = {old_band} AND in_stock = (OLD.stock > 0);
+    '''
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS products_facets_insert AFTER INSERT ON products BEGIN {add_new} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS products_facets_delete AFTER DELETE ON products BEGIN {remove_old} END")
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS products_facets_update AFTER UPDATE OF category, price, stock ON products
+    WHEN OLD.category IS NOT NEW.category OR OLD.price != NEW.price OR (OLD.stock > 0) != (NEW.stock > 0)
+    BEGIN {remove_old} {add_new} END
+    ''')
+
+
+# Generated from PRICE_BANDS, so registered here rather than in queries.py
+queries.statement(
+    "rebuild_category_facets",
+    f"""
+    INSERT INTO category_facets (category, price_band, in_stock, count)
+    SELECT category, {price_band_sql("price")}, stock > 0, COUNT(*) FROM products GROUP BY 1, 2, 3
+    """
+)
+
+
+def rebuild_counts(conn):
+    """Recompute every facet count from the products table (setup and migration). Does not commit."""
+    queries.run(conn, "register_product_categories")
+    queries.run(conn, "clear_category_facets")
+    queries.run(conn, "rebuild_category_facets")
+
+
+def category_tree(conn):
+    """Every category, depth first and sorted by name, with product counts including subcategories
+
+    Reads the categories table and the facet counts, never products, so it
+    costs the same however many products there are.
+
+    Returns:
+        list of CategoryNode
+    """
+    counts = {row.category: (row.product_count, row.in_stock_count)
+              for row in queries.fetch_all(conn, "category_counts")}
+    children = {}
+    for row in queries.fetch_all(conn, "all_categories"):
+        children.setdefault(row.parent_id, []).append(row)
+
+    totals = {}
+
+    def total(node):
+        product_count, in_stock_count = counts.get(node.name, (0, 0))
+        for child in children.get(node.id, ()):
+            child_count, child_in_stock = total(child)
+            product_count += child_count
+            in_stock_count += child_in_stock
+        totals[node.id] = (product_count, in_stock_count)
+        return totals[node.id]
+
+    for root in children.get(None, ()):
+        total(root)
+
+    nodes = []
+
+    def walk(node, depth):
+        nodes.append(CategoryNode(node.id, node.name, node.parent_id, depth, *totals[node.id]))
+        for child in children.get(node.id, ()):
+            walk(child, depth + 1)
+
+    for root in children.get(None, ()):
+        walk(root, 0)
+    return nodes
+
+
+def subtree(conn, category):
+    """Names of `category` and every category below it"""
+    return [row.name for row in queries.fetch_all(conn, "category_subtree", (category,))] or [category]
+
+
+def facets(conn, category, names=None):
+    """Product counts for one category, subcategories included, by price band
+
+    Args:
+        names: The category's subtree() if the caller already has it
+
+    Returns:
+        dict with "products", "in_stock" and "bands": a list of
+        (band, label, products, in_stock) for each band with products
+    """
+    by_band = {}
+    for name in names or subtree(conn, category):
+        for row in queries.fetch_all(conn, "category_facet_counts", (name,)):
+            products, in_stock = by_band.get(row.price_band, (0, 0))
+            by_band[row.price_band] = (products + row.count, in_stock + (row.count if row.in_stock else 0))
+
+    return {
+        "products": sum(products for products, _ in by_band.values()),
+        "in_stock": sum(in_stock for _, in_stock in by_band.values()),
+        "bands": [(band, band_label(band), *by_band[band]) for band in sorted(by_band) if by_band[band][0]],
+    }
+
+
+def category_page(conn, category, sort="price", after=None, in_stock_only=False, band=None, page_size=PAGE_SIZE):
+    """One page of a category's products, subcategories included, by keyset pagination
+
+    Pages are read from the (category, price) or (category, name) index
+    starting just after `after`, the sort key of the last row of the
+    previous page, so every page costs the same whether it is the first or
+    the thousandth and no OFFSET rows are skipped over. A category with
+    subcategories reads one page from each and keeps the first rows of
+    their merge.
+
+    Only the category and the sort column bound the index range, so a
+    filter that matches few of a category's products walks past the rest.
+    A price band sorted by name is checked on the index entries, which
+    carry the price. The in-stock filter reads each candidate's table row,
+    since stock is not indexed.
+
+    Args:
+        conn: Connection to the catalog database
+        category: Category name
+        sort: "price" (ascending, then ID) or "name"
+        after: next_key of the previous page, or None for the first page
+        in_stock_only: Leave out products with no stock
+        band: Index into PRICE_BANDS to restrict to, or None
+        page_size: Products per page
+
+    Returns:
+        Page(products, next_key, total): next_key is None on the last page,
+        and total is the number of products matching the filters, from the
+        facet counts
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+
+    low, high = (0, _NO_CEILING) if band is None else PRICE_BANDS[band]
+    high = _NO_CEILING if high is None else high
+    if after is None:
+        after = (-1, 0) if sort == "price" else ("", 0)
+
+    min_stock = 1 if in_stock_only else -_NO_CEILING
+    if sort == "price":
+        bounds = (max(low, after[0]), high, min_stock, *after, page_size + 1)
+    else:
+        bounds = (after[0], low, high, min_stock, *after, page_size + 1)
+    names = subtree(conn, category)
+    rows = []
+    for name in names:
+        rows.extend(queries.fetch_all(conn, f"category_page_by_{sort}", (name, *bounds)))
+    if len(names) > 1:
+        rows.sort(key=(lambda row: (row.price, row.id)) if sort == "price" else (lambda row: (row.name, row.id)))
+    next_key = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_key = (last.price, last.id) if sort == "price" else (last.name, last.id)
+
+    counts = facets(conn, category, names)
+    if band is not None:
+        matching = [entry for entry in counts["bands"] if entry[0] == band]
+        total = (matching[0][3] if in_stock_only else matching[0][2]) if matching else 0
+    else:
+        total = counts["in_stock"] if in_stock_only else counts["products"]
+    return Page(rows, next_key, total)
+
+
+def set_parent(conn, name, parent_name):
+    """Move a category under another one (or to the top level with parent_name None)
+
+    Either category is created if it does not exist yet, so an admin can
+    group existing categories under a new heading. Does not commit.
+
+    Raises:
+        ValueError: If the move would make a category its own ancestor
+    """
+    queries.run(conn, "insert_category", (name,))
+    category_id = queries.scalar(conn, "category_id", (name,))
+
+    parent_id = None
+    if parent_name:
+        queries.run(conn, "insert_category", (parent_name,))
+        parent_id = queries.scalar(conn, "category_id", (parent_name,))
+        ancestor = parent_id
+        while ancestor is not None:
+            if ancestor == category_id:
+                raise ValueError(f"'{parent_name}' is inside '{name}'; a category cannot be its own ancestor")
+            ancestor = queries.scalar(conn, "category_parent", (ancestor,))
+
+    queries.run(conn, "set_category_parent", (parent_id, category_id))
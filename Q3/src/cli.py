@@ -0,0 +1,214 @@
+"""Scripted DollMart commands that run one operation and exit
+
+Run from the src folder:
+    python dollmart.py products list [--category Groceries] [--in-stock]
+    python dollmart.py orders export [--since "2025-06-01 00:00:00"] [--until ...]
+    python dollmart.py orders export-lines FILE [--format jsonl|columnar] [--since ...] [--state FILE]
+    python dollmart.py orders advance
+    python dollmart.py coupons issue --percent 10 [--prefix PROMO] USER_ID... (or - to read IDs from stdin)
+    python dollmart.py init | backup | rebuild-recommendations
+
+Listings go to stdout one row per line, as TSV with a header line
+(--format tsv, the default) or JSON Lines (--format jsonl), so they can be
+piped into other tools. Amounts are integer cents. The DOLLMART_*
+environment variables apply as they do to the interactive app.
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+
+import dollmart
+import queries
+
+
+FORMATS = ("tsv", "jsonl")
+
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def tsv_field(value):
+    """One TSV field: None is empty, and backslash, tab and newlines are escaped"""
+    if value is None:
+        return ""
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def write_rows(rows, fields, fmt, out):
+    """Write rows as they arrive, so a listing never has to fit in memory
+
+    Returns:
+        Number of rows written
+    """
+    count = 0
+    if fmt == "tsv":
+        out.write("\t".join(fields) + "\n")
+        for row in rows:
+            out.write("\t".join(map(tsv_field, row)) + "\n")
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(fields, row)), separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def products_list(args, out):
+    conn = dollmart.connect_db()
+    try:
+        if args.category:
+            rows = queries.run(conn, "products_in_category", (args.category,))
+        else:
+            rows = queries.run(conn, "catalog_products")
+        if args.in_stock:
+            rows = (row for row in rows if row.stock > 0)
+        write_rows(rows, queries.STATEMENTS["catalog_products"].row_type._fields, args.format, out)
+    finally:
+        conn.close()
+    return 0
+
+
+def orders_export(args, out):
+    # Each database streams its orders by date; shards are merged into one stream
+    connections = list(dollmart.customer_databases())
+    try:
+        cursors = [queries.run(conn, "orders_between", (args.since, args.until)) for conn in connections]
+        rows = heapq.merge(*cursors, key=lambda row: (row.order_date, row.id))
+        write_rows(rows, queries.STATEMENTS["orders_between"].row_type._fields, args.format, out)
+    finally:
+        for conn in connections:
+            conn.close()
+    return 0
+
+
+def orders_export_lines(args, out):
+    result = dollmart.export_orders(args.output, args.format, args.since, args.until, args.state)
+    marks = ", ".join(f"{name} {order_id}" for name, order_id in sorted(result.high_water.items()))
+    size = "" if result.bytes is None else f", {result.bytes / 1e6:.1f} MB"
+    print(f"Exported {result.orders} orders ({result.lines} lines{size}) in {result.seconds:.2f} s; "
+          f"last order ID: {marks or 'none'}", file=sys.stderr if args.output == "-" else out)
+    return 0
+
+
+def orders_advance(args, out):
+    write_rows(dollmart.update_order_statuses(), ["order_id", "old_status", "new_status"], args.format, out)
+    return 0
+
+
+def coupons_issue(args, out):
+    if not 0 < args.percent <= 100:
+        print(f"--percent must be between 0 and 100, not {args.percent}", file=sys.stderr)
+        return 2
+
+    user_ids = [line.strip() for line in sys.stdin if line.strip()] if args.user_ids == ["-"] else args.user_ids
+    status = 0
+
+    def issued():
+        nonlocal status
+        conn = dollmart.connect_db()
+        try:
+            for user_id in user_ids:
+                if not user_id.isdigit() or queries.fetch_one(conn, "customer_profile", (int(user_id),)) is None:
+                    print(f"No customer with ID {user_id}; no coupon issued", file=sys.stderr)
+                    status = 1
+                    continue
+                coupon_id, code = dollmart.create_coupon(int(user_id), args.percent, args.prefix)
+                yield coupon_id, int(user_id), code, args.percent
+        finally:
+            conn.close()
+
+    write_rows(issued(), ["coupon_id", "user_id", "code", "discount_percentage"], args.format, out)
+    return status
+
+
+def init(args, out):
+    dollmart.setup_database()
+    print("Database initialized with sample products.", file=out)
+    return 0
+
+
+def backup(args, out):
+    for result in dollmart.backup_database(args.dir):
+        print(f"{result.path}: {result.database_bytes / 1e6:.1f} MB -> {result.snapshot_bytes / 1e6:.1f} MB "
+              f"in {result.seconds:.2f} s", file=out)
+    return 0
+
+
+def rebuild_recommendations(args, out):
+    print(f"Counted {dollmart.rebuild_recommendations()} product pairs.", file=out)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="dollmart.py", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def listing(subcommands, name, handler, summary):
+        command = subcommands.add_parser(name, help=summary)
+        command.add_argument("--format", choices=FORMATS, default="tsv")
+        command.set_defaults(handler=handler)
+        return command
+
+    products = commands.add_parser("products", help="catalog").add_subparsers(dest="action", required=True)
+    command = listing(products, "list", products_list, "list products, by ID")
+    command.add_argument("--category", help="only this category")
+    command.add_argument("--in-stock", action="store_true", help="leave out products with no stock")
+
+    orders = commands.add_parser("orders", help="orders").add_subparsers(dest="action", required=True)
+    command = listing(orders, "export", orders_export, "stream orders placed in a date range, oldest first")
+    command.add_argument("--since", default="", help='"YYYY-MM-DD[ HH:MM:SS]", inclusive (default: the first order)')
+    command.add_argument("--until", default="9999", help='"YYYY-MM-DD[ HH:MM:SS]", exclusive (default: no end)')
+    command = orders.add_parser("export-lines", help="stream order lines joined with customers to a file, for accounting")
+    command.add_argument("output", help='file to write, or - for stdout')
+    command.add_argument("--format", choices=("jsonl", "columnar"), default="jsonl")
+    command.add_argument("--since", default="", help='"YYYY-MM-DD[ HH:MM:SS]", inclusive')
+    command.add_argument("--until", help='"YYYY-MM-DD[ HH:MM:SS]", exclusive')
+    command.add_argument("--state", help="high-water mark file; only orders placed after the last export with it are written")
+    command.set_defaults(handler=orders_export_lines)
+    listing(orders, "advance", orders_advance, "move orders on to Out for Delivery / Delivered; lists the changes")
+
+    coupons = commands.add_parser("coupons", help="coupons").add_subparsers(dest="action", required=True)
+    command = listing(coupons, "issue", coupons_issue, "give customers a coupon each; lists the coupons issued")
+    command.add_argument("user_ids", nargs="+", metavar="USER_ID", help="customer IDs, or - to read them one per line from stdin")
+    command.add_argument("--percent", type=float, required=True, help="discount percentage")
+    command.add_argument("--prefix", default="PROMO", help="coupon code prefix (default PROMO)")
+
+    commands.add_parser("init", help="create the database with sample products").set_defaults(handler=init)
+    command = commands.add_parser("backup", help="online snapshot of the database and any shards")
+    command.add_argument("--dir", default=os.environ.get("DOLLMART_BACKUP_DIR"), help="snapshot folder (default backups/)")
+    command.set_defaults(handler=backup)
+    commands.add_parser("rebuild-recommendations", help="recount co-purchases from all orders").set_defaults(
+        handler=rebuild_recommendations
+    )
+    return parser
+
+
+def main(argv=None, out=None):
+    """Run one command
+
+    Returns:
+        Exit status: 0 on success, 1 if some rows were refused or the
+        database has a newer schema, 2 for bad arguments
+    """
+    args = build_parser().parse_args(argv)
+    out = sys.stdout if out is None else out
+
+    try:
+        if args.handler is not init:
+            dollmart.ensure_database()
+        dollmart.configure_from_environment()
+        return args.handler(args, out)
+    except dollmart.SchemaTooNew as e:
+        print(e, file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader (e.g. `head`) stopped early; stop quietly like other Unix tools
+        sys.stdout = open(os.devnull, "w")
+        return 0
+    finally:
+        dollmart.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
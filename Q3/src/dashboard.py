@@ -0,0 +1,247 @@
+"""Admin dashboard KPIs, kept in memory and updated as orders come in
+
+The counters are built once from the database, then moved on by the
+checkout and status-change events this process records, so showing the
+dashboard reads a handful of numbers instead of scanning the orders table.
+Every `refresh_interval` seconds they are rebuilt from the database in a
+background thread, which picks up orders placed and moved on by other
+processes; the view keeps showing the current counters while it runs.
+
+Applying an event twice, or an event the rebuild already saw, changes
+nothing: orders are counted by ID, a status change only applies to an order
+still in its old status, and each customer keeps only their latest order
+day. So events that arrive during a rebuild are simply replayed on top of it,
+and so are the last `replay_seconds` of events when the rebuild reads a
+copy of the database that may be that old (see replica.py). A replayed
+order_placed for an order the rebuild already read is skipped by ID even
+when that order has since been delivered: order IDs only grow within a shard,
+so anything at or below the newest ID the rebuild saw in its shard is counted.
+"""
+import datetime
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from sharding import SHARD_ID_RANGE
+
+
+PROCESSING = "Processing"
+OUT_FOR_DELIVERY = "Out for Delivery"
+DELIVERED = "Delivered"
+
+# What a rebuild reads from the database
+KpiSnapshot = namedtuple("KpiSnapshot", [
+    "today",          # {order_id: total_amount} for orders placed today
+    "open_orders",    # {order_id: status} for orders not yet delivered
+    "delivered",      # number of delivered orders
+    "stock",          # {product_id: stock}
+    "last_order_day", # {user_id: "YYYY-MM-DD"} for customers who ordered since the active window began
+    "newest_orders",  # {shard: newest order ID read}, where an order's shard is order_id // SHARD_ID_RANGE
+])
+
+Kpis = namedtuple("Kpis", [
+    "day", "orders_today", "revenue_today", "by_status", "low_stock", "active_customers", "refreshed_at"
+])
+
+
+class KpiCache:
+    """Dashboard counters, updated from order events and rebuilt periodically"""
+
+    def __init__(self, load, refresh_interval=300, low_stock_threshold=10, active_days=30, replay_seconds=0,
+                 background=True, clock=time.time):
+        """
+        Args:
+            load: Function (day, active_since) -> KpiSnapshot reading the
+                database; both arguments are "YYYY-MM-DD" strings
+            refresh_interval: Seconds between rebuilds from the database
+            low_stock_threshold: Products with this much stock or less count as low
+            active_days: Customers who ordered within this many days (today
+                included) count as active
+            replay_seconds: Replay events this recent after every rebuild, for
+                a `load` that reads a copy of the database up to this old
+            background: False to rebuild in the caller's thread (for tests)
+            clock: Returns the current time in seconds since the epoch
+        """
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.low_stock_threshold = low_stock_threshold
+        self.active_days = active_days
+        self.replay_seconds = replay_seconds
+        self.background = background
+        self.clock = clock
+        self.refreshed_at = None
+        self._stale = False
+
+        self._lock = threading.Lock()
+        # Events seen while a rebuild is reading the database; None when none is running
+        self._pending = None
+        # (time, event_type, payload) for the last replay_seconds
+        self._recent = deque()
+        vars(self).update(self._counters(self._day(), KpiSnapshot({}, {}, 0, {}, {}, {})))
+
+    def _day(self):
+        return datetime.date.fromtimestamp(self.clock())
+
+    def _counters(self, day, snapshot):
+        """The counters for a snapshot, as attributes; built without holding the lock"""
+        today = dict(snapshot.today)
+        open_orders = dict(snapshot.open_orders)
+        stock = dict(snapshot.stock)
+        # Customers by the ordinal of the day they last ordered on
+        last_order = {
+            user_id: datetime.date.fromisoformat(last[:10]).toordinal() for user_id, last in snapshot.last_order_day.items()
+        }
+        return {
+            "day": day,
+            "_today": today,
+            "_revenue": sum(today.values()),
+            "_open": open_orders,
+            "_by_status": Counter(open_orders.values()),
+            "_delivered": snapshot.delivered,
+            "_stock": stock,
+            "_low": sum(1 for value in stock.values() if value <= self.low_stock_threshold),
+            "_last_order": last_order,
+            "_active_by_day": Counter(last_order.values()),
+            "_newest": dict(snapshot.newest_orders),
+        }
+
+    def _roll_over(self):
+        day = self._day()
+        if day != self.day:
+            self.day = day
+            self._today = {}
+            self._revenue = 0
+
+    # ---- events ----
+
+    def apply(self, event_type, payload):
+        """Move the counters on for an order event (see dollmart.record_event)"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((event_type, payload))
+            if self.replay_seconds:
+                now = self.clock()
+                self._recent.append((now, event_type, payload))
+                while self._recent[0][0] < now - self.replay_seconds:
+                    self._recent.popleft()
+            self._apply(event_type, payload)
+
+    def _apply(self, event_type, payload):
+        self._roll_over()
+        if event_type == "order_placed":
+            self._order_placed(payload)
+        elif event_type == "order_status_changed":
+            self._status_changed(payload["order_id"], payload["old_status"], payload["new_status"])
+        elif event_type == "stock_changed":
+            self._set_stock(payload["product_id"], payload["stock"])
+
+    def _order_placed(self, order):
+        order_id = order["order_id"]
+        if order_id in self._today or order_id in self._open:
+            return
+        if order_id <= self._newest.get(order_id // SHARD_ID_RANGE, 0):
+            # Already in the rebuild, and delivered since
+            return
+
+        day = datetime.date.fromisoformat(order["order_date"][:10])
+        if day == self.day:
+            self._today[order_id] = order["total_amount"]
+            self._revenue += order["total_amount"]
+        self._open[order_id] = PROCESSING
+        self._by_status[PROCESSING] += 1
+
+        ordinal = day.toordinal()
+        last = self._last_order.get(order["user_id"])
+        if last is None or last < ordinal:
+            if last is not None:
+                self._active_by_day[last] -= 1
+            self._last_order[order["user_id"]] = ordinal
+            self._active_by_day[ordinal] += 1
+
+        for item in order["items"]:
+            stock = self._stock.get(item["product_id"])
+            if stock is not None:
+                self._set_stock(item["product_id"], stock - item["quantity"])
+
+    def _status_changed(self, order_id, old_status, new_status):
+        if self._open.get(order_id) != old_status:
+            return
+        self._by_status[old_status] -= 1
+        if new_status == DELIVERED:
+            del self._open[order_id]
+            self._delivered += 1
+        else:
+            self._open[order_id] = new_status
+            self._by_status[new_status] += 1
+
+    def _set_stock(self, product_id, stock):
+        """Record a product's stock; None for a deleted product"""
+        threshold = self.low_stock_threshold
+        old = self._stock.pop(product_id, None)
+        if old is not None and old <= threshold:
+            self._low -= 1
+        if stock is not None:
+            self._stock[product_id] = stock
+            if stock <= threshold:
+                self._low += 1
+
+    # ---- reading ----
+
+    def refresh(self):
+        """Rebuild the counters from the database, replaying events that arrived meanwhile"""
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+            self._stale = False
+
+        try:
+            day = self._day()
+            active_since = day - datetime.timedelta(days=self.active_days - 1)
+            counters = self._counters(day, self.load(day.isoformat(), active_since.isoformat()))
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            vars(self).update(counters)
+            since = self.clock() - self.replay_seconds
+            recent = [(event_type, payload) for at, event_type, payload in self._recent if at >= since]
+            for event_type, payload in recent + pending:
+                self._apply(event_type, payload)
+            self.refreshed_at = self.clock()
+
+    def expire(self):
+        """Rebuild at the next view, for changes no event describes (e.g. archiving)"""
+        self._stale = True
+
+    def kpis(self):
+        """The current KPIs; rebuilds first only if they were never loaded
+
+        A rebuild that is due starts in the background and the counters as
+        they are now are returned straight away.
+        """
+        if self.refreshed_at is None:
+            self.refresh()
+        elif (self._stale or self.clock() - self.refreshed_at >= self.refresh_interval) and self._pending is None:
+            if self.background:
+                threading.Thread(target=self.refresh, name="kpi-refresh", daemon=True).start()
+            else:
+                self.refresh()
+
+        with self._lock:
+            self._roll_over()
+            active_since = self.day.toordinal() - self.active_days + 1
+            by_status = {PROCESSING: self._by_status[PROCESSING], OUT_FOR_DELIVERY: self._by_status[OUT_FOR_DELIVERY],
+                         DELIVERED: self._delivered}
+            return Kpis(
+                day=self.day.isoformat(),
+                orders_today=len(self._today),
+                revenue_today=self._revenue,
+                by_status=by_status,
+                low_stock=self._low,
+                active_customers=sum(count for day, count in self._active_by_day.items() if day >= active_since),
+                refreshed_at=self.refreshed_at,
+            )
@@ -0,0 +1,341 @@
+"""Seeded synthetic data for scale testing dollmart.db
+
+Run from the src folder:
+    python datagen.py --users 1000000 --products 50000 --orders 5000000
+
+Fills an existing (or new) database with customers, a catalog spread over
+many categories, orders whose products follow a Zipf distribution, their
+order items and coupons, then prints rows/sec per table. The same seed and
+`--now` always produce the same rows.
+"""
+import argparse
+import bisect
+import datetime
+import hashlib
+import itertools
+import math
+import random
+import sqlite3
+import time
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+
+import queries
+
+
+LoadStats = namedtuple("LoadStats", ["table", "rows", "seconds"])
+
+# Relative frequency of basket sizes 1-8
+BASKET_SIZE_WEIGHTS = [30, 25, 18, 12, 7, 4, 2, 2]
+QUANTITIES = [1, 1, 1, 1, 1, 1, 2, 2, 2, 3]
+RETAIL_SHARE = 0.1
+OUT_OF_STOCK_SHARE = 0.05
+MIN_PRICE, MAX_PRICE = 50, 200000
+
+# Order age at which update_order_statuses() moves an order on (PROCESSING_TIME_HOURS
+# and PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS in dollmart)
+PROCESSING_SECONDS = 2 * 3600
+DELIVERED_SECONDS = 26 * 3600
+
+WORDS = ["Classic", "Organic", "Deluxe", "Compact", "Family", "Premium", "Everyday", "Fresh",
+         "Smart", "Mini", "Large", "Eco", "Value", "Pro", "Travel", "Home"]
+NOUNS = ["Rice", "Soap", "Kettle", "Towel", "Juice", "Cable", "Lamp", "Notebook",
+         "Shampoo", "Biscuits", "Charger", "Mug", "Blanket", "Speaker", "Pasta", "Broom"]
+
+# Connection settings for a bulk load: no rollback journal or fsync, a
+# large page cache and temp B-trees in memory. A crash mid-load can leave
+# the file unusable, which is fine for generated data.
+LOADING_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+
+
+class ZipfSampler:
+    """Draws indexes 0..n-1 with P(rank r) proportional to 1 / r**s
+
+    Ranks are mapped through a seeded shuffle so the most popular items are
+    spread over the ID range instead of being the lowest IDs. Cumulative
+    weights are kept in an array of doubles (8 bytes per item), and each
+    draw is one bisect.
+    """
+
+    def __init__(self, n, s, rng, shuffle=True):
+        self.cumulative = array("d")
+        total = 0.0
+        for rank in range(1, n + 1):
+            total += rank ** -s
+            self.cumulative.append(total)
+        self.total = total
+        self.order = array("l", range(n))
+        if shuffle:
+            rng.shuffle(self.order)
+        self.rng = rng
+
+    def sample(self):
+        rank = bisect.bisect(self.cumulative, self.rng.random() * self.total)
+        return self.order[min(rank, len(self.order) - 1)]
+
+
+@contextmanager
+def loading_pragmas(conn):
+    """Apply LOADING_PRAGMAS for the duration, restoring the journal mode afterwards
+
+    The other settings only last as long as the connection.
+    """
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    for pragma in LOADING_PRAGMAS:
+        conn.execute(pragma)
+    try:
+        yield
+    finally:
+        conn.commit()
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.execute("PRAGMA synchronous = FULL")
+        conn.execute("PRAGMA locking_mode = NORMAL")
+        # The exclusive lock is only given up at the next access
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+
+@contextmanager
+def indexes_dropped(conn):
+    """Drop secondary indexes on the loaded tables and rebuild them once at the end
+
+    Building an index from sorted data after the load is much cheaper than
+    updating it row by row in random key order (orders by user, for one).
+    """
+    indexes = queries.fetch_all(conn, "secondary_indexes")
+    for index in indexes:
+        conn.execute(f"DROP INDEX {index.name}")
+    try:
+        yield
+    finally:
+        for index in indexes:
+            conn.execute(index.sql)
+
+
+class _Clock:
+    """Formats `start + seconds` as "YYYY-MM-DD HH:MM:SS", caching the date part per day
+
+    datetime.strftime dominated order generation; this is about 5x cheaper.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.start_seconds = start.hour * 3600 + start.minute * 60 + start.second
+        self.days = {}
+
+    def timestamp(self, seconds):
+        day, second = divmod(self.start_seconds + seconds, 86400)
+        date = self.days.get(day)
+        if date is None:
+            date = self.days[day] = (self.start.date() + datetime.timedelta(days=day)).isoformat()
+        hour, second = divmod(second, 3600)
+        minute, second = divmod(second, 60)
+        return f"{date} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+class _Loader:
+    """Runs executemany in batches and commits every `commit_rows` rows"""
+
+    def __init__(self, conn, batch_size, commit_rows):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commit_rows = commit_rows
+        self.uncommitted = 0
+        self.stats = []
+
+    def load(self, table, statement, rows):
+        start = time.perf_counter()
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                count += self.flush(statement, batch)
+                batch = []
+        count += self.flush(statement, batch)
+        self.record(table, count, time.perf_counter() - start)
+
+    def flush(self, statement, batch):
+        if not batch:
+            return 0
+        queries.run_many(self.conn, statement, batch)
+        self.uncommitted += len(batch)
+        if self.uncommitted >= self.commit_rows:
+            self.conn.commit()
+            self.uncommitted = 0
+        return len(batch)
+
+    def record(self, table, rows, seconds):
+        for i, entry in enumerate(self.stats):
+            if entry.table == table:
+                self.stats[i] = LoadStats(table, entry.rows + rows, entry.seconds + seconds)
+                return
+        self.stats.append(LoadStats(table, rows, seconds))
+
+
+def generate(conn, users=10000, products=2000, categories=50, orders=50000, seed=1, zipf_s=1.0,
+             days=365, now=None, password="password", batch_size=10000, commit_rows=1000000):
+    """Append a synthetic dataset to a database that already has the dollmart schema
+
+    Rows get IDs after the existing ones, so this can run on top of
+    `setup_database()`. Every customer's password is `password`. Orders
+    are spread evenly over the `days` before `now` with statuses matching
+    their age, product popularity follows Zipf(zipf_s), and customers get
+    a welcome coupon plus a loyalty coupon for every third order, as the
+    app would issue them. Product pairs for recommendations are not
+    counted; run `rebuild_recommendations()` afterwards if needed.
+
+    Args:
+        conn: Connection to the database to fill (committed on return)
+        users, products, categories, orders: Rows to generate
+        seed: Random seed; the same seed and `now` give the same rows
+        zipf_s: Zipf exponent for product popularity (1.0 is classic Zipf)
+        days: Length of the order history
+        now: datetime the history ends at (default: the current time)
+        password: Password for every generated customer
+        batch_size: Rows per executemany call
+        commit_rows: Rows per transaction
+
+    Returns:
+        list of LoadStats(table, rows, seconds), in load order
+    """
+    from categories import set_parent
+
+    rng = random.Random(seed)
+    now = now or datetime.datetime.now().replace(microsecond=0)
+    clock = _Clock(now - datetime.timedelta(days=days))
+    loader = _Loader(conn, batch_size, commit_rows)
+
+    with loading_pragmas(conn), indexes_dropped(conn):
+        first_user = queries.scalar(conn, "max_user_id") + 1
+        first_product = queries.scalar(conn, "max_product_id") + 1
+        first_order = queries.scalar(conn, "max_order_id") + 1
+
+        # Products, with categories themselves Zipf-sized (a few big ones, a long tail)
+        category_sampler = ZipfSampler(categories, 0.8, rng, shuffle=False)
+        prices = array("l")
+        low, high = math.log(MIN_PRICE), math.log(MAX_PRICE)
+
+        def product_rows():
+            for offset in range(products):
+                price = int(math.exp(rng.uniform(low, high)))
+                prices.append(price)
+                stock = 0 if rng.random() < OUT_OF_STOCK_SHARE else rng.randint(1, 500)
+                yield (first_product + offset, f"{rng.choice(WORDS)} {rng.choice(NOUNS)} {offset:07d}",
+                       f"Category {category_sampler.sample():03d}", price, stock, rng.choice((0, 0.05, 0.1, 0.15)))
+
+        loader.load("products", "load_product", product_rows())
+
+        start_time = time.perf_counter()
+        for category in range(categories):
+            set_parent(conn, f"Category {category:03d}", f"Department {category % max(1, categories // 10):02d}")
+        loader.record("categories", categories, time.perf_counter() - start_time)
+
+        # Who places each order is drawn up front so users can be written with their orders_count
+        start_time = time.perf_counter()
+        user_sampler = ZipfSampler(users, 0.5, rng)
+        order_users = array("l", (user_sampler.sample() for _ in range(orders)))
+        orders_count = array("l", [0]) * users
+        for user in order_users:
+            orders_count[user] += 1
+        draw_seconds = time.perf_counter() - start_time
+
+        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        span = days * 86400
+
+        def user_rows():
+            for offset in range(users):
+                yield (first_user + offset, f"user{first_user + offset:08d}", password_hash,
+                       int(rng.random() < RETAIL_SHARE), orders_count[offset], clock.timestamp(rng.randrange(span)))
+
+        loader.load("users", "load_user", user_rows())
+        loader.record("users", 0, draw_seconds)
+
+        # Orders and their items, a batch at a time so memory stays flat. The
+        # orders entry includes the time spent drawing baskets.
+        product_sampler = ZipfSampler(products, zipf_s, rng)
+        size_weights = array("d", itertools.accumulate(BASKET_SIZE_WEIGHTS))
+        size_total = size_weights[-1]
+        step = span / max(orders, 1)
+        random_, bisect_, sample = rng.random, bisect.bisect, product_sampler.sample
+
+        for batch_start in range(0, orders, batch_size):
+            start_time = time.perf_counter()
+            order_rows, item_rows = [], []
+            for index in range(batch_start, min(orders, batch_start + batch_size)):
+                order_id = first_order + index
+                placed = int(index * step + random_() * step)
+                age = span - placed
+                status = "Processing" if age < PROCESSING_SECONDS else "Out for Delivery" if age < DELIVERED_SECONDS else "Delivered"
+
+                basket = {sample() for _ in range(bisect_(size_weights, random_() * size_total) + 1)}
+                total = 0
+                for product in sorted(basket):
+                    quantity = QUANTITIES[int(random_() * len(QUANTITIES))]
+                    item_rows.append((order_id, first_product + product, quantity, prices[product]))
+                    total += quantity * prices[product]
+                order_rows.append((order_id, first_user + order_users[index], clock.timestamp(placed),
+                                   status, total, clock.timestamp(placed + DELIVERED_SECONDS)[:16]))
+            loader.record("orders", 0, time.perf_counter() - start_time)
+            loader.load("orders", "load_order", order_rows)
+            loader.load("order_items", "insert_order_item", item_rows)
+
+        def coupon_rows():
+            for offset in range(users):
+                user_id = first_user + offset
+                count = orders_count[offset]
+                yield (user_id, f"WELCOME-{rng.getrandbits(32):08X}", 10, int(count > 0 and rng.random() < 0.6))
+                for _ in range(count // 3):
+                    yield (user_id, f"LOYAL-{rng.getrandbits(32):08X}", 5, int(rng.random() < 0.5))
+
+        loader.load("coupons", "load_coupon", coupon_rows())
+
+        conn.commit()
+        start_time = time.perf_counter()
+
+    loader.record("indexes", 0, time.perf_counter() - start_time)
+    return loader.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="dollmart.db", help="database to fill (created if missing)")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--zipf", type=float, default=1.0, help="Zipf exponent for product popularity")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--now", help="end of the order history, YYYY-MM-DD HH:MM:SS (default: now)")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    import dollmart
+    dollmart.DB_PATH = args.db
+    dollmart.setup_database(seed=False)
+
+    conn = sqlite3.connect(args.db)
+    now = datetime.datetime.strptime(args.now, "%Y-%m-%d %H:%M:%S") if args.now else None
+    start = time.perf_counter()
+    stats = generate(conn, args.users, args.products, args.categories, args.orders, args.seed,
+                     args.zipf, args.days, now, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    total_rows = 0
+    for entry in stats:
+        rate = f"{entry.rows / entry.seconds:12,.0f} rows/s" if entry.rows and entry.seconds else ""
+        print(f"{entry.table:12s} {entry.rows:12,d} rows {entry.seconds:8.2f} s {rate}")
+        total_rows += entry.rows
+    print(f"{'total':12s} {total_rows:12,d} rows {elapsed:8.2f} s {total_rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Delivery slots: fixed windows each day that hold a limited number of orders
+
+Each order is booked into the earliest slot that starts at least
+`lead_hours` after it is placed and still has room. The order goes out for
+delivery when its slot starts and counts as delivered when the slot ends.
+
+Slots are numbered consecutively, skipping the hours outside delivery
+times, so "the next slot" is always index + 1. Full slots are linked to
+the slot after them in a disjoint-set forest with path compression, so a
+booking jumps over any run of full slots in near-constant time instead of
+checking them one by one.
+"""
+import datetime
+import threading
+
+
+SLOT_FORMAT = "%Y-%m-%d %H:%M"
+
+# Slot indexes count from the delivery day of this date
+_EPOCH = datetime.date(2000, 1, 1)
+
+
+class DeliveryPlanner:
+    """Books orders into capacity-limited delivery slots
+
+    The counts here are the planner's view; the delivery_slots table is the
+    record every process books against. When the table says a slot is full
+    (another process filled it), mark_full() tells the planner to move on.
+    """
+
+    def __init__(self, slot_capacity=50, slot_hours=2, first_hour=8, last_hour=20, lead_hours=2):
+        if slot_capacity < 1:
+            raise ValueError("slot_capacity must be at least 1")
+        if not 0 <= first_hour < last_hour <= 24 or (last_hour - first_hour) % slot_hours:
+            raise ValueError("Delivery hours must be a whole number of slots within one day")
+        self.slot_capacity = slot_capacity
+        self.slot_hours = slot_hours
+        self.first_hour = first_hour
+        self.lead_hours = lead_hours
+        self.slots_per_day = (last_hour - first_hour) // slot_hours
+
+        self._booked = {}
+        # Full slot index -> a later slot that may have room (disjoint-set parent)
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def slot_start(self, index):
+        day, slot = divmod(index, self.slots_per_day)
+        start = datetime.datetime.combine(_EPOCH + datetime.timedelta(days=day), datetime.time(self.first_hour))
+        return start + datetime.timedelta(hours=slot * self.slot_hours)
+
+    def slot_end(self, index):
+        return self.slot_start(index) + datetime.timedelta(hours=self.slot_hours)
+
+    def slot_index(self, start):
+        """Index of the slot starting at `start`, a datetime or SLOT_FORMAT string"""
+        if isinstance(start, str):
+            start = datetime.datetime.strptime(start, SLOT_FORMAT)
+        hours = (start - datetime.datetime.combine(start.date(), datetime.time(self.first_hour))).total_seconds() / 3600
+        return (start.date() - _EPOCH).days * self.slots_per_day + int(hours // self.slot_hours)
+
+    def first_slot(self, placed_at):
+        """Index of the first slot starting at or after placed_at + lead_hours"""
+        ready = placed_at + datetime.timedelta(hours=self.lead_hours)
+        day = (ready.date() - _EPOCH).days
+        opens = datetime.datetime.combine(ready.date(), datetime.time(self.first_hour))
+        if ready <= opens:
+            return day * self.slots_per_day
+        slot = int(-(-(ready - opens).total_seconds() // (self.slot_hours * 3600)))
+        if slot >= self.slots_per_day:
+            # Ready after the last slot of its day: the next day's first slot
+            return (day + 1) * self.slots_per_day
+        return day * self.slots_per_day + slot
+
+    def _find(self, index):
+        root = index
+        while root in self._next:
+            root = self._next[root]
+        while index != root:
+            self._next[index], index = root, self._next[index]
+        return root
+
+    def book(self, placed_at):
+        """Count one order in the earliest open slot for `placed_at`; returns the slot index"""
+        with self._lock:
+            index = self._find(self.first_slot(placed_at))
+            booked = self._booked.get(index, 0) + 1
+            self._booked[index] = booked
+            if booked >= self.slot_capacity:
+                self._next[index] = index + 1
+            return index
+
+    def release(self, index):
+        """Undo a booking whose order was not written"""
+        with self._lock:
+            booked = self._booked.get(index, 0)
+            if booked <= 0:
+                return
+            self._booked[index] = booked - 1
+            if booked >= self.slot_capacity:
+                # Compressed paths may jump over this slot; rebuild them from the full slots
+                self._next = {slot: slot + 1 for slot, count in self._booked.items() if count >= self.slot_capacity}
+
+    def mark_full(self, index):
+        with self._lock:
+            self._booked[index] = max(self._booked.get(index, 0), self.slot_capacity)
+            self._next[index] = index + 1
+
+    def load(self, rows):
+        """Start from (slot_start, booked) rows stored by earlier runs"""
+        with self._lock:
+            for start, booked in rows:
+                index = self.slot_index(start)
+                self._booked[index] = booked
+                if booked >= self.slot_capacity:
+                    self._next[index] = index + 1
+
+    def booked(self, index):
+        return self._booked.get(index, 0)
@@ -4,18 +4,819 @@ import datetime
 import random
 import time
 import hashlib
-import uuid
-from tabulate import tabulate
+import sys
+import threading
 from abc import ABC, abstractmethod
+from collections import namedtuple
+import instrument
+import queries
+import money
+from instrument import timed
+from money import format_cents, to_cents
 
 
+DB_PATH = 'dollmart.db'
+
+# Bump whenever setup_database() changes the schema; stored in PRAGMA user_version
+SCHEMA_VERSION = 12
+
+# Columns holding money, stored as integer cents since schema version 3
+MONEY_COLUMNS = {
+    "products": ["price"],
+    "orders": ["total_amount"],
+    "order_items": ["price"],
+    "price_lists": ["price"],
+}
+
 PROCESSING_TIME_HOURS = 2  
 DELIVERY_TIME_HOURS = 24  
 
+EVENT_LOG = None
+WRITE_QUEUE = None
+SHARD_ROUTER = None
+ARCHIVE = None
+ARCHIVE_DIR = 'archive'
+BACKUP_DIR = 'backups'
+PRICE_BOOK = None
+PRICE_BOOK_KEY = None
+LOGIN_LIMITER = None
+DELIVERY_PLANNER = None
+KPI_CACHE = None
+REPLICA = None
+QUERY_CACHE = None
+
+# None keeps users, products, orders and coupons in dollmart.db; see configure_storage()
+STORAGE = None
+
+# Keyword arguments for ratelimit.LoginLimiter; None turns login rate limiting off
+LOGIN_LIMITS = {}
+
+# Keyword arguments for delivery.DeliveryPlanner; None goes back to the fixed
+# PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS estimate
+DELIVERY_SLOTS = {}
+
+# Keyword arguments for dashboard.KpiCache (refresh_interval, low_stock_threshold, active_days)
+DASHBOARD = {}
+
+# Estimated bytes of admin listing results the query cache keeps; None turns it off
+QUERY_CACHE_BYTES = 64 * 1024 * 1024
+
+# view_cart suggests products for at most this many cart lines, largest quantities first
+ALSO_BOUGHT_CART_LINES = 20
+
+# Tries checkout() makes with an idempotency key while the database stays locked
+CHECKOUT_ATTEMPTS = 3
+
+# Undo and after-commit callbacks registered by the write running on this
+# thread (see on_write_failure and after_write_commit)
+_WRITE_HOOKS = threading.local()
+
+_tabulate = None
+
+
+def tabulate(rows, *args, **kwargs):
+    """Render a table with the tabulate package, importing it on first use
+
+    tabulate is the most expensive import in the app, and a user who only
+    logs in and exits never needs it.
+    """
+    global _tabulate
+
+    if _tabulate is None:
+        from tabulate import tabulate as render_table
+        _tabulate = render_table
+
+    return _tabulate(rows, *args, **kwargs)
+
+
+def connect_db(path=None, timeout=5.0):
+    """Open a connection to the main database (instrumented when profiling is on)
+
+    The statement cache is sized to hold every statement in the query
+    registry, so each one is only prepared once per connection.
+
+    Args:
+        path: Database file; DB_PATH by default
+        timeout: Seconds to wait for another connection's lock
+    """
+    return instrument.connect(path or DB_PATH, timeout=timeout, cached_statements=queries.STATEMENT_CACHE_SIZE)
+
+
+def configure_profiling(enabled, slow_query_ms=None, slow_operation_ms=None, slow_log_path=None):
+    """Turn per-operation and per-query timing on or off
+
+    Args:
+        enabled: True to start recording, False to stop
+        slow_query_ms: Threshold for the slow-query log
+        slow_operation_ms: Threshold for logging slow service operations
+        slow_log_path: File to append slow entries to (optional)
+    """
+    if enabled:
+        instrument.enable(slow_query_ms, slow_operation_ms, slow_log_path)
+    else:
+        instrument.disable()
+
+
+def configure_event_log(directory):
+    """Start writing order events to the segment log in `directory`
+
+    Args:
+        directory: Folder for the log segments, or None to stop logging
+    """
+    global EVENT_LOG
+
+    if EVENT_LOG is not None:
+        EVENT_LOG.close()
+        EVENT_LOG = None
+
+    if directory:
+        from eventlog import EventLog
+        EVENT_LOG = EventLog(directory)
+
+
+def record_event(event_type, **payload):
+    """Append an event to the order event log if one is configured, and count it on the dashboard"""
+    if EVENT_LOG is not None:
+        EVENT_LOG.append(event_type, **payload)
+    update_dashboard(event_type, **payload)
+
+
+def update_dashboard(event_type, **payload):
+    """Move the admin dashboard's KPIs on, if they have been loaded (see dashboard.KpiCache.apply)"""
+    if KPI_CACHE is not None:
+        KPI_CACHE.apply(event_type, payload)
+
+
+def configure_write_queue(enabled, max_batch=500, max_delay=0.005):
+    """Route checkout and registration writes through a group-commit queue
+
+    Args:
+        enabled: True to start the queue, False to flush and stop it
+        max_batch: Most operations committed together in one transaction
+        max_delay: Longest time in seconds an operation waits for its batch
+    """
+    global WRITE_QUEUE
+
+    if WRITE_QUEUE is not None:
+        WRITE_QUEUE.close()
+        WRITE_QUEUE = None
+
+    if enabled:
+        from writequeue import GroupCommitQueue
+        # The writer waits out other processes' write locks rather than failing a whole batch
+        path = DB_PATH
+        WRITE_QUEUE = GroupCommitQueue(lambda: connect_db(path, timeout=30), max_batch, max_delay)
+
+
+def enable_wal(db_path=None):
+    """Switch the database to write-ahead logging so readers never block the writer
+
+    The journal mode is stored in the database file, so this only has to run once.
+    """
+    conn = connect_db(db_path)
+    mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    conn.close()
+    return mode
+
+
+def configure_sharding(num_shards, directory="shards"):
+    """Keep orders, order items and coupons in per-customer shard files
+
+    Args:
+        num_shards: Number of shard databases, or 0/None to use dollmart.db only
+        directory: Folder holding the shard files
+    """
+    global SHARD_ROUTER
+
+    if num_shards:
+        from sharding import ShardRouter
+        SHARD_ROUTER = ShardRouter(num_shards, directory, DB_PATH)
+        SHARD_ROUTER.setup()
+    else:
+        SHARD_ROUTER = None
+
+
+def connect_customer_db(user_id):
+    """Open the database holding a customer's orders and coupons"""
+    if SHARD_ROUTER is None:
+        return connect_db()
+    return SHARD_ROUTER.connect_for_user(user_id)
+
+
+def connect_order_db(order_id):
+    """Open the database holding an order, given only its ID"""
+    if SHARD_ROUTER is None:
+        return connect_db()
+    return SHARD_ROUTER.connect_for_id(order_id)
+
+
+def customer_databases():
+    """Yield a connection to every database holding orders and coupons"""
+    if SHARD_ROUTER is None:
+        yield connect_db()
+        return
+
+    for shard in range(SHARD_ROUTER.num_shards):
+        yield SHARD_ROUTER.connect(shard)
+
+
+def query_customer_data(query, params=(), sort_key=None, reverse=False, reporting=False, tables=()):
+    """Run a read over orders/order_items/coupons, scatter-gathering across shards
+
+    Args:
+        query: SQL to run; it may join products and users
+        params: Parameters for the query
+        sort_key: Key the query orders its rows by, used to merge shard results
+        reverse: True if the query sorts in descending order
+        reporting: Read from the read replica when one is configured (see
+            connect_reporting_db()); shards are always read directly
+        tables: Versioned tables the query reads, to serve it from the
+            query cache until one of them is written (see fetch_listing())
+
+    Returns:
+        list of rows
+    """
+    cache = get_query_cache() if tables and QUERY_CACHE_BYTES is not None else None
+    key = (os.path.abspath(DB_PATH), query, params)
+
+    if SHARD_ROUTER is not None:
+        if cache is None:
+            return SHARD_ROUTER.scatter_gather(query, params, sort_key, reverse)
+        versions = []
+        for conn in [connect_db(), *customer_databases()]:
+            try:
+                versions.append(table_versions(conn, tables))
+            finally:
+                conn.close()
+        return cache.get(key, tuple(versions),
+                         lambda: SHARD_ROUTER.scatter_gather(query, params, sort_key, reverse))
+
+    conn = connect_reporting_db() if reporting else connect_db()
+    try:
+        if cache is None:
+            return conn.execute(query, params).fetchall()
+        return cache.get(key, table_versions(conn, tables), lambda: conn.execute(query, params).fetchall())
+    finally:
+        conn.close()
+
+
+def configure_replica(max_staleness, **options):
+    """Send admin listings and reporting reads to a periodically refreshed copy of dollmart.db
+
+    Checkouts, registration, coupon redemption and stock updates always
+    write to dollmart.db itself.
+
+    Args:
+        max_staleness: Oldest copy, in seconds, a read may be given; 0 or
+            None turns the replica off
+        **options: Overrides for replica.ReadReplica (replica_path,
+            refresh_after, pages, sleep, background, clock)
+    """
+    global REPLICA, KPI_CACHE
+
+    if REPLICA is not None:
+        REPLICA.close()
+        REPLICA = None
+
+    if max_staleness:
+        from replica import ReadReplica
+        REPLICA = ReadReplica(DB_PATH, max_staleness=max_staleness, **options)
+
+    # The dashboard replays events as old as the replica can be
+    KPI_CACHE = None
+
+
+def connect_reporting_db():
+    """Open dollmart.db for a long read-only report: the replica when one is configured and fresh enough
+
+    Falls back to dollmart.db while the replica is older than its
+    staleness bound (a refresh is then started in the background).
+    """
+    if REPLICA is None:
+        return connect_db()
+
+    conn = connect_db(REPLICA.read_path())
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def reporting_databases():
+    """Like customer_databases(), but reading dollmart.db through connect_reporting_db()"""
+    if SHARD_ROUTER is not None:
+        yield from customer_databases()
+        return
+
+    yield connect_reporting_db()
+
+
+def configure_query_cache(max_bytes=64 * 1024 * 1024):
+    """Size the admin listing cache, emptying it
+
+    Args:
+        max_bytes: Estimated bytes of results to keep; 0 or None turns the cache off
+    """
+    global QUERY_CACHE_BYTES, QUERY_CACHE
+    QUERY_CACHE_BYTES = max_bytes or None
+    QUERY_CACHE = None
+
+
+def get_query_cache():
+    """Return the admin listing cache, creating it on first use"""
+    global QUERY_CACHE
+
+    if QUERY_CACHE is None:
+        from querycache import QueryCache
+        QUERY_CACHE = QueryCache(QUERY_CACHE_BYTES)
+
+    return QUERY_CACHE
+
+
+def table_versions(conn, tables):
+    """The write counters of `tables` in conn's database (see querycache.create_schema())"""
+    versions = dict(queries.run(conn, "table_versions"))
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def fetch_listing(conn, name, tables, params=()):
+    """queries.fetch_all() for an admin listing, served from the query cache while `tables` are unchanged
+
+    The versions are read on `conn` before the rows, so a cached result is
+    never older than what running the statement now would return, whether
+    `conn` is dollmart.db or its read replica.
+
+    Args:
+        conn: Connection to run the statement on
+        name: Registered statement
+        tables: Versioned tables the statement reads
+        params: Parameters for the statement
+    """
+    if QUERY_CACHE_BYTES is None:
+        return queries.fetch_all(conn, name, params)
+
+    return get_query_cache().get((os.path.abspath(DB_PATH), name, params), table_versions(conn, tables),
+                                 lambda: queries.fetch_all(conn, name, params))
+
+
+def configure_archive(directory):
+    """Keep archived (cold) orders in `directory`"""
+    global ARCHIVE, ARCHIVE_DIR
+    ARCHIVE_DIR = directory
+    ARCHIVE = None
+
+
+def backup_database(directory=None):
+    """Take an online, compressed snapshot of dollmart.db and every shard file
+
+    Safe while the app is serving checkouts; see backup.copy_database().
+
+    Args:
+        directory: Folder for the snapshots (default BACKUP_DIR)
+
+    Returns:
+        list of backup.BackupResult, one per database file
+    """
+    from backup import take_snapshot
+
+    paths = [DB_PATH]
+    if SHARD_ROUTER is not None:
+        paths += [SHARD_ROUTER.shard_path(shard) for shard in range(SHARD_ROUTER.num_shards)]
+    return [take_snapshot(path, directory or BACKUP_DIR) for path in paths]
+
+
+def export_orders(path, fmt="jsonl", since="", until=None, state_path=None):
+    """Stream order lines from every database holding orders into one file
+
+    See export.export_to_file(). With `state_path`, only orders placed after
+    the previous export with the same state file are written. High-water
+    marks are keyed by database file name, so each shard keeps its own.
+
+    Args:
+        path: File to write, or "-" for stdout
+        fmt: "jsonl" or "columnar"
+        since: Only orders placed at or after this "YYYY-MM-DD[ HH:MM:SS]"
+        until: Only orders placed before this (default: no end)
+        state_path: JSON file holding the high-water marks
+
+    Returns:
+        export.ExportResult
+    """
+    from export import export_to_file, NO_END
+
+    if SHARD_ROUTER is None:
+        names = [os.path.basename(DB_PATH)]
+    else:
+        names = [os.path.basename(SHARD_ROUTER.shard_path(shard)) for shard in range(SHARD_ROUTER.num_shards)]
+    connections = list(customer_databases())
+    try:
+        return export_to_file(list(zip(names, connections)), path, fmt, since, until or NO_END, state_path)
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def configure_login_limits(enabled=True, **limits):
+    """Turn login rate limiting on or off
+
+    Args:
+        enabled: False to check every login attempt against the database
+        **limits: Overrides for ratelimit.LoginLimiter (username_burst,
+            username_refill_seconds, client_burst, client_refill_seconds,
+            lockout_seconds, max_entries, clock)
+    """
+    global LOGIN_LIMITER, LOGIN_LIMITS
+    LOGIN_LIMITS = limits if enabled else None
+    LOGIN_LIMITER = None
+
+
+def get_login_limiter():
+    """Return the login limiter, creating it on first use, or None when limiting is off
+
+    Lockouts stored by earlier runs are loaded once here, so later
+    attempts are judged in memory.
+    """
+    global LOGIN_LIMITER
+
+    if LOGIN_LIMITS is None:
+        return None
+
+    if LOGIN_LIMITER is None:
+        from ratelimit import LoginLimiter
+        limiter = LoginLimiter(**LOGIN_LIMITS)
+        with open_storage() as repos:
+            limiter.load_lockouts(repos.users.active_lockouts(limiter.clock()))
+        LOGIN_LIMITER = limiter
+
+    return LOGIN_LIMITER
+
+
+def configure_delivery(enabled=True, **slots):
+    """Turn delivery slot booking on or off
+
+    Args:
+        enabled: False to give every order the fixed delivery estimate
+        **slots: Overrides for delivery.DeliveryPlanner (slot_capacity,
+            slot_hours, first_hour, last_hour, lead_hours)
+    """
+    global DELIVERY_PLANNER, DELIVERY_SLOTS
+    DELIVERY_SLOTS = slots if enabled else None
+    DELIVERY_PLANNER = None
+
+
+def get_delivery_planner():
+    """Return the delivery planner, creating it on first use, or None when slots are off
+
+    Bookings stored by earlier runs for slots from now on are loaded once here.
+    """
+    global DELIVERY_PLANNER
+
+    if DELIVERY_SLOTS is None:
+        return None
+
+    if DELIVERY_PLANNER is None:
+        from delivery import DeliveryPlanner, SLOT_FORMAT
+        planner = DeliveryPlanner(**{"lead_hours": PROCESSING_TIME_HOURS, **DELIVERY_SLOTS})
+        if STORAGE is None:
+            conn = connect_db()
+            try:
+                now = datetime.datetime.now().strftime(SLOT_FORMAT)
+                planner.load(queries.fetch_all(conn, "delivery_slots_from", (now,)))
+            finally:
+                conn.close()
+        DELIVERY_PLANNER = planner
+
+    return DELIVERY_PLANNER
+
 
-def setup_database():
-    """Initialize the SQLite database with necessary tables if they don't exist"""
-    conn = sqlite3.connect('dollmart.db')
+def book_delivery_slot(repos, placed_at):
+    """Book the earliest delivery slot with room for an order placed at `placed_at`
+
+    On SQLite the booking is a conditional upsert on delivery_slots in the
+    order's transaction, so processes sharing the database never overfill a
+    slot; a slot another process filled is skipped. Does not commit; under
+    run_write() the planner's booking is given back if the write fails.
+
+    Returns:
+        tuple: (slot index, slot start, slot end) with the times as
+        "YYYY-MM-DD HH:MM", or None when delivery slots are off
+    """
+    planner = get_delivery_planner()
+    if planner is None:
+        return None
+
+    from delivery import SLOT_FORMAT
+    while True:
+        index = planner.book(placed_at)
+        start = planner.slot_start(index).strftime(SLOT_FORMAT)
+        if repos.connection is None or queries.run(
+            repos.connection, "book_delivery_slot", (start, planner.slot_capacity)
+        ).rowcount:
+            on_write_failure(lambda: planner.release(index))
+            return index, start, planner.slot_end(index).strftime(SLOT_FORMAT)
+        planner.release(index)
+        planner.mark_full(index)
+
+
+def configure_dashboard(**options):
+    """Set up the admin dashboard's KPI cache; it is loaded on first view
+
+    Args:
+        **options: Overrides for dashboard.KpiCache (refresh_interval,
+            low_stock_threshold, active_days, background, clock)
+    """
+    global KPI_CACHE, DASHBOARD
+    DASHBOARD = options
+    KPI_CACHE = None
+
+
+def get_kpi_cache():
+    """Return the dashboard's KPI cache, creating it on first use"""
+    global KPI_CACHE
+
+    if KPI_CACHE is None:
+        from dashboard import KpiCache
+        replay_seconds = 0 if REPLICA is None else REPLICA.max_staleness
+        KPI_CACHE = KpiCache(load_kpi_snapshot, **{"replay_seconds": replay_seconds, **DASHBOARD})
+
+    return KPI_CACHE
+
+
+def load_kpi_snapshot(day, active_since):
+    """Read what the dashboard counts from every database holding orders
+
+    This scans the orders table, so it only runs when the KPI cache is
+    first loaded and then every refresh interval, in the background. It
+    reads the read replica when one is configured.
+
+    Returns:
+        dashboard.KpiSnapshot
+    """
+    from dashboard import KpiSnapshot
+    from sharding import SHARD_ID_RANGE
+
+    today, open_orders, last_order_day, newest_orders, delivered = {}, {}, {}, {}, 0
+    for conn in reporting_databases():
+        try:
+            # Read first: every order up to here is committed, so the queries below count it
+            newest = queries.scalar(conn, "max_order_id")
+            shard = newest // SHARD_ID_RANGE
+            newest_orders[shard] = max(newest, newest_orders.get(shard, 0))
+            today.update(queries.run(conn, "orders_placed_since", (day,)))
+            open_orders.update((order.id, order.status) for order in queries.run(conn, "open_orders"))
+            delivered += queries.scalar(conn, "delivered_order_count")
+            for user_id, last in queries.run(conn, "customers_ordering_since", (active_since,)):
+                last_order_day[user_id] = max(last, last_order_day.get(user_id, last))
+        finally:
+            conn.close()
+
+    conn = connect_reporting_db()
+    try:
+        stock = dict(queries.run(conn, "product_stock"))
+    finally:
+        conn.close()
+
+    return KpiSnapshot(today, open_orders, delivered, stock, last_order_day, newest_orders)
+
+
+def save_login_lockout(conn, username, locked_until):
+    repositories(conn).users.save_lockout(username, locked_until)
+
+
+def clear_login_lockout(conn, username):
+    repositories(conn).users.clear_lockout(username)
+
+
+def configure_storage(kind="sqlite", load=False):
+    """Choose the backend for users, products, orders and coupons
+
+    Args:
+        kind: "sqlite" for dollmart.db (the default), or "memory" for a
+            storage.MemoryStorage held by this process and lost on exit
+        load: With "memory", start from a copy of dollmart.db rather than empty
+
+    Raises:
+        ValueError: For an unknown kind
+    """
+    global STORAGE, DELIVERY_PLANNER
+
+    # Slot bookings are counted per backend, so the planner starts over from the new one
+    DELIVERY_PLANNER = None
+    if kind == "sqlite":
+        STORAGE = None
+    elif kind == "memory":
+        from storage import MemoryStorage
+        STORAGE = MemoryStorage()
+        if load:
+            conn = connect_db()
+            STORAGE.load(conn)
+            conn.close()
+    else:
+        raise ValueError(f"Unknown storage backend: {kind}")
+
+
+class StorageUnsupported(RuntimeError):
+    """An operation that needs SQLite was called with the in-memory backend configured"""
+
+
+def require_sqlite(feature):
+    """Raise StorageUnsupported, naming `feature`, when the in-memory backend is configured"""
+    if STORAGE is not None:
+        raise StorageUnsupported(
+            f"{feature} reads tables only dollmart.db has; call configure_storage('sqlite') to use it"
+        )
+
+
+def repositories(conn):
+    """The repositories behind the `conn` an operation was handed
+
+    Operations run by run_write() get a SQLite connection, or the
+    in-memory backend's Repositories when that is configured; this gives
+    them one interface to both.
+    """
+    from storage import Repositories, sqlite_repositories
+    return conn if isinstance(conn, Repositories) else sqlite_repositories(conn)
+
+
+def open_storage(user_id=None):
+    """Context manager yielding the configured backend's repositories for reading
+
+    Args:
+        user_id: Read from this customer's shard when sharding is on
+    """
+    if STORAGE is not None:
+        return STORAGE.transaction()
+
+    from storage import sqlite_session
+    return sqlite_session(connect_db() if user_id is None else connect_customer_db(user_id))
+
+
+def get_archive():
+    """Return the order archive, importing the archive module on first use"""
+    global ARCHIVE
+
+    if ARCHIVE is None:
+        from archive import OrderArchive
+        ARCHIVE = OrderArchive(ARCHIVE_DIR)
+
+    return ARCHIVE
+
+
+@timed("archive_delivered_orders")
+def archive_delivered_orders(older_than_days=30):
+    """Move orders delivered more than `older_than_days` days ago into the archive
+
+    Returns:
+        Number of orders archived
+    """
+    # Without delivery slots orders are delivered PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS after
+    # being placed; with slots it can be later, but only orders marked Delivered are archived
+    cutoff = datetime.datetime.now() - datetime.timedelta(
+        days=older_than_days, hours=PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS
+    )
+
+    archived = 0
+    for conn in customer_databases():
+        archived += get_archive().archive(conn, cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+        conn.close()
+
+    # Archived orders leave the Delivered count, which no event covers
+    if archived and KPI_CACHE is not None:
+        KPI_CACHE.expire()
+    return archived
+
+
+def run_write(operation, *args, user_id=None):
+    """Run `operation(conn, *args)` in a committed transaction
+
+    When the group-commit queue is enabled the operation is batched with
+    other concurrent writes; otherwise it gets its own connection and commit.
+    With sharding enabled, passing `user_id` runs it on that customer's shard.
+    With the in-memory backend the operation is handed that backend's
+    Repositories instead of a connection, in one MemoryStorage transaction.
+
+    If run_write() raises, whether the operation, its savepoint or the
+    commit failed, the callbacks the operation passed to on_write_failure()
+    run after the rollback, newest first. Once it has committed, the
+    callbacks passed to after_write_commit() run, oldest first; a
+    run_write() inside another operation hands them on to that operation's
+    run_write() instead, so they wait for the outermost commit.
+
+    Returns:
+        Whatever the operation returns
+    """
+    undo = []
+    committed = []
+    outer_committed = getattr(_WRITE_HOOKS, "committed", None)
+
+    def undoable(conn, *args):
+        outer = (getattr(_WRITE_HOOKS, "undo", None), getattr(_WRITE_HOOKS, "committed", None))
+        _WRITE_HOOKS.undo, _WRITE_HOOKS.committed = undo, committed
+        try:
+            return operation(conn, *args)
+        finally:
+            _WRITE_HOOKS.undo, _WRITE_HOOKS.committed = outer
+
+    try:
+        result = _run_write(undoable, args, user_id)
+    except Exception:
+        for callback in reversed(undo):
+            callback()
+        raise
+
+    if outer_committed is not None:
+        outer_committed.extend(committed)
+    else:
+        for callback in committed:
+            callback()
+    return result
+
+
+def on_write_failure(callback):
+    """Have the run_write() running this operation call `callback()` if it raises
+
+    For what the transaction's rollback cannot undo: the delivery planner's
+    in-process counts, or a row committed in another database. Does nothing
+    outside run_write().
+    """
+    undo = getattr(_WRITE_HOOKS, "undo", None)
+    if undo is not None:
+        undo.append(callback)
+
+
+def after_write_commit(callback):
+    """Have the run_write() running this operation call `callback()` once it has committed
+
+    For what must not happen if the transaction rolls back, such as
+    recording an event about a row it wrote. Outside run_write() the
+    callback runs at once.
+    """
+    committed = getattr(_WRITE_HOOKS, "committed", None)
+    if committed is None:
+        callback()
+    else:
+        committed.append(callback)
+
+
+def _run_write(operation, args, user_id):
+    if STORAGE is not None:
+        with STORAGE.transaction() as repos:
+            return operation(repos, *args)
+
+    if SHARD_ROUTER is not None and user_id is not None:
+        conn = connect_customer_db(user_id)
+    elif WRITE_QUEUE is not None:
+        return WRITE_QUEUE.submit(operation, *args).result()
+    else:
+        conn = connect_db()
+
+    try:
+        result = operation(conn, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class SchemaTooNew(RuntimeError):
+    """The database was written by a newer DollMart, whose schema this one must not touch"""
+
+
+def check_schema_version(conn):
+    """Return the schema version stored in PRAGMA user_version
+
+    Raises:
+        SchemaTooNew: If it is newer than SCHEMA_VERSION
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise SchemaTooNew(
+            f"{DB_PATH} has schema version {version}, but this DollMart only knows up to {SCHEMA_VERSION}; "
+            "upgrade DollMart to open it"
+        )
+    return version
+
+
+def setup_database(seed=True):
+    """Initialize the SQLite database with necessary tables if they don't exist
+
+    Args:
+        seed: Also load the sample products when the products table is empty
+
+    Raises:
+        SchemaTooNew: If the database has a newer schema; it is left alone
+    """
+    from categories import create_schema as create_category_schema, rebuild_counts as rebuild_category_counts
+    from querycache import create_schema as create_version_schema
+    from pricing import create_schema as create_price_book_schema
+
+    conn = connect_db()
+    try:
+        check_schema_version(conn)
+    except SchemaTooNew:
+        conn.close()
+        raise
     cursor = conn.cursor()
     
     
@@ -32,12 +833,20 @@ def setup_database():
     ''')
     
    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS login_lockouts (
+        username TEXT PRIMARY KEY,
+        locked_until REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    
+   
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS products (
         id INTEGER PRIMARY KEY,
         name TEXT NOT NULL,
         category TEXT NOT NULL,
-        price REAL NOT NULL,
+        price INTEGER NOT NULL,
         stock INTEGER NOT NULL,
         bulk_discount REAL DEFAULT 0
     )
@@ -49,11 +858,16 @@ def setup_database():
         user_id INTEGER NOT NULL,
         order_date TEXT NOT NULL,
         status TEXT NOT NULL,
-        total_amount REAL NOT NULL,
+        total_amount INTEGER NOT NULL,
         estimated_delivery TEXT,
+        delivery_slot TEXT,
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+
+    # Schema version 8: the start of the delivery slot each order is booked into
+    if "delivery_slot" not in [row[1] for row in cursor.execute("PRAGMA table_info(orders)").fetchall()]:
+        cursor.execute("ALTER TABLE orders ADD COLUMN delivery_slot TEXT")
     
     
     cursor.execute('''
@@ -61,7 +875,7 @@ def setup_database():
         order_id INTEGER NOT NULL,
         product_id INTEGER NOT NULL,
         quantity INTEGER NOT NULL,
-        price REAL NOT NULL,
+        price INTEGER NOT NULL,
         PRIMARY KEY (order_id, product_id),
         FOREIGN KEY (order_id) REFERENCES orders (id),
         FOREIGN KEY (product_id) REFERENCES products (id)
@@ -79,68 +893,214 @@ def setup_database():
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
-    
-    
-    cursor.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
-    if cursor.fetchone()[0] == 0:
+
+
+    # Schema version 7: the order each checkout request placed, so a retried request is not placed twice
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS checkout_requests (
+        user_id INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        order_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        estimated_delivery TEXT,
+        PRIMARY KEY (user_id, idempotency_key)
+    ) WITHOUT ROWID
+    ''')
+
+    # Schema version 11: a request keeps its order's dates, so it is still found once the order is archived
+    if "estimated_delivery" not in [row[1] for row in cursor.execute("PRAGMA table_info(checkout_requests)").fetchall()]:
+        cursor.execute("ALTER TABLE checkout_requests ADD COLUMN estimated_delivery TEXT")
+        cursor.execute(
+            "UPDATE checkout_requests SET estimated_delivery = "
+            "(SELECT estimated_delivery FROM orders WHERE orders.id = checkout_requests.order_id)"
+        )
+
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS delivery_slots (
+        slot_start TEXT PRIMARY KEY,
+        booked INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS discount_tiers (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        category TEXT,
+        customer_type TEXT NOT NULL DEFAULT 'all',
+        min_quantity INTEGER NOT NULL,
+        discount REAL NOT NULL,
+        CHECK ((product_id IS NULL) != (category IS NULL)),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS price_lists (
+        customer_type TEXT NOT NULL,
+        product_id INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        PRIMARY KEY (customer_type, product_id),
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+    ''')
+
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_pairs (
+        product_id INTEGER NOT NULL,
+        other_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (product_id, other_id)
+    ) WITHOUT ROWID
+    ''')
+
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS product_neighbors (
+        product_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (product_id, rank)
+    ) WITHOUT ROWID
+    ''')
+
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders (user_id, order_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_pairs_count ON product_pairs (product_id, count DESC, other_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_coupons_user ON coupons (user_id, used)")
+
+
+    # Schema version 3: money columns hold integer cents instead of REAL dollars
+    for table, columns in MONEY_COLUMNS.items():
+        money.convert_columns_to_cents(conn, table, columns)
+
+
+    # Category tables and their triggers on products, which the conversion above would drop.
+    # Schema version 12: the (category, name) listing index also carries the price
+    create_category_schema(cursor)
+
+    # Schema version 9: write counters for users, products and orders, which the
+    # admin listing cache checks. After the conversion above, which recreates tables.
+    create_version_schema(cursor)
+    # Schema version 10: the write counter of the catalog the price book is built from
+    create_price_book_schema(cursor)
+
+
+    if queries.scalar(conn, "admin_count") == 0:
         admin_pass = hashlib.sha256("admin123".encode()).hexdigest()
-        cursor.execute("INSERT INTO users (username, password_hash, role, is_retail, registration_date) VALUES (?, ?, ?, ?, ?)", 
-                      ("admin", admin_pass, "admin", 0, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        queries.run(conn, "insert_user",
+                    ("admin", admin_pass, "admin", 0, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
     
    
-    cursor.execute("SELECT COUNT(*) FROM products")
-    if cursor.fetchone()[0] == 0:
+    if seed and queries.scalar(conn, "product_count") == 0:
         sample_products = [
-            ("Rice", "Groceries", 2.99, 100, 0.1),
-            ("Milk", "Groceries", 1.99, 50, 0.1),
-            ("Bread", "Groceries", 1.49, 30, 0.1),
-            ("Smartphone", "Electronics", 499.99, 10, 0.05),
-            ("Laptop", "Electronics", 899.99, 5, 0.05),
-            ("Shampoo", "Personal Care", 4.99, 40, 0.15),
-            ("Toothpaste", "Personal Care", 2.49, 60, 0.15)
+            ("Rice", "Groceries", 299, 100, 0.1),
+            ("Milk", "Groceries", 199, 50, 0.1),
+            ("Bread", "Groceries", 149, 30, 0.1),
+            ("Smartphone", "Electronics", 49999, 10, 0.05),
+            ("Laptop", "Electronics", 89999, 5, 0.05),
+            ("Shampoo", "Personal Care", 499, 40, 0.15),
+            ("Toothpaste", "Personal Care", 249, 60, 0.15)
         ]
-        cursor.executemany("INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)", 
-                          sample_products)
+        queries.run_many(conn, "insert_product", sample_products)
+
+    # Schema version 5: category counts, rebuilt here so migrated catalogs start out exact
+    rebuild_category_counts(conn)
+
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     
     conn.commit()
     conn.close()
+    invalidate_price_book()
+
 
+def ensure_database():
+    """Fast startup check: create the schema only if the stored version is behind
 
+    A single PRAGMA read replaces the CREATE TABLE IF NOT EXISTS statements
+    and seed checks on every launch. Sample products are only loaded by the
+    explicit `init` command.
 
+    Raises:
+        SchemaTooNew: If the database has a newer schema, which is never
+            migrated down
+    """
+    conn = connect_db()
+    try:
+        version = check_schema_version(conn)
+    finally:
+        conn.close()
+
+    if version < SCHEMA_VERSION:
+        setup_database(seed=False)
+
+
+
+@timed("update_order_statuses")
 def update_order_statuses():
-    """Update order statuses based on time elapsed since order creation"""
-    conn = sqlite3.connect('dollmart.db')
-    cursor = conn.cursor()
-    
-    
+    """Update order statuses from each order's delivery slot
+
+    An order booked into a slot goes out for delivery when the slot starts
+    and is delivered when it ends (its estimated_delivery). Orders placed
+    without a slot move on by time elapsed since they were placed.
+
+    Returns:
+        list of (order_id, old_status, new_status) for the orders moved on
+    """
     current_time = datetime.datetime.now()
-    
-    
-    cursor.execute("SELECT id, order_date, status FROM orders WHERE status != 'Delivered'")
-    orders = cursor.fetchall()
-    
-    for order in orders:
-        order_id, order_date_str, status = order
-        order_date = datetime.datetime.strptime(order_date_str, "%Y-%m-%d %H:%M:%S")
-        
-        
-        elapsed_time = current_time - order_date
-        hours_elapsed = elapsed_time.total_seconds() / 3600
-        
+
+    if STORAGE is not None:
+        with STORAGE.transaction() as repos:
+            transitions = _move_orders_on(repos, current_time)
+    else:
+        transitions = []
+        for conn in customer_databases():
+            try:
+                transitions += _move_orders_on(repositories(conn), current_time)
+                conn.commit()
+            finally:
+                conn.close()
+
+    for order_id, old_status, new_status in transitions:
+        record_event("order_status_changed", order_id=order_id, old_status=old_status, new_status=new_status)
+    return transitions
+
+def _move_orders_on(repos, current_time):
+    """Set the status each open order in `repos` has reached; returns the transitions"""
+    # Slot times are stored to the minute, and compare as text in this format
+    now = current_time.strftime("%Y-%m-%d %H:%M")
+    transitions = []
+
+    for order in repos.orders.open():
+        order_id, order_date_str, status, delivery_slot, estimated_delivery = order
+
         new_status = status
-        
-       
-        if status == "Processing" and hours_elapsed >= PROCESSING_TIME_HOURS:
-            new_status = "Out for Delivery"
-        elif status == "Out for Delivery" and hours_elapsed >= (PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS):
-            new_status = "Delivered"
-        
-        
+
+        if delivery_slot:
+            if status == "Processing" and now >= delivery_slot:
+                new_status = "Out for Delivery"
+            elif status == "Out for Delivery" and now >= estimated_delivery:
+                new_status = "Delivered"
+        else:
+            order_date = datetime.datetime.strptime(order_date_str, "%Y-%m-%d %H:%M:%S")
+            hours_elapsed = (current_time - order_date).total_seconds() / 3600
+
+            if status == "Processing" and hours_elapsed >= PROCESSING_TIME_HOURS:
+                new_status = "Out for Delivery"
+            elif status == "Out for Delivery" and hours_elapsed >= (PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS):
+                new_status = "Delivered"
+
+
         if new_status != status:
-            cursor.execute("UPDATE orders SET status = ? WHERE id = ?", (new_status, order_id))
-    
-    conn.commit()
-    conn.close()
+            repos.orders.set_status(order_id, new_status)
+            transitions.append((order_id, status, new_status))
+
+    return transitions
 
 def generate_coupon_code(user_id, type_prefix):
     """Generate a unique coupon code based on user ID and coupon type
@@ -157,6 +1117,7 @@ def generate_coupon_code(user_id, type_prefix):
     return f"{type_prefix}-{unique_id}"
 
 
+@timed("create_coupon")
 def create_coupon(user_id, discount_percentage, type_prefix="COUPON", existing_conn=None):
     """Create a new coupon for a user
     
@@ -164,72 +1125,547 @@ def create_coupon(user_id, discount_percentage, type_prefix="COUPON", existing_c
         user_id: The user's ID
         discount_percentage: The percentage discount to apply
         type_prefix: The type of coupon (e.g., WELCOME, LOYAL)
-        existing_conn: An existing database connection (optional)
+        existing_conn: The connection of a transaction to write in, without
+            committing (optional)
         
     Returns:
         The coupon ID and code
     """
-   
-    should_close_conn = False
+    coupon_code = generate_coupon_code(user_id, type_prefix)
+
+    def insert(conn):
+        return repositories(conn).coupons.add(user_id, coupon_code, discount_percentage)
+
     if existing_conn is None:
-        conn = sqlite3.connect('dollmart.db')
-        should_close_conn = True
+        coupon_id = run_write(insert, user_id=user_id)
     else:
-        conn = existing_conn
-    
-    cursor = conn.cursor()
-    
-    coupon_code = generate_coupon_code(user_id, type_prefix)
-    
-    cursor.execute(
-        "INSERT INTO coupons (user_id, code, discount_percentage, used) VALUES (?, ?, ?, ?)",
-        (user_id, coupon_code, discount_percentage, 0)
-    )
-    
-    coupon_id = cursor.lastrowid
-    
-    
-    if should_close_conn:
-        conn.commit()
-        conn.close()
+        coupon_id = insert(existing_conn)
+
+    # Inside a write (existing_conn, or a registration that commits this coupon
+    # to a shard first) the event waits for that write to commit
+    after_write_commit(lambda: record_event("coupon_created", coupon_id=coupon_id, user_id=user_id,
+                                            code=coupon_code, discount_percentage=discount_percentage))
     
     return coupon_id, coupon_code
 
 
+@timed("apply_coupon")
 def apply_coupon(user_id, coupon_id, total_amount):
     """Apply a coupon to the total amount
     
     Args:
         user_id: The user's ID
         coupon_id: The ID of the coupon to apply
-        total_amount: The current total amount
+        total_amount: The current total amount in cents
         
     Returns:
-        tuple: (successful, new_total, discount, coupon_code, coupon_percentage)
+        tuple: (successful, new_total, discount, coupon_code, coupon_percentage),
+        with the amounts in cents
     """
-    conn = sqlite3.connect('dollmart.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT code, discount_percentage FROM coupons WHERE id = ? AND user_id = ? AND used = 0",
-        (coupon_id, user_id)
-    )
-    coupon = cursor.fetchone()
-    
+    coupon = run_write(lambda conn: repositories(conn).coupons.redeem(coupon_id, user_id), user_id=user_id)
     if not coupon:
-        conn.close()
         return False, total_amount, 0, None, None
     
     code, discount_percentage = coupon
-    discount = total_amount * (discount_percentage / 100)
+    discount = money.apply_bp(total_amount, money.percent_to_bp(discount_percentage))
     new_total = total_amount - discount
+
+    record_event("coupon_redeemed", coupon_id=coupon_id, user_id=user_id, code=code, discount=discount)
     
-    
-    cursor.execute("UPDATE coupons SET used = 1 WHERE id = ?", (coupon_id,))
+    return True, new_total, discount, code, discount_percentage
+
+
+class CouponUnavailable(ValueError):
+    """The coupon is not the customer's, or another checkout redeemed it first"""
+
+
+CheckoutResult = namedtuple(
+    "CheckoutResult", ["order_id", "order_date", "estimated_delivery", "orders_count", "loyalty_coupon_code", "replayed"]
+)
+
+
+@timed("insert_order")
+def insert_order(conn, user_id, cart, total_amount, coupon_id=None, check_stock=False, idempotency_key=None):
+    """Write an order, its items, the stock decrements and loyalty bookkeeping
+
+    Does not commit, so it can run inside run_write() or a group-commit batch.
+    On SQLite, items and stock decrements are each written with one executemany.
+    The coupon is redeemed first, with a conditional UPDATE in the same
+    transaction, so a coupon is used exactly when its order is placed. The
+    order is booked into the earliest delivery slot with room, and its
+    estimated_delivery is the end of that slot.
+
+    Args:
+        conn: The database connection to write with, or the in-memory
+            backend's Repositories
+        user_id: The customer's ID
+        cart: Mapping of product ID to {"name", "price" (cents), "quantity"}
+        total_amount: The final amount charged, in cents
+        coupon_id: The coupon redeemed for this order (optional)
+        check_stock: Only decrement stock that is still there, raising
+            ValueError (so the caller rolls back) if any line is short
+        idempotency_key: Recorded against the order for checkout() (optional)
+
+    Returns:
+        tuple: (order_id, order_date, estimated_delivery, orders_count, loyalty_coupon_code)
+
+    Raises:
+        CouponUnavailable: If the coupon is not the customer's or is already used
+    """
+    now = datetime.datetime.now()
+    order_date = now.strftime("%Y-%m-%d %H:%M:%S")
+
+    repos = repositories(conn)
+    if coupon_id and repos.coupons.redeem(coupon_id, user_id) is None:
+        raise CouponUnavailable(f"Coupon {coupon_id} is no longer available; no order was placed")
+
+    quantities = {product_id: item["quantity"] for product_id, item in cart.items()}
+    if check_stock:
+        if repos.products.decrement_stock(quantities, only_if_available=True) < len(cart):
+            raise ValueError("Stock changed since the order was validated; no order was placed")
+    else:
+        repos.products.decrement_stock(quantities)
+
+    slot = book_delivery_slot(repos, now)
+    if slot is None:
+        delivery_slot = None
+        estimated_delivery = (now + datetime.timedelta(hours=PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS)).strftime("%Y-%m-%d %H:%M")
+    else:
+        _, delivery_slot, estimated_delivery = slot
+
+    order_id = repos.orders.add(
+        user_id, order_date, "Processing", total_amount, estimated_delivery,
+        [(product_id, item["quantity"], item["price"]) for product_id, item in cart.items()], delivery_slot
+    )
+    if idempotency_key is not None:
+        repos.orders.add_request(user_id, idempotency_key, order_id, order_date, estimated_delivery)
+
+    # Co-purchase counts live in SQLite tables, so only the SQLite backend keeps them
+    if repos.connection is not None:
+        from recommend import record_order
+        record_order(repos.connection, cart)
+
+    orders_count = repos.users.increment_orders_count(user_id)
+
+    loyalty_coupon_code = None
+    if orders_count and orders_count % 3 == 0:
+        _, loyalty_coupon_code = create_coupon(user_id, 5, "LOYAL", existing_conn=conn)
+
+    return order_id, order_date, estimated_delivery, orders_count, loyalty_coupon_code
+
+
+@timed("checkout")
+def checkout(user_id, cart, total_amount, coupon_id=None, idempotency_key=None, check_stock=False):
+    """Place an order at most once per idempotency key
+
+    A request that repeats a key the customer already checked out with gets
+    the original order back (with `replayed` set) instead of a second order.
+    Two requests racing with the same key both try to record it; the loser's
+    transaction fails on the checkout_requests primary key, rolls back, and
+    is retried, which finds the winner's order. A loser that fails on the
+    coupon the winner redeemed looks for the key again and replays the
+    winner's order if it finds it. With a key, a transaction
+    that fails because the database stayed locked is retried as well, up to
+    CHECKOUT_ATTEMPTS tries in all. Without a key nothing is retried.
+
+    Args:
+        user_id: The customer's ID
+        cart: Mapping of product ID to {"name", "price" (cents), "quantity"}
+        total_amount: The final amount charged, in cents
+        coupon_id: The coupon to redeem with this order (optional)
+        idempotency_key: A string the client generates once per checkout
+            and sends again on every retry of it
+        check_stock: As for insert_order()
+
+    Returns:
+        CheckoutResult; loyalty_coupon_code is None on a replay, and the
+        caller records events only when `replayed` is False
+
+    Raises:
+        CouponUnavailable: If the coupon was already used by another
+            checkout; nothing is written
+        ValueError: If check_stock is set and a line is short
+    """
+    def place(conn):
+        if idempotency_key is not None:
+            previous = repositories(conn).orders.by_request(user_id, idempotency_key)
+            if previous is not None:
+                return CheckoutResult(*previous, None, True)
+        return CheckoutResult(
+            *insert_order(conn, user_id, cart, total_amount, coupon_id, check_stock, idempotency_key), False
+        )
+
+    attempt = 1
+    while True:
+        try:
+            result = run_write(place, user_id=user_id)
+            break
+        except (sqlite3.IntegrityError, sqlite3.OperationalError):
+            if idempotency_key is None or attempt == CHECKOUT_ATTEMPTS:
+                raise
+            attempt += 1
+        except CouponUnavailable:
+            if idempotency_key is None:
+                raise
+            # A retry that looked for its key before the original committed
+            # finds the coupon redeemed by the original: replay that order
+            with open_storage(user_id) as repos:
+                previous = repos.orders.by_request(user_id, idempotency_key)
+            if previous is None:
+                raise
+            result = CheckoutResult(*previous, None, True)
+            break
+    return result
+
+
+def new_idempotency_key():
+    """A random key for one checkout, reused by each retry of it"""
+    return os.urandom(16).hex()
+
+
+@timed("create_customer")
+def create_customer(conn, username, password_hash, is_retail):
+    """Insert a customer and their welcome coupon without committing
+
+    Returns:
+        tuple: (user_id, coupon_id, coupon_code)
+    """
+    registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    user_id = repositories(conn).users.add(username, password_hash, "customer", is_retail, registration_date)
+
+    if SHARD_ROUTER is None or STORAGE is not None:
+        coupon_id, coupon_code = create_coupon(user_id, 10, "WELCOME", existing_conn=conn)
+        return user_id, coupon_id, coupon_code
+
+    # A sharded customer's coupons live in their shard, not alongside the user row. The
+    # coupon commits there first, so it is deleted again if the user row then fails to commit.
+    coupon_id, coupon_code = create_coupon(user_id, 10, "WELCOME")
+    on_write_failure(lambda: run_write(
+        lambda shard: queries.run(shard, "delete_coupon", (coupon_id, user_id)), user_id=user_id
+    ))
+    return user_id, coupon_id, coupon_code
+
+
+@timed("find_products")
+def find_products(search_term):
+    """Return (id, name, category, price, stock) for products whose name contains `search_term`"""
+    with open_storage() as repos:
+        return repos.products.search(search_term)
+
+
+@timed("search_customers")
+def search_customers(prefix, limit=20):
+    """Find customers whose username starts with the given prefix
+
+    The prefix is turned into a half-open range on username so the lookup
+    walks the UNIQUE username index instead of scanning every user.
+
+    Args:
+        prefix: The start of the username to search for
+        limit: Maximum number of matches to return
+
+    Returns:
+        list of (id, username, is_retail, orders_count, registration_date)
+    """
+    conn = connect_db()
+
+    if prefix:
+        upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        customers = queries.fetch_all(conn, "customers_by_username_range", (prefix, upper_bound, limit))
+    else:
+        customers = queries.fetch_all(conn, "customers_by_username", (limit,))
+
+    conn.close()
+    return customers
+
+
+@timed("get_customer_360")
+def get_customer_360(customer_id, page=1, page_size=10):
+    """Load everything the admin needs about a customer in three queries
+
+    Args:
+        customer_id: The customer's user ID
+        page: 1-based page of the order history to load
+        page_size: Number of orders per page
+
+    Returns:
+        dict with "profile", "orders", "total_orders", "page", "page_size",
+        "coupons" and "coupon_summary" keys, or None if no such customer
+    """
+    with open_storage(customer_id) as repos:
+        profile = repos.users.profile(customer_id)
+
+        if not profile:
+            return None
+
+        # On SQLite the correlated item count is resolved through the order_items primary
+        # key and the window count rides along with the page, so no second COUNT(*) query.
+        rows = repos.orders.page_for_user(customer_id, page_size, (page - 1) * page_size)
+        coupons = repos.coupons.all_for_user(customer_id)
+
+    orders = [row[:5] for row in rows]
+    total_orders = rows[0].total_orders if rows else profile.orders_count
+
+    used = sum(1 for coupon in coupons if coupon.used == 1)
+    return {
+        "profile": profile,
+        "orders": orders,
+        "total_orders": total_orders,
+        "page": page,
+        "page_size": page_size,
+        "coupons": coupons,
+        "coupon_summary": {"total": len(coupons), "used": used, "available": len(coupons) - used},
+    }
+
+
+def get_price_book():
+    """Return the cached PriceBook, reloading it once the catalog it was built from has changed
+
+    The book is kept with the price book write counter (see
+    pricing.create_schema()) it was read at, so a price, tier or price list
+    change made by another process, worker or plain SQL is picked up on the
+    next quote. Checking costs one read of table_versions.
+
+    Raises:
+        StorageUnsupported: With the in-memory backend, which has no
+            discount tiers or price lists
+    """
+    global PRICE_BOOK, PRICE_BOOK_KEY
+    from pricing import PriceBook, VERSION_NAME
+
+    require_sqlite("The price book")
+    conn = connect_db()
+    try:
+        key = (os.path.abspath(DB_PATH), table_versions(conn, (VERSION_NAME,)))
+        if PRICE_BOOK is None or key != PRICE_BOOK_KEY:
+            PRICE_BOOK = PriceBook.load(conn)
+            PRICE_BOOK_KEY = key
+    finally:
+        conn.close()
+
+    return PRICE_BOOK
+
+
+def invalidate_price_book():
+    """Drop the cached PriceBook, so the next quote reloads it whatever the write counter says"""
+    global PRICE_BOOK
+    PRICE_BOOK = None
+
+
+def quote_cart(cart, is_retail, coupon_percentage=0):
+    """Price a cart with the cached PriceBook (see pricing.PriceBook.quote)
+
+    The in-memory backend has no discount tiers or price lists, so there
+    the cart is priced by a book of its own products' bulk discounts.
+    """
+    if STORAGE is None:
+        return get_price_book().quote(cart, is_retail, coupon_percentage)
+
+    from pricing import PriceBook
+    with STORAGE.transaction() as repos:
+        products = [product for product in map(repos.products.by_id, cart) if product is not None]
+    book = PriceBook([(product.id, product.category, product.price, product.bulk_discount) for product in products])
+    return book.quote(cart, is_retail, coupon_percentage)
+
+
+def read_order_sheet(path):
+    """Parse a CSV order sheet file into {product_id: quantity} (see bulkorder.parse_order_sheet)"""
+    from bulkorder import read_order_sheet as read
+    return read(path)
+
+
+@timed("bulk_order_cart")
+def bulk_order_cart(quantities):
+    """Validate every line of an order sheet with one catalog lookup
+
+    Returns:
+        tuple: (cart, problems) as returned by bulkorder.build_cart
+    """
+    from bulkorder import build_cart
+    with open_storage() as repos:
+        return build_cart(repos.products, quantities)
+
+
+@timed("place_bulk_order")
+def place_bulk_order(user_id, cart, quote, idempotency_key=None):
+    """Write a validated bulk order in one transaction
+
+    Items and stock decrements go in with executemany, and stock is only
+    taken if it is still there, so a sheet that raced another order rolls
+    back whole instead of driving stock negative.
+
+    Args:
+        user_id: The retail customer's ID
+        cart: The cart from bulk_order_cart()
+        quote: quote_cart() of that cart
+        idempotency_key: See checkout()
+
+    Returns:
+        tuple: (order_id, estimated_delivery, orders_count, loyalty_coupon_code)
+
+    Raises:
+        ValueError: If a product ran out of stock after validation
+    """
+    order_cart = {line.product_id: dict(cart[line.product_id], price=line.unit_price) for line in quote.lines}
+    result = checkout(user_id, order_cart, quote.total, None, idempotency_key, check_stock=True)
+
+    if not result.replayed:
+        record_event(
+            "order_placed",
+            order_id=result.order_id,
+            user_id=user_id,
+            order_date=result.order_date,
+            total_amount=quote.total,
+            coupon_id=None,
+            items=[
+                {"product_id": product_id, "quantity": item["quantity"], "price": item["price"]}
+                for product_id, item in order_cart.items()
+            ]
+        )
+    return result.order_id, result.estimated_delivery, result.orders_count, result.loyalty_coupon_code
+
+
+def add_discount_tier(min_quantity, discount, product_id=None, category=None, customer_type="all"):
+    """Add a bulk discount tier for a product or a whole category
+
+    Args:
+        min_quantity: Units of the product (or of the category, across the
+            cart) needed to reach the tier
+        discount: Discount rate, e.g. 0.1 for 10%
+        product_id: The product the tier applies to
+        category: The category the tier applies to, instead of a product
+        customer_type: "retail", "individual" or "all"
+
+    Returns:
+        The new tier's ID
+    """
+    if (product_id is None) == (category is None):
+        raise ValueError("A tier applies to exactly one of product_id or category")
+    if customer_type not in ("retail", "individual", "all"):
+        raise ValueError(f"Unknown customer type: {customer_type}")
+
+    conn = connect_db()
+    tier_id = queries.run(
+        conn, "insert_discount_tier", (product_id, category, customer_type, min_quantity, discount)
+    ).lastrowid
     conn.commit()
     conn.close()
-    
-    return True, new_total, discount, code, discount_percentage
+
+    invalidate_price_book()
+    return tier_id
+
+
+def remove_discount_tier(tier_id):
+    """Delete a discount tier
+
+    Returns:
+        True if the tier existed
+    """
+    conn = connect_db()
+    removed = queries.run(conn, "delete_discount_tier", (tier_id,)).rowcount > 0
+    conn.commit()
+    conn.close()
+
+    invalidate_price_book()
+    return removed
+
+
+def set_price_list_price(customer_type, product_id, price):
+    """Set the price a customer type ("retail" or "individual") pays for a product"""
+    if customer_type not in ("retail", "individual"):
+        raise ValueError(f"Unknown customer type: {customer_type}")
+
+    conn = connect_db()
+    queries.run(conn, "set_price_list_price", (customer_type, product_id, price))
+    conn.commit()
+    conn.close()
+
+    invalidate_price_book()
+
+
+@timed("also_bought")
+def also_bought(product_ids, limit=None, exclude=()):
+    """Return products customers bought together with `product_ids` (see recommend.also_bought)"""
+    import recommend
+    conn = connect_db()
+    try:
+        return recommend.also_bought(conn, product_ids, limit or recommend.TOP_K, exclude)
+    finally:
+        conn.close()
+
+
+@timed("rebuild_recommendations")
+def rebuild_recommendations():
+    """Recompute the "customers also bought" tables from every order in the database or shards
+
+    Returns:
+        Number of distinct product pairs counted
+    """
+    import recommend
+    conn = connect_db()
+    sources = [conn] if SHARD_ROUTER is None else list(customer_databases())
+    try:
+        pairs = recommend.rebuild(conn, sources)
+        conn.commit()
+        return pairs
+    finally:
+        for source in sources:
+            if source is not conn:
+                source.close()
+        conn.close()
+
+
+def print_also_bought(product_ids, exclude=()):
+    """Print the "Customers also bought" suggestions for some products, if there are any"""
+    products = also_bought(product_ids, exclude=exclude)
+    if not products:
+        return
+
+    print("\nCustomers also bought:")
+    for product in products:
+        print(f"  [{product.id}] {product.name} - {format_cents(product.price)}")
+
+
+def set_category_parent(name, parent_name=None):
+    """Place a category under `parent_name`, or at the top level (see categories.set_parent)"""
+    from categories import set_parent
+    conn = connect_db()
+    try:
+        set_parent(conn, name, parent_name)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def print_order_items(conn, order_id):
+    """Print the line items of an order held in the database behind `conn`"""
+    print_order_lines(order_id, queries.fetch_all(conn, "order_item_details", (order_id,)))
+
+
+def print_order_lines(order_id, items):
+    """Print an order's OrderItemDetailsRow lines"""
+    print(f"\n===== Order #{order_id} Details =====")
+    items_table = []
+    for item in items:
+        items_table.append([item.name, item.quantity, format_cents(item.price), format_cents(item.subtotal)])
+
+    print(tabulate(items_table, headers=["Product", "Quantity", "Unit Price", "Subtotal"], tablefmt="simple"))
+
+
+def print_archived_order(record):
+    """Print the line items of an order served from the archive"""
+    print(f"\n===== Order #{record['id']} Details (archived) =====")
+    items_table = []
+    for item in record["items"]:
+        items_table.append([
+            item["name"] or f"Product #{item['product_id']}",
+            item["quantity"],
+            format_cents(item['price']),
+            format_cents(item['quantity'] * item['price'])
+        ])
+
+    print(tabulate(items_table, headers=["Product", "Quantity", "Unit Price", "Subtotal"], tablefmt="simple"))
 
 
 class User(ABC):
@@ -249,6 +1685,8 @@ class Customer(User):
         super().__init__(user_id, username, "customer", is_retail)
         self.orders_count = orders_count
         self.cart = {}
+        # Units in the cart, kept up to date by the cart methods instead of summed on every view
+        self.cart_quantity = 0
     
     def show_menu(self):
         while True:
@@ -262,7 +1700,8 @@ class Customer(User):
             print("4. Place Order")
             print("5. View Order History")
             print("6. Check Available Coupons")
-            print("7. Logout")
+            print("7. Bulk Order from Order Sheet")
+            print("8. Logout")
             
             choice = input("\nEnter your choice: ")
             
@@ -279,47 +1718,86 @@ class Customer(User):
             elif choice == '6':
                 self.check_coupons()
             elif choice == '7':
+                self.bulk_order()
+            elif choice == '8':
                 print("Logging out...")
                 return
             else:
                 print("Invalid choice. Please try again.")
     
     def browse_products(self):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
+        from categories import category_tree, category_page, facets, band_label, PAGE_SIZE
+        require_sqlite("Browsing categories")
+        conn = connect_db()
         
         
-        cursor.execute("SELECT DISTINCT category FROM products")
-        categories = cursor.fetchall()
+        categories = [node for node in category_tree(conn) if node.product_count]
         
         print("\n===== Product Categories =====")
         for i, category in enumerate(categories, 1):
-            print(f"{i}. {category[0]}")
+            print(f"{i}. {'  ' * category.depth}{category.name} ({category.product_count} products, {category.in_stock_count} in stock)")
         
         try:
             choice = int(input("\nSelect a category (0 to cancel): "))
             if choice == 0:
                 conn.close()
                 return
+            if choice < 0:
+                raise IndexError(choice)
             
-            selected_category = categories[choice-1][0]
-            
-           
-            cursor.execute("SELECT id, name, price, stock FROM products WHERE category = ?", (selected_category,))
-            products = cursor.fetchall()
-            
-            print(f"\n===== Products in {selected_category} =====")
-            products_table = []
-            for product in products:
-                products_table.append([product[0], product[1], f"${product[2]:.2f}", product[3]])
-            
-            print(tabulate(products_table, headers=["ID", "Name", "Price", "Stock"], tablefmt="simple"))
-            
+            selected_category = categories[choice-1].name
+            counts = facets(conn, selected_category)
+            sort, band, in_stock_only = "price", None, False
+            after, previous = None, []
             
-            product_id = input("\nEnter product ID to add to cart (0 to cancel): ")
-            if product_id != '0':
-                quantity = int(input("Enter quantity: "))
-                self.add_to_cart(int(product_id), quantity)
+            while True:
+                page = category_page(conn, selected_category, sort, after, in_stock_only, band)
+                
+                filters = [f"sorted by {sort}"]
+                if band is not None:
+                    filters.append(band_label(band))
+                if in_stock_only:
+                    filters.append("in stock only")
+                print(f"\n===== Products in {selected_category} ({', '.join(filters)}) =====")
+                print("Price ranges: " + ", ".join(f"{label} ({products})" for _, label, products, _ in counts["bands"]))
+                
+                products_table = []
+                for product in page.products:
+                    products_table.append([product.id, product.name, format_cents(product.price), product.stock])
+                
+                print(tabulate(products_table, headers=["ID", "Name", "Price", "Stock"], tablefmt="simple"))
+                print(f"Page {len(previous) + 1} of {max(1, -(-page.total // PAGE_SIZE))} ({page.total} products)")
+                
+                
+                product_id = input(
+                    "\nEnter product ID to add to cart, n/p for next/previous page, o to change sort, "
+                    "s for in stock only, r for a price range (0 to cancel): "
+                ).strip().lower()
+                if product_id == 'n' and page.next_key is not None:
+                    previous.append(after)
+                    after = page.next_key
+                elif product_id == 'p' and previous:
+                    after = previous.pop()
+                elif product_id in ('o', 's', 'r'):
+                    if product_id == 'o':
+                        sort = "name" if sort == "price" else "price"
+                    elif product_id == 's':
+                        in_stock_only = not in_stock_only
+                    else:
+                        for i, label, products, _ in counts["bands"]:
+                            print(f"{i + 1}. {label} ({products})")
+                        band = int(input("Select a price range (0 for all): ")) - 1
+                        band = band if band >= 0 else None
+                    after, previous = None, []
+                elif product_id.isdigit():
+                    if product_id != '0':
+                        quantity = int(input("Enter quantity: "))
+                        self.add_to_cart(int(product_id), quantity)
+                        if int(product_id) in self.cart:
+                            print_also_bought([int(product_id)], exclude=self.cart)
+                    break
+                else:
+                    print("No more pages." if product_id in ('n', 'p') else "Invalid choice.")
         
         except (ValueError, IndexError):
             print("Invalid selection.")
@@ -329,11 +1807,7 @@ class Customer(User):
     def search_products(self):
         search_term = input("\nEnter product name to search: ")
         
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, name, category, price, stock FROM products WHERE name LIKE ?", (f"%{search_term}%",))
-        products = cursor.fetchall()
+        products = find_products(search_term)
         
         if not products:
             print("No products found matching your search.")
@@ -341,7 +1815,7 @@ class Customer(User):
             print("\n===== Search Results =====")
             products_table = []
             for product in products:
-                products_table.append([product[0], product[1], product[2], f"${product[3]:.2f}", product[4]])
+                products_table.append([product[0], product[1], product[2], format_cents(product[3]), product[4]])
             
             print(tabulate(products_table, headers=["ID", "Name", "Category", "Price", "Stock"], tablefmt="simple"))
             
@@ -350,24 +1824,17 @@ class Customer(User):
             if product_id != '0':
                 quantity = int(input("Enter quantity: "))
                 self.add_to_cart(int(product_id), quantity)
-        
-        conn.close()
     
     def add_to_cart(self, product_id, quantity):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT name, price, stock FROM products WHERE id = ?", (product_id,))
-        product = cursor.fetchone()
+        with open_storage() as repos:
+            product = repos.products.for_cart(product_id)
         
         if not product:
             print("Product not found.")
-            conn.close()
             return
         
         if product[2] < quantity:
             print(f"Sorry, only {product[2]} units available in stock.")
-            conn.close()
             return
         
         
@@ -379,16 +1846,17 @@ class Customer(User):
                 "price": product[1],
                 "quantity": quantity
             }
+        self.cart_quantity += quantity
         
         print(f"Added {quantity} x {product[0]} to your cart.")
-        conn.close()
     
     def remove_from_cart(self, product_id):
         if product_id in self.cart:
-            del self.cart[product_id]
+            self.cart_quantity -= self.cart.pop(product_id)["quantity"]
 
     def update_cart(self, product_id, quantity):
         if product_id in self.cart:
+            self.cart_quantity += quantity - self.cart[product_id]["quantity"]
             self.cart[product_id]["quantity"] = quantity
         else:
             print("Product not found in cart.")
@@ -402,22 +1870,17 @@ class Customer(User):
         
         self.view_cart()
         
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
         
-        total_amount = sum(item["price"] * item["quantity"] for item in self.cart.values())
-        final_amount = total_amount
+        quote = quote_cart(self.cart, self.is_retail)
+        total_amount = quote.subtotal
+        final_amount = quote.total
         
         
-        bulk_discount_applied = False
-        bulk_discount_amount = 0
-        if self.is_retail and self.calculate_total_quantity() >= 50:
-            bulk_discount_amount = total_amount * 0.1
-            final_amount = total_amount - bulk_discount_amount
-            bulk_discount_applied = True
-            print(f"\nRetail Bulk Discount (10%): -${bulk_discount_amount:.2f}")
-            print(f"After Bulk Discount: ${final_amount:.2f}")
+        bulk_discount_applied = quote.bulk_discount > 0
+        bulk_discount_amount = quote.bulk_discount
+        if bulk_discount_applied:
+            print(f"\nBulk Discount: -{format_cents(bulk_discount_amount)}")
+            print(f"After Bulk Discount: {format_cents(final_amount)}")
         
         
         coupon_applied = False
@@ -425,20 +1888,14 @@ class Customer(User):
         coupon_discount = 0
         
         
-        cursor.execute("SELECT COUNT(*) FROM coupons WHERE user_id = ? AND used = 0", (self.id,))
-        has_coupons = cursor.fetchone()[0] > 0
+        with open_storage(self.id) as repos:
+            coupons = repos.coupons.for_user(self.id)
         
-        if has_coupons:
+        if coupons:
             use_coupon = input("\nWould you like to use a coupon for this order? (y/n): ").lower()
             
             if use_coupon == 'y':
                 
-                cursor.execute(
-                    "SELECT id, code, discount_percentage FROM coupons WHERE user_id = ? AND used = 0", 
-                    (self.id,)
-                )
-                coupons = cursor.fetchall()
-                
                 print("\n===== Your Available Coupons =====")
                 coupons_table = []
                 for coupon in coupons:
@@ -451,18 +1908,18 @@ class Customer(User):
                     coupon_id = int(input("\nEnter Coupon ID to apply (0 to skip): "))
                     
                     if coupon_id > 0:
-                       
-                        success, discounted_total, discount_amount, coupon_code, discount_percentage = apply_coupon(
-                            self.id, coupon_id, final_amount
-                        )
+                        # Only chosen here; checkout() redeems it in the same transaction as the order
+                        coupon = next((coupon for coupon in coupons if coupon.id == coupon_id), None)
                         
-                        if success:
+                        if coupon:
                             coupon_applied = True
-                            coupon_discount = discount_amount
-                            final_amount = discounted_total
+                            coupon_code, discount_percentage = coupon.code, coupon.discount_percentage
+                            quote = quote_cart(self.cart, self.is_retail, discount_percentage)
+                            coupon_discount = quote.coupon_discount
+                            final_amount = quote.total
                             print(f"\nCoupon {coupon_code} applied!")
-                            print(f"Coupon Discount ({discount_percentage}%): -${coupon_discount:.2f}")
-                            print(f"Final Total: ${final_amount:.2f}")
+                            print(f"Coupon Discount ({discount_percentage}%): -{format_cents(coupon_discount)}")
+                            print(f"Final Total: {format_cents(final_amount)}")
                         else:
                             print("Invalid coupon ID or coupon already used.")
                             coupon_id = None
@@ -472,69 +1929,70 @@ class Customer(User):
         
         
         print("\n===== Order Summary =====")
-        print(f"Subtotal: ${total_amount:.2f}")
+        print(f"Subtotal: {format_cents(total_amount)}")
         
         if bulk_discount_applied:
-            print(f"Bulk Discount (10%): -${bulk_discount_amount:.2f}")
+            print(f"Bulk Discount: -{format_cents(bulk_discount_amount)}")
         
         if coupon_applied:
-            print(f"Coupon Discount: -${coupon_discount:.2f}")
+            print(f"Coupon Discount: -{format_cents(coupon_discount)}")
         
-        print(f"Final Total: ${final_amount:.2f}")
+        print(f"Final Total: {format_cents(final_amount)}")
         
         
         confirm = input("\nConfirm order? (y/n): ").lower()
         if confirm != 'y':
             print("Order cancelled.")
-            conn.close()
             return
-        
-        
-        order_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        estimated_delivery = (datetime.datetime.now() + datetime.timedelta(hours=PROCESSING_TIME_HOURS + DELIVERY_TIME_HOURS)).strftime("%Y-%m-%d %H:%M")
-        
-        cursor.execute(
-            "INSERT INTO orders (user_id, order_date, status, total_amount, estimated_delivery) VALUES (?, ?, ?, ?, ?)",
-            (self.id, order_date, "Processing", final_amount, estimated_delivery)
-        )
-        
-        order_id = cursor.lastrowid
-        
-        
-        for product_id, item in self.cart.items():
-            cursor.execute(
-                "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
-                (order_id, product_id, item["quantity"], item["price"])
-            )
-            
-            cursor.execute(
-                "UPDATE products SET stock = stock - ? WHERE id = ?",
-                (item["quantity"], product_id)
+
+        # Order items record the unit price actually charged, which may come from a price list
+        order_cart = {
+            line.product_id: dict(self.cart[line.product_id], price=line.unit_price) for line in quote.lines
+        }
+        try:
+            order_id, order_date, estimated_delivery, self.orders_count, loyalty_coupon_code, _ = checkout(
+                self.id, order_cart, final_amount, coupon_id, new_idempotency_key()
             )
-        
-        
-        if coupon_id:
-            cursor.execute("UPDATE coupons SET used = 1 WHERE id = ?", (coupon_id,))
-        
-        
-        self.orders_count += 1
-        cursor.execute("UPDATE users SET orders_count = ? WHERE id = ?", (self.orders_count, self.id))
-        
-        
-        if self.orders_count % 3 == 0:
-            new_coupon_id, coupon_code = create_coupon(self.id, 5, "LOYAL", existing_conn=conn)
-            print(f"\nCongratulations! You've earned a loyalty coupon: {coupon_code} (5% off)")
-        
-        conn.commit()
-        conn.close()
+        except CouponUnavailable:
+            print("That coupon was just used by another checkout. No order was placed; please check out again.")
+            return
+
+        if loyalty_coupon_code:
+            print(f"\nCongratulations! You've earned a loyalty coupon: {loyalty_coupon_code} (5% off)")
+
+        if coupon_applied:
+            record_event("coupon_redeemed", coupon_id=coupon_id, user_id=self.id, code=coupon_code,
+                         discount=coupon_discount)
+
+        record_event(
+            "order_placed",
+            order_id=order_id,
+            user_id=self.id,
+            order_date=order_date,
+            total_amount=final_amount,
+            coupon_id=coupon_id,
+            items=[
+                {"product_id": product_id, "quantity": item["quantity"], "price": item["price"]}
+                for product_id, item in order_cart.items()
+            ]
+        )
         
         print(f"\nOrder placed successfully! Your order ID is: {order_id}")
         print(f"Status: Processing")
-        print(f"Will be out for delivery after: {(datetime.datetime.now() + datetime.timedelta(hours=PROCESSING_TIME_HOURS)).strftime('%Y-%m-%d %H:%M')}")
+        planner = get_delivery_planner()
+        if planner is None:
+            out_for_delivery = datetime.datetime.now() + datetime.timedelta(hours=PROCESSING_TIME_HOURS)
+        else:
+            # estimated_delivery is the end of the order's slot
+            out_for_delivery = datetime.datetime.strptime(estimated_delivery, "%Y-%m-%d %H:%M") - datetime.timedelta(
+                hours=planner.slot_hours
+            )
+        print(f"Will be out for delivery after: {out_for_delivery.strftime('%Y-%m-%d %H:%M')}")
         print(f"Estimated delivery by: {estimated_delivery}")
         
         
         self.cart = {}
+        self.cart_quantity = 0
     
     def view_cart(self):
         if not self.cart:
@@ -542,43 +2000,99 @@ class Customer(User):
             return
         
         print("\n===== Your Cart =====")
+        quote = quote_cart(self.cart, self.is_retail)
         cart_table = []
-        total = 0
         
-        for product_id, item in self.cart.items():
-            subtotal = item["price"] * item["quantity"]
-            cart_table.append([item["name"], item["quantity"], f"${item['price']:.2f}", f"${subtotal:.2f}"])
-            total += subtotal
+        for line in quote.lines:
+            item = self.cart[line.product_id]
+            discount = f"{line.discount_bp / 100:g}%" if line.discount_bp else ""
+            cart_table.append([item["name"], line.quantity, format_cents(line.unit_price), discount, format_cents(line.subtotal)])
         
-        print(tabulate(cart_table, headers=["Product", "Quantity", "Unit Price", "Subtotal"], tablefmt="simple"))
-        print(f"\nTotal: ${total:.2f}")
+        print(tabulate(cart_table, headers=["Product", "Quantity", "Unit Price", "Bulk Discount", "Subtotal"], tablefmt="simple"))
+        print(f"\nUnits: {self.cart_quantity}")
+        print(f"Total: {format_cents(quote.subtotal)}")
         
         
-        if self.is_retail and self.calculate_total_quantity() >= 50:
-            discount = total * 0.1
-            print(f"Retail Bulk Discount (10%): -${discount:.2f}")
-            print(f"Final Total: ${total - discount:.2f}")
+        if quote.bulk_discount:
+            print(f"Bulk Discount: -{format_cents(quote.bulk_discount)}")
+            print(f"Final Total: {format_cents(quote.total)}")
+
+        largest = sorted(self.cart, key=lambda product_id: -self.cart[product_id]["quantity"])
+        print_also_bought(largest[:ALSO_BOUGHT_CART_LINES], exclude=self.cart)
     
     def calculate_total_quantity(self):
-        return sum(item["quantity"] for item in self.cart.values())
+        return self.cart_quantity
+
+    def bulk_order(self):
+        if not self.is_retail:
+            print("Bulk orders from an order sheet are available to retail store customers.")
+            return
+
+        path = input("\nPath to order sheet (CSV of product_id,quantity): ").strip()
+        try:
+            quantities = read_order_sheet(path)
+        except (OSError, ValueError) as e:
+            print(f"Could not read order sheet: {e}")
+            return
+
+        if not quantities:
+            print("The order sheet has no lines.")
+            return
+
+        cart, problems = bulk_order_cart(quantities)
+        if problems:
+            print("\n===== Order Sheet Problems =====")
+            for problem in problems[:20]:
+                print(problem)
+            if len(problems) > 20:
+                print(f"... and {len(problems) - 20} more")
+            print("No order was placed. Fix the sheet and try again.")
+            return
+
+        quote = quote_cart(cart, self.is_retail)
+        print("\n===== Bulk Order Summary =====")
+        print(f"Lines: {len(quote.lines)}")
+        print(f"Units: {quote.units}")
+        print(f"Subtotal: {format_cents(quote.subtotal)}")
+        if quote.bulk_discount:
+            print(f"Bulk Discount: -{format_cents(quote.bulk_discount)}")
+        print(f"Final Total: {format_cents(quote.total)}")
+
+        if input("\nConfirm bulk order? (y/n): ").lower() != 'y':
+            print("Order cancelled.")
+            return
+
+        try:
+            order_id, estimated_delivery, self.orders_count, loyalty_coupon_code = place_bulk_order(
+                self.id, cart, quote, new_idempotency_key()
+            )
+        except ValueError as e:
+            print(e)
+            return
+
+        if loyalty_coupon_code:
+            print(f"\nCongratulations! You've earned a loyalty coupon: {loyalty_coupon_code} (5% off)")
+        print(f"\nBulk order placed successfully! Your order ID is: {order_id}")
+        print(f"Estimated delivery by: {estimated_delivery}")
     
     def view_order_history(self):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        
         update_order_statuses()
         
-        cursor.execute(
-            """
-            SELECT id, order_date, status, total_amount, estimated_delivery
-            FROM orders
-            WHERE user_id = ?
-            ORDER BY order_date DESC
-            """,
-            (self.id,)
-        )
-        orders = cursor.fetchall()
+        with open_storage(self.id) as repos:
+            orders = repos.orders.for_user(self.id)
+
+        archived_count = get_archive().count_for_user(self.id)
+        if archived_count:
+            show_archived = input(f"\nYou have {archived_count} archived orders. Include them? (y/n): ").lower()
+            if show_archived == 'y':
+                for record in get_archive().orders_for_user(self.id):
+                    orders.append((
+                        record["id"],
+                        record["order_date"],
+                        record["status"],
+                        record["total_amount"],
+                        record["estimated_delivery"]
+                    ))
         
         if not orders:
             print("You have no order history.")
@@ -590,7 +2104,7 @@ class Customer(User):
                     order[0],
                     order[1],
                     order[2],
-                    f"${order[3]:.2f}",
+                    format_cents(order[3]),
                     order[4]
                 ])
             
@@ -603,50 +2117,24 @@ class Customer(User):
                     self.view_order_details(int(order_id))
                 except ValueError:
                     print("Invalid order ID.")
-        
-        conn.close()
     
     def view_order_details(self, order_id):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
+        with open_storage(self.id) as repos:
+            items = repos.orders.item_details(order_id, self.id)
         
-        
-        cursor.execute("SELECT id FROM orders WHERE id = ? AND user_id = ?", (order_id, self.id))
-        if not cursor.fetchone():
-            print("Order not found or doesn't belong to you.")
-            conn.close()
+        if items is None:
+            record = get_archive().find(order_id)
+            if record and record["user_id"] == self.id:
+                print_archived_order(record)
+            else:
+                print("Order not found or doesn't belong to you.")
             return
         
-        
-        cursor.execute(
-            """
-            SELECT p.name, oi.quantity, oi.price, (oi.quantity * oi.price) as subtotal
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = ?
-            """,
-            (order_id,)
-        )
-        items = cursor.fetchall()
-        
-        print(f"\n===== Order #{order_id} Details =====")
-        items_table = []
-        for item in items:
-            items_table.append([item[0], item[1], f"${item[2]:.2f}", f"${item[3]:.2f}"])
-        
-        print(tabulate(items_table, headers=["Product", "Quantity", "Unit Price", "Subtotal"], tablefmt="simple"))
-        
-        conn.close()
+        print_order_lines(order_id, items)
     
     def check_coupons(self):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, code, discount_percentage, used FROM coupons WHERE user_id = ?", 
-            (self.id,)
-        )
-        coupons = cursor.fetchall()
+        with open_storage(self.id) as repos:
+            coupons = repos.coupons.all_for_user(self.id)
         
         if not coupons:
             print("You don't have any coupons.")
@@ -658,8 +2146,6 @@ class Customer(User):
                 coupons_table.append([coupon[0], coupon[1], f"{coupon[2]}%", status])
             
             print(tabulate(coupons_table, headers=["ID", "Code", "Discount", "Status"], tablefmt="simple"))
-        
-        conn.close()
 
 class Admin(User):
     def __init__(self, user_id, username):
@@ -672,7 +2158,8 @@ class Admin(User):
             print("1. Manage Products")
             print("2. Manage Orders")
             print("3. Manage Customers")
-            print("4. Logout")
+            print("4. Dashboard")
+            print("5. Logout")
             
             choice = input("\nEnter your choice: ")
             
@@ -683,11 +2170,32 @@ class Admin(User):
             elif choice == '3':
                 self.customer_management()
             elif choice == '4':
+                self.view_dashboard()
+            elif choice == '5':
                 print("Logging out...")
                 return
             else:
                 print("Invalid choice. Please try again.")
     
+    def view_dashboard(self):
+        with timed("render_dashboard"):
+            cache = get_kpi_cache()
+            kpis = cache.kpis()
+
+            print(f"\n===== Dashboard for {kpis.day} =====")
+            print(tabulate([
+                ["Orders today", kpis.orders_today],
+                ["Revenue today", format_cents(kpis.revenue_today)],
+                [f"Active customers ({cache.active_days} days)", kpis.active_customers],
+                [f"Low stock products (<= {cache.low_stock_threshold})", kpis.low_stock],
+            ], tablefmt="simple"))
+            print()
+            print(tabulate(list(kpis.by_status.items()), headers=["Status", "Orders"], tablefmt="simple"))
+
+            refreshed = datetime.datetime.fromtimestamp(kpis.refreshed_at).strftime("%H:%M:%S")
+            print(f"\nRecounted from the database at {refreshed} (every {cache.refresh_interval:.0f} s), "
+                  f"plus orders and status changes made by this process since.")
+    
     def product_management(self):
         while True:
             print("\n===== Product Management =====")
@@ -695,7 +2203,9 @@ class Admin(User):
             print("2. Add New Product")
             print("3. Update Product")
             print("4. Delete Product")
-            print("5. Back to Main Menu")
+            print("5. Discount Tiers and Price Lists")
+            print("6. Category Hierarchy")
+            print("7. Back to Main Menu")
             
             choice = input("\nEnter your choice: ")
             
@@ -708,16 +2218,22 @@ class Admin(User):
             elif choice == '4':
                 self.delete_product()
             elif choice == '5':
+                self.manage_pricing()
+            elif choice == '6':
+                self.manage_categories()
+            elif choice == '7':
                 return
             else:
                 print("Invalid choice. Please try again.")
     
     def view_all_products(self):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, name, category, price, stock, bulk_discount FROM products")
-        products = cursor.fetchall()
+        if STORAGE is None:
+            conn = connect_db()
+            products = fetch_listing(conn, "all_products", ("products",))
+            conn.close()
+        else:
+            with open_storage() as repos:
+                products = repos.products.all()
         
         if not products:
             print("No products found.")
@@ -729,36 +2245,29 @@ class Admin(User):
                     product[0], 
                     product[1], 
                     product[2], 
-                    f"${product[3]:.2f}", 
+                    format_cents(product[3]), 
                     product[4],
                     f"{product[5]*100:.0f}%"
                 ])
             
             print(tabulate(products_table, headers=["ID", "Name", "Category", "Price", "Stock", "Bulk Discount"], tablefmt="simple"))
-        
-        conn.close()
     
     def add_product(self):
         try:
             name = input("Enter product name: ")
             category = input("Enter product category: ")
-            price = float(input("Enter product price: $"))
+            price = to_cents(input("Enter product price: $"))
             stock = int(input("Enter initial stock quantity: "))
             bulk_discount_str = input("Enter bulk discount percentage (e.g., 10 for 10%): ")
             bulk_discount = float(bulk_discount_str) / 100 if bulk_discount_str else 0
             
-            conn = sqlite3.connect('dollmart.db')
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
-                (name, category, price, stock, bulk_discount)
+            product_id = run_write(
+                lambda conn: repositories(conn).products.add(name, category, price, stock, bulk_discount)
             )
             
-            conn.commit()
-            print(f"Product '{name}' added successfully with ID: {cursor.lastrowid}")
-            
-            conn.close()
+            invalidate_price_book()
+            update_dashboard("stock_changed", product_id=product_id, stock=stock)
+            print(f"Product '{name}' added successfully with ID: {product_id}")
         
         except ValueError:
             print("Invalid input. Please enter numeric values where required.")
@@ -769,36 +2278,30 @@ class Admin(User):
         try:
             product_id = int(input("\nEnter product ID to update: "))
             
-            conn = sqlite3.connect('dollmart.db')
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-            product = cursor.fetchone()
+            with open_storage() as repos:
+                product = repos.products.by_id(product_id)
             
             if not product:
                 print("Product not found.")
-                conn.close()
                 return
             
             print("\nLeave field empty to keep current value.")
             name = input(f"Name [{product[1]}]: ") or product[1]
             category = input(f"Category [{product[2]}]: ") or product[2]
-            price_str = input(f"Price [${product[3]:.2f}]: ")
-            price = float(price_str) if price_str else product[3]
+            price_str = input(f"Price [{format_cents(product[3])}]: ")
+            price = to_cents(price_str) if price_str else product[3]
             stock_str = input(f"Stock [{product[4]}]: ")
             stock = int(stock_str) if stock_str else product[4]
             discount_str = input(f"Bulk discount [{product[5]*100}%]: ")
             bulk_discount = float(discount_str)/100 if discount_str else product[5]
             
-            cursor.execute(
-                "UPDATE products SET name = ?, category = ?, price = ?, stock = ?, bulk_discount = ? WHERE id = ?",
-                (name, category, price, stock, bulk_discount, product_id)
-            )
+            run_write(lambda conn: repositories(conn).products.update(
+                product_id, name, category, price, stock, bulk_discount
+            ))
             
-            conn.commit()
+            invalidate_price_book()
+            update_dashboard("stock_changed", product_id=product_id, stock=stock)
             print("Product updated successfully!")
-            
-            conn.close()
         
         except ValueError:
             print("Invalid input. Please enter numeric values where required.")
@@ -814,41 +2317,100 @@ class Admin(User):
                 print("Deletion cancelled.")
                 return
             
-            conn = sqlite3.connect('dollmart.db')
-            cursor = conn.cursor()
-            
-           
-            cursor.execute("SELECT name FROM products WHERE id = ?", (product_id,))
-            product = cursor.fetchone()
+            with open_storage() as repos:
+                product = repos.products.by_id(product_id)
+                # Order items are in each shard when sharding is on; the in-memory backend holds them all
+                in_orders = repos.orders.count_items_of(product_id) if STORAGE is not None else sum(
+                    row[0] for row in query_customer_data(queries.sql("product_order_item_count"), (product_id,))
+                )
             
             if not product:
                 print("Product not found.")
-                conn.close()
                 return
             
-            
-            cursor.execute("SELECT COUNT(*) FROM order_items WHERE product_id = ?", (product_id,))
-            if cursor.fetchone()[0] > 0:
+            if in_orders > 0:
                 print("Cannot delete product as it is part of existing orders.")
-                conn.close()
                 return
             
-            cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            run_write(lambda conn: repositories(conn).products.delete(product_id))
             
-            conn.commit()
-            print(f"Product '{product[0]}' deleted successfully!")
-            
-            conn.close()
+            invalidate_price_book()
+            update_dashboard("stock_changed", product_id=product_id, stock=None)
+            print(f"Product '{product.name}' deleted successfully!")
         
         except ValueError:
             print("Invalid input. Please enter a numeric product ID.")
     
+    def manage_pricing(self):
+        conn = connect_db()
+        tiers = queries.fetch_all(conn, "all_discount_tiers")
+        conn.close()
+
+        print("\n===== Discount Tiers =====")
+        tiers_table = []
+        for tier in tiers:
+            target = f"Product #{tier.product_id}" if tier.product_id is not None else f"Category {tier.category}"
+            tiers_table.append([tier.id, target, tier.customer_type, tier.min_quantity, f"{tier.discount*100:.0f}%"])
+
+        print(tabulate(tiers_table, headers=["ID", "Applies To", "Customers", "Min Quantity", "Discount"], tablefmt="simple"))
+
+        print("\n1. Add Product Tier")
+        print("2. Add Category Tier")
+        print("3. Remove Tier")
+        print("4. Set Price List Price")
+        print("5. Back")
+        choice = input("\nEnter your choice: ")
+
+        try:
+            if choice in ('1', '2'):
+                if choice == '1':
+                    product_id, category = int(input("Enter product ID: ")), None
+                else:
+                    product_id, category = None, input("Enter category: ")
+                min_quantity = int(input("Enter minimum quantity: "))
+                discount = float(input("Enter discount percentage (e.g., 10 for 10%): ")) / 100
+                customer_type = input("Customer type (retail/individual/all) [all]: ") or "all"
+                add_discount_tier(min_quantity, discount, product_id, category, customer_type)
+                print("Discount tier added.")
+            elif choice == '3':
+                tier_id = int(input("Enter tier ID: "))
+                print("Discount tier removed." if remove_discount_tier(tier_id) else "Tier not found.")
+            elif choice == '4':
+                product_id = int(input("Enter product ID: "))
+                customer_type = input("Customer type (retail/individual): ")
+                price = to_cents(input("Enter price: $"))
+                set_price_list_price(customer_type, product_id, price)
+                print("Price list updated.")
+        except ValueError:
+            print("Invalid input. Please enter numeric values where required.")
+    
+    def manage_categories(self):
+        from categories import category_tree
+        conn = connect_db()
+        tree = category_tree(conn)
+        conn.close()
+
+        print("\n===== Category Hierarchy =====")
+        for node in tree:
+            print(f"{'  ' * node.depth}{node.name} ({node.product_count} products, {node.in_stock_count} in stock)")
+
+        name = input("\nCategory to move (blank to go back): ").strip()
+        if not name:
+            return
+        parent_name = input("New parent category (blank for top level): ").strip() or None
+        try:
+            set_category_parent(name, parent_name)
+            print(f"'{name}' is now under '{parent_name}'." if parent_name else f"'{name}' is now a top-level category.")
+        except ValueError as e:
+            print(e)
+
     def order_management(self):
         while True:
             print("\n===== Order Management =====")
             print("1. View All Orders")
             print("2. View Order Details")
-            print("3. Back to Main Menu")
+            print("3. Archive Delivered Orders")
+            print("4. Back to Main Menu")
             
             choice = input("\nEnter your choice: ")
             
@@ -861,6 +2423,8 @@ class Admin(User):
                 except ValueError:
                     print("Invalid order ID. Please enter a number.")
             elif choice == '3':
+                self.archive_orders()
+            elif choice == '4':
                 return
             else:
                 print("Invalid choice. Please try again.")
@@ -869,18 +2433,13 @@ class Admin(User):
         
         update_order_statuses()
         
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """
-            SELECT o.id, u.username, o.order_date, o.status, o.total_amount, o.estimated_delivery
-            FROM orders o
-            JOIN users u ON o.user_id = u.id
-            ORDER BY o.order_date DESC
-            """
+        orders = query_customer_data(
+            queries.sql("all_orders"),
+            sort_key=lambda order: order[2],
+            reverse=True,
+            reporting=True,
+            tables=("orders", "users")
         )
-        orders = cursor.fetchall()
         
         if not orders:
             print("No orders found.")
@@ -893,7 +2452,7 @@ class Admin(User):
                     order[1],
                     order[2],
                     order[3],
-                    f"${order[4]:.2f}",
+                    format_cents(order[4]),
                     order[5]
                 ])
             
@@ -903,38 +2462,32 @@ class Admin(User):
             order_id = input("\nEnter order ID to view details (0 to cancel): ")
             if order_id != '0':
                 self.view_order_details(int(order_id))
-        
-        conn.close()
+    
+    def archive_orders(self):
+        try:
+            days = int(input("Archive orders delivered more than how many days ago? [30]: ") or 30)
+        except ValueError:
+            print("Invalid input. Please enter a number of days.")
+            return
+
+        archived = archive_delivered_orders(days)
+        print(f"{archived} orders moved to the archive.")
     
     def view_order_details(self, order_id):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
+        conn = connect_order_db(order_id)
         
         
-        cursor.execute("SELECT id FROM orders WHERE id = ?", (order_id,))
-        if not cursor.fetchone():
-            print("Order not found.")
+        if not queries.fetch_one(conn, "order_exists", (order_id,)):
             conn.close()
+            record = get_archive().find(order_id)
+            if record:
+                print_archived_order(record)
+            else:
+                print("Order not found.")
             return
         
         
-        cursor.execute(
-            """
-            SELECT p.name, oi.quantity, oi.price, (oi.quantity * oi.price) as subtotal
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id = ?
-            """,
-            (order_id,)
-        )
-        items = cursor.fetchall()
-        
-        print(f"\n===== Order #{order_id} Details =====")
-        items_table = []
-        for item in items:
-            items_table.append([item[0], item[1], f"${item[2]:.2f}", f"${item[3]:.2f}"])
-        
-        print(tabulate(items_table, headers=["Product", "Quantity", "Unit Price", "Subtotal"], tablefmt="simple"))
+        print_order_items(conn, order_id)
         
         conn.close()
     
@@ -957,18 +2510,9 @@ class Admin(User):
                 print("Invalid choice. Please try again.")
     
     def view_all_customers(self):
-        conn = sqlite3.connect('dollmart.db')
-        cursor = conn.cursor()
+        conn = connect_reporting_db()
         
-        cursor.execute(
-            """
-            SELECT id, username, is_retail, orders_count, registration_date
-            FROM users
-            WHERE role = 'customer'
-            ORDER BY registration_date DESC
-            """
-        )
-        customers = cursor.fetchall()
+        customers = fetch_listing(conn, "all_customers", ("users",))
         
         if not customers:
             print("No customers found.")
@@ -990,115 +2534,161 @@ class Admin(User):
         conn.close()
     
     def view_customer_details(self):
-        self.view_all_customers()
-        
-        try:
-            customer_id = int(input("\nEnter customer ID to view details: "))
-            
-            conn = sqlite3.connect('dollmart.db')
-            cursor = conn.cursor()
-            
-            
-            cursor.execute("SELECT username, is_retail, orders_count, registration_date FROM users WHERE id = ? AND role = 'customer'", (customer_id,))
-            customer = cursor.fetchone()
-            
-            if not customer:
+        lookup = input("\nEnter customer ID or username prefix: ").strip()
+
+        if lookup.isdigit():
+            customer_id = int(lookup)
+        else:
+            matches = search_customers(lookup)
+            if not matches:
+                print("No customers found matching that username.")
+                return
+
+            if len(matches) == 1:
+                customer_id = matches[0][0]
+            else:
+                matches_table = []
+                for customer in matches:
+                    customer_type = "Retail Store" if customer[2] == 1 else "Individual"
+                    matches_table.append([customer[0], customer[1], customer_type, customer[3]])
+
+                print(tabulate(matches_table, headers=["ID", "Username", "Type", "Orders"], tablefmt="simple"))
+
+                try:
+                    customer_id = int(input("\nEnter customer ID to view details: "))
+                except ValueError:
+                    print("Invalid input. Please enter a numeric customer ID.")
+                    return
+
+        page = 1
+        while True:
+            details = get_customer_360(customer_id, page=page)
+
+            if not details:
                 print("Customer not found.")
-                conn.close()
                 return
-            
+
+            username, is_retail, orders_count, registration_date = details["profile"][1:]
             print(f"\n===== Customer #{customer_id} Details =====")
-            print(f"Username: {customer[0]}")
-            print(f"Type: {'Retail Store' if customer[1] == 1 else 'Individual'}")
-            print(f"Orders Count: {customer[2]}")
-            print(f"Registration Date: {customer[3]}")
-            
-            
-            cursor.execute(
-                """
-                SELECT id, order_date, status, total_amount
-                FROM orders
-                WHERE user_id = ?
-                ORDER BY order_date DESC
-                """,
-                (customer_id,)
-            )
-            orders = cursor.fetchall()
-            
-            if orders:
-                print("\nOrder History:")
+            print(f"Username: {username}")
+            print(f"Type: {'Retail Store' if is_retail == 1 else 'Individual'}")
+            print(f"Orders Count: {orders_count}")
+            print(f"Registration Date: {registration_date}")
+
+            if details["orders"]:
+                total_pages = (details["total_orders"] + details["page_size"] - 1) // details["page_size"]
+                print(f"\nOrder History (page {page} of {total_pages}):")
                 orders_table = []
-                for order in orders:
+                for order in details["orders"]:
                     orders_table.append([
                         order[0],
                         order[1],
                         order[2],
-                        f"${order[3]:.2f}"
+                        format_cents(order[3]),
+                        order[4]
                     ])
-                
-                print(tabulate(orders_table, headers=["Order ID", "Date", "Status", "Amount"], tablefmt="simple"))
-                
-                
-                cursor.execute(
-                    """
-                    SELECT id, code, discount_percentage, used
-                    FROM coupons
-                    WHERE user_id = ?
-                    """,
-                    (customer_id,)
-                )
-                coupons = cursor.fetchall()
-                
-                if coupons:
-                    print("\nCoupons:")
-                    coupons_table = []
-                    for coupon in coupons:
-                        status = "Used" if coupon[3] == 1 else "Available"
-                        coupons_table.append([
-                            coupon[0],
-                            coupon[1],
-                            f"{coupon[2]}%",
-                            status
-                        ])
-                    
-                    print(tabulate(coupons_table, headers=["ID", "Code", "Discount", "Status"], tablefmt="simple"))
-                else:
-                    print("\nNo coupons available for this customer.")
+
+                print(tabulate(orders_table, headers=["Order ID", "Date", "Status", "Amount", "Items"], tablefmt="simple"))
             else:
+                total_pages = page
                 print("\nNo order history found for this customer.")
-            
-            conn.close()
-            
-        except ValueError:
-            print("Invalid input. Please enter a numeric customer ID.")
+
+            summary = details["coupon_summary"]
+            if details["coupons"]:
+                print(f"\nCoupons ({summary['available']} available, {summary['used']} used):")
+                coupons_table = []
+                for coupon in details["coupons"]:
+                    status = "Used" if coupon[3] == 1 else "Available"
+                    coupons_table.append([
+                        coupon[0],
+                        coupon[1],
+                        f"{coupon[2]}%",
+                        status
+                    ])
+
+                print(tabulate(coupons_table, headers=["ID", "Code", "Discount", "Status"], tablefmt="simple"))
+            else:
+                print("\nNo coupons available for this customer.")
+
+            if total_pages <= 1:
+                return
+
+            choice = input("\nn = next page, p = previous page, anything else to go back: ").lower()
+            if choice == 'n' and page < total_pages:
+                page += 1
+            elif choice == 'p' and page > 1:
+                page -= 1
+            else:
+                return
+
+
+@timed("login")
+def authenticate(username, password, client="local"):
+    """Return the User for a username/password pair, or None if they don't match
+
+    With login limits on, attempts over the username's or the client's
+    failure budget are refused before any hashing or query. Only the
+    failure that locks a username out is written to the database.
+
+    Args:
+        username: Username entered
+        password: Password entered
+        client: Where the attempt comes from, e.g. an IP address
+
+    Raises:
+        ratelimit.LoginRateLimited: If the attempt was refused unchecked
+    """
+    limiter = get_login_limiter()
+    if limiter is not None:
+        limiter.check(username, client)
+
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+
+    with open_storage() as repos:
+        user = repos.users.by_credentials(username, password_hash)
+    
+    if not user:
+        if limiter is not None:
+            locked_until = limiter.check_failure(username, client)
+            if locked_until is not None:
+                run_write(save_login_lockout, username, locked_until)
+        return None
+
+    if limiter is not None:
+        if user.locked_until is not None:
+            # Stored by another process after this one loaded its lockouts, or expired
+            limiter.lock(username, user.locked_until)
+            limiter.check(username, client)
+            run_write(clear_login_lockout, username)
+        limiter.succeeded(username)
+
+    user_id, role, is_retail, orders_count, _ = user
+    if role == "admin":
+        return Admin(user_id, username)
+    return Customer(user_id, username, is_retail, orders_count)
+
+
+def login_client():
+    """Identify where this session comes from, for the per-client login limit"""
+    ssh_client = os.environ.get("SSH_CLIENT")
+    return ssh_client.split()[0] if ssh_client else "local"
 
 
 def login():
     """Authenticate user and return User object if successful"""
+    from ratelimit import LoginRateLimited
+
     username = input("Enter username: ")
     password = input("Enter password: ")
-    
-    conn = sqlite3.connect('dollmart.db')
-    cursor = conn.cursor()
-    
-    
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    
-    cursor.execute("SELECT id, role, is_retail, orders_count FROM users WHERE username = ? AND password_hash = ?", 
-                  (username, password_hash))
-    user = cursor.fetchone()
-    
-    conn.close()
-    
-    if user:
-        user_id, role, is_retail, orders_count = user
-        if role == "admin":
-            return Admin(user_id, username)
-        else:
-            return Customer(user_id, username, is_retail, orders_count)
-    else:
-        print("Invalid username or password.")
+
+    try:
+        user = authenticate(username, password, login_client())
+    except LoginRateLimited as e:
+        print(f"{e}.")
         return None
+    if not user:
+        print("Invalid username or password.")
+    return user
 
 
 
@@ -1111,49 +2701,74 @@ def register():
     customer_type = input("Are you a retail store? (y/n): ").lower()
     is_retail = 1 if customer_type == 'y' else 0
     
-    conn = sqlite3.connect('dollmart.db')
-    cursor = conn.cursor()
-    
-    
-    cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-    if cursor.fetchone():
+    with open_storage() as repos:
+        exists = repos.users.id_by_username(username)
+
+    if exists:
         print("Username already exists. Please choose another one.")
-        conn.close()
         return None
     
     
     password_hash = hashlib.sha256(password.encode()).hexdigest()
-    registration_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     try:
-        cursor.execute(
-            "INSERT INTO users (username, password_hash, role, is_retail, registration_date) VALUES (?, ?, ?, ?, ?)",
-            (username, password_hash, "customer", is_retail, registration_date)
-        )
-        
-        conn.commit()
-        user_id = cursor.lastrowid
-        
-        print("Registration successful! You can now login.")
-        
-        
-        coupon_id, coupon_code = create_coupon(user_id, 10, "WELCOME", existing_conn=conn)
-        
-        print(f"Welcome gift! You've received a 10% off coupon: {coupon_code}")
-        print(f"Use Coupon ID: {coupon_id} during checkout to apply this discount.")
-        
-        conn.commit()
-        conn.close()
-        return Customer(user_id, username, is_retail)
-    
+        user_id, coupon_id, coupon_code = run_write(create_customer, username, password_hash, is_retail)
     except sqlite3.Error as e:
         print(f"Error during registration: {e}")
-        conn.close()
         return None
 
-def main():
-    
-    setup_database()
+    print("Registration successful! You can now login.")
+    print(f"Welcome gift! You've received a 10% off coupon: {coupon_code}")
+    print(f"Use Coupon ID: {coupon_id} during checkout to apply this discount.")
+
+    return Customer(user_id, username, is_retail)
+
+def configure_from_environment():
+    """Apply the DOLLMART_* environment variables (see the README) to this process"""
+    configure_profiling(
+        os.environ.get("DOLLMART_PROFILE") == "1",
+        slow_query_ms=float(os.environ.get("DOLLMART_SLOW_QUERY_MS", "50")),
+        slow_log_path=os.environ.get("DOLLMART_SLOW_LOG")
+    )
+    configure_event_log(os.environ.get("DOLLMART_EVENT_LOG"))
+    configure_write_queue(os.environ.get("DOLLMART_GROUP_COMMIT") == "1")
+    configure_sharding(int(os.environ.get("DOLLMART_SHARDS", "0")))
+    configure_archive(os.environ.get("DOLLMART_ARCHIVE", "archive"))
+    configure_login_limits(os.environ.get("DOLLMART_LOGIN_LIMITS") != "0")
+    slot_capacity = int(os.environ.get("DOLLMART_SLOT_CAPACITY", "50"))
+    configure_delivery(slot_capacity > 0, slot_capacity=slot_capacity)
+    configure_replica(float(os.environ.get("DOLLMART_REPLICA_STALENESS", "0")))
+    configure_query_cache(int(os.environ.get("DOLLMART_QUERY_CACHE_MB", "64")) * 1024 * 1024)
+    configure_dashboard(refresh_interval=float(os.environ.get("DOLLMART_DASHBOARD_REFRESH", "300")))
+
+
+def shutdown():
+    """Flush queued writes and the event log, stop replica refreshes, and print the profile if profiling is on"""
+    configure_write_queue(False)
+    configure_replica(None)
+    configure_event_log(None)
+    if instrument.ENABLED:
+        print(instrument.dump_text(), file=sys.stderr)
+
+
+def main(argv=None):
+    """Run the interactive app, or with arguments one scripted command (see cli.py)
+
+    Returns:
+        The command's exit status
+    """
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv:
+        from cli import main as run_command
+        return run_command(argv)
+
+    try:
+        ensure_database()
+    except SchemaTooNew as e:
+        print(e, file=sys.stderr)
+        return 1
+    configure_from_environment()
     
     while True:
         print("\n===== Welcome to DollMart =====")
@@ -1173,10 +2788,11 @@ def main():
                 user.show_menu()
         elif choice == '3':
             print("Thank you for using DollMart. Goodbye!")
+            shutdown()
             break
         else:
             print("Invalid choice. Please try again.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
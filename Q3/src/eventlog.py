@@ -0,0 +1,237 @@
+import os
+import json
+import mmap
+import struct
+import threading
+import time
+import zlib
+
+
+# Every record is <payload length><crc32 of payload><JSON payload>
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def segment_path(directory, number):
+    """Return the file path of segment `number` inside `directory`"""
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+
+def list_segments(directory):
+    """Return the segment numbers present in `directory`, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+
+    numbers = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+    return sorted(numbers)
+
+
+def decode_records(buffer, offset):
+    """Decode complete records from `buffer` starting at `offset`
+
+    Decoding stops at the first incomplete or corrupt record, which is what a
+    reader sees when it catches up with a writer that is mid-append.
+
+    Returns:
+        tuple: (list of events, offset just past the last complete record)
+    """
+    events = []
+    size = len(buffer)
+
+    while offset + RECORD_HEADER.size <= size:
+        length, checksum = RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + length
+        if end > size:
+            break
+
+        payload = buffer[start:end]
+        if zlib.crc32(payload) != checksum:
+            break
+
+        events.append(json.loads(payload))
+        offset = end
+
+    return events, offset
+
+
+class EventLog:
+    """Append-only writer for the order event log
+
+    Records are flushed to the OS on every append so tailing readers see them
+    immediately, while fsync is batched: it runs once `fsync_every` records
+    are pending, and otherwise within `fsync_interval` seconds of the first
+    pending append, from a timer thread if nothing else is appended.
+    """
+
+    def __init__(self, directory, segment_max_bytes=SEGMENT_MAX_BYTES, fsync_every=64, fsync_interval=0.05):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None
+
+        os.makedirs(directory, exist_ok=True)
+        segments = list_segments(directory)
+        self._segment = segments[-1] if segments else 1
+        self._next_seq = self._recover_next_seq(segments)
+        self._file = open(segment_path(directory, self._segment), "ab")
+
+    def _recover_next_seq(self, segments):
+        # Walk back to the newest segment holding a complete record
+        for number in reversed(segments):
+            with open(segment_path(self.directory, number), "r+b") as f:
+                events, end = decode_records(f.read(), 0)
+                # A crash mid-append leaves a torn record at the end of the
+                # newest segment. Readers stop at it, so cut it off before
+                # appending after it.
+                if number == self._segment and f.tell() > end:
+                    f.truncate(end)
+                    os.fsync(f.fileno())
+            if events:
+                return events[-1]["seq"] + 1
+        return 1
+
+    def append(self, event_type, **payload):
+        """Append one event and return its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            record = {"seq": seq, "ts": time.time(), "type": event_type}
+            record.update(payload)
+            data = json.dumps(record, separators=(",", ":")).encode()
+
+            self._file.write(RECORD_HEADER.pack(len(data), zlib.crc32(data)))
+            self._file.write(data)
+            self._file.flush()
+            self._next_seq += 1
+            self._pending += 1
+
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self._sync_idle)
+                self._timer.daemon = True
+                self._timer.start()
+
+            if self._file.tell() >= self.segment_max_bytes:
+                self._roll_locked()
+
+            return seq
+
+    def sync(self):
+        """Force every appended event to stable storage"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_idle(self):
+        with self._lock:
+            self._timer = None
+            if not self._file.closed:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _roll_locked(self):
+        self._sync_locked()
+        self._file.close()
+        self._segment += 1
+        self._file = open(segment_path(self.directory, self._segment), "ab")
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+
+class EventLogReader:
+    """Tails the event log by memory-mapping segment files
+
+    The reader keeps a (segment, offset) position that callers can persist and
+    pass back in later to resume without re-reading consumed events.
+    """
+
+    def __init__(self, directory, position=None):
+        self.directory = directory
+        if position is None:
+            segments = list_segments(directory)
+            position = (segments[0] if segments else 1, 0)
+        self.segment, self.offset = position
+
+    @property
+    def position(self):
+        return self.segment, self.offset
+
+    def _read_segment(self, number, offset):
+        try:
+            with open(segment_path(self.directory, number), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size <= offset:
+                    return [], offset
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                    return decode_records(mapped, offset)
+        except FileNotFoundError:
+            return [], offset
+
+    def poll(self):
+        """Return every event appended since the last call"""
+        events = []
+
+        while True:
+            new_events, self.offset = self._read_segment(self.segment, self.offset)
+            events.extend(new_events)
+
+            # Only move on once the writer has rolled to a newer segment;
+            # anything left in this one is then a torn tail we can skip.
+            later = [number for number in list_segments(self.directory) if number > self.segment]
+            if not later:
+                return events
+
+            new_events, self.offset = self._read_segment(self.segment, self.offset)
+            events.extend(new_events)
+            self.segment, self.offset = later[0], 0
+
+    def follow(self, poll_interval=0.1, stop=None):
+        """Yield events forever (or until `stop` is set), sleeping when idle
+
+        Args:
+            poll_interval: Seconds to wait between polls once caught up
+            stop: An optional threading.Event that ends the generator
+        """
+        while stop is None or not stop.is_set():
+            events = self.poll()
+            if not events:
+                time.sleep(poll_interval)
+                continue
+            for event in events:
+                yield event
+
+
+def replay(directory, handler, since_seq=0):
+    """Feed every event with seq greater than `since_seq` to `handler`
+
+    Returns:
+        The sequence number of the last event replayed (or `since_seq`)
+    """
+    last_seq = since_seq
+    for event in EventLogReader(directory).poll():
+        if event["seq"] > since_seq:
+            handler(event)
+            last_seq = event["seq"]
+    return last_seq
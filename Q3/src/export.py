@@ -0,0 +1,228 @@
+"""Streaming export of order lines (orders JOIN order_items JOIN users) for accounting
+
+Rows are read with fetchmany() and written as they arrive, as JSON Lines or
+in a compact columnar format, so memory stays bounded by one chunk however
+many orders are exported. A high-water mark (the last order ID exported
+from each database) lets nightly jobs export only orders placed since the
+previous run.
+"""
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+import queries
+
+
+CHUNK_ROWS = 10000
+COMPRESS_LEVEL = 6
+FORMATS = ("jsonl", "columnar")
+
+# One row per order line; the order's fields repeat on each of its lines
+FIELDS = ["order_id", "order_date", "status", "user_id", "username", "total_amount", "product_id", "quantity", "price"]
+TYPES = ["int", "str", "str", "int", "str", "int", "int", "int", "int"]
+
+# Until any real date, so the default range is open-ended
+NO_END = "9999"
+
+MAGIC = b"DMCOL1\n"
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+ExportResult = namedtuple("ExportResult", ["path", "orders", "lines", "bytes", "seconds", "high_water"])
+
+
+class JsonLinesWriter:
+    def __init__(self, out):
+        self.out = out
+        self._encode = json.JSONEncoder(separators=(",", ":")).encode
+
+    def write(self, rows):
+        encode = self._encode
+        self.out.write(b"".join((encode(dict(zip(FIELDS, row))) + "\n").encode() for row in rows))
+
+
+class ColumnarWriter:
+    """Writes chunks of rows column by column
+
+    Layout, all integers little-endian:
+        MAGIC, then a uint32 length and a JSON header {"fields", "types"}
+        per chunk: uint32 rows, uint32 compressed length, zlib(body)
+    In a chunk body each column follows the previous one. An int column is
+    `rows` int64 values. A str column is dictionary-encoded: uint32 count of
+    distinct values, their uint32 byte lengths, their UTF-8 bytes, then one
+    uint32 index per row. Statuses, dates and usernames repeat heavily
+    within a chunk, so the dictionaries stay small.
+    """
+
+    def __init__(self, out, compress_level=COMPRESS_LEVEL):
+        self.out = out
+        self.compress_level = compress_level
+        header = json.dumps({"fields": FIELDS, "types": TYPES}).encode()
+        out.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def write(self, rows):
+        if not rows:
+            return
+        parts = []
+        for column, kind in zip(zip(*rows), TYPES):
+            if kind == "int":
+                parts.append(_to_bytes(array("q", column)))
+            else:
+                positions = {}
+                indexes = array("I", [positions.setdefault(value, len(positions)) for value in column])
+                encoded = [value.encode() for value in positions]
+                parts += [struct.pack("<I", len(encoded)), _to_bytes(array("I", map(len, encoded))),
+                          b"".join(encoded), _to_bytes(indexes)]
+        body = zlib.compress(b"".join(parts), self.compress_level)
+        self.out.write(struct.pack("<II", len(rows), len(body)) + body)
+
+
+def _to_bytes(values):
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def read_columnar(path):
+    """Yield each row of a columnar export as a dict, one chunk in memory at a time"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar order export")
+        header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+        fields, types = header["fields"], header["types"]
+
+        while True:
+            prefix = f.read(8)
+            if not prefix:
+                return
+            rows, length = struct.unpack("<II", prefix)
+            body = zlib.decompress(f.read(length))
+            columns, offset = [], 0
+            for kind in types:
+                if kind == "int":
+                    columns.append(_from_bytes("q", body[offset:offset + 8 * rows]))
+                    offset += 8 * rows
+                    continue
+                count = struct.unpack_from("<I", body, offset)[0]
+                offset += 4
+                lengths = _from_bytes("I", body[offset:offset + 4 * count])
+                offset += 4 * count
+                values = []
+                for length in lengths:
+                    values.append(body[offset:offset + length].decode())
+                    offset += length
+                indexes = _from_bytes("I", body[offset:offset + 4 * rows])
+                offset += 4 * rows
+                columns.append([values[index] for index in indexes])
+            for row in zip(*columns):
+                yield dict(zip(fields, row))
+
+
+def load_high_water(state_path):
+    """{database name: last order ID exported} from a state file, or {} if there is none yet"""
+    if state_path is None or not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)["high_water"]
+
+
+def save_high_water(state_path, high_water):
+    """Replace the state file atomically, so a crash leaves the old marks"""
+    partial = state_path + ".partial"
+    with open(partial, "w") as f:
+        json.dump({"high_water": high_water}, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, state_path)
+
+
+def export_lines(sources, out, fmt="jsonl", since="", until=NO_END, high_water=None, chunk_rows=CHUNK_ROWS):
+    """Stream the order lines of every source into a binary file
+
+    Each source is read in order ID order, `chunk_rows` rows per fetchmany().
+
+    Args:
+        sources: (name, connection) pairs, one per database holding orders;
+            the connections must see the users table
+        out: Binary file to write to
+        fmt: "jsonl" or "columnar"
+        since: Only orders with order_date >= since
+        until: Only orders with order_date < until
+        high_water: {name: last order ID exported}; only later orders are
+            read, and the marks are moved on in place
+        chunk_rows: Rows fetched and written at a time
+
+    Returns:
+        tuple: (orders, lines) exported
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    high_water = {} if high_water is None else high_water
+    writer = JsonLinesWriter(out) if fmt == "jsonl" else ColumnarWriter(out)
+
+    orders = lines = 0
+    for name, conn in sources:
+        last_order_id = high_water.get(name, 0)
+        cursor = conn.cursor()
+        cursor.arraysize = chunk_rows
+        cursor.execute(queries.sql("order_lines_after"), (last_order_id, since, until))
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            writer.write(rows)
+            lines += len(rows)
+            for row in rows:
+                if row[0] != last_order_id:
+                    last_order_id = row[0]
+                    orders += 1
+        cursor.close()
+        if last_order_id:
+            high_water[name] = last_order_id
+    return orders, lines
+
+
+def export_to_file(sources, path, fmt="jsonl", since="", until=NO_END, state_path=None, chunk_rows=CHUNK_ROWS):
+    """Export order lines to `path`, incrementally when `state_path` is given
+
+    The export is written to `path`.partial and renamed into place when
+    complete. The high-water marks in `state_path` are saved only after
+    that, so a run that dies exports the same orders again next time
+    rather than skipping them. "-" writes to stdout instead of a file.
+
+    Returns:
+        ExportResult
+    """
+    start = time.perf_counter()
+    high_water = load_high_water(state_path)
+
+    if path == "-":
+        orders, lines = export_lines(sources, sys.stdout.buffer, fmt, since, until, high_water, chunk_rows)
+        sys.stdout.buffer.flush()
+        size = None
+    else:
+        partial = path + ".partial"
+        try:
+            with open(partial, "wb") as out:
+                orders, lines = export_lines(sources, out, fmt, since, until, high_water, chunk_rows)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        size = os.path.getsize(path)
+
+    if state_path is not None:
+        save_high_water(state_path, high_water)
+    return ExportResult(path, orders, lines, size, time.perf_counter() - start, high_water)
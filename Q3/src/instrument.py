@@ -0,0 +1,339 @@
+import sqlite3
+import threading
+import time
+import functools
+from collections import deque
+
+
+ENABLED = False
+SLOW_QUERY_MS = 50.0
+SLOW_OPERATION_MS = 200.0
+SLOW_LOG_SIZE = 1000
+
+_operations = {}
+_queries = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_slow_log_path = None
+# Guards the histograms, which the group-commit writer thread records into alongside callers
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Latency histogram with power-of-two microsecond buckets
+
+    Recording is a couple of integer operations, and percentiles are read
+    from the bucket bounds, so they are accurate to within a factor of two.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = {}
+
+    def record(self, seconds, rows=0):
+        micros = int(seconds * 1000000)
+        bucket = micros.bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        self.max = max(self.max, seconds)
+        self.min = seconds if self.min is None else min(self.min, seconds)
+
+    def percentile(self, fraction):
+        """Upper bound, in seconds, of the bucket holding the given fraction of samples"""
+        if not self.count:
+            return 0.0
+
+        target = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min((1 << bucket) / 1000000, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total * 1000 / self.count if self.count else 0.0,
+            "min_ms": (self.min or 0.0) * 1000,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+            "rows": self.rows,
+        }
+
+
+def enable(slow_query_ms=None, slow_operation_ms=None, slow_log_path=None):
+    """Start recording operation and query timings
+
+    Args:
+        slow_query_ms: Log statements slower than this many milliseconds
+        slow_operation_ms: Log service operations slower than this
+        slow_log_path: Also append slow entries to this file (optional)
+    """
+    global ENABLED, SLOW_QUERY_MS, SLOW_OPERATION_MS, _slow_log_path
+
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = slow_query_ms
+    if slow_operation_ms is not None:
+        SLOW_OPERATION_MS = slow_operation_ms
+    _slow_log_path = slow_log_path
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Forget every recorded timing"""
+    with _lock:
+        _operations.clear()
+        _queries.clear()
+        _slow_log.clear()
+
+
+def _log_slow(kind, name, seconds, rows=None):
+    entry = {"ts": time.time(), "kind": kind, "name": name, "ms": seconds * 1000, "rows": rows}
+    _slow_log.append(entry)
+
+    if _slow_log_path:
+        with open(_slow_log_path, "a") as f:
+            f.write(f"{entry['ts']:.3f}\t{kind}\t{entry['ms']:.2f}ms\trows={rows}\t{name}\n")
+
+
+def record_operation(name, seconds):
+    with _lock:
+        histogram = _operations.get(name)
+        if histogram is None:
+            histogram = _operations[name] = Histogram()
+        histogram.record(seconds)
+
+    if seconds * 1000 >= SLOW_OPERATION_MS:
+        _log_slow("operation", name, seconds)
+
+
+def record_query(sql, seconds, rows):
+    sql = " ".join(sql.split())
+    with _lock:
+        histogram = _queries.get(sql)
+        if histogram is None:
+            histogram = _queries[sql] = Histogram()
+        histogram.record(seconds, rows)
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        _log_slow("query", sql, seconds, rows)
+
+
+class timed:
+    """Time a service operation, as a decorator or a context manager
+
+        @timed("insert_order")
+        def insert_order(...): ...
+
+        with timed("render_dashboard"):
+            ...
+
+    When instrumentation is disabled the decorated function is called
+    straight through after a single flag check.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def __call__(self, function):
+        name = self.name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_operation(name, time.perf_counter() - start)
+
+        return wrapper
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if ENABLED:
+            record_operation(self.name, time.perf_counter() - self._start)
+        return False
+
+
+class InstrumentedCursor:
+    """sqlite3 cursor wrapper that records SQL text, row counts and duration
+
+    Time spent fetching is charged to the statement that produced the rows.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._sql = None
+        self._elapsed = 0.0
+        self._rows = 0
+
+    def _finish(self):
+        if self._sql is not None:
+            rows = self._rows if self._rows else max(self._cursor.rowcount, 0)
+            record_query(self._sql, self._elapsed, rows)
+            self._sql = None
+
+    def _run(self, method, sql, params):
+        self._finish()
+        start = time.perf_counter()
+        method(sql, params)
+        self._sql = sql
+        self._elapsed = time.perf_counter() - start
+        self._rows = 0
+        return self
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        self._elapsed += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(self._cursor.fetchmany, size or self._cursor.arraysize)
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        self._rows += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        row = self.fetchone()
+        while row is not None:
+            yield row
+            row = self.fetchone()
+        self._finish()
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # Own state is underscore-prefixed; anything else (row_factory, arraysize) belongs to the cursor
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection:
+    """sqlite3 connection wrapper whose cursors are instrumented"""
+
+    def __init__(self, conn):
+        object.__setattr__(self, "raw", conn)
+
+    def cursor(self):
+        return InstrumentedCursor(self.raw.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.raw.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect, returning an instrumented connection when enabled"""
+    conn = sqlite3.connect(path, **kwargs)
+    return InstrumentedConnection(conn) if ENABLED else conn
+
+
+def _table(title, stats, key_header):
+    lines = [title, f"{key_header[:60]:60s} {'count':>7s} {'mean':>9s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s} {'rows':>8s}"]
+    for name, summary in sorted(stats.items(), key=lambda item: -item[1]["total_ms"]):
+        lines.append(
+            f"{name[:60]:60s} {summary['count']:7d} {summary['mean_ms']:8.2f}ms {summary['p50_ms']:8.2f}ms "
+            f"{summary['p95_ms']:8.2f}ms {summary['p99_ms']:8.2f}ms {summary['max_ms']:8.2f}ms {summary['rows']:8d}"
+        )
+    return lines
+
+
+def metrics():
+    """Return every recorded timing as plain dicts"""
+    with _lock:
+        return {
+            "operations": {name: h.summary() for name, h in _operations.items()},
+            "queries": {sql: h.summary() for sql, h in _queries.items()},
+            "slow_log": list(_slow_log),
+        }
+
+
+def dump_text():
+    """Render operation and query timings as a text report, slowest total first"""
+    data = metrics()
+    lines = _table("== Operations ==", data["operations"], "operation")
+    lines.append("")
+    lines.extend(_table("== Queries ==", data["queries"], "sql"))
+    if data["slow_log"]:
+        lines.append("")
+        lines.append(f"== Slow log (operations >= {SLOW_OPERATION_MS}ms, queries >= {SLOW_QUERY_MS}ms) ==")
+        for entry in data["slow_log"]:
+            lines.append(f"{entry['kind']:9s} {entry['ms']:8.2f}ms  {entry['name']}")
+    return "\n".join(lines)
+
+
+def dump_json():
+    import json
+    return json.dumps(metrics(), indent=2)
@@ -0,0 +1,118 @@
+# Money is stored and computed as integer cents. Discount rates and
+# percentages become integer basis points (1/100 of a percent) once, so
+# applying them is integer multiply, add and floor-divide.
+BP_PER_UNIT = 10000
+
+
+def to_cents(amount):
+    """Convert a dollar amount to integer cents, rounding half away from zero
+
+    Strings (user input, e.g. "9.99") are converted exactly. Floats are
+    converted from their shortest repr, so 2.675 becomes 268 rather than
+    the 267 its binary value would round to.
+    """
+    if isinstance(amount, int):
+        return amount * 100
+
+    from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+    text = amount.strip() if isinstance(amount, str) else repr(amount)
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"Not an amount: {amount!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"Not an amount: {amount!r}")
+    return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_cents(cents):
+    """Render cents as a dollar string, e.g. 1299 -> "$12.99" """
+    cents = int(round(cents))
+    sign = "-" if cents < 0 else ""
+    dollars, remainder = divmod(abs(cents), 100)
+    return f"{sign}${dollars}.{remainder:02d}"
+
+
+def rate_to_bp(rate):
+    """Convert a fractional rate (0.1 for 10%) to basis points"""
+    return int(round(rate * BP_PER_UNIT))
+
+
+def percent_to_bp(percentage):
+    """Convert a percentage (10 for 10%) to basis points"""
+    return int(round(percentage * 100))
+
+
+def apply_bp(cents, bp):
+    """Return `bp` basis points of `cents`, rounded half up to a whole cent"""
+    return (cents * bp + BP_PER_UNIT // 2) // BP_PER_UNIT
+
+
+def convert_columns_to_cents(conn, table, columns):
+    """Rebuild `table` so the given REAL dollar columns become INTEGER cents
+
+    SQLite cannot change a column's type in place, and a REAL column would
+    turn the converted values back into floats, so the table is recreated
+    from its own CREATE statement with the types swapped. Indexes, triggers
+    and the AUTOINCREMENT counter are carried over. Tables whose columns are
+    already INTEGER are left alone, so this is safe to run repeatedly.
+    Does not commit.
+
+    Values are converted with to_cents() rather than SQL ROUND(x * 100),
+    which works on the binary value and so turns 1.005 into 100 cents where
+    the app, reading the same dollars, charges 101.
+
+    Returns:
+        True if the table was converted
+    """
+    cursor = conn.cursor()
+    types = {row[1]: row[2].upper() for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    if not any(types.get(column) == "REAL" for column in columns):
+        return False
+
+    create_sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+    carried_sql = [
+        row[0] for row in cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        ).fetchall()
+    ]
+    sequence = None
+    if "AUTOINCREMENT" in create_sql.upper():
+        row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        sequence = row[0] if row else None
+
+    import re
+    new_table = f"{table}_cents"
+    new_sql = re.sub(rf"\b{table}\b", new_table, create_sql, count=1)
+    for column in columns:
+        new_sql = re.sub(rf"\b{column}\s+REAL\b", f"{column} INTEGER", new_sql, count=1)
+
+    names = list(types)
+    positions = [i for i, name in enumerate(names) if name in columns]
+
+    def converted(rows):
+        for row in rows:
+            row = list(row)
+            for i in positions:
+                if row[i] is not None:
+                    row[i] = to_cents(row[i])
+            yield row
+
+    cursor.execute(new_sql)
+    # A second cursor streams the old rows while the first inserts them
+    cursor.executemany(
+        f"INSERT INTO {new_table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+        converted(conn.execute(f"SELECT {', '.join(names)} FROM {table}"))
+    )
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for sql in carried_sql:
+        cursor.execute(sql)
+
+    if sequence is not None:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, sequence))
+    return True
@@ -0,0 +1,258 @@
+import bisect
+from collections import namedtuple
+from collections.abc import Sequence
+from itertools import compress, repeat
+from operator import itemgetter, mul
+
+import money
+import queries
+
+
+RETAIL = "retail"
+INDIVIDUAL = "individual"
+ALL = "all"
+CUSTOMER_TYPES = (RETAIL, INDIVIDUAL)
+
+BP_PER_UNIT = money.BP_PER_UNIT
+HALF_BP = BP_PER_UNIT // 2
+
+# Retail stores get each product's own `bulk_discount` once the cart holds this many units
+RETAIL_BULK_MIN_UNITS = 50
+
+# Prices, subtotals and discounts are integer cents; discount rates are basis points
+PricedLine = namedtuple("PricedLine", ["product_id", "quantity", "unit_price", "discount_bp", "subtotal", "discount"])
+Quote = namedtuple("Quote", ["lines", "units", "subtotal", "bulk_discount", "coupon_discount", "total"])
+
+_QUANTITY = itemgetter("quantity")
+_PRICE = itemgetter("price")
+
+
+# Row in table_versions (see querycache) moved by every write a PriceBook depends on
+VERSION_NAME = "price_book"
+
+
+def create_schema(cursor):
+    """Create the triggers that move the price book's write counter
+
+    New and removed products, changes to a product's price, category or
+    bulk_discount, and any write to discount_tiers or price_lists move it.
+    Stock changes, which every checkout makes, do not.
+    """
+    cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (VERSION_NAME,))
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{VERSION_NAME}';"
+    events = {
+        "products": ("INSERT", "DELETE", "UPDATE OF price, category, bulk_discount"),
+        "discount_tiers": ("INSERT", "UPDATE", "DELETE"),
+        "price_lists": ("INSERT", "UPDATE", "DELETE"),
+    }
+    for table, table_events in events.items():
+        for event in table_events:
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_{VERSION_NAME}_{event.split()[0].lower()} "
+                f"AFTER {event} ON {table} BEGIN {bump} END"
+            )
+
+
+def customer_type(is_retail):
+    return RETAIL if is_retail else INDIVIDUAL
+
+
+class TierTable:
+    """Quantity thresholds and the best discount rate reached at each one
+
+    Rates are made non-decreasing when the table is built, so looking up a
+    quantity is one bisect instead of a scan over every tier.
+    """
+
+    __slots__ = ("thresholds", "rates")
+
+    def __init__(self, tiers):
+        self.thresholds = []
+        self.rates = []
+        best = 0
+        for min_quantity, rate in sorted(tiers):
+            best = max(best, rate)
+            if self.thresholds and self.thresholds[-1] == min_quantity:
+                self.rates[-1] = best
+            else:
+                self.thresholds.append(min_quantity)
+                self.rates.append(best)
+
+    def rate(self, quantity):
+        i = bisect.bisect_right(self.thresholds, quantity)
+        return self.rates[i - 1] if i else 0
+
+
+class PricedLines(Sequence):
+    """The lines of a Quote, made into PricedLine tuples in product ID order when first read
+
+    A quote works on columns (product IDs, quantities, prices, rates,
+    subtotals, discounts in cart order); a caller that only needs the totals
+    never pays for sorting the lines and building a tuple for each.
+    """
+
+    __slots__ = ("_columns", "_lines")
+
+    def __init__(self, columns):
+        self._columns = columns
+        self._lines = None
+
+    def _built(self):
+        if self._lines is None:
+            self._lines = sorted(map(tuple.__new__, repeat(PricedLine), zip(*self._columns)))
+            self._columns = None
+        return self._lines
+
+    def __getitem__(self, index):
+        return self._built()[index]
+
+    def __len__(self):
+        return len(self._built())
+
+    def __iter__(self):
+        return iter(self._built())
+
+    def __eq__(self, other):
+        if isinstance(other, PricedLines):
+            other = other._built()
+        return self._built() == other
+
+    def __repr__(self):
+        return repr(self._built())
+
+
+class PriceBook:
+    """Precomputed prices and tier tables for pricing carts
+
+    Built once from the catalog (see `load`) and reused until the catalog
+    changes. Each customer type gets its own price list and its own tier
+    tables, with the tiers that apply to every customer type merged in.
+    """
+
+    def __init__(self, products, tiers=(), price_lists=()):
+        """
+        Args:
+            products: (id, category, price, bulk_discount) rows
+            tiers: (product_id, category, customer_type, min_quantity, discount) rows,
+                with exactly one of product_id and category set
+            price_lists: (customer_type, product_id, price) rows overriding the base price
+
+        Prices are integer cents and discounts fractional rates (0.1 for
+        10%), which are converted to basis points here.
+        """
+        self.categories = {}
+        self.retail_rates = {}
+        for product_id, category, price, bulk_discount in products:
+            self.categories[product_id] = category
+            if bulk_discount:
+                self.retail_rates[product_id] = money.rate_to_bp(bulk_discount)
+
+        product_tiers = {ctype: {} for ctype in CUSTOMER_TYPES}
+        category_tiers = {ctype: {} for ctype in CUSTOMER_TYPES}
+        for product_id, category, ctype, min_quantity, discount in tiers:
+            for target_type in (CUSTOMER_TYPES if ctype == ALL else (ctype,)):
+                if product_id is not None:
+                    product_tiers[target_type].setdefault(product_id, []).append((min_quantity, money.rate_to_bp(discount)))
+                else:
+                    category_tiers[target_type].setdefault(category, []).append((min_quantity, money.rate_to_bp(discount)))
+
+        self.product_tiers = {
+            ctype: {key: TierTable(rows) for key, rows in by_key.items()} for ctype, by_key in product_tiers.items()
+        }
+        self.category_tiers = {
+            ctype: {key: TierTable(rows) for key, rows in by_key.items()} for ctype, by_key in category_tiers.items()
+        }
+
+        self.list_prices = {ctype: {} for ctype in CUSTOMER_TYPES}
+        for ctype, product_id, price in price_lists:
+            self.list_prices[ctype][product_id] = price
+
+        # Each product's tiers as (thresholds, rates), looked up once per line
+        self.tier_lookups = {
+            ctype: {product_id: (table.thresholds, table.rates) for product_id, table in by_product.items()}
+            for ctype, by_product in self.product_tiers.items()
+        }
+
+        # Categories with tiers are numbered from 1 per customer type, so a cart's
+        # units are tallied into a list by each product's slot (0 for products
+        # whose category has no tiers) instead of into a dict by name
+        self.category_slots = {}
+        self.slot_tiers = {}
+        for ctype in CUSTOMER_TYPES:
+            slots = {category: slot for slot, category in enumerate(self.category_tiers[ctype], 1)}
+            self.category_slots[ctype] = {
+                product_id: slots[category] for product_id, category in self.categories.items() if category in slots
+            }
+            self.slot_tiers[ctype] = [None, *self.category_tiers[ctype].values()]
+
+    @classmethod
+    def load(cls, conn):
+        return cls(
+            queries.fetch_all(conn, "pricing_products"),
+            queries.fetch_all(conn, "discount_tiers"),
+            queries.fetch_all(conn, "price_list_prices"),
+        )
+
+    def quote(self, cart, is_retail, coupon_percentage=0):
+        """Price a cart a column at a time: quantities, rates, prices, then subtotals and discounts
+
+        Each line's unit price comes from the customer type's price list,
+        falling back to the price in the cart. Its discount rate is the best
+        of its product tier (by line quantity), its category tier (by units
+        of that category in the cart) and, for retail stores with at least
+        RETAIL_BULK_MIN_UNITS units, the product's bulk_discount. Discounts
+        do not stack. The coupon then applies to the discounted subtotal.
+        Products missing from the catalog are priced from the cart with no
+        discount. Lines come out in product ID order, so the result does not
+        depend on the order items were added in.
+
+        All arithmetic is on integers: each discount is rounded half up to a
+        whole cent once, on the line (bulk) or on the discounted subtotal
+        (coupon), so the lines always add up to the totals.
+
+        Args:
+            cart: Mapping of product ID to {"price" (cents), "quantity", ...}
+            is_retail: True for retail store customers
+            coupon_percentage: Coupon discount in percent (0 for none)
+
+        Returns:
+            Quote, whose lines are a PricedLines
+        """
+        ctype = customer_type(is_retail)
+        product_ids = list(cart)
+        items = list(cart.values())
+        quantities = list(map(_QUANTITY, items))
+        units = sum(quantities)
+        base_rates = self.retail_rates if is_retail and units >= RETAIL_BULK_MIN_UNITS else {}
+
+        slot_tiers = self.slot_tiers[ctype]
+        if len(slot_tiers) > 1:
+            slots = list(map(self.category_slots[ctype].get, product_ids, repeat(0)))
+            slot_units = [0] * len(slot_tiers)
+            for slot, quantity in zip(slots, quantities):
+                slot_units[slot] += quantity
+            slot_rates = [0] + [table.rate(count) for table, count in zip(slot_tiers[1:], slot_units[1:])]
+            category_rates = map(slot_rates.__getitem__, slots)
+            rates = [category_rate if category_rate > rate else rate
+                     for rate, category_rate in zip(map(base_rates.get, product_ids, repeat(0)), category_rates)]
+        else:
+            rates = list(map(base_rates.get, product_ids, repeat(0)))
+
+        bisect_right = bisect.bisect_right
+        tier_lookups = list(map(self.tier_lookups[ctype].get, product_ids))
+        for i in compress(range(len(product_ids)), tier_lookups):
+            thresholds, tier_rates = tier_lookups[i]
+            reached = bisect_right(thresholds, quantities[i])
+            if reached and tier_rates[reached - 1] > rates[i]:
+                rates[i] = tier_rates[reached - 1]
+
+        prices = list(map(self.list_prices[ctype].get, product_ids, map(_PRICE, items)))
+        subtotals = list(map(mul, prices, quantities))
+        discounts = [(line_subtotal * rate + HALF_BP) // BP_PER_UNIT for line_subtotal, rate in zip(subtotals, rates)]
+
+        subtotal = sum(subtotals)
+        bulk_discount = sum(discounts)
+        coupon_discount = money.apply_bp(subtotal - bulk_discount, money.percent_to_bp(coupon_percentage))
+        total = subtotal - bulk_discount - coupon_discount
+        lines = PricedLines((product_ids, quantities, prices, rates, subtotals, discounts))
+        return Quote(lines, units, subtotal, bulk_discount, coupon_discount, total)
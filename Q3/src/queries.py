@@ -0,0 +1,555 @@
+from collections import namedtuple
+
+
+# Every statement the service layer runs, by name. Keeping each SQL string in
+# one place means sqlite3's per-connection statement cache (keyed on the exact
+# text) is hit no matter which method runs the query.
+STATEMENTS = {}
+
+# Passed to sqlite3.connect(cached_statements=...) so the whole registry fits
+STATEMENT_CACHE_SIZE = 256
+
+
+class Statement:
+    """A named, parameterized SQL statement with an optional typed row"""
+
+    __slots__ = ("name", "sql", "row_type", "row_factory")
+
+    def __init__(self, name, sql, fields=None):
+        self.name = name
+        self.sql = " ".join(sql.split())
+        self.row_type = namedtuple(_type_name(name), fields) if fields else None
+        self.row_factory = None
+        if self.row_type is not None:
+            make = self.row_type._make
+            self.row_factory = lambda cursor, row: make(row)
+
+
+def _type_name(name):
+    return "".join(part.capitalize() for part in name.split("_")) + "Row"
+
+
+def statement(name, sql, fields=None):
+    """Register a statement; `fields` names the columns of the typed row it returns"""
+    if name in STATEMENTS:
+        raise ValueError(f"Duplicate statement name: {name}")
+    stmt = STATEMENTS[name] = Statement(name, sql, fields)
+
+    # Row types live at module level so rows pickle across worker processes
+    if stmt.row_type is not None:
+        globals()[stmt.row_type.__name__] = stmt.row_type
+    return stmt
+
+
+def sql(name):
+    """Return the SQL text of a registered statement"""
+    return STATEMENTS[name].sql
+
+
+def run(conn, name, params=()):
+    """Execute a registered statement and return the cursor
+
+    Rows fetched from the cursor are namedtuples when the statement declares
+    fields, so callers can use either `row.price` or `row[3]`.
+    """
+    stmt = STATEMENTS[name]
+    cursor = conn.cursor()
+    if stmt.row_factory is not None:
+        cursor.row_factory = stmt.row_factory
+    cursor.execute(stmt.sql, params)
+    return cursor
+
+
+def run_many(conn, name, seq_of_params):
+    cursor = conn.cursor()
+    cursor.executemany(STATEMENTS[name].sql, seq_of_params)
+    return cursor
+
+
+def fetch_all(conn, name, params=()):
+    return run(conn, name, params).fetchall()
+
+
+def fetch_one(conn, name, params=()):
+    return run(conn, name, params).fetchone()
+
+
+def scalar(conn, name, params=()):
+    """Return the first column of the first row, or None"""
+    row = conn.execute(STATEMENTS[name].sql, params).fetchone()
+    return row[0] if row else None
+
+
+def explain(conn, name):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    stmt = STATEMENTS[name]
+    placeholders = (None,) * stmt.sql.count("?")
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {stmt.sql}", placeholders).fetchall()]
+
+
+def explain_all(conn):
+    """EXPLAIN QUERY PLAN every registered statement, keyed by name"""
+    return {name: explain(conn, name) for name in STATEMENTS}
+
+
+# ---- users ----
+
+statement("admin_count", "SELECT COUNT(*) FROM users WHERE role = 'admin'")
+statement(
+    "insert_user",
+    "INSERT INTO users (username, password_hash, role, is_retail, registration_date) VALUES (?, ?, ?, ?, ?)"
+)
+statement(
+    "user_by_credentials",
+    """
+    SELECT u.id, u.role, u.is_retail, u.orders_count, l.locked_until
+    FROM users u
+    LEFT JOIN login_lockouts l ON l.username = u.username
+    WHERE u.username = ? AND u.password_hash = ?
+    """,
+    ["id", "role", "is_retail", "orders_count", "locked_until"]
+)
+statement("user_id_by_username", "SELECT id FROM users WHERE username = ?")
+statement("increment_orders_count", "UPDATE users SET orders_count = orders_count + 1 WHERE id = ?")
+statement("user_orders_count", "SELECT orders_count FROM users WHERE id = ?")
+statement(
+    "upsert_login_lockout",
+    """
+    INSERT INTO login_lockouts (username, locked_until) VALUES (?, ?)
+    ON CONFLICT (username) DO UPDATE SET locked_until = excluded.locked_until
+    """
+)
+statement("delete_login_lockout", "DELETE FROM login_lockouts WHERE username = ?")
+statement(
+    "active_login_lockouts",
+    "SELECT username, locked_until FROM login_lockouts WHERE locked_until > ?",
+    ["username", "locked_until"]
+)
+
+CUSTOMER_FIELDS = ["id", "username", "is_retail", "orders_count", "registration_date"]
+statement(
+    "customers_by_username_range",
+    """
+    SELECT id, username, is_retail, orders_count, registration_date
+    FROM users
+    WHERE username >= ? AND username < ? AND role = 'customer'
+    ORDER BY username
+    LIMIT ?
+    """,
+    CUSTOMER_FIELDS
+)
+statement(
+    "customers_by_username",
+    """
+    SELECT id, username, is_retail, orders_count, registration_date
+    FROM users
+    WHERE role = 'customer'
+    ORDER BY username
+    LIMIT ?
+    """,
+    CUSTOMER_FIELDS
+)
+statement(
+    "customer_profile",
+    "SELECT id, username, is_retail, orders_count, registration_date FROM users WHERE id = ? AND role = 'customer'",
+    CUSTOMER_FIELDS
+)
+statement(
+    "all_customers",
+    """
+    SELECT id, username, is_retail, orders_count, registration_date
+    FROM users
+    WHERE role = 'customer'
+    ORDER BY registration_date DESC
+    """,
+    CUSTOMER_FIELDS
+)
+
+# ---- products ----
+
+statement("product_count", "SELECT COUNT(*) FROM products")
+statement(
+    "insert_product",
+    "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)"
+)
+statement(
+    "update_product",
+    "UPDATE products SET name = ?, category = ?, price = ?, stock = ?, bulk_discount = ? WHERE id = ?"
+)
+statement("delete_product", "DELETE FROM products WHERE id = ?")
+statement("decrement_stock", "UPDATE products SET stock = stock - ? WHERE id = ?")
+statement("decrement_stock_if_available", "UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?")
+
+PRODUCT_FIELDS = ["id", "name", "category", "price", "stock", "bulk_discount"]
+statement("all_products", "SELECT id, name, category, price, stock, bulk_discount FROM products", PRODUCT_FIELDS)
+statement(
+    "catalog_products",
+    "SELECT id, name, category, price, stock FROM products ORDER BY id",
+    ["id", "name", "category", "price", "stock"]
+)
+statement(
+    "product_by_id",
+    "SELECT id, name, category, price, stock, bulk_discount FROM products WHERE id = ?",
+    PRODUCT_FIELDS
+)
+statement(
+    "products_by_name",
+    "SELECT id, name, category, price, stock FROM products WHERE name LIKE ?",
+    ["id", "name", "category", "price", "stock"]
+)
+statement("product_categories", "SELECT DISTINCT category FROM products", ["category"])
+statement(
+    "products_in_category",
+    "SELECT id, name, category, price, stock FROM products WHERE category = ? ORDER BY id",
+    ["id", "name", "category", "price", "stock"]
+)
+statement("product_stock", "SELECT id, stock FROM products")
+statement("product_for_cart", "SELECT name, price, stock FROM products WHERE id = ?", ["name", "price", "stock"])
+statement(
+    "products_for_order_sheet",
+    "SELECT p.id, p.name, p.price, p.stock FROM products p JOIN json_each(?) j ON p.id = j.value",
+    ["id", "name", "price", "stock"]
+)
+statement("product_order_item_count", "SELECT COUNT(*) FROM order_items WHERE product_id = ?")
+
+# ---- categories ----
+
+statement("register_product_categories", "INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM products")
+statement("insert_category", "INSERT OR IGNORE INTO categories (name) VALUES (?)")
+statement("category_id", "SELECT id FROM categories WHERE name = ?")
+statement("category_parent", "SELECT parent_id FROM categories WHERE id = ?")
+statement("set_category_parent", "UPDATE categories SET parent_id = ? WHERE id = ?")
+statement("all_categories", "SELECT id, name, parent_id FROM categories ORDER BY name", ["id", "name", "parent_id"])
+statement(
+    "category_subtree",
+    """
+    WITH RECURSIVE subtree (id, name) AS (
+        SELECT id, name FROM categories WHERE name = ?
+        UNION ALL
+        SELECT c.id, c.name FROM categories c JOIN subtree s ON c.parent_id = s.id
+    )
+    SELECT name FROM subtree
+    """,
+    ["name"]
+)
+statement("clear_category_facets", "DELETE FROM category_facets")
+statement(
+    "category_counts",
+    """
+    SELECT category, SUM(count) AS product_count, SUM(CASE WHEN in_stock THEN count ELSE 0 END) AS in_stock_count
+    FROM category_facets
+    GROUP BY category
+    """,
+    ["category", "product_count", "in_stock_count"]
+)
+statement(
+    "category_facet_counts",
+    "SELECT price_band, in_stock, count FROM category_facets WHERE category = ?",
+    ["price_band", "in_stock", "count"]
+)
+
+# Keyset pagination: (price, id) or (name, id) of the previous page's last row. The
+# caller also passes the last price/name as a plain lower bound, which SQLite can
+# start the index range at; the row value comparison alone is only a filter.
+statement(
+    "category_page_by_price",
+    """
+    SELECT id, name, price, stock
+    FROM products
+    WHERE category = ? AND price >= ? AND price < ? AND stock >= ? AND (price, id) > (?, ?)
+    ORDER BY price, id
+    LIMIT ?
+    """,
+    ["id", "name", "price", "stock"]
+)
+statement(
+    "category_page_by_name",
+    """
+    SELECT id, name, price, stock
+    FROM products
+    WHERE category = ? AND name >= ? AND price >= ? AND price < ? AND stock >= ? AND (name, id) > (?, ?)
+    ORDER BY name, id
+    LIMIT ?
+    """,
+    ["id", "name", "price", "stock"]
+)
+
+# ---- pricing ----
+
+statement(
+    "pricing_products",
+    "SELECT id, category, price, bulk_discount FROM products",
+    ["id", "category", "price", "bulk_discount"]
+)
+statement(
+    "discount_tiers",
+    "SELECT product_id, category, customer_type, min_quantity, discount FROM discount_tiers",
+    ["product_id", "category", "customer_type", "min_quantity", "discount"]
+)
+statement(
+    "insert_discount_tier",
+    "INSERT INTO discount_tiers (product_id, category, customer_type, min_quantity, discount) VALUES (?, ?, ?, ?, ?)"
+)
+statement("delete_discount_tier", "DELETE FROM discount_tiers WHERE id = ?")
+statement(
+    "all_discount_tiers",
+    "SELECT id, product_id, category, customer_type, min_quantity, discount FROM discount_tiers ORDER BY id",
+    ["id", "product_id", "category", "customer_type", "min_quantity", "discount"]
+)
+statement(
+    "price_list_prices",
+    "SELECT customer_type, product_id, price FROM price_lists",
+    ["customer_type", "product_id", "price"]
+)
+statement("set_price_list_price", "INSERT OR REPLACE INTO price_lists (customer_type, product_id, price) VALUES (?, ?, ?)")
+
+# ---- recommendations ----
+
+statement(
+    "add_co_purchase",
+    """
+    INSERT INTO product_pairs (product_id, other_id, count) VALUES (?, ?, 1)
+    ON CONFLICT (product_id, other_id) DO UPDATE SET count = count + 1
+    """
+)
+statement(
+    "merge_co_purchase_count",
+    """
+    INSERT INTO product_pairs (product_id, other_id, count) VALUES (?, ?, ?)
+    ON CONFLICT (product_id, other_id) DO UPDATE SET count = count + excluded.count
+    """
+)
+statement(
+    "co_purchase_counts",
+    """
+    WITH baskets AS (
+        SELECT order_id FROM order_items GROUP BY order_id HAVING COUNT(*) BETWEEN 2 AND ?
+    )
+    SELECT a.product_id, b.product_id, COUNT(*)
+    FROM baskets o
+    JOIN order_items a ON a.order_id = o.order_id
+    JOIN order_items b ON b.order_id = o.order_id AND b.product_id > a.product_id
+    GROUP BY a.product_id, b.product_id
+    """
+)
+statement("clear_co_purchases", "DELETE FROM product_pairs")
+statement("clear_neighbors", "DELETE FROM product_neighbors")
+statement("clear_product_neighbors", "DELETE FROM product_neighbors WHERE product_id = ?")
+statement(
+    "refresh_product_neighbors",
+    """
+    INSERT INTO product_neighbors (product_id, rank, neighbor_id, score)
+    SELECT product_id, ROW_NUMBER() OVER (ORDER BY count DESC, other_id), other_id, count
+    FROM product_pairs
+    WHERE product_id = ?
+    ORDER BY count DESC, other_id
+    LIMIT ?
+    """
+)
+statement(
+    "rebuild_neighbors",
+    """
+    INSERT INTO product_neighbors (product_id, rank, neighbor_id, score)
+    SELECT product_id, rank, other_id, count
+    FROM (
+        SELECT product_id, other_id, count,
+               ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY count DESC, other_id) AS rank
+        FROM product_pairs
+    )
+    WHERE rank <= ?
+    """
+)
+statement(
+    "product_neighbors",
+    """
+    SELECT p.id, p.name, p.price, p.stock, n.score
+    FROM product_neighbors n
+    JOIN products p ON p.id = n.neighbor_id
+    WHERE n.product_id = ?
+    ORDER BY n.rank
+    """,
+    ["id", "name", "price", "stock", "score"]
+)
+
+# ---- orders ----
+
+statement(
+    "insert_order",
+    """
+    INSERT INTO orders (user_id, order_date, status, total_amount, estimated_delivery, delivery_slot)
+    VALUES (?, ?, ?, ?, ?, ?)
+    """
+)
+statement("insert_order_item", "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)")
+statement(
+    "order_item_lines",
+    "SELECT product_id, quantity, price FROM order_items WHERE order_id = ?",
+    ["product_id", "quantity", "price"]
+)
+statement(
+    "orders_between",
+    """
+    SELECT id, user_id, order_date, status, total_amount, estimated_delivery
+    FROM orders
+    WHERE order_date >= ? AND order_date < ?
+    ORDER BY order_date, id
+    """,
+    ["id", "user_id", "order_date", "status", "total_amount", "estimated_delivery"]
+)
+statement(
+    "order_lines_after",
+    """
+    SELECT o.id, o.order_date, o.status, o.user_id, COALESCE(u.username, ''), o.total_amount,
+           oi.product_id, oi.quantity, oi.price
+    FROM orders o
+    JOIN order_items oi ON oi.order_id = o.id
+    LEFT JOIN users u ON u.id = o.user_id
+    WHERE o.id > ? AND o.order_date >= ? AND o.order_date < ?
+    ORDER BY o.id, oi.product_id
+    """,
+    ["order_id", "order_date", "status", "user_id", "username", "total_amount", "product_id", "quantity", "price"]
+)
+statement(
+    "open_orders",
+    "SELECT id, order_date, status, delivery_slot, estimated_delivery FROM orders WHERE status != 'Delivered'",
+    ["id", "order_date", "status", "delivery_slot", "estimated_delivery"]
+)
+statement("orders_placed_since", "SELECT id, total_amount FROM orders WHERE order_date >= ?")
+statement(
+    "customers_ordering_since",
+    "SELECT user_id, MAX(order_date) FROM orders WHERE order_date >= ? GROUP BY user_id"
+)
+statement("delivered_order_count", "SELECT COUNT(*) FROM orders WHERE status = 'Delivered'")
+statement("set_order_status", "UPDATE orders SET status = ? WHERE id = ?")
+statement("order_exists", "SELECT id FROM orders WHERE id = ?")
+statement("customer_order_exists", "SELECT id FROM orders WHERE id = ? AND user_id = ?")
+statement(
+    "customer_orders",
+    """
+    SELECT id, order_date, status, total_amount, estimated_delivery
+    FROM orders
+    WHERE user_id = ?
+    ORDER BY order_date DESC
+    """,
+    ["id", "order_date", "status", "total_amount", "estimated_delivery"]
+)
+statement(
+    "customer_orders_page",
+    """
+    SELECT o.id, o.order_date, o.status, o.total_amount,
+           (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) AS item_count,
+           COUNT(*) OVER () AS total_orders
+    FROM orders o
+    WHERE o.user_id = ?
+    ORDER BY o.order_date DESC, o.id DESC
+    LIMIT ? OFFSET ?
+    """,
+    ["id", "order_date", "status", "total_amount", "item_count", "total_orders"]
+)
+statement(
+    "all_orders",
+    """
+    SELECT o.id, u.username, o.order_date, o.status, o.total_amount, o.estimated_delivery
+    FROM orders o
+    JOIN users u ON o.user_id = u.id
+    ORDER BY o.order_date DESC
+    """,
+    ["id", "username", "order_date", "status", "total_amount", "estimated_delivery"]
+)
+statement(
+    "order_item_details",
+    """
+    SELECT p.name, oi.quantity, oi.price, (oi.quantity * oi.price) as subtotal
+    FROM order_items oi
+    JOIN products p ON oi.product_id = p.id
+    WHERE oi.order_id = ?
+    """,
+    ["name", "quantity", "price", "subtotal"]
+)
+statement(
+    "checkout_request",
+    """
+    SELECT r.order_id, r.created_at, r.estimated_delivery, u.orders_count
+    FROM checkout_requests r
+    JOIN users u ON u.id = r.user_id
+    WHERE r.user_id = ? AND r.idempotency_key = ?
+    """,
+    ["order_id", "order_date", "estimated_delivery", "orders_count"]
+)
+statement(
+    "insert_checkout_request",
+    "INSERT INTO checkout_requests (user_id, idempotency_key, order_id, created_at, estimated_delivery) VALUES (?, ?, ?, ?, ?)"
+)
+
+# ---- delivery slots ----
+
+# Books one order into a slot unless it is full; a full slot changes no row
+statement(
+    "book_delivery_slot",
+    """
+    INSERT INTO delivery_slots (slot_start, booked) VALUES (?, 1)
+    ON CONFLICT (slot_start) DO UPDATE SET booked = booked + 1 WHERE booked < ?
+    """
+)
+statement(
+    "delivery_slots_from",
+    "SELECT slot_start, booked FROM delivery_slots WHERE slot_start >= ? ORDER BY slot_start",
+    ["slot_start", "booked"]
+)
+
+# ---- coupons ----
+
+statement("insert_coupon", "INSERT INTO coupons (user_id, code, discount_percentage, used) VALUES (?, ?, ?, ?)")
+statement(
+    "available_coupon",
+    "SELECT code, discount_percentage FROM coupons WHERE id = ? AND user_id = ? AND used = 0",
+    ["code", "discount_percentage"]
+)
+# Conditional, so of two checkouts racing for one coupon only the first matches a row
+statement("redeem_coupon", "UPDATE coupons SET used = 1 WHERE id = ? AND user_id = ? AND used = 0")
+statement("delete_coupon", "DELETE FROM coupons WHERE id = ? AND user_id = ?")
+statement(
+    "available_coupons",
+    "SELECT id, code, discount_percentage FROM coupons WHERE user_id = ? AND used = 0",
+    ["id", "code", "discount_percentage"]
+)
+statement(
+    "customer_coupons",
+    "SELECT id, code, discount_percentage, used FROM coupons WHERE user_id = ? ORDER BY used, id",
+    ["id", "code", "discount_percentage", "used"]
+)
+
+# ---- query cache ----
+
+statement("table_versions", "SELECT name, version FROM table_versions")
+
+
+# ---- synthetic data (datagen) ----
+
+statement(
+    "load_user",
+    """
+    INSERT INTO users (id, username, password_hash, role, is_retail, orders_count, registration_date)
+    VALUES (?, ?, ?, 'customer', ?, ?, ?)
+    """
+)
+statement(
+    "load_product",
+    "INSERT INTO products (id, name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?, ?)"
+)
+statement(
+    "load_order",
+    "INSERT INTO orders (id, user_id, order_date, status, total_amount, estimated_delivery) VALUES (?, ?, ?, ?, ?, ?)"
+)
+statement("load_coupon", "INSERT INTO coupons (user_id, code, discount_percentage, used) VALUES (?, ?, ?, ?)")
+statement("max_user_id", "SELECT COALESCE(MAX(id), 0) FROM users")
+statement("max_product_id", "SELECT COALESCE(MAX(id), 0) FROM products")
+statement("max_order_id", "SELECT COALESCE(MAX(id), 0) FROM orders")
+statement(
+    "secondary_indexes",
+    """
+    SELECT name, sql FROM sqlite_master
+    WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ('users', 'products', 'orders', 'order_items', 'coupons')
+    """,
+    ["name", "sql"]
+)
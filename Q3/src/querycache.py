@@ -0,0 +1,117 @@
+"""Admin listing results, kept in memory until a table they read is written
+
+Every admin listing (all products, all customers, all orders) reads a whole
+table, and an admin moving between menus runs the same ones again and
+again. QueryCache keeps the last result of each listing together with the
+versions of the tables it read, and reuses it only while those versions
+are still current.
+
+The versions live in the table_versions table: one write counter per
+table, bumped by triggers on every row inserted, updated or deleted. So
+every write moves them, from any process and any code path, plain SQL
+included, and a copy of the database (see replica.py) carries the versions
+of the rows it holds. The caller reads the versions on the connection that
+then runs the query, before the query, so a result is never older than the
+versions it is stored with.
+
+The cache is bounded by an estimate of the bytes its results hold, and
+evicts the least recently used listing first.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+
+# Tables whose writes table_versions counts: the ones the admin listings read
+VERSIONED_TABLES = ("users", "products", "orders")
+
+# Rows measured to estimate the size of a result
+SIZE_SAMPLE = 256
+
+
+def create_schema(cursor, tables=VERSIONED_TABLES):
+    """Create table_versions and the triggers that count writes to `tables`
+
+    A trigger costs one single-row update for each row changed.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+
+    for table in tables:
+        cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+        bump = f"UPDATE table_versions SET version = version + 1 WHERE name = '{table}';"
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table} BEGIN {bump} END"
+            )
+
+
+def estimate_size(rows):
+    """Approximate bytes held by a list of row tuples, measured on evenly spaced rows"""
+    size = sys.getsizeof(rows)
+    if not rows:
+        return size
+
+    sample = rows[::max(1, len(rows) // SIZE_SAMPLE)]
+    per_row = sum(sys.getsizeof(row) + sum(map(sys.getsizeof, row)) for row in sample) / len(sample)
+    return size + int(per_row * len(rows))
+
+
+class QueryCache:
+    """The latest result of each listing, with the table versions it was read at"""
+
+    def __init__(self, max_bytes):
+        """
+        Args:
+            max_bytes: Estimated bytes of results to keep; a result larger
+                than this is not cached
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # key -> (versions, rows, size), least recently used first
+        self._entries = OrderedDict()
+
+    def get(self, key, versions, load):
+        """The rows for `key`, reused if they were read at `versions`, else from `load()`
+
+        Callers must not modify the rows returned.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        rows = load()
+        size = estimate_size(rows)
+
+        with self._lock:
+            # A result read at older versions is never used again
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (versions, rows, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+                    self.evictions += 1
+
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
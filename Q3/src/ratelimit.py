@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LoginRateLimited(Exception):
+    """Raised instead of checking a password when the attempt is over the limit
+
+    Attributes:
+        retry_after: Seconds until the next attempt will be considered
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed login attempts; try again in {int(retry_after) + 1} seconds")
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Token buckets keyed by an arbitrary string, in a bounded LRU dict
+
+    Each key holds a (tokens, updated) pair; tokens refill continuously at
+    one per `refill_seconds` up to `capacity`. A key with no entry has a
+    full bucket, so entries that refill completely are dropped, and once
+    `max_entries` keys are held the least recently used one is evicted.
+    Memory is therefore bounded by `max_entries` whatever the attacker sends.
+    Not thread-safe on its own; LoginLimiter holds its lock around every use.
+    """
+
+    def __init__(self, capacity, refill_seconds, max_entries):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def tokens(self, key, now):
+        """Tokens currently available for key"""
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+
+        tokens, updated = entry
+        tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+        if tokens >= self.capacity:
+            del self._buckets[key]
+        return tokens
+
+    def retry_after(self, key, now):
+        """Seconds until key has a whole token again"""
+        return max(0.0, (1 - self.tokens(key, now)) * self.refill_seconds)
+
+    def take(self, key, now):
+        """Spend one token for key
+
+        Returns:
+            Tokens left afterwards (below 1 means the next attempt is refused)
+        """
+        tokens = self.tokens(key, now) - 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+        return tokens
+
+    def reset(self, key):
+        self._buckets.pop(key, None)
+
+
+class LoginLimiter:
+    """Decides, without touching the database, whether a login attempt is checked
+
+    Failed attempts spend a token from the username's bucket and from the
+    client's bucket; successful ones refill the username's. An attempt is
+    refused up front, before any password hashing or query, while either
+    bucket is empty or the username is locked out. Only a breach of the
+    threshold, the username's bucket running dry, produces a lockout worth
+    persisting: `check_failure()` returns its expiry time so the caller can
+    store it, and `load_lockouts()` brings stored ones back after a restart.
+
+    One lock guards the buckets and lockouts, since logins from several
+    threads share a limiter; it is never held across a database call.
+    """
+
+    def __init__(self, username_burst=5, username_refill_seconds=60, client_burst=30,
+                 client_refill_seconds=2, lockout_seconds=900, max_entries=10000, clock=time.time):
+        self.users = TokenBuckets(username_burst, username_refill_seconds, max_entries)
+        self.clients = TokenBuckets(client_burst, client_refill_seconds, max_entries)
+        self.lockout_seconds = lockout_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lockouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load_lockouts(self, rows):
+        """Remember lockouts read from storage as (username, locked_until) pairs"""
+        with self._lock:
+            for username, locked_until in rows:
+                self._lock_out(username, locked_until)
+
+    def lock(self, username, locked_until):
+        with self._lock:
+            self._lock_out(username, locked_until)
+
+    def _lock_out(self, username, locked_until):
+        self._lockouts[username] = locked_until
+        self._lockouts.move_to_end(username)
+        if len(self._lockouts) > self.max_entries:
+            self._lockouts.popitem(last=False)
+
+    def check(self, username, client):
+        """Raise LoginRateLimited if this attempt should not reach the database"""
+        now = self.clock()
+        with self._lock:
+            locked_until = self._lockouts.get(username)
+            if locked_until is not None and locked_until <= now:
+                del self._lockouts[username]
+                locked_until = None
+            wait = max(self.users.retry_after(username, now), self.clients.retry_after(client, now))
+
+        if locked_until is not None:
+            raise LoginRateLimited(locked_until - now)
+        if wait > 0:
+            raise LoginRateLimited(wait)
+
+    def check_failure(self, username, client):
+        """Charge a failed attempt
+
+        Returns:
+            The lockout expiry (a clock() time) if this failure emptied the
+            username's bucket, otherwise None
+        """
+        now = self.clock()
+        with self._lock:
+            self.clients.take(client, now)
+            if self.users.take(username, now) >= 1:
+                return None
+
+            locked_until = now + self.lockout_seconds
+            self._lock_out(username, locked_until)
+            self.users.reset(username)
+            return locked_until
+
+    def succeeded(self, username):
+        with self._lock:
+            self.users.reset(username)
+            self._lockouts.pop(username, None)
@@ -0,0 +1,93 @@
+import queries
+
+
+# Neighbors kept per product in product_neighbors
+TOP_K = 5
+
+# Orders with more distinct products than this (bulk order sheets) say little
+# about which products go together and would add n^2 pairs, so they are skipped
+MAX_BASKET_PRODUCTS = 50
+
+
+def record_order(conn, product_ids, top_k=TOP_K):
+    """Count one order's product pairs and refresh the affected neighbor lists
+
+    Runs inside the checkout transaction and does not commit. Each ordered
+    pair of distinct products gets its count bumped, then every product in
+    the order has its top-K list rewritten from the pair counts, which
+    reads K rows from the (product_id, count) index.
+
+    Args:
+        conn: The connection the order is being written with
+        product_ids: The products in the order
+        top_k: Neighbors to keep per product
+    """
+    product_ids = sorted(set(product_ids))
+    if not 2 <= len(product_ids) <= MAX_BASKET_PRODUCTS:
+        return
+
+    queries.run_many(conn, "add_co_purchase", [(a, b) for a in product_ids for b in product_ids if a != b])
+    for product_id in product_ids:
+        queries.run(conn, "clear_product_neighbors", (product_id,))
+        queries.run(conn, "refresh_product_neighbors", (product_id, top_k))
+
+
+def rebuild(conn, sources, top_k=TOP_K, batch_size=10000):
+    """Recompute every pair count and neighbor list from order history
+
+    The pair counts are the sparse product AᵀA of the order-by-product
+    incidence matrix A. SQLite computes it with a self-join of order_items
+    on order_id grouped by product pair, so only pairs that actually occur
+    are ever materialized. AᵀA is symmetric, so the query only produces
+    pairs with a < b (halving the GROUP BY sort) and each is stored both
+    ways. Does not commit.
+
+    Args:
+        conn: Connection to the catalog database holding product_pairs
+        sources: Connections to every database holding order_items (the
+            catalog itself, or each shard)
+        top_k: Neighbors to keep per product
+        batch_size: Pair rows read and merged per batch
+
+    Returns:
+        Number of distinct unordered product pairs counted (per source)
+    """
+    queries.run(conn, "clear_co_purchases")
+    pairs = 0
+    for source in sources:
+        cursor = queries.run(source, "co_purchase_counts", (MAX_BASKET_PRODUCTS,))
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            queries.run_many(
+                conn, "merge_co_purchase_count", [pair for a, b, count in rows for pair in ((a, b, count), (b, a, count))]
+            )
+            pairs += len(rows)
+            rows = cursor.fetchmany(batch_size)
+
+    queries.run(conn, "clear_neighbors")
+    queries.run(conn, "rebuild_neighbors", (top_k,))
+    return pairs
+
+
+def also_bought(conn, product_ids, limit=TOP_K, exclude=()):
+    """Products most often bought with the given ones, best first
+
+    Reads the stored top-K list of each product, so the cost is O(K) per
+    product and does not depend on the size of the order history.
+    Products in `product_ids` or `exclude` and out-of-stock products are
+    left out.
+
+    Returns:
+        list of ProductNeighborsRow (id, name, price, stock, score), with
+        scores summed across the given products
+    """
+    exclude = set(product_ids).union(exclude)
+    best = {}
+    for product_id in product_ids:
+        for row in queries.fetch_all(conn, "product_neighbors", (product_id,)):
+            if row.id in exclude or row.stock <= 0:
+                continue
+            seen = best.get(row.id)
+            best[row.id] = row if seen is None else seen._replace(score=seen.score + row.score)
+
+    return sorted(best.values(), key=lambda row: (-row.score, row.id))[:limit]
@@ -0,0 +1,175 @@
+"""A periodically refreshed copy of dollmart.db for admin and reporting reads
+
+Long reports (every order, every customer, the dashboard's recount) run
+against the copy, so they never hold locks on the database checkouts
+write to. The copy is taken with SQLite's online backup API (see
+backup.copy_database()) into a temporary file that is renamed over the
+replica. Readers that already have the old copy open keep reading it;
+new connections get the new one, so nobody ever waits for a refresh.
+
+The replica's modification time is set to when its copy started, so its
+age is known to every process sharing it. A read gets the replica only if
+that age is within `max_staleness`; otherwise it is sent to the primary.
+The first read takes the first copy and starts a background thread that
+refreshes the replica whenever it is `refresh_after` seconds old, so reads
+keep finding it fresh; the thread stops once no read has come for
+`idle_after` seconds, and the next read starts it again.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from backup import copy_database, CopyCancelled
+
+
+class ReadReplica:
+    """A copy of `primary_path` no older than `max_staleness` seconds, or the primary itself"""
+
+    def __init__(self, primary_path, replica_path=None, max_staleness=60, refresh_after=None, idle_after=None,
+                 pages=1024, sleep=0.001, background=True, clock=time.time):
+        """
+        Args:
+            primary_path: The database checkouts write to
+            replica_path: Where to keep the copy (default: <primary>-replica.db)
+            max_staleness: Oldest copy, in seconds, a read may be given
+            refresh_after: Age at which the replica is refreshed (default: half of max_staleness)
+            idle_after: Seconds without a read after which refreshing stops
+                (default: 10 times max_staleness)
+            pages, sleep: Pages copied per backup step and the pause between steps
+            background: False to refresh in the reading thread (for tests)
+            clock: Wall-clock time in seconds, comparable with file modification times
+        """
+        self.primary_path = primary_path
+        self.replica_path = replica_path or os.path.splitext(primary_path)[0] + "-replica.db"
+        self.max_staleness = max_staleness
+        self.refresh_after = max_staleness / 2 if refresh_after is None else refresh_after
+        self.idle_after = max_staleness * 10 if idle_after is None else idle_after
+        self.pages = pages
+        self.sleep = sleep
+        self.background = background
+        self.clock = clock
+
+        self.copies = 0
+        self.unchanged = 0
+        self.primary_reads = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_read = None
+        # PRAGMA data_version on a connection that never writes moves whenever another
+        # connection commits; opened by the first refresh
+        self._watch = None
+        self._copied_version = None
+        self._copied_at = None
+
+    def _copied_ns(self):
+        """When the replica's copy started (its mtime), in nanoseconds, or None if there is no replica"""
+        try:
+            return os.stat(self.replica_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def age(self):
+        """Seconds since the replica's copy started, or None if there is no replica"""
+        copied = self._copied_ns()
+        return None if copied is None else self.clock() - copied / 1e9
+
+    def read_path(self):
+        """The database a reporting read should open: the replica if fresh enough, else the primary
+
+        Before there is any replica the read waits for the first copy, which
+        takes far less time than the reports it would otherwise run on the primary.
+        """
+        self._last_read = self.clock()
+        age = self.age()
+        if age is None or age >= self.refresh_after:
+            if age is not None and self.background:
+                self._start_refresh()
+            else:
+                try:
+                    self.refresh()
+                except CopyCancelled:
+                    pass
+                age = self.age()
+                if self.background:
+                    self._start_refresh()
+
+        if age is not None and age <= self.max_staleness:
+            return self.replica_path
+        self.primary_reads += 1
+        return self.primary_path
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._thread is not None or self._stop.is_set():
+                return
+            self._thread = threading.Thread(target=self._keep_fresh, name="replica-refresh", daemon=True)
+            self._thread.start()
+
+    def _keep_fresh(self):
+        try:
+            while not self._stop.is_set() and self.clock() - self._last_read <= self.idle_after:
+                age = self.age()
+                if age is None or age >= self.refresh_after:
+                    self.refresh()
+                else:
+                    self._stop.wait(self.refresh_after - age)
+        except CopyCancelled:
+            pass
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def refresh(self):
+        """Bring the replica up to date; only copies if the primary changed since the last copy
+
+        Returns:
+            True if the database was copied, False if the replica was only marked fresh
+        """
+        started = int(self.clock() * 1e9)
+        with self._lock:
+            if self._watch is None:
+                self._watch = sqlite3.connect(self.primary_path, check_same_thread=False)
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+        # Unchanged since this process's last copy, and that copy (or a newer one) is still in place
+        copied = self._copied_ns()
+        if version == self._copied_version and copied is not None and copied >= self._copied_at:
+            os.utime(self.replica_path, ns=(started, started))
+            self.unchanged += 1
+            return False
+
+        copy_path = f"{self.replica_path}.{os.getpid()}.{threading.get_ident()}.copy"
+        try:
+            copy_database(self.primary_path, copy_path, self.pages, self.sleep, stop=self._stop)
+            # A copy of a WAL database is in WAL mode too; readers of a file that is
+            # replaced under them must not share -wal/-shm files, so switch it back
+            conn = sqlite3.connect(copy_path)
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.close()
+            os.utime(copy_path, ns=(started, started))
+            # Another process may have put a newer copy in place while this one ran
+            copied = self._copied_ns()
+            if copied is None or copied < started:
+                os.replace(copy_path, self.replica_path)
+        finally:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)
+
+        self._copied_version = version
+        self._copied_at = started
+        self.copies += 1
+        return True
+
+    def close(self):
+        """Stop any refresh in progress; the replica file is left for other processes"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
@@ -0,0 +1,709 @@
+"""Storage backends for the users, products, orders and coupons the service layer writes
+
+Each table is reached through a repository interface. sqlite_repositories()
+binds the repositories to a connection and runs the statements in queries.py;
+MemoryStorage keeps the rows in dicts with the indexes those statements rely
+on (username, category, a customer's orders and coupons), so the same service
+code and tests run against either.
+"""
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import insort
+from contextlib import contextmanager
+
+import queries
+
+
+class UserRepository(ABC):
+    @abstractmethod
+    def add(self, username, password_hash, role, is_retail, registration_date):
+        """Insert a user; returns its ID. Raises sqlite3.IntegrityError if the username is taken."""
+
+    @abstractmethod
+    def by_credentials(self, username, password_hash):
+        """UserByCredentialsRow(id, role, is_retail, orders_count, locked_until) or None"""
+
+    @abstractmethod
+    def id_by_username(self, username):
+        """The user's ID, or None"""
+
+    @abstractmethod
+    def profile(self, user_id):
+        """CustomerProfileRow(id, username, is_retail, orders_count, registration_date) for a customer, or None"""
+
+    @abstractmethod
+    def increment_orders_count(self, user_id):
+        """Count one more order for the user; returns the new count"""
+
+    @abstractmethod
+    def save_lockout(self, username, locked_until):
+        pass
+
+    @abstractmethod
+    def clear_lockout(self, username):
+        pass
+
+    @abstractmethod
+    def active_lockouts(self, now):
+        """(username, locked_until) for lockouts that end after `now`"""
+
+
+class ProductRepository(ABC):
+    @abstractmethod
+    def add(self, name, category, price, stock, bulk_discount=0):
+        """Insert a product; returns its ID"""
+
+    @abstractmethod
+    def for_cart(self, product_id):
+        """ProductForCartRow(name, price, stock) or None"""
+
+    @abstractmethod
+    def by_id(self, product_id):
+        """ProductByIdRow(id, name, category, price, stock, bulk_discount) or None"""
+
+    @abstractmethod
+    def all(self):
+        """AllProductsRow(id, name, category, price, stock, bulk_discount) for every product"""
+
+    @abstractmethod
+    def for_order_sheet(self, product_ids):
+        """ProductsForOrderSheetRow(id, name, price, stock) for those of `product_ids` that exist"""
+
+    @abstractmethod
+    def search(self, term):
+        """ProductsByNameRow(id, name, category, price, stock) for names containing `term`, any case"""
+
+    @abstractmethod
+    def in_category(self, category):
+        """ProductsByNameRow for every product in a category, by ID"""
+
+    @abstractmethod
+    def decrement_stock(self, quantities, only_if_available=False):
+        """Take {product_id: quantity} out of stock
+
+        With only_if_available, lines short of stock are left alone.
+
+        Returns:
+            Number of lines decremented
+        """
+
+    @abstractmethod
+    def update(self, product_id, name, category, price, stock, bulk_discount):
+        pass
+
+    @abstractmethod
+    def delete(self, product_id):
+        """Delete a product; returns whether it existed"""
+
+
+class OrderRepository(ABC):
+    @abstractmethod
+    def add(self, user_id, order_date, status, total_amount, estimated_delivery, items, delivery_slot=None):
+        """Insert an order and its (product_id, quantity, price) items; returns the order ID"""
+
+    @abstractmethod
+    def items(self, order_id):
+        """OrderItemLinesRow(product_id, quantity, price) for each item"""
+
+    @abstractmethod
+    def item_details(self, order_id, user_id):
+        """OrderItemDetailsRow(name, quantity, price, subtotal) for each item, or None if it is not the user's order"""
+
+    @abstractmethod
+    def for_user(self, user_id):
+        """CustomerOrdersRow for each of the user's orders, newest first"""
+
+    @abstractmethod
+    def open(self):
+        """OpenOrdersRow(id, order_date, status, delivery_slot, estimated_delivery) for orders not yet delivered"""
+
+    @abstractmethod
+    def set_status(self, order_id, status):
+        pass
+
+    @abstractmethod
+    def count_items_of(self, product_id):
+        """Number of order items for a product"""
+
+    @abstractmethod
+    def page_for_user(self, user_id, limit, offset):
+        """CustomerOrdersPageRow(id, order_date, status, total_amount, item_count, total_orders)
+        for one page of the user's orders, newest first"""
+
+    @abstractmethod
+    def by_request(self, user_id, idempotency_key):
+        """CheckoutRequestRow(order_id, order_date, estimated_delivery, orders_count) for the order
+        a checkout request placed, or None"""
+
+    @abstractmethod
+    def add_request(self, user_id, idempotency_key, order_id, created_at, estimated_delivery):
+        """Remember the order a checkout request placed, with its order date (created_at) and
+        estimated delivery, which outlive the order's archiving. Raises sqlite3.IntegrityError if the key was used."""
+
+
+class CouponRepository(ABC):
+    @abstractmethod
+    def add(self, user_id, code, discount_percentage):
+        """Insert an unused coupon; returns its ID"""
+
+    @abstractmethod
+    def available(self, coupon_id, user_id):
+        """AvailableCouponRow(code, discount_percentage) if the user holds the coupon unused, else None"""
+
+    @abstractmethod
+    def redeem(self, coupon_id, user_id):
+        """Mark the coupon used if the user holds it unused, as one conditional write
+
+        Returns AvailableCouponRow(code, discount_percentage) if this call
+        redeemed it, else None.
+        """
+
+    @abstractmethod
+    def for_user(self, user_id):
+        """AvailableCouponsRow(id, code, discount_percentage) for the user's unused coupons"""
+
+    @abstractmethod
+    def all_for_user(self, user_id):
+        """CustomerCouponsRow(id, code, discount_percentage, used) for every coupon the user holds, unused first"""
+
+
+class Repositories:
+    """The four repositories of one backend, plus its SQLite connection if it has one
+
+    `connection` is None for the in-memory backend; callers use it to skip
+    the SQL-only extras (co-purchase counts, price book) there.
+    """
+
+    __slots__ = ("users", "products", "orders", "coupons", "connection")
+
+    def __init__(self, users, products, orders, coupons, connection=None):
+        self.users = users
+        self.products = products
+        self.orders = orders
+        self.coupons = coupons
+        self.connection = connection
+
+
+# ---- SQLite ----
+
+class SQLiteUsers(UserRepository):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add(self, username, password_hash, role, is_retail, registration_date):
+        return queries.run(self.conn, "insert_user", (username, password_hash, role, is_retail, registration_date)).lastrowid
+
+    def by_credentials(self, username, password_hash):
+        return queries.fetch_one(self.conn, "user_by_credentials", (username, password_hash))
+
+    def id_by_username(self, username):
+        return queries.scalar(self.conn, "user_id_by_username", (username,))
+
+    def profile(self, user_id):
+        return queries.fetch_one(self.conn, "customer_profile", (user_id,))
+
+    def increment_orders_count(self, user_id):
+        queries.run(self.conn, "increment_orders_count", (user_id,))
+        return queries.scalar(self.conn, "user_orders_count", (user_id,)) or 0
+
+    def save_lockout(self, username, locked_until):
+        queries.run(self.conn, "upsert_login_lockout", (username, locked_until))
+
+    def clear_lockout(self, username):
+        queries.run(self.conn, "delete_login_lockout", (username,))
+
+    def active_lockouts(self, now):
+        return queries.fetch_all(self.conn, "active_login_lockouts", (now,))
+
+
+class SQLiteProducts(ProductRepository):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add(self, name, category, price, stock, bulk_discount=0):
+        return queries.run(self.conn, "insert_product", (name, category, price, stock, bulk_discount)).lastrowid
+
+    def for_cart(self, product_id):
+        return queries.fetch_one(self.conn, "product_for_cart", (product_id,))
+
+    def by_id(self, product_id):
+        return queries.fetch_one(self.conn, "product_by_id", (product_id,))
+
+    def all(self):
+        return queries.fetch_all(self.conn, "all_products")
+
+    def for_order_sheet(self, product_ids):
+        # The IDs go in as one JSON array joined through json_each, so a 10,000-line sheet
+        # is one statement rather than one lookup per line, clear of the bound-parameter limit
+        return queries.fetch_all(self.conn, "products_for_order_sheet", (json.dumps(list(product_ids)),))
+
+    def search(self, term):
+        return queries.fetch_all(self.conn, "products_by_name", (f"%{term}%",))
+
+    def in_category(self, category):
+        return queries.fetch_all(self.conn, "products_in_category", (category,))
+
+    def decrement_stock(self, quantities, only_if_available=False):
+        if only_if_available:
+            params = [(quantity, product_id, quantity) for product_id, quantity in quantities.items()]
+            return queries.run_many(self.conn, "decrement_stock_if_available", params).rowcount
+        params = [(quantity, product_id) for product_id, quantity in quantities.items()]
+        return queries.run_many(self.conn, "decrement_stock", params).rowcount
+
+    def update(self, product_id, name, category, price, stock, bulk_discount):
+        queries.run(self.conn, "update_product", (name, category, price, stock, bulk_discount, product_id))
+
+    def delete(self, product_id):
+        return queries.run(self.conn, "delete_product", (product_id,)).rowcount > 0
+
+
+class SQLiteOrders(OrderRepository):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add(self, user_id, order_date, status, total_amount, estimated_delivery, items, delivery_slot=None):
+        order_id = queries.run(
+            self.conn, "insert_order", (user_id, order_date, status, total_amount, estimated_delivery, delivery_slot)
+        ).lastrowid
+        queries.run_many(self.conn, "insert_order_item", [(order_id, *item) for item in items])
+        return order_id
+
+    def items(self, order_id):
+        return queries.fetch_all(self.conn, "order_item_lines", (order_id,))
+
+    def item_details(self, order_id, user_id):
+        if not queries.fetch_one(self.conn, "customer_order_exists", (order_id, user_id)):
+            return None
+        return queries.fetch_all(self.conn, "order_item_details", (order_id,))
+
+    def for_user(self, user_id):
+        return queries.fetch_all(self.conn, "customer_orders", (user_id,))
+
+    def open(self):
+        return queries.fetch_all(self.conn, "open_orders")
+
+    def set_status(self, order_id, status):
+        queries.run(self.conn, "set_order_status", (status, order_id))
+
+    def count_items_of(self, product_id):
+        return queries.scalar(self.conn, "product_order_item_count", (product_id,))
+
+    def page_for_user(self, user_id, limit, offset):
+        return queries.fetch_all(self.conn, "customer_orders_page", (user_id, limit, offset))
+
+    def by_request(self, user_id, idempotency_key):
+        return queries.fetch_one(self.conn, "checkout_request", (user_id, idempotency_key))
+
+    def add_request(self, user_id, idempotency_key, order_id, created_at, estimated_delivery):
+        queries.run(self.conn, "insert_checkout_request",
+                    (user_id, idempotency_key, order_id, created_at, estimated_delivery))
+
+
+class SQLiteCoupons(CouponRepository):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add(self, user_id, code, discount_percentage):
+        return queries.run(self.conn, "insert_coupon", (user_id, code, discount_percentage, 0)).lastrowid
+
+    def available(self, coupon_id, user_id):
+        return queries.fetch_one(self.conn, "available_coupon", (coupon_id, user_id))
+
+    def redeem(self, coupon_id, user_id):
+        # Coupons that are plainly gone fail without waiting for the write lock. Otherwise the
+        # conditional UPDATE decides: it rereads used under the lock, so only one checkout matches.
+        coupon = queries.fetch_one(self.conn, "available_coupon", (coupon_id, user_id))
+        if coupon is None or queries.run(self.conn, "redeem_coupon", (coupon_id, user_id)).rowcount == 0:
+            return None
+        return coupon
+
+    def for_user(self, user_id):
+        return queries.fetch_all(self.conn, "available_coupons", (user_id,))
+
+    def all_for_user(self, user_id):
+        return queries.fetch_all(self.conn, "customer_coupons", (user_id,))
+
+
+def sqlite_repositories(conn):
+    """Repositories that read and write through `conn`; the caller commits"""
+    return Repositories(SQLiteUsers(conn), SQLiteProducts(conn), SQLiteOrders(conn), SQLiteCoupons(conn), conn)
+
+
+@contextmanager
+def sqlite_session(conn):
+    """Yield repositories over `conn`, closing it afterwards"""
+    try:
+        yield sqlite_repositories(conn)
+    finally:
+        conn.close()
+
+
+# ---- in memory ----
+
+# Column positions in the in-memory rows, which are lists so updates happen in place
+_ROLE, _IS_RETAIL, _ORDERS_COUNT = 3, 4, 6
+_CATEGORY, _STOCK = 2, 4
+_STATUS = 3
+_USED = 4
+
+
+class MemoryStorage:
+    """Every table in dicts keyed by ID, with the secondary indexes the repositories query
+
+    Reads and writes go through transaction(), which holds one lock for its
+    duration. Each write logs how to undo itself, so an exception inside
+    the transaction leaves the tables as they were, like a SQLite rollback.
+    Nothing is persisted.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.products = {}
+        self.orders = {}
+        self.order_items = {}
+        self.coupons = {}
+        self.lockouts = {}
+        # (user_id, idempotency_key): (order_id, order_date, estimated_delivery)
+        self.checkout_requests = {}
+
+        self.user_by_name = {}
+        self.products_by_category = {}
+        self.orders_by_user = {}
+        self.coupons_by_user = {}
+
+        self._last_id = {"users": 0, "products": 0, "orders": 0, "coupons": 0}
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._undo = None
+        self.repositories = Repositories(
+            MemoryUsers(self), MemoryProducts(self), MemoryOrders(self), MemoryCoupons(self)
+        )
+
+    @contextmanager
+    def transaction(self):
+        """Yield the repositories under the storage lock, undoing every write if the block raises
+
+        Nested transactions join the outermost one.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self.repositories
+                finally:
+                    self._depth -= 1
+                return
+
+            self._depth, self._undo = 1, []
+            try:
+                yield self.repositories
+            except BaseException:
+                for undo in reversed(self._undo):
+                    undo()
+                raise
+            finally:
+                self._depth, self._undo = 0, None
+
+    def next_id(self, table):
+        self._last_id[table] += 1
+        self.log(self._last_id.__setitem__, table, self._last_id[table] - 1)
+        return self._last_id[table]
+
+    def log(self, undo, *args):
+        """Remember `undo(*args)` for a rollback of the current transaction"""
+        if self._undo is not None:
+            self._undo.append(lambda: undo(*args))
+
+    def insert(self, table, index, key, row):
+        """Put `row` in `table` under its ID and append the ID to index[key]"""
+        table[row[0]] = row
+        ids = index.setdefault(key, [])
+        ids.append(row[0])
+        self.log(self._remove, table, index, key, row[0])
+
+    @staticmethod
+    def _remove(table, index, key, row_id):
+        del table[row_id]
+        index[key].remove(row_id)
+
+    def set(self, row, column, value):
+        self.log(row.__setitem__, column, row[column])
+        row[column] = value
+
+    def load(self, conn):
+        """Copy every user, product, order and coupon out of a SQLite database"""
+        with self._lock:
+            for row in conn.execute(
+                "SELECT id, username, password_hash, role, is_retail, registration_date, orders_count FROM users ORDER BY id"
+            ):
+                self.users[row[0]] = list(row)
+                self.user_by_name[row[1]] = row[0]
+            for row in conn.execute("SELECT id, name, category, price, stock, bulk_discount FROM products ORDER BY id"):
+                self.insert(self.products, self.products_by_category, row[2], list(row))
+            for row in conn.execute(
+                "SELECT id, user_id, order_date, status, total_amount, estimated_delivery, delivery_slot FROM orders ORDER BY id"
+            ):
+                self.insert(self.orders, self.orders_by_user, row[1], list(row))
+            for order_id, *item in conn.execute("SELECT order_id, product_id, quantity, price FROM order_items ORDER BY rowid"):
+                self.order_items.setdefault(order_id, []).append(queries.OrderItemLinesRow(*item))
+            for row in conn.execute("SELECT id, user_id, code, discount_percentage, used FROM coupons ORDER BY id"):
+                self.insert(self.coupons, self.coupons_by_user, row[1], list(row))
+            self.lockouts.update(conn.execute("SELECT username, locked_until FROM login_lockouts"))
+            for user_id, key, *request in conn.execute(
+                "SELECT user_id, idempotency_key, order_id, created_at, estimated_delivery FROM checkout_requests"
+            ):
+                self.checkout_requests[user_id, key] = tuple(request)
+            for table in self._last_id:
+                self._last_id[table] = max(getattr(self, table), default=0)
+
+
+class MemoryUsers(UserRepository):
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add(self, username, password_hash, role, is_retail, registration_date):
+        storage = self.storage
+        if username in storage.user_by_name:
+            # The same error SQLite raises, so callers handle both backends alike
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: users.username")
+        user_id = storage.next_id("users")
+        storage.users[user_id] = [user_id, username, password_hash, role, is_retail, registration_date, 0]
+        storage.user_by_name[username] = user_id
+        storage.log(self._remove, user_id, username)
+        return user_id
+
+    def _remove(self, user_id, username):
+        del self.storage.users[user_id]
+        del self.storage.user_by_name[username]
+
+    def by_credentials(self, username, password_hash):
+        user = self.storage.users.get(self.storage.user_by_name.get(username))
+        if user is None or user[2] != password_hash:
+            return None
+        return queries.UserByCredentialsRow(
+            user[0], user[_ROLE], user[_IS_RETAIL], user[_ORDERS_COUNT], self.storage.lockouts.get(username)
+        )
+
+    def id_by_username(self, username):
+        return self.storage.user_by_name.get(username)
+
+    def profile(self, user_id):
+        user = self.storage.users.get(user_id)
+        if user is None or user[_ROLE] != "customer":
+            return None
+        return queries.CustomerProfileRow(user[0], user[1], user[_IS_RETAIL], user[_ORDERS_COUNT], user[5])
+
+    def increment_orders_count(self, user_id):
+        user = self.storage.users.get(user_id)
+        if user is None:
+            return 0
+        self.storage.set(user, _ORDERS_COUNT, user[_ORDERS_COUNT] + 1)
+        return user[_ORDERS_COUNT]
+
+    def save_lockout(self, username, locked_until):
+        lockouts = self.storage.lockouts
+        self.storage.log(self._restore_lockout, username, lockouts.get(username))
+        lockouts[username] = locked_until
+
+    def clear_lockout(self, username):
+        lockouts = self.storage.lockouts
+        self.storage.log(self._restore_lockout, username, lockouts.get(username))
+        lockouts.pop(username, None)
+
+    def _restore_lockout(self, username, locked_until):
+        if locked_until is None:
+            self.storage.lockouts.pop(username, None)
+        else:
+            self.storage.lockouts[username] = locked_until
+
+    def active_lockouts(self, now):
+        return [queries.ActiveLoginLockoutsRow(username, locked_until)
+                for username, locked_until in self.storage.lockouts.items() if locked_until > now]
+
+
+class MemoryProducts(ProductRepository):
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add(self, name, category, price, stock, bulk_discount=0):
+        storage = self.storage
+        product_id = storage.next_id("products")
+        storage.insert(storage.products, storage.products_by_category, category,
+                       [product_id, name, category, price, stock, bulk_discount])
+        return product_id
+
+    def for_cart(self, product_id):
+        product = self.storage.products.get(product_id)
+        if product is None:
+            return None
+        return queries.ProductForCartRow(product[1], product[3], product[_STOCK])
+
+    def by_id(self, product_id):
+        product = self.storage.products.get(product_id)
+        return None if product is None else queries.ProductByIdRow(*product)
+
+    def all(self):
+        return [queries.AllProductsRow(*product) for product in self.storage.products.values()]
+
+    def for_order_sheet(self, product_ids):
+        products = self.storage.products
+        return [queries.ProductsForOrderSheetRow(product[0], product[1], product[3], product[_STOCK])
+                for product in map(products.get, product_ids) if product is not None]
+
+    def search(self, term):
+        # LIKE '%term%' is case-insensitive for ASCII, and a full scan either way
+        term = term.lower()
+        return [queries.ProductsByNameRow(*product[:5])
+                for product in self.storage.products.values() if term in product[1].lower()]
+
+    def in_category(self, category):
+        products = self.storage.products
+        return [queries.ProductsByNameRow(*products[product_id][:5])
+                for product_id in self.storage.products_by_category.get(category, ())]
+
+    def decrement_stock(self, quantities, only_if_available=False):
+        storage = self.storage
+        decremented = 0
+        for product_id, quantity in quantities.items():
+            product = storage.products.get(product_id)
+            if product is None or (only_if_available and product[_STOCK] < quantity):
+                continue
+            storage.set(product, _STOCK, product[_STOCK] - quantity)
+            decremented += 1
+        return decremented
+
+    def update(self, product_id, name, category, price, stock, bulk_discount):
+        storage = self.storage
+        product = storage.products.get(product_id)
+        if product is None:
+            return
+        if product[_CATEGORY] != category:
+            self._remove_from_category(product)
+            # Kept in ID order, which in_category() returns like the SQL
+            ids = storage.products_by_category.setdefault(category, [])
+            insort(ids, product_id)
+            storage.log(ids.remove, product_id)
+        storage.log(product.__setitem__, slice(1, 6), product[1:6])
+        product[1:6] = [name, category, price, stock, bulk_discount]
+
+    def delete(self, product_id):
+        storage = self.storage
+        product = storage.products.pop(product_id, None)
+        if product is None:
+            return False
+        storage.log(storage.products.__setitem__, product_id, product)
+        self._remove_from_category(product)
+        return True
+
+    def _remove_from_category(self, product):
+        ids = self.storage.products_by_category[product[_CATEGORY]]
+        position = ids.index(product[0])
+        del ids[position]
+        self.storage.log(ids.insert, position, product[0])
+
+
+class MemoryOrders(OrderRepository):
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add(self, user_id, order_date, status, total_amount, estimated_delivery, items, delivery_slot=None):
+        storage = self.storage
+        order_id = storage.next_id("orders")
+        storage.insert(storage.orders, storage.orders_by_user, user_id,
+                       [order_id, user_id, order_date, status, total_amount, estimated_delivery, delivery_slot])
+        storage.order_items[order_id] = [queries.OrderItemLinesRow(*item) for item in items]
+        storage.log(storage.order_items.pop, order_id)
+        return order_id
+
+    def items(self, order_id):
+        return list(self.storage.order_items.get(order_id, ()))
+
+    def item_details(self, order_id, user_id):
+        order = self.storage.orders.get(order_id)
+        if order is None or order[1] != user_id:
+            return None
+        products = self.storage.products
+        # Items of deleted products drop out, as they do from the SQL join
+        return [queries.OrderItemDetailsRow(products[item.product_id][1], item.quantity, item.price,
+                                            item.quantity * item.price)
+                for item in self.storage.order_items.get(order_id, ()) if item.product_id in products]
+
+    def for_user(self, user_id):
+        orders = self.storage.orders
+        rows = [queries.CustomerOrdersRow(order[0], *order[2:6])
+                for order in map(orders.__getitem__, self.storage.orders_by_user.get(user_id, ()))]
+        # IDs break ties between orders placed in the same second, newest first like SQLite's rowid order
+        rows.sort(key=lambda row: (row.order_date, row.id), reverse=True)
+        return rows
+
+    def open(self):
+        return [queries.OpenOrdersRow(order[0], order[2], order[_STATUS], order[6], order[5])
+                for order in self.storage.orders.values() if order[_STATUS] != "Delivered"]
+
+    def set_status(self, order_id, status):
+        order = self.storage.orders.get(order_id)
+        if order is not None:
+            self.storage.set(order, _STATUS, status)
+
+    def count_items_of(self, product_id):
+        return sum(item.product_id == product_id for items in self.storage.order_items.values() for item in items)
+
+    def page_for_user(self, user_id, limit, offset):
+        orders = self.for_user(user_id)
+        order_items = self.storage.order_items
+        return [queries.CustomerOrdersPageRow(*order[:4], len(order_items.get(order.id, ())), len(orders))
+                for order in orders[offset:offset + limit]]
+
+    def by_request(self, user_id, idempotency_key):
+        storage = self.storage
+        request = storage.checkout_requests.get((user_id, idempotency_key))
+        if request is None:
+            return None
+        return queries.CheckoutRequestRow(*request, storage.users[user_id][_ORDERS_COUNT])
+
+    def add_request(self, user_id, idempotency_key, order_id, created_at, estimated_delivery):
+        requests = self.storage.checkout_requests
+        if (user_id, idempotency_key) in requests:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: checkout_requests.user_id, checkout_requests.idempotency_key")
+        requests[user_id, idempotency_key] = (order_id, created_at, estimated_delivery)
+        self.storage.log(requests.pop, (user_id, idempotency_key))
+
+
+class MemoryCoupons(CouponRepository):
+    def __init__(self, storage):
+        self.storage = storage
+
+    def add(self, user_id, code, discount_percentage):
+        storage = self.storage
+        coupon_id = storage.next_id("coupons")
+        storage.insert(storage.coupons, storage.coupons_by_user, user_id,
+                       [coupon_id, user_id, code, discount_percentage, 0])
+        return coupon_id
+
+    def available(self, coupon_id, user_id):
+        coupon = self.storage.coupons.get(coupon_id)
+        if coupon is None or coupon[1] != user_id or coupon[_USED]:
+            return None
+        return queries.AvailableCouponRow(coupon[2], coupon[3])
+
+    def redeem(self, coupon_id, user_id):
+        # The check and the write happen under the storage lock held by the transaction
+        coupon = self.storage.coupons.get(coupon_id)
+        if coupon is None or coupon[1] != user_id or coupon[_USED]:
+            return None
+        self.storage.set(coupon, _USED, 1)
+        return queries.AvailableCouponRow(coupon[2], coupon[3])
+
+    def for_user(self, user_id):
+        coupons = self.storage.coupons
+        return [queries.AvailableCouponsRow(coupon_id, *coupons[coupon_id][2:4])
+                for coupon_id in self.storage.coupons_by_user.get(user_id, ()) if not coupons[coupon_id][_USED]]
+
+    def all_for_user(self, user_id):
+        coupons = self.storage.coupons
+        rows = [queries.CustomerCouponsRow(coupon_id, *coupons[coupon_id][2:5])
+                for coupon_id in self.storage.coupons_by_user.get(user_id, ())]
+        rows.sort(key=lambda row: (row.used, row.id))
+        return rows
@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+import itertools
+import time
+import multiprocessing
+from concurrent.futures import Future
+
+import dollmart
+import queries
+
+
+def _catalog(cache):
+    return cache.products()
+
+
+# Reads run in whichever worker picks the request up; writes are forwarded
+# to the single writer process so workers never contend for the write lock.
+READ_OPERATIONS = {
+    "catalog": _catalog,
+    "search_products": lambda cache, term: dollmart.find_products(term),
+    "search_customers": lambda cache, prefix, limit=20: dollmart.search_customers(prefix, limit),
+    "customer_360": lambda cache, customer_id, page=1, page_size=10: dollmart.get_customer_360(customer_id, page, page_size),
+}
+
+WRITE_OPERATIONS = {
+    "insert_order": dollmart.insert_order,
+    "create_customer": dollmart.create_customer,
+}
+
+# Writes that change product rows and therefore invalidate every worker's catalog
+CATALOG_WRITES = {"insert_order"}
+
+
+def retry_locked(function, *args, attempts=5, delay=0.01):
+    """Call `function(*args)`, backing off and retrying while the database is locked"""
+    for attempt in range(attempts):
+        try:
+            return function(*args)
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(delay * (2 ** attempt))
+
+
+class CatalogCache:
+    """Per-worker copy of the product catalog, reloaded when the shared version moves"""
+
+    def __init__(self, version):
+        self._version = version
+        self._seen = None
+        self._rows = None
+
+    def products(self):
+        current = self._version.value
+        if self._rows is None or current != self._seen:
+            conn = sqlite3.connect(dollmart.DB_PATH)
+            self._rows = queries.fetch_all(conn, "catalog_products")
+            conn.close()
+            self._seen = current
+        return self._rows
+
+
+def _worker_main(db_path, requests, writes, responses, version):
+    dollmart.DB_PATH = db_path
+    cache = CatalogCache(version)
+
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+
+        request_id, operation, args = item
+        if operation in WRITE_OPERATIONS:
+            writes.put(item)
+            continue
+
+        try:
+            responses.put((request_id, True, READ_OPERATIONS[operation](cache, *args)))
+        except Exception as e:
+            responses.put((request_id, False, e))
+
+
+def _writer_main(db_path, writes, responses, version):
+    dollmart.DB_PATH = db_path
+
+    while True:
+        item = writes.get()
+        if item is None:
+            return
+
+        request_id, operation, args = item
+        try:
+            result = retry_locked(dollmart.run_write, WRITE_OPERATIONS[operation], *args)
+        except Exception as e:
+            responses.put((request_id, False, e))
+            continue
+
+        if operation in CATALOG_WRITES:
+            with version.get_lock():
+                version.value += 1
+        responses.put((request_id, True, result))
+
+
+class Supervisor:
+    """Runs N reader worker processes and one writer process on a WAL-mode database
+
+    Requests are submitted by operation name (see READ_OPERATIONS and
+    WRITE_OPERATIONS) and answered through futures. `catalog_version` is the
+    shared invalidation channel: the writer bumps it after stock-changing
+    writes and every worker reloads its cached catalog when it moves.
+    """
+
+    def __init__(self, num_workers=None, db_path=None):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.db_path = db_path or dollmart.DB_PATH
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._processes = []
+        self._writer = None
+        self._dispatcher = None
+
+    def start(self):
+        dollmart.enable_wal(self.db_path)
+
+        context = multiprocessing.get_context()
+        self._requests = context.Queue()
+        self._writes = context.Queue()
+        self._responses = context.Queue()
+        self.catalog_version = context.Value("q", 0)
+
+        self._writer = context.Process(
+            target=_writer_main,
+            args=(self.db_path, self._writes, self._responses, self.catalog_version),
+            daemon=True
+        )
+        self._writer.start()
+
+        for _ in range(self.num_workers):
+            process = context.Process(
+                target=_worker_main,
+                args=(self.db_path, self._requests, self._writes, self._responses, self.catalog_version),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        return self
+
+    def _dispatch(self):
+        while True:
+            item = self._responses.get()
+            if item is None:
+                return
+
+            request_id, ok, value = item
+            with self._lock:
+                future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def submit(self, operation, *args):
+        """Queue a request and return a Future for its result"""
+        if operation not in READ_OPERATIONS and operation not in WRITE_OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation}")
+
+        request_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._pending[request_id] = future
+        self._requests.put((request_id, operation, args))
+        return future
+
+    def call(self, operation, *args, timeout=None):
+        """Submit a request and wait for its result"""
+        return self.submit(operation, *args).result(timeout)
+
+    def invalidate_catalog(self):
+        """Tell every worker to reload the catalog, e.g. after an admin edit"""
+        with self.catalog_version.get_lock():
+            self.catalog_version.value += 1
+
+    def stop(self):
+        """Let in-flight requests finish, then shut every process down"""
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join()
+
+        self._writes.put(None)
+        self._writer.join()
+
+        self._responses.put(None)
+        self._dispatcher.join()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import time
+import queue
+from concurrent.futures import Future
+
+
+class GroupCommitQueue:
+    """Coalesces concurrent write operations into shared transactions
+
+    A single writer thread owns the database connection. Submitted operations
+    are collected until `max_batch` are waiting or `max_delay` seconds have
+    passed since the first one arrived, then run back to back inside one
+    transaction and committed together, so many checkouts share one fsync.
+
+    Each operation runs in its own SAVEPOINT: one that raises is rolled back
+    on its own and its future receives the exception, while the rest of the
+    batch still commits. Operations are called as `operation(conn, *args)`
+    and must not call `conn.commit()` themselves.
+    """
+
+    _STOP = object()
+
+    def __init__(self, connect, max_batch=500, max_delay=0.005):
+        """
+        Args:
+            connect: Function returning a new connection to the database
+                (e.g. dollmart.connect_db); the writer thread opens its
+                one connection with it and manages transactions itself
+            max_batch: Most operations committed together in one transaction
+            max_delay: Longest time in seconds an operation waits for its batch
+        """
+        self.connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches_committed = 0
+        self.operations_committed = 0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="dollmart-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args):
+        """Queue a write operation
+
+        Returns:
+            A concurrent.futures.Future resolved with the operation's return
+            value once its batch has been committed
+        """
+        if self._closed:
+            raise RuntimeError("GroupCommitQueue is closed")
+
+        future = Future()
+        self._queue.put((future, operation, args))
+        return future
+
+    def close(self):
+        """Flush everything already submitted and stop the writer thread"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is self._STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        conn = self.connect()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+
+            results = []
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for future, operation, args in batch:
+                    cursor.execute("SAVEPOINT op")
+                    try:
+                        results.append((future, True, operation(conn, *args)))
+                        cursor.execute("RELEASE op")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO op")
+                        cursor.execute("RELEASE op")
+                        results.append((future, False, e))
+                cursor.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                for future, _, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_committed += 1
+            for future, ok, value in results:
+                if ok:
+                    self.operations_committed += 1
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+        conn.close()
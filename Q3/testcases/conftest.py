@@ -0,0 +1,22 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Run the test against a brand new dollmart.db in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    dollmart.setup_database()
+    dollmart.configure_login_limits()
+    dollmart.configure_delivery()
+    dollmart.configure_dashboard()
+    dollmart.configure_storage()
+    dollmart.configure_replica(None)
+    dollmart.configure_query_cache()
+    yield tmp_path
+    dollmart.configure_storage()
+    dollmart.configure_replica(None)
@@ -0,0 +1,91 @@
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from archive import OrderArchive
+
+
+def _add_order(cursor, user_id, order_date, status):
+    cursor.execute(
+        "INSERT INTO orders (user_id, order_date, status, total_amount, estimated_delivery) VALUES (?, ?, ?, ?, ?)",
+        (user_id, order_date, status, 598, order_date[:16])
+    )
+    order_id = cursor.lastrowid
+    cursor.execute(
+        "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+        (order_id, 1, 2, 299)
+    )
+    return order_id
+
+@pytest.fixture
+def orders(fresh_db):
+    conn = sqlite3.connect('dollmart.db')
+    cursor = conn.cursor()
+    ids = {
+        "old_jan": _add_order(cursor, 1, "2024-01-10 09:00:00", "Delivered"),
+        "old_feb": _add_order(cursor, 1, "2024-02-10 09:00:00", "Delivered"),
+        "other_user": _add_order(cursor, 2, "2024-02-11 09:00:00", "Delivered"),
+        "recent": _add_order(cursor, 1, "2099-01-01 09:00:00", "Delivered"),
+        "in_transit": _add_order(cursor, 1, "2024-01-11 09:00:00", "Out for Delivery"),
+    }
+    conn.commit()
+    conn.close()
+    return ids
+
+def test_archive_moves_old_delivered_orders(orders):
+    assert dollmart.archive_delivered_orders(30) == 3
+
+    conn = sqlite3.connect('dollmart.db')
+    remaining = {row[0] for row in conn.execute("SELECT id FROM orders")}
+    items = conn.execute("SELECT COUNT(*) FROM order_items").fetchone()[0]
+    conn.close()
+    assert remaining == {orders["recent"], orders["in_transit"]}
+    assert items == 2
+
+    assert os.path.exists("archive/orders-2024-01.jsonl.gz")
+    assert os.path.exists("archive/orders-2024-02.jsonl.gz")
+    assert dollmart.archive_delivered_orders(30) == 0
+
+def test_archived_orders_are_served_from_index(orders):
+    dollmart.archive_delivered_orders(30)
+
+    record = dollmart.get_archive().find(orders["old_feb"])
+    assert record["items"] == [{"product_id": 1, "name": "Rice", "quantity": 2, "price": 299}]
+    assert dollmart.get_archive().find(orders["recent"]) is None
+
+    history = dollmart.get_archive().orders_for_user(1)
+    assert [r["id"] for r in history] == [orders["old_feb"], orders["old_jan"]]
+    assert dollmart.get_archive().count_for_user(2) == 1
+
+def test_view_order_details_falls_back_to_archive(orders, capsys):
+    dollmart.archive_delivered_orders(30)
+
+    dollmart.Customer(1, "admin").view_order_details(orders["old_jan"])
+    assert "(archived)" in capsys.readouterr().out
+
+    dollmart.Customer(1, "admin").view_order_details(orders["other_user"])
+    assert "doesn't belong to you" in capsys.readouterr().out
+
+def test_partitions_are_appended_not_rewritten(fresh_db):
+    archive = OrderArchive("archive")
+    conn = sqlite3.connect('dollmart.db')
+    cursor = conn.cursor()
+    first = _add_order(cursor, 1, "2024-03-01 09:00:00", "Delivered")
+    second = _add_order(cursor, 1, "2024-03-02 09:00:00", "Delivered")
+    conn.commit()
+    assert archive.archive(conn, "2024-12-31 00:00:00") == 1
+    size = os.path.getsize("archive/orders-2024-03.jsonl.gz")
+
+    third = _add_order(cursor, 1, "2024-03-03 09:00:00", "Delivered")
+    conn.commit()
+    assert archive.archive(conn, "2024-12-31 00:00:00") == 1
+    conn.close()
+
+    assert third > second
+    assert os.path.getsize("archive/orders-2024-03.jsonl.gz") > size
+    assert archive.find(first)["id"] == first
+    assert archive.find(second)["id"] == second
+    assert archive.find(third) is None
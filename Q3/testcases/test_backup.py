@@ -0,0 +1,141 @@
+import pytest
+import datetime
+import gzip
+import sqlite3
+import threading
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import backup
+
+
+CART = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+
+
+def count(path, table):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return rows
+
+def unpack(snapshot, path):
+    with gzip.open(snapshot, "rb") as source, open(path, "wb") as target:
+        target.write(source.read())
+    return path
+
+def orders_without_items(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT COUNT(*) FROM orders WHERE id NOT IN (SELECT order_id FROM order_items)").fetchone()[0]
+    conn.close()
+    return rows
+
+def checkouts_running(stop):
+    def run():
+        while not stop.is_set():
+            dollmart.run_write(dollmart.insert_order, 1, CART, 299)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def stocked(fresh_db):
+    conn = sqlite3.connect('dollmart.db')
+    conn.execute("UPDATE products SET stock = 1000000")
+    conn.executemany("INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, 'Bulk', 100, 0, 0)",
+                     [(f"Filler {i}",) for i in range(3000)])
+    conn.commit()
+    conn.close()
+    return fresh_db
+
+def test_backup_and_restore_round_trip(stocked):
+    dollmart.run_write(dollmart.insert_order, 1, CART, 299)
+    [result] = dollmart.backup_database(str(stocked / "backups"))
+    assert result.path.endswith(".db.gz") and result.snapshot_bytes < result.database_bytes
+    assert backup.list_snapshots(str(stocked / "backups")) == [(backup.list_snapshots(str(stocked / "backups"))[0].taken_at, result.path)]
+
+    conn = sqlite3.connect('dollmart.db')
+    conn.execute("DELETE FROM order_items")
+    conn.execute("DELETE FROM orders")
+    conn.commit()
+    conn.close()
+
+    backup.restore(result.path, 'dollmart.db')
+    assert count('dollmart.db', "orders") == 1
+    assert count('dollmart.db.pre-restore', "orders") == 0
+
+@pytest.mark.parametrize("wal", [True, False])
+def test_online_backup_during_checkouts_is_consistent(stocked, wal):
+    if wal:
+        dollmart.enable_wal()
+    stop = threading.Event()
+    writer = checkouts_running(stop)
+    try:
+        result = backup.take_snapshot('dollmart.db', str(stocked / "backups"), pages=4, sleep=0.001)
+    finally:
+        stop.set()
+        writer.join()
+
+    copy = unpack(result.path, str(stocked / "copy.db"))
+    assert orders_without_items(copy) == 0
+    assert count(copy, "orders") <= count('dollmart.db', "orders")
+    if wal:
+        assert result.restarts == 0
+    else:
+        assert result.restarts <= backup.MAX_RESTARTS + 1
+
+def test_snapshot_at_and_prune(tmp_path):
+    for stamp in ("20250101-000000-000000", "20250102-000000-000000", "20250103-000000-000000"):
+        (tmp_path / f"dollmart-{stamp}.db.gz").write_bytes(b"")
+    (tmp_path / "shard-000-20250102-120000-000000.db.gz").write_bytes(b"")
+
+    assert backup.snapshot_at(str(tmp_path), datetime.datetime(2025, 1, 2, 12)).taken_at == datetime.datetime(2025, 1, 2)
+    assert backup.snapshot_at(str(tmp_path), datetime.datetime(2024, 12, 31)) is None
+    assert len(backup.prune(str(tmp_path), 1)) == 2
+    assert [s.taken_at.day for s in backup.list_snapshots(str(tmp_path))] == [3]
+    assert len(backup.list_snapshots(str(tmp_path), "shard-000")) == 1
+
+def test_bad_snapshot_leaves_database_alone(fresh_db):
+    bad = fresh_db / "dollmart-20250101-000000-000000.db.gz"
+    with gzip.open(bad, "wb") as snapshot:
+        snapshot.write(b"not a database" * 100)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        backup.restore(str(bad), 'dollmart.db')
+    assert count('dollmart.db', "products") == 7
+    assert not os.path.exists('dollmart.db.restoring')
+
+def test_restore_moves_leftover_wal_aside(stocked):
+    dollmart.enable_wal()
+    [result] = dollmart.backup_database(str(stocked / "backups"))
+
+    # A WAL left behind by a crash, holding a delete that never reached dollmart.db
+    holder = sqlite3.connect('dollmart.db')
+    holder.execute("PRAGMA wal_autocheckpoint = 0")
+    holder.execute("DELETE FROM products WHERE category = 'Bulk'")
+    holder.commit()
+    with open('dollmart.db-wal', 'rb') as wal:
+        leftover = wal.read()
+    holder.close()
+    with open('dollmart.db-wal', 'wb') as wal:
+        wal.write(leftover)
+
+    backup.restore(result.path, 'dollmart.db')
+    assert not os.path.exists('dollmart.db-wal')
+    assert os.path.exists('dollmart.db.pre-restore-wal')
+    assert count('dollmart.db', "products") == 3007
+
+def test_sharded_backup_covers_every_file(stocked):
+    dollmart.configure_sharding(2, str(stocked / "shards"))
+    try:
+        results = dollmart.backup_database(str(stocked / "backups"))
+    finally:
+        dollmart.configure_sharding(0)
+    assert sorted(os.path.basename(r.path).rsplit("-", 3)[0] for r in results) == ["dollmart", "shard-000", "shard-001"]
+
+def test_backup_command(stocked, monkeypatch, capsys):
+    monkeypatch.setenv("DOLLMART_BACKUP_DIR", str(stocked / "nightly"))
+    dollmart.main(["backup"])
+    assert "nightly" in capsys.readouterr().out
+    assert len(backup.list_snapshots(str(stocked / "nightly"))) == 1
@@ -0,0 +1,124 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+from bulkorder import parse_order_sheet
+
+
+def add_products(count, stock=1000):
+    conn = dollmart.connect_db()
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
+        [(f"Item {i}", f"Category {i % 10}", 100 + i, stock, 0.05) for i in range(count)]
+    )
+    conn.commit()
+    ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE name LIKE 'Item %' ORDER BY id")]
+    conn.close()
+    return ids
+
+def stock_of(product_id):
+    conn = dollmart.connect_db()
+    stock = conn.execute("SELECT stock FROM products WHERE id = ?", (product_id,)).fetchone()[0]
+    conn.close()
+    return stock
+
+def test_parse_order_sheet():
+    sheet = ["product_id,quantity", "", "# pallet one", "1,10", " 2 , 5", "1,3"]
+    assert parse_order_sheet(sheet) == {1: 13, 2: 5}
+    assert parse_order_sheet(["1,10"]) == {1: 10}
+
+    with pytest.raises(ValueError, match="Line 3"):
+        parse_order_sheet(["product_id,quantity", "1,10", "x,1"])
+    with pytest.raises(ValueError, match="positive"):
+        parse_order_sheet(["1,0"])
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_order_sheet(["1,2,3"])
+
+def test_bulk_order_cart_reports_every_bad_line(fresh_db):
+    cart, problems = dollmart.bulk_order_cart({1: 5, 999: 1, 4: 10000})
+
+    assert cart == {1: {"name": "Rice", "price": 299, "quantity": 5}}
+    assert problems == [
+        "Product 999 not found.",
+        "Product 4 (Smartphone): only 10 units available.",
+    ]
+
+def test_bulk_order_validates_with_one_query(fresh_db):
+    ids = add_products(500)
+    instrument.reset()
+    instrument.enable()
+    try:
+        cart, problems = dollmart.bulk_order_cart({product_id: 2 for product_id in ids})
+    finally:
+        instrument.disable()
+
+    assert len(cart) == 500 and not problems
+    assert [summary["count"] for summary in instrument.metrics()["queries"].values()] == [1]
+    instrument.reset()
+
+def test_ten_thousand_line_order_in_one_transaction(fresh_db):
+    ids = add_products(10000)
+    user_id = dollmart.run_write(dollmart.create_customer, "bigstore", "x", 1)[0]
+
+    cart, problems = dollmart.bulk_order_cart({product_id: 3 for product_id in ids})
+    quote = dollmart.quote_cart(cart, True)
+    order_id, _, _, _ = dollmart.place_bulk_order(user_id, cart, quote)
+
+    conn = dollmart.connect_db()
+    assert conn.execute("SELECT COUNT(*), SUM(quantity) FROM order_items WHERE order_id = ?", (order_id,)).fetchone() == (10000, 30000)
+    assert conn.execute("SELECT total_amount FROM orders WHERE id = ?", (order_id,)).fetchone()[0] == quote.total
+    assert conn.execute("SELECT COUNT(*) FROM products WHERE name LIKE 'Item %' AND stock != 997").fetchone()[0] == 0
+    conn.close()
+    assert quote.bulk_discount > 0
+
+def test_bulk_order_rolls_back_when_stock_runs_out(fresh_db):
+    user_id = dollmart.run_write(dollmart.create_customer, "store", "x", 1)[0]
+    cart, _ = dollmart.bulk_order_cart({1: 40, 2: 40})
+
+    conn = dollmart.connect_db()
+    conn.execute("UPDATE products SET stock = 10 WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(ValueError, match="Stock changed"):
+        dollmart.place_bulk_order(user_id, cart, dollmart.quote_cart(cart, True))
+
+    assert stock_of(1) == 100 and stock_of(2) == 10
+    conn = dollmart.connect_db()
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+    conn.close()
+
+def test_customer_bulk_order_from_sheet(fresh_db, monkeypatch, capsys):
+    user_id = dollmart.run_write(dollmart.create_customer, "store", "x", 1)[0]
+    sheet = fresh_db / "sheet.csv"
+    sheet.write_text("product_id,quantity\n1,30\n2,25\n")
+
+    answers = iter([str(sheet), "y"])
+    monkeypatch.setattr('builtins.input', lambda _: next(answers))
+    dollmart.Customer(user_id, "store", 1).bulk_order()
+
+    out = capsys.readouterr().out
+    assert "Units: 55" in out and "Bulk order placed successfully!" in out
+    assert stock_of(1) == 70 and stock_of(2) == 25
+
+    dollmart.Customer(1, "someone", 0).bulk_order()
+    assert "retail store customers" in capsys.readouterr().out
+
+def test_cart_quantity_is_kept_up_to_date(fresh_db, monkeypatch):
+    customer = dollmart.Customer(1, "someone", 0)
+    customer.add_to_cart(1, 2)
+    customer.add_to_cart(2, 5)
+    customer.add_to_cart(1, 3)
+    assert customer.calculate_total_quantity() == 10
+
+    customer.update_cart(2, 1)
+    assert customer.calculate_total_quantity() == 6
+    customer.remove_from_cart(1)
+    assert customer.calculate_total_quantity() == 1
+
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    customer.place_order()
+    assert customer.calculate_total_quantity() == 0
@@ -0,0 +1,201 @@
+import pytest
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import queries
+from categories import band_label, category_tree, category_page, facets, rebuild_counts, PRICE_BANDS
+
+
+def facet_rows(conn):
+    return conn.execute(
+        "SELECT category, price_band, in_stock, count FROM category_facets WHERE count != 0 ORDER BY 1, 2, 3"
+    ).fetchall()
+
+def add_products(conn, category, count, rng):
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, 0)",
+        [(f"{category} {rng.randint(0, 999):03d}", category, rng.choice([99, 499, 1500, 2500, 60000]), rng.choice([0, 5]))
+         for _ in range(count)]
+    )
+
+def test_tree_counts_include_subcategories(fresh_db):
+    dollmart.set_category_parent("Groceries", "Food")
+    dollmart.set_category_parent("Food", "Everything")
+    dollmart.set_category_parent("Electronics", "Everything")
+
+    conn = dollmart.connect_db()
+    conn.execute("UPDATE products SET stock = 0 WHERE id = 1")
+    tree = [(node.depth, node.name, node.product_count, node.in_stock_count) for node in category_tree(conn)]
+    conn.close()
+
+    assert tree == [
+        (0, "Everything", 5, 4),
+        (1, "Electronics", 2, 2),
+        (1, "Food", 3, 2),
+        (2, "Groceries", 3, 2),
+        (0, "Personal Care", 2, 2),
+    ]
+
+    with pytest.raises(ValueError, match="own ancestor"):
+        dollmart.set_category_parent("Everything", "Groceries")
+    dollmart.set_category_parent("Food")
+    conn = dollmart.connect_db()
+    assert [node.name for node in category_tree(conn) if node.depth == 0] == ["Everything", "Food", "Personal Care"]
+    conn.close()
+
+def test_triggers_keep_counts_equal_to_a_rebuild(fresh_db):
+    rng = random.Random(3)
+    conn = dollmart.connect_db()
+    add_products(conn, "Garden", 30, rng)
+    for _ in range(300):
+        product_id = rng.choice([row[0] for row in conn.execute("SELECT id FROM products")])
+        action = rng.randrange(5)
+        if action == 0:
+            conn.execute("UPDATE products SET price = ? WHERE id = ?", (rng.choice([50, 700, 3000, 20000, 90000]), product_id))
+        elif action == 1:
+            conn.execute("UPDATE products SET stock = ? WHERE id = ?", (rng.choice([0, 1, 10]), product_id))
+        elif action == 2:
+            conn.execute("UPDATE products SET category = ? WHERE id = ?", (rng.choice(["Garden", "Tools", "Groceries"]), product_id))
+        elif action == 3:
+            queries.run(conn, "decrement_stock", (1, product_id))
+        else:
+            add_products(conn, rng.choice(["Garden", "Tools"]), 1, rng)
+    conn.execute("DELETE FROM products WHERE id IN (SELECT id FROM products ORDER BY random() LIMIT 5)")
+
+    incremental = facet_rows(conn)
+    rebuild_counts(conn)
+    assert facet_rows(conn) == incremental
+    assert sum(row[3] for row in incremental) == conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    conn.close()
+
+def test_checkout_that_sells_out_updates_in_stock_count(fresh_db):
+    cart = {5: {"name": "Laptop", "price": 89999, "quantity": 5}}
+    dollmart.run_write(dollmart.insert_order, 1, cart, 5 * 89999)
+
+    conn = dollmart.connect_db()
+    assert facets(conn, "Electronics")["products"] == 2
+    assert facets(conn, "Electronics")["in_stock"] == 1
+    conn.close()
+
+def test_keyset_pages_match_a_full_sort(fresh_db):
+    conn = dollmart.connect_db()
+    add_products(conn, "Garden", 47, random.Random(5))
+    everything = conn.execute("SELECT id, name, price, stock FROM products WHERE category = 'Garden'").fetchall()
+
+    for sort, key in (("price", lambda row: (row[2], row[0])), ("name", lambda row: (row[1], row[0]))):
+        for in_stock_only in (False, True):
+            for band in (None, 1, 4):
+                expected = sorted(
+                    (row for row in everything
+                     if (not in_stock_only or row[3] > 0)
+                     and (band is None or PRICE_BANDS[band][0] <= row[2] < (PRICE_BANDS[band][1] or 2 ** 62))),
+                    key=key
+                )
+                seen, after = [], None
+                while True:
+                    page = category_page(conn, "Garden", sort, after, in_stock_only, band, page_size=10)
+                    assert page.total == len(expected)
+                    seen.extend(page.products)
+                    if page.next_key is None:
+                        break
+                    after = page.next_key
+                assert seen == expected
+    conn.close()
+
+def test_parent_pages_include_subcategories(fresh_db):
+    conn = dollmart.connect_db()
+    rng = random.Random(7)
+    for category in ("Garden", "Seeds", "Bulbs"):
+        add_products(conn, category, 13, rng)
+    conn.commit()
+    dollmart.set_category_parent("Seeds", "Garden")
+    dollmart.set_category_parent("Bulbs", "Seeds")
+    everything = conn.execute(
+        "SELECT id, name, price, stock FROM products WHERE category IN ('Garden', 'Seeds', 'Bulbs')"
+    ).fetchall()
+
+    node = [node for node in category_tree(conn) if node.name == "Garden"][0]
+    assert facets(conn, "Garden")["products"] == node.product_count == 39
+    for sort, key in (("price", lambda row: (row[2], row[0])), ("name", lambda row: (row[1], row[0]))):
+        seen, after = [], None
+        while True:
+            page = category_page(conn, "Garden", sort, after, page_size=10)
+            assert page.total == 39
+            seen.extend(page.products)
+            if page.next_key is None:
+                break
+            after = page.next_key
+        assert seen == sorted(everything, key=key)
+
+    assert category_page(conn, "Bulbs", in_stock_only=True).total == facets(conn, "Bulbs")["in_stock"] < 39
+    conn.close()
+
+def test_listing_pages_read_the_index_without_sorting(fresh_db):
+    conn = dollmart.connect_db()
+    for name in ("category_page_by_price", "category_page_by_name", "category_facet_counts"):
+        plan = " ".join(queries.explain(conn, name))
+        assert "TEMP B-TREE" not in plan and "SCAN products" not in plan, plan
+    assert "idx_products_category_name_price" in " ".join(queries.explain(conn, "category_page_by_name"))
+    conn.close()
+
+def test_band_labels_are_half_open():
+    assert [band_label(band) for band in range(len(PRICE_BANDS))] == [
+        "$0.00 to under $5.00", "$5.00 to under $20.00", "$20.00 to under $100.00",
+        "$100.00 to under $500.00", "$500.00 and up",
+    ]
+
+def test_schema_12_replaces_the_name_listing_index(fresh_db):
+    conn = dollmart.connect_db()
+    conn.executescript("""
+        DROP INDEX idx_products_category_name_price;
+        CREATE INDEX idx_products_category_name ON products (category, name);
+        PRAGMA user_version = 11;
+    """)
+    conn.close()
+
+    dollmart.ensure_database()
+
+    conn = dollmart.connect_db()
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'products'")}
+    assert {"idx_products_category_price", "idx_products_category_name_price"} <= indexes
+    assert "idx_products_category_name" not in indexes
+    conn.close()
+
+def test_browse_products_pages_and_adds_to_cart(fresh_db, monkeypatch, capsys):
+    conn = dollmart.connect_db()
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, 'Garden', ?, 10, 0)",
+        [(f"Seed {i:02d}", 100 + i) for i in range(15)]
+    )
+    conn.commit()
+    seed_14 = conn.execute("SELECT id FROM products WHERE name = 'Seed 14'").fetchone()[0]
+    conn.close()
+
+    answers = iter(["2", "n", str(seed_14), "2"])
+    monkeypatch.setattr('builtins.input', lambda _: next(answers))
+    customer = dollmart.Customer(1, "someone", 0)
+    customer.browse_products()
+
+    out = capsys.readouterr().out
+    assert "2. Garden (15 products, 15 in stock)" in out
+    assert "Page 1 of 2 (15 products)" in out and "Page 2 of 2 (15 products)" in out
+    assert "Price ranges: $0.00 to under $5.00 (15)" in out
+    assert customer.cart[seed_14]["quantity"] == 2
+
+def test_ensure_database_builds_counts_for_existing_catalog(fresh_db):
+    conn = dollmart.connect_db()
+    conn.executescript("DROP TRIGGER products_facets_insert; DROP TABLE category_facets; DROP TABLE categories; PRAGMA user_version = 4;")
+    conn.execute("INSERT INTO products (name, category, price, stock, bulk_discount) VALUES ('Rake', 'Garden', 1999, 3, 0)")
+    conn.commit()
+    conn.close()
+
+    dollmart.ensure_database()
+
+    conn = dollmart.connect_db()
+    assert [(node.name, node.product_count) for node in category_tree(conn)] == [
+        ("Electronics", 2), ("Garden", 1), ("Groceries", 3), ("Personal Care", 2)
+    ]
+    conn.close()
@@ -0,0 +1,201 @@
+import pytest
+import sqlite3
+import sys
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+
+
+RICE = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, fresh_db):
+    dollmart.configure_storage(request.param, load=True)
+    yield request.param
+
+
+def register(username):
+    return dollmart.run_write(dollmart.create_customer, username, "x", 0)
+
+def race(threads, function):
+    """Call function(i) on every thread at once; exceptions are returned, not raised"""
+    barrier = threading.Barrier(threads)
+
+    def run(i):
+        barrier.wait()
+        try:
+            return function(i)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(run, range(threads)))
+
+def read(function):
+    with dollmart.open_storage() as repos:
+        return function(repos)
+
+
+def test_concurrent_checkouts_redeem_a_coupon_once(backend):
+    for round in range(10):
+        user_id, coupon_id, _ = register(f"shopper{round}")
+        results = race(12, lambda i: dollmart.checkout(user_id, RICE, 269, coupon_id, f"request-{i}"))
+
+        placed = [result for result in results if isinstance(result, dollmart.CheckoutResult)]
+        assert len(placed) == 1
+        assert all(isinstance(result, dollmart.CouponUnavailable) for result in results if result not in placed)
+        assert [order.id for order in read(lambda repos: repos.orders.for_user(user_id))] == [placed[0].order_id]
+        assert read(lambda repos: repos.coupons.available(coupon_id, user_id)) is None
+
+    assert read(lambda repos: repos.products.for_cart(1)).stock == 90
+
+
+def test_concurrent_retries_place_one_order(backend):
+    user_id = register("shopper")[0]
+    results = race(8, lambda i: dollmart.checkout(user_id, RICE, 299, None, "retry-me"))
+
+    assert all(isinstance(result, dollmart.CheckoutResult) for result in results)
+    assert len({result.order_id for result in results}) == 1
+    assert [result.replayed for result in results].count(False) == 1
+    assert len(read(lambda repos: repos.orders.for_user(user_id))) == 1
+    assert read(lambda repos: repos.products.for_cart(1)).stock == 99
+
+
+def test_retry_returns_the_original_order(backend):
+    user_id, coupon_id, _ = register("shopper")
+    first = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+    again = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+
+    assert not first.replayed and again.replayed
+    assert again[:4] == first[:4] == (first.order_id, first.order_date, first.estimated_delivery, 1)
+    assert again.loyalty_coupon_code is None
+
+    # Keys belong to a customer, so another customer's identical key is a new checkout
+    other = register("other")[0]
+    assert dollmart.checkout(other, RICE, 299, None, "key").order_id != first.order_id
+
+
+def test_retry_after_the_order_was_archived_replays_it(fresh_db):
+    user_id = register("shopper")[0]
+    first = dollmart.checkout(user_id, RICE, 299, None, "key")
+    # The newest order always stays hot
+    latest = dollmart.checkout(user_id, RICE, 299, None, "later")
+    conn = dollmart.connect_db()
+    conn.execute("UPDATE orders SET status = 'Delivered', order_date = '2024-01-10 09:00:00' WHERE id = ?",
+                 (first.order_id,))
+    conn.commit()
+    conn.close()
+    assert dollmart.archive_delivered_orders(30) == 1
+
+    again = dollmart.checkout(user_id, RICE, 299, None, "key")
+    assert again.replayed
+    assert again[:4] == (first.order_id, first.order_date, first.estimated_delivery, 2)
+    assert [order.id for order in read(lambda repos: repos.orders.for_user(user_id))] == [latest.order_id]
+
+
+def test_requests_from_before_schema_11_get_their_orders_dates(fresh_db):
+    user_id = register("shopper")[0]
+    first = dollmart.checkout(user_id, RICE, 299, None, "key")
+    conn = dollmart.connect_db()
+    conn.executescript("""
+        CREATE TABLE old_requests AS SELECT user_id, idempotency_key, order_id, created_at FROM checkout_requests;
+        DROP TABLE checkout_requests;
+        ALTER TABLE old_requests RENAME TO checkout_requests;
+        PRAGMA user_version = 10;
+    """)
+    conn.close()
+
+    dollmart.ensure_database()
+    assert dollmart.checkout(user_id, RICE, 299, None, "key")[:3] == first[:3]
+
+
+def test_retry_with_a_coupon_that_raced_the_original_replays_it(backend, monkeypatch):
+    user_id, coupon_id, _ = register("shopper")
+    first = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+
+    # The retry looked for its key before the original committed, then found the coupon redeemed
+    orders = type(read(lambda repos: repos.orders))
+    by_request = orders.by_request
+    lookups = []
+
+    def stale(self, *args):
+        lookups.append(args)
+        return None if len(lookups) == 1 else by_request(self, *args)
+
+    monkeypatch.setattr(orders, "by_request", stale)
+    again = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+    assert again.replayed and again[:4] == first[:4]
+    assert len(read(lambda repos: repos.orders.for_user(user_id))) == 1
+
+    # Without a matching key the coupon is still refused
+    with pytest.raises(dollmart.CouponUnavailable):
+        dollmart.checkout(user_id, RICE, 269, coupon_id, "other-key")
+
+
+def test_used_coupon_rolls_back_the_order(backend):
+    user_id, coupon_id, _ = register("shopper")
+    assert dollmart.apply_coupon(user_id, coupon_id, 299)[0]
+
+    with pytest.raises(dollmart.CouponUnavailable):
+        dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+    assert read(lambda repos: repos.orders.for_user(user_id)) == []
+    assert read(lambda repos: repos.products.for_cart(1)).stock == 100
+
+    # The failed attempt did not record its key
+    assert not dollmart.checkout(user_id, RICE, 299, None, "key").replayed
+
+
+def test_locked_database_is_retried_only_with_a_key(fresh_db, monkeypatch):
+    user_id = register("shopper")[0]
+    run_write = dollmart.run_write
+    failures = []
+
+    def flaky(operation, *args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return run_write(operation, *args, **kwargs)
+
+    monkeypatch.setattr(dollmart, "run_write", flaky)
+    assert not dollmart.checkout(user_id, RICE, 299, None, "key").replayed
+    assert len(failures) == 2
+
+    failures.clear()
+    with pytest.raises(sqlite3.OperationalError):
+        dollmart.checkout(user_id, RICE, 299)
+
+
+def test_sharded_checkout_replays_from_the_shard(fresh_db):
+    dollmart.configure_sharding(2)
+    try:
+        user_id, coupon_id, _ = register("shopper")
+        first = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+        again = dollmart.checkout(user_id, RICE, 269, coupon_id, "key")
+        assert again.replayed and again.order_id == first.order_id
+        assert dollmart.SHARD_ROUTER.shard_for_id(first.order_id) == dollmart.SHARD_ROUTER.shard_for_user(user_id)
+    finally:
+        dollmart.configure_sharding(0)
+
+
+def test_place_order_when_the_coupon_is_taken_meanwhile(fresh_db, monkeypatch, capsys):
+    user_id, coupon_id, _ = register("shopper")
+    customer = dollmart.Customer(user_id, "shopper")
+    customer.add_to_cart(1, 2)
+
+    def answer(prompt):
+        if prompt.startswith("\nConfirm"):
+            # Another session redeems the coupon between choosing it and confirming
+            dollmart.apply_coupon(user_id, coupon_id, 598)
+            return "y"
+        return {"\nWould": "y", "\nEnter": str(coupon_id)}[prompt[:6]]
+
+    monkeypatch.setattr('builtins.input', answer)
+    customer.place_order()
+
+    assert "No order was placed" in capsys.readouterr().out
+    assert read(lambda repos: repos.orders.for_user(user_id)) == []
+    assert customer.cart
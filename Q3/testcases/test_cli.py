@@ -0,0 +1,112 @@
+import pytest
+import io
+import json
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import cli
+
+
+def run(*argv):
+    out = io.StringIO()
+    status = cli.main(list(argv), out)
+    return status, out.getvalue().splitlines()
+
+def register(username):
+    return dollmart.run_write(dollmart.create_customer, username, "x", 0)[0]
+
+def place(user_id, order_date):
+    def insert(conn):
+        return conn.execute(
+            "INSERT INTO orders (user_id, order_date, status, total_amount, estimated_delivery) VALUES (?, ?, 'Processing', 199, '')",
+            (user_id, order_date)
+        ).lastrowid
+    return dollmart.run_write(insert, user_id=user_id)
+
+
+def test_products_list_tsv_and_jsonl(fresh_db):
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute("UPDATE products SET stock = 0 WHERE id = 2")
+    conn.execute("UPDATE products SET name = 'Brown\tBread\nLoaf' WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    status, lines = run("products", "list", "--category", "Groceries")
+    assert status == 0
+    assert lines == ["id\tname\tcategory\tprice\tstock", "1\tRice\tGroceries\t299\t100",
+                     "2\tMilk\tGroceries\t199\t0", "3\tBrown\\tBread\\nLoaf\tGroceries\t149\t30"]
+
+    status, lines = run("products", "list", "--in-stock", "--format", "jsonl")
+    rows = [json.loads(line) for line in lines]
+    assert [row["id"] for row in rows] == [1, 3, 4, 5, 6, 7]
+    assert rows[1]["name"] == "Brown\tBread\nLoaf"
+
+
+def test_orders_export_merges_shards_by_date(fresh_db, monkeypatch):
+    monkeypatch.setenv("DOLLMART_SHARDS", "2")
+    dollmart.configure_sharding(2)
+    try:
+        users = [register(f"shopper{i}") for i in range(4)]
+        assert len({dollmart.SHARD_ROUTER.shard_for_user(user_id) for user_id in users}) == 2
+        dates = ["2025-06-03 09:00:00", "2025-06-01 10:00:00", "2025-06-02 11:00:00", "2025-05-31 23:59:59"]
+        for user_id, order_date in zip(users, dates):
+            place(user_id, order_date)
+
+        status, lines = run("orders", "export", "--since", "2025-06-01", "--until", "2025-06-03", "--format", "jsonl")
+        rows = [json.loads(line) for line in lines]
+        assert status == 0
+        assert [(row["user_id"], row["order_date"]) for row in rows] == [(users[1], dates[1]), (users[2], dates[2])]
+
+        status, lines = run("orders", "export")
+        assert lines[0] == "id\tuser_id\torder_date\tstatus\ttotal_amount\testimated_delivery"
+        assert [line.split("\t")[2] for line in lines[1:]] == sorted(dates)
+    finally:
+        dollmart.configure_sharding(0)
+
+
+def test_orders_advance_lists_transitions(fresh_db):
+    user_id = register("shopper")
+    order_id = place(user_id, "2000-01-01 00:00:00")
+    place(user_id, "2999-01-01 00:00:00")
+
+    status, lines = run("orders", "advance", "--format", "jsonl")
+    assert status == 0
+    assert [json.loads(line) for line in lines] == [
+        {"order_id": order_id, "old_status": "Processing", "new_status": "Out for Delivery"}
+    ]
+    assert run("orders", "advance")[1] == ["order_id\told_status\tnew_status", f"{order_id}\tOut for Delivery\tDelivered"]
+
+
+def test_coupons_issue(fresh_db, monkeypatch, capsys):
+    first, second = register("first"), register("second")
+
+    status, lines = run("coupons", "issue", "--percent", "15", str(first), "1", "999", "bogus")
+    assert status == 1
+    assert len(lines) == 2
+    coupon_id, user_id, code, percent = lines[1].split("\t")
+    assert (int(user_id), percent) == (first, "15.0") and code.startswith("PROMO-")
+    assert capsys.readouterr().err.count("no coupon issued") == 3
+
+    monkeypatch.setattr(sys, "stdin", io.StringIO(f"{first}\n\n{second}\n"))
+    status, lines = run("coupons", "issue", "--percent", "5", "--prefix", "SPRING", "--format", "jsonl", "-")
+    assert status == 0
+    assert [json.loads(line)["user_id"] for line in lines] == [first, second]
+
+    conn = sqlite3.connect("dollmart.db")
+    assert conn.execute("SELECT COUNT(*) FROM coupons WHERE code LIKE 'SPRING-%' AND used = 0").fetchone()[0] == 2
+    conn.close()
+
+
+def test_coupons_issue_rejects_bad_percent(fresh_db):
+    assert run("coupons", "issue", "--percent", "150", "2")[0] == 2
+
+
+def test_commands_dispatch_from_main(fresh_db, capsys):
+    assert dollmart.main(["products", "list", "--category", "Electronics"]) == 0
+    assert capsys.readouterr().out.splitlines()[1:] == ["4\tSmartphone\tElectronics\t49999\t10",
+                                                         "5\tLaptop\tElectronics\t89999\t5"]
+    with pytest.raises(SystemExit):
+        dollmart.main(["products"])
@@ -0,0 +1,197 @@
+import pytest
+import datetime
+import sqlite3
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from dashboard import KpiCache, KpiSnapshot
+from sharding import SHARD_ID_RANGE
+
+
+RICE = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+NOON = datetime.datetime(2025, 6, 2, 12, 0).timestamp()
+
+
+class Clock:
+    def __init__(self, now=NOON):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def placed(order_id, user_id=1, order_date="2025-06-02 11:00:00", total=500, items=()):
+    return ("order_placed", {"order_id": order_id, "user_id": user_id, "order_date": order_date,
+                             "total_amount": total, "items": [dict(item) for item in items]})
+
+def moved(order_id, old_status, new_status):
+    return ("order_status_changed", {"order_id": order_id, "old_status": old_status, "new_status": new_status})
+
+
+@pytest.fixture
+def shop(fresh_db):
+    dollmart.configure_dashboard(background=False)
+    user_id = dollmart.run_write(dollmart.create_customer, "shopper", "x", 0)[0]
+    yield user_id
+
+
+def order(user_id, cart=RICE):
+    """Place an order the way the bulk order screen does, recording its events"""
+    quote = dollmart.quote_cart(cart, False)
+    return dollmart.place_bulk_order(user_id, cart, quote)[0]
+
+def full_count():
+    cache = KpiCache(dollmart.load_kpi_snapshot, background=False)
+    return cache.kpis()[1:-1]
+
+
+def test_events_move_the_counters():
+    snapshot = KpiSnapshot({7: 1000}, {7: "Processing", 6: "Out for Delivery"}, 40, {1: 100, 2: 8},
+                           {1: "2025-06-02 09:00:00", 2: "2025-05-01 10:00:00"}, {0: 7})
+    cache = KpiCache(lambda day, since: snapshot, low_stock_threshold=10, active_days=30, clock=Clock())
+    kpis = cache.kpis()
+    assert (kpis.day, kpis.orders_today, kpis.revenue_today, kpis.low_stock, kpis.active_customers) == (
+        "2025-06-02", 1, 1000, 1, 1
+    )
+    assert kpis.by_status == {"Processing": 1, "Out for Delivery": 1, "Delivered": 40}
+
+    events = [
+        placed(8, user_id=3, total=250, items=[{"product_id": 1, "quantity": 95}]),
+        moved(6, "Out for Delivery", "Delivered"),
+        moved(7, "Processing", "Out for Delivery"),
+        ("stock_changed", {"product_id": 2, "stock": 50}),
+        ("coupon_redeemed", {"coupon_id": 1}),
+    ]
+    # Every event applied twice: the second time changes nothing
+    for event_type, payload in events + events:
+        cache.apply(event_type, payload)
+
+    kpis = cache.kpis()
+    assert (kpis.orders_today, kpis.revenue_today, kpis.low_stock, kpis.active_customers) == (2, 1250, 1, 2)
+    assert kpis.by_status == {"Processing": 1, "Out for Delivery": 1, "Delivered": 41}
+
+
+def test_day_rolls_over_without_a_rebuild():
+    clock = Clock()
+    loads = []
+    cache = KpiCache(lambda day, since: loads.append(since) or KpiSnapshot({}, {}, 0, {}, {}, {}),
+                     refresh_interval=86400 * 10, active_days=2, clock=clock)
+    cache.kpis()
+    cache.apply(*placed(1, user_id=1))
+
+    clock.now += 86400
+    assert cache.kpis()[1:3] == (0, 0)
+    cache.apply(*placed(2, user_id=2, order_date="2025-06-03 08:00:00"))
+    assert cache.kpis().active_customers == 2
+
+    clock.now += 86400
+    assert cache.kpis().active_customers == 1
+    assert loads == ["2025-06-01"]
+
+
+def test_events_during_a_rebuild_are_replayed():
+    cache = None
+
+    def load(day, since):
+        # Order 2 commits before the rebuild reads it; order 3 after
+        cache.apply(*placed(2))
+        cache.apply(*placed(3))
+        return KpiSnapshot({1: 500, 2: 500}, {1: "Processing", 2: "Processing"}, 0, {}, {1: "2025-06-02 11:00:00"}, {0: 2})
+
+    cache = KpiCache(load, clock=Clock())
+    kpis = cache.kpis()
+    assert (kpis.orders_today, kpis.by_status["Processing"]) == (3, 3)
+
+
+def test_replay_skips_orders_the_rebuild_saw_delivered():
+    clock = Clock()
+    # Order 4 was placed yesterday and delivered within the replay window, by
+    # another process; order 5 was placed in the window after the copy was taken
+    snapshot = KpiSnapshot({}, {}, 1, {}, {}, {0: 4, 2 * SHARD_ID_RANGE: 2 * SHARD_ID_RANGE + 9})
+    cache = KpiCache(lambda day, since: snapshot, replay_seconds=60, clock=clock)
+    cache.kpis()
+    cache.apply(*placed(4, order_date="2025-06-01 23:59:59"))
+    cache.apply(*placed(5))
+    cache.apply(*placed(SHARD_ID_RANGE + 3))
+    clock.now += 30
+
+    cache.refresh()
+    kpis = cache.kpis()
+    assert kpis.by_status == {"Processing": 2, "Out for Delivery": 0, "Delivered": 1}
+    assert kpis.orders_today == 2
+
+
+def test_dashboard_follows_orders_without_rescanning(shop, monkeypatch):
+    cache = dollmart.get_kpi_cache()
+    assert cache.kpis()[1:-1] == full_count()
+
+    def no_scan(day, since):
+        raise AssertionError("the dashboard rescanned the orders table")
+    monkeypatch.setattr(cache, "load", no_scan)
+
+    first = order(shop)
+    order(shop, {4: {"name": "Headphones", "price": 4999, "quantity": 1}})
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute("UPDATE orders SET delivery_slot = '2000-01-01 08:00' WHERE id = ?", (first,))
+    conn.commit()
+    conn.close()
+    assert [change[0] for change in dollmart.update_order_statuses()] == [first]
+
+    kpis = cache.kpis()
+    assert (kpis.orders_today, kpis.active_customers, kpis.low_stock) == (2, 1, 2)
+    assert kpis.by_status == {"Processing": 1, "Out for Delivery": 1, "Delivered": 0}
+
+    # Counted by the events, the figures match a full recount
+    assert kpis[1:-1] == full_count()
+
+
+def test_refresh_interval_picks_up_other_processes(shop):
+    clock = Clock(datetime.datetime.now().timestamp())
+    dollmart.configure_dashboard(refresh_interval=60, background=False, clock=clock)
+    cache = dollmart.get_kpi_cache()
+    assert cache.kpis().orders_today == 0
+
+    # Written by another process: no event reaches this one
+    dollmart.run_write(dollmart.insert_order, shop, RICE, 299)
+    clock.now += 30
+    assert cache.kpis().orders_today == 0
+    clock.now += 30
+    assert cache.kpis().orders_today == 1
+
+
+def test_background_rebuild_keeps_serving(shop):
+    clock = Clock(datetime.datetime.now().timestamp())
+    dollmart.configure_dashboard(refresh_interval=60, clock=clock)
+    cache = dollmart.get_kpi_cache()
+    cache.kpis()
+    dollmart.run_write(dollmart.insert_order, shop, RICE, 299)
+
+    clock.now += 60
+    assert cache.kpis().orders_today == 0
+    for _ in range(200):
+        if cache.kpis().orders_today == 1:
+            break
+        time.sleep(0.01)
+    assert cache.kpis().orders_today == 1
+
+
+def test_view_dashboard(shop, capsys, monkeypatch):
+    admin = dollmart.Admin(1, "admin")
+    order(shop, {4: {"name": "Headphones", "price": 4999, "quantity": 2}})
+    admin.view_dashboard()
+    lines = [line.split() for line in capsys.readouterr().out.splitlines()]
+    revenue = dollmart.format_cents(dollmart.get_kpi_cache().kpis().revenue_today)
+    assert ["Orders", "today", "1"] in lines and ["Revenue", "today", revenue] in lines
+    assert ["Processing", "1"] in lines
+
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute("UPDATE products SET stock = 200 WHERE id = 5")
+    conn.commit()
+    conn.close()
+    answers = iter(["5", "", "", "", "", ""])
+    monkeypatch.setattr('builtins.input', lambda _: next(answers))
+    admin.update_product()
+    assert dollmart.get_kpi_cache().kpis().low_stock == full_count()[3] == 1
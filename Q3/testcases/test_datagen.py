@@ -0,0 +1,93 @@
+import pytest
+import datetime
+import hashlib
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import datagen
+from categories import rebuild_counts
+
+NOW = datetime.datetime(2025, 6, 1, 12, 0, 0)
+TABLES = ("users", "products", "orders", "order_items", "coupons", "categories", "category_facets")
+# setup_database stamps the admin with the current time, so only generated users are compared
+GENERATED = {"users": "WHERE role = 'customer'"}
+
+
+def build(path, seed=1, **sizes):
+    dollmart.DB_PATH = str(path)
+    dollmart.setup_database()
+    conn = sqlite3.connect(str(path))
+    stats = datagen.generate(conn, **{"users": 300, "products": 120, "categories": 12, "orders": 2000, **sizes},
+                             seed=seed, now=NOW, batch_size=256)
+    return conn, stats
+
+def digest(conn):
+    return {table: hashlib.sha256(repr(conn.execute(f"SELECT * FROM {table} {GENERATED.get(table, '')} ORDER BY 1, 2").fetchall()).encode()).hexdigest()
+            for table in TABLES}
+
+@pytest.fixture
+def generated(fresh_db):
+    conn, stats = build(fresh_db / "dollmart.db")
+    yield conn, stats
+    conn.close()
+    dollmart.DB_PATH = 'dollmart.db'
+
+def test_same_seed_gives_the_same_rows(generated, tmp_path):
+    conn, _ = generated
+    again, _ = build(tmp_path / "again.db")
+    other, _ = build(tmp_path / "other.db", seed=2)
+    assert digest(again) == digest(conn)
+    assert digest(other)["orders"] != digest(conn)["orders"]
+    again.close()
+    other.close()
+    dollmart.DB_PATH = 'dollmart.db'
+
+def test_rows_are_consistent_with_the_app(generated):
+    conn, stats = generated
+    assert {entry.table: entry.rows for entry in stats if entry.rows}["orders"] == 2000
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE role = 'customer'").fetchone()[0] == 300
+
+    assert conn.execute("""
+        SELECT COUNT(*) FROM orders o
+        WHERE total_amount != (SELECT SUM(quantity * price) FROM order_items WHERE order_id = o.id)
+    """).fetchone()[0] == 0
+    assert conn.execute("""
+        SELECT COUNT(*) FROM users u
+        WHERE orders_count != (SELECT COUNT(*) FROM orders WHERE user_id = u.id)
+    """).fetchone()[0] == 0
+    assert conn.execute("""
+        SELECT COUNT(*) FROM users u WHERE role = 'customer'
+        AND (SELECT COUNT(*) FROM coupons WHERE user_id = u.id AND code LIKE 'LOYAL-%') != orders_count / 3
+    """).fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM order_items oi LEFT JOIN products p ON p.id = oi.product_id WHERE p.id IS NULL").fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT COUNT(*) FROM orders WHERE (status = 'Delivered') != (order_date <= '2025-05-31 10:00:00')"
+    ).fetchone()[0] == 0
+    assert conn.execute("SELECT MIN(order_date) FROM orders").fetchone()[0] >= "2024-06-01 12:00:00"
+
+    facets = conn.execute("SELECT * FROM category_facets ORDER BY 1, 2, 3").fetchall()
+    rebuild_counts(conn)
+    assert conn.execute("SELECT * FROM category_facets ORDER BY 1, 2, 3").fetchall() == facets
+    assert conn.execute("SELECT COUNT(*) FROM categories WHERE name LIKE 'Category %' AND parent_id IS NULL").fetchone()[0] == 0
+
+def test_product_popularity_is_skewed(generated):
+    conn, _ = generated
+    counts = [row[0] for row in conn.execute("SELECT COUNT(*) FROM order_items GROUP BY product_id ORDER BY 1 DESC")]
+    assert counts[0] > 10 * sum(counts) / 120
+    assert sum(counts[:12]) > sum(counts) / 2
+
+def test_load_restores_indexes_and_journal_mode(generated):
+    conn, _ = generated
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+    assert {"idx_orders_user_date", "idx_coupons_user", "idx_products_category_price"} <= indexes
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+
+def test_generated_customers_can_log_in(generated):
+    conn, _ = generated
+    user = dollmart.authenticate("user00000002", "password")
+    assert isinstance(user, dollmart.Customer)
+    assert user.orders_count == conn.execute("SELECT orders_count FROM users WHERE id = 2").fetchone()[0]
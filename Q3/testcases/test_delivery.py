@@ -0,0 +1,201 @@
+import pytest
+import datetime
+import random
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from delivery import DeliveryPlanner
+
+
+CART = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+
+
+def at(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M")
+
+def slot_text(planner, index):
+    return planner.slot_start(index).strftime("%Y-%m-%d %H:%M")
+
+def place(user_id=1):
+    return dollmart.run_write(dollmart.insert_order, user_id, CART, 299)
+
+def stored_slots():
+    conn = sqlite3.connect("dollmart.db")
+    rows = conn.execute("SELECT slot_start, booked FROM delivery_slots ORDER BY slot_start").fetchall()
+    conn.close()
+    return rows
+
+
+def test_first_slot_leaves_time_to_pack():
+    planner = DeliveryPlanner(lead_hours=2)
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 05:00"))) == "2025-06-02 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 07:00"))) == "2025-06-02 10:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 08:00"))) == "2025-06-02 10:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 16:00"))) == "2025-06-02 18:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 16:01"))) == "2025-06-03 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 17:30"))) == "2025-06-03 08:00"
+    # Evening orders, ready after the last slot, go to the next morning's first
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 19:30"))) == "2025-06-03 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 20:30"))) == "2025-06-03 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 21:30"))) == "2025-06-03 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 22:30"))) == "2025-06-03 08:00"
+    assert slot_text(planner, planner.first_slot(at("2025-06-02 23:59"))) == "2025-06-03 08:00"
+    assert planner.slot_end(planner.slot_index("2025-06-02 18:00")) == at("2025-06-02 20:00")
+
+
+def test_full_slots_spill_into_later_slots_and_days():
+    planner = DeliveryPlanner(slot_capacity=2, first_hour=8, last_hour=12, lead_hours=0)
+    placed = at("2025-06-02 07:00")
+    slots = [slot_text(planner, planner.book(placed)) for _ in range(6)]
+    assert slots == ["2025-06-02 08:00", "2025-06-02 08:00", "2025-06-02 10:00", "2025-06-02 10:00",
+                     "2025-06-03 08:00", "2025-06-03 08:00"]
+
+    planner.release(planner.slot_index("2025-06-02 10:00"))
+    assert slot_text(planner, planner.book(placed)) == "2025-06-02 10:00"
+
+    planner.mark_full(planner.slot_index("2025-06-03 10:00"))
+    assert slot_text(planner, planner.book(placed)) == "2025-06-04 08:00"
+
+
+def test_bookings_match_a_linear_scan():
+    rng = random.Random(7)
+    planner = DeliveryPlanner(slot_capacity=3, lead_hours=2)
+    booked = {}
+    start = at("2025-06-02 00:00")
+    for _ in range(3000):
+        placed = start + datetime.timedelta(minutes=rng.randrange(3 * 24 * 60))
+        index = planner.first_slot(placed)
+        while booked.get(index, 0) >= 3:
+            index += 1
+        if rng.random() < 0.1 and booked:
+            released = rng.choice([slot for slot, count in booked.items() if count])
+            booked[released] -= 1
+            planner.release(released)
+            continue
+        booked[index] = booked.get(index, 0) + 1
+        assert planner.book(placed) == index
+
+
+def test_orders_get_the_earliest_slot_with_room(fresh_db):
+    dollmart.configure_delivery(slot_capacity=2)
+    planner = dollmart.get_delivery_planner()
+    first = planner.first_slot(datetime.datetime.now())
+
+    results = [place() for _ in range(5)]
+
+    expected = [first, first, first + 1, first + 1, first + 2]
+    assert [result[2] for result in results] == [planner.slot_end(index).strftime("%Y-%m-%d %H:%M") for index in expected]
+    assert stored_slots() == [(slot_text(planner, first + i), count) for i, count in enumerate([2, 2, 1])]
+
+    conn = sqlite3.connect("dollmart.db")
+    assert [row[0] for row in conn.execute("SELECT delivery_slot FROM orders ORDER BY id")] == [
+        slot_text(planner, index) for index in expected
+    ]
+    conn.close()
+
+
+def test_slot_filled_by_another_process_is_skipped(fresh_db):
+    dollmart.configure_delivery(slot_capacity=2)
+    planner = dollmart.get_delivery_planner()
+    first = planner.first_slot(datetime.datetime.now())
+
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute("INSERT INTO delivery_slots (slot_start, booked) VALUES (?, 2)", (slot_text(planner, first),))
+    conn.commit()
+    conn.close()
+
+    place()
+    assert stored_slots() == [(slot_text(planner, first), 2), (slot_text(planner, first + 1), 1)]
+
+    # A new planner starts from the stored counts
+    dollmart.configure_delivery(slot_capacity=2)
+    assert dollmart.get_delivery_planner().booked(first + 1) == 1
+
+
+def test_failed_order_gives_its_booking_back(fresh_db):
+    dollmart.configure_delivery(slot_capacity=5)
+    dollmart.run_write(dollmart.insert_order, 1, CART, 299, None, False, "key")
+    with pytest.raises(sqlite3.IntegrityError):
+        dollmart.run_write(dollmart.insert_order, 1, CART, 299, None, False, "key")
+
+    planner = dollmart.get_delivery_planner()
+    assert [count for _, count in stored_slots()] == [1]
+    assert planner.booked(planner.first_slot(datetime.datetime.now())) == 1
+
+
+def test_bookings_are_given_back_whenever_the_write_fails(fresh_db, monkeypatch):
+    dollmart.configure_delivery(slot_capacity=5)
+    planner = dollmart.get_delivery_planner()
+    first = planner.first_slot(datetime.datetime.now())
+
+    def fail(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr("recommend.record_order", fail)
+        # After the order row is written
+        with pytest.raises(sqlite3.OperationalError):
+            place()
+        # Every attempt of a retried checkout
+        with pytest.raises(sqlite3.OperationalError):
+            dollmart.checkout(1, CART, 299, None, "key")
+    assert planner.booked(first) == 0 and stored_slots() == []
+
+    # A group-commit operation rolled back to its savepoint
+    dollmart.configure_write_queue(True)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            dollmart.run_write(lambda conn: (dollmart.insert_order(conn, 1, CART, 299), 1 / 0))
+        place()
+    finally:
+        dollmart.configure_write_queue(False)
+    assert planner.booked(first) == 1 and stored_slots() == [(slot_text(planner, first), 1)]
+
+
+def test_memory_backend_books_without_the_table(fresh_db):
+    dollmart.configure_storage("memory", load=True)
+    dollmart.configure_delivery(slot_capacity=1)
+    results = [place() for _ in range(3)]
+    assert len({result[2] for result in results}) == 3
+    assert stored_slots() == []
+
+
+def test_statuses_follow_the_slot(fresh_db):
+    now = datetime.datetime.now()
+
+    def order(placed_hours_ago, slot_starts_in_hours):
+        start = now + datetime.timedelta(hours=slot_starts_in_hours)
+        end = start + datetime.timedelta(hours=2)
+        conn = sqlite3.connect("dollmart.db")
+        order_id = conn.execute(
+            "INSERT INTO orders (user_id, order_date, status, total_amount, estimated_delivery, delivery_slot) "
+            "VALUES (1, ?, 'Processing', 299, ?, ?)",
+            ((now - datetime.timedelta(hours=placed_hours_ago)).strftime("%Y-%m-%d %H:%M:%S"),
+             end.strftime("%Y-%m-%d %H:%M"), start.strftime("%Y-%m-%d %H:%M"))
+        ).lastrowid
+        conn.commit()
+        conn.close()
+        return order_id
+
+    # Placed long ago but booked into a later slot: stays Processing
+    waiting = order(30, 3)
+    in_slot = order(3, -1)
+    finished = order(5, -3)
+
+    assert sorted(dollmart.update_order_statuses()) == [
+        (in_slot, "Processing", "Out for Delivery"), (finished, "Processing", "Out for Delivery")
+    ]
+    assert dollmart.update_order_statuses() == [(finished, "Out for Delivery", "Delivered")]
+    assert waiting not in [transition[0] for transition in dollmart.update_order_statuses()]
+
+
+def test_slots_off_keeps_the_fixed_estimate(fresh_db):
+    dollmart.configure_delivery(False)
+    before = datetime.datetime.now().replace(second=0, microsecond=0)
+    estimated_delivery = at(place()[2])
+    hours = dollmart.PROCESSING_TIME_HOURS + dollmart.DELIVERY_TIME_HOURS
+    assert before + datetime.timedelta(hours=hours) <= estimated_delivery <= before + datetime.timedelta(hours=hours, minutes=1)
+    assert stored_slots() == []
@@ -4,15 +4,15 @@ import hashlib
 import datetime
 import sys
 import os
+import subprocess
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
-from dollmart import setup_database, generate_coupon_code, create_coupon, apply_coupon, Customer, Admin
+import dollmart
+from dollmart import generate_coupon_code, create_coupon, apply_coupon, search_customers, get_customer_360, Customer, Admin
 
 
-setup_database()
-
 @pytest.fixture
-def db_connection():
+def db_connection(fresh_db):
     conn = sqlite3.connect('dollmart.db')
     yield conn
     conn.close()
@@ -109,6 +109,7 @@ def test_login_user(db_connection):
     username = "testuser"
     password = "testpass"
     password_hash = hashlib.sha256(password.encode()).hexdigest()
+    dollmart.run_write(dollmart.create_customer, username, password_hash, 0)
     cursor = db_connection.cursor()
     cursor.execute("SELECT id, role, is_retail, orders_count FROM users WHERE username = ? AND password_hash = ?", 
                   (username, password_hash))
@@ -125,14 +126,14 @@ def test_login_invalid_user(db_connection):
     user = cursor.fetchone()
     assert user is None
 
-def test_customer_cart_operations():
+def test_customer_cart_operations(fresh_db):
     customer = Customer(1, "testuser")
     customer.add_to_cart(1, 2)
     assert customer.cart[1]["quantity"] == 2
     customer.add_to_cart(1, 3)
     assert customer.cart[1]["quantity"] == 5
 
-def test_customer_cart_invalid_product():
+def test_customer_cart_invalid_product(fresh_db):
     customer = Customer(1, "testuser")
     customer.add_to_cart(999, 2)
     assert 999 not in customer.cart
@@ -167,7 +168,7 @@ def test_admin_add_product(db_connection):
     admin = Admin(1, "admin")
     name = "Test Product"
     category = "Test Category"
-    price = 9.99
+    price = 999
     stock = 100
     bulk_discount = 0.1
     cursor = db_connection.cursor()
@@ -261,16 +262,17 @@ def test_customer_cart_remove_item(db_connection):
    
     cursor = db_connection.cursor()
     cursor.execute(
-        "INSERT INTO products (id, name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?, ?)",
-        (1, "Test Product", "Test Category", 9.99, 100, 0.1)
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
+        ("Test Product", "Test Category", 999, 100, 0.1)
     )
     db_connection.commit()
+    product_id = cursor.lastrowid
     
     customer = Customer(1, "testuser")
-    customer.add_to_cart(1, 2)
-    assert customer.cart[1]["quantity"] == 2
-    customer.remove_from_cart(1)
-    assert 1 not in customer.cart
+    customer.add_to_cart(product_id, 2)
+    assert customer.cart[product_id]["quantity"] == 2
+    customer.remove_from_cart(product_id)
+    assert product_id not in customer.cart
 
 def test_customer_cart_update_quantity(db_connection):
     cursor = db_connection.cursor()
@@ -282,7 +284,7 @@ def test_customer_cart_update_quantity(db_connection):
     if not product_exists:
         cursor.execute(
             "INSERT INTO products (id, name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?, ?)",
-            (1, "Test Product", "Test Category", 9.99, 100, 0.1)
+            (1, "Test Product", "Test Category", 999, 100, 0.1)
         )
         db_connection.commit()
     
@@ -291,3 +293,106 @@ def test_customer_cart_update_quantity(db_connection):
     assert customer.cart[1]["quantity"] == 2
     customer.update_cart(1, 5)
     assert customer.cart[1]["quantity"] == 5
+
+def _insert_customer(cursor, username, is_retail=0):
+    cursor.execute(
+        "INSERT INTO users (username, password_hash, role, is_retail, registration_date) VALUES (?, ?, ?, ?, ?)",
+        (username, "x", "customer", is_retail, "2025-01-01 10:00:00")
+    )
+    return cursor.lastrowid
+
+def test_search_customers_by_prefix(fresh_db):
+    conn = sqlite3.connect('dollmart.db')
+    cursor = conn.cursor()
+    for username in ["alice", "alina", "bob", "al"]:
+        _insert_customer(cursor, username)
+    conn.commit()
+    conn.close()
+
+    matches = search_customers("ali")
+    assert [m[1] for m in matches] == ["alice", "alina"]
+    assert [m[1] for m in search_customers("al", limit=2)] == ["al", "alice"]
+    assert search_customers("zed") == []
+
+def test_customer_360_pages_orders_with_item_counts(fresh_db):
+    conn = sqlite3.connect('dollmart.db')
+    cursor = conn.cursor()
+    customer_id = _insert_customer(cursor, "carol")
+    for day in range(1, 6):
+        cursor.execute(
+            "INSERT INTO orders (user_id, order_date, status, total_amount) VALUES (?, ?, ?, ?)",
+            (customer_id, f"2025-01-0{day} 10:00:00", "Delivered", 1000 * day)
+        )
+        order_id = cursor.lastrowid
+        for product_id in range(1, day + 1):
+            cursor.execute(
+                "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (?, ?, ?, ?)",
+                (order_id, product_id, 1, 100)
+            )
+    conn.commit()
+    conn.close()
+    create_coupon(customer_id, 10, "WELCOME")
+    create_coupon(customer_id, 5, "LOYAL")
+
+    details = get_customer_360(customer_id, page=1, page_size=2)
+    assert details["profile"][1] == "carol"
+    assert details["total_orders"] == 5
+    assert [order[4] for order in details["orders"]] == [5, 4]
+    assert details["coupon_summary"] == {"total": 2, "used": 0, "available": 2}
+
+    last_page = get_customer_360(customer_id, page=3, page_size=2)
+    assert [order[4] for order in last_page["orders"]] == [1]
+
+def test_customer_360_unknown_customer(fresh_db):
+    assert get_customer_360(9999) is None
+    assert get_customer_360(1) is None
+
+def test_import_does_not_load_rendering_stack():
+    src = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+    code = "import sys, dollmart; print(sorted(m for m in ('tabulate', 'eventlog', 'writequeue', 'sharding', 'archive', 'pricing', 'bulkorder', 'recommend', 'categories', 'ratelimit', 'backup', 'storage', 'cli', 'export', 'delivery', 'dashboard', 'replica', 'querycache') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=src, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+def test_ensure_database_creates_schema_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dollmart.ensure_database()
+
+    conn = sqlite3.connect('dollmart.db')
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == dollmart.SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 0
+    conn.close()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("schema should not be rebuilt")
+
+    monkeypatch.setattr(dollmart, "setup_database", fail)
+    dollmart.ensure_database()
+
+def test_newer_schema_is_never_migrated_down(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect('dollmart.db')
+    conn.execute("CREATE TABLE future (id INTEGER PRIMARY KEY)")
+    conn.execute(f"PRAGMA user_version = {dollmart.SCHEMA_VERSION + 1}")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(dollmart.SchemaTooNew):
+        dollmart.ensure_database()
+    with pytest.raises(dollmart.SchemaTooNew):
+        dollmart.setup_database()
+    assert dollmart.main(["init"]) == 1
+    assert "upgrade DollMart" in capsys.readouterr().err
+
+    conn = sqlite3.connect('dollmart.db')
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == dollmart.SCHEMA_VERSION + 1
+    assert [row[0] for row in conn.execute("SELECT name FROM sqlite_master")] == ["future"]
+    conn.close()
+
+def test_init_command_seeds_products(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dollmart.main(["init"])
+
+    conn = sqlite3.connect('dollmart.db')
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 7
+    conn.close()
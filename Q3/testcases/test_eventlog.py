@@ -0,0 +1,129 @@
+import pytest
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from eventlog import EventLog, EventLogReader, replay, list_segments, segment_path
+
+
+def test_append_and_poll(tmp_path):
+    log = EventLog(str(tmp_path))
+    reader = EventLogReader(str(tmp_path))
+
+    log.append("order_placed", order_id=1)
+    log.append("order_placed", order_id=2)
+    events = reader.poll()
+    assert [e["order_id"] for e in events] == [1, 2]
+    assert [e["seq"] for e in events] == [1, 2]
+
+    assert reader.poll() == []
+    log.append("coupon_redeemed", coupon_id=7)
+    assert [e["type"] for e in reader.poll()] == ["coupon_redeemed"]
+    log.close()
+
+def test_segments_roll_and_reader_follows(tmp_path):
+    log = EventLog(str(tmp_path), segment_max_bytes=200)
+    for i in range(20):
+        log.append("order_placed", order_id=i)
+    log.close()
+
+    assert len(list_segments(str(tmp_path))) > 1
+    events = EventLogReader(str(tmp_path)).poll()
+    assert [e["order_id"] for e in events] == list(range(20))
+
+def test_sequence_resumes_after_reopen(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append("a")
+    log.close()
+
+    log = EventLog(str(tmp_path))
+    assert log.append("b") == 2
+    log.close()
+
+def test_torn_tail_is_not_returned(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append("order_placed", order_id=1)
+    log.close()
+
+    with open(segment_path(str(tmp_path), 1), "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x00")
+
+    reader = EventLogReader(str(tmp_path))
+    assert [e["order_id"] for e in reader.poll()] == [1]
+    assert reader.poll() == []
+
+def test_appends_after_a_torn_tail_are_read(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append("order_placed", order_id=1)
+    log.close()
+
+    with open(segment_path(str(tmp_path), 1), "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x00")
+
+    log = EventLog(str(tmp_path))
+    assert log.append("order_placed", order_id=2) == 2
+    log.close()
+    assert [e["order_id"] for e in EventLogReader(str(tmp_path)).poll()] == [1, 2]
+
+def test_idle_log_is_synced_by_its_timer(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", synced.append)
+    log = EventLog(str(tmp_path), fsync_interval=0.05)
+    log._last_sync = time.monotonic()
+    log.append("a")
+    assert synced == []
+    for _ in range(100):
+        if synced:
+            break
+        time.sleep(0.01)
+    assert len(synced) == 1 and log._pending == 0
+    log.close()
+
+def test_reader_resumes_from_position(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append("a")
+    reader = EventLogReader(str(tmp_path))
+    reader.poll()
+    log.append("b")
+    log.close()
+
+    resumed = EventLogReader(str(tmp_path), position=reader.position)
+    assert [e["type"] for e in resumed.poll()] == ["b"]
+
+    seen = []
+    assert replay(str(tmp_path), seen.append, since_seq=1) == 2
+    assert [e["type"] for e in seen] == ["b"]
+
+def test_checkout_writes_events(fresh_db, monkeypatch):
+    dollmart.configure_event_log(str(fresh_db / "events"))
+    try:
+        coupon_id, _ = dollmart.create_coupon(1, 10, "WELCOME")
+        customer = dollmart.Customer(1, "testuser")
+        customer.add_to_cart(1, 2)
+        answers = iter(["y", str(coupon_id), "y"])
+        monkeypatch.setattr('builtins.input', lambda _: next(answers))
+        customer.place_order()
+    finally:
+        dollmart.configure_event_log(None)
+
+    events = EventLogReader(str(fresh_db / "events")).poll()
+    assert [e["type"] for e in events] == ["coupon_created", "coupon_redeemed", "order_placed"]
+    assert events[2]["items"] == [{"product_id": 1, "quantity": 2, "price": 299}]
+
+def test_coupon_events_wait_for_the_write_to_commit(fresh_db):
+    def register_then_fail(conn):
+        dollmart.create_customer(conn, "rolledback", "x", 0)
+        raise ValueError("registration failed")
+
+    dollmart.configure_event_log(str(fresh_db / "events"))
+    try:
+        with pytest.raises(ValueError):
+            dollmart.run_write(register_then_fail)
+        user_id, coupon_id, _ = dollmart.run_write(dollmart.create_customer, "committed", "x", 0)
+    finally:
+        dollmart.configure_event_log(None)
+
+    events = EventLogReader(str(fresh_db / "events")).poll()
+    assert [(e["type"], e["user_id"], e["coupon_id"]) for e in events] == [("coupon_created", user_id, coupon_id)]
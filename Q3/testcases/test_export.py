@@ -0,0 +1,116 @@
+import pytest
+import datetime
+import io
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import cli
+import datagen
+import dollmart
+import export
+
+
+@pytest.fixture
+def orders(fresh_db):
+    conn = sqlite3.connect("dollmart.db")
+    datagen.generate(conn, users=20, products=10, categories=2, orders=50, now=datetime.datetime(2025, 6, 1, 12), days=10)
+    conn.close()
+    return fresh_db
+
+def jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def expected_lines(where="1 = 1", params=()):
+    conn = sqlite3.connect("dollmart.db")
+    rows = conn.execute(f"""
+        SELECT o.id, o.order_date, o.status, o.user_id, u.username, o.total_amount, oi.product_id, oi.quantity, oi.price
+        FROM orders o JOIN order_items oi ON oi.order_id = o.id JOIN users u ON u.id = o.user_id
+        WHERE {where} ORDER BY o.id, oi.product_id
+    """, params).fetchall()
+    conn.close()
+    return [dict(zip(export.FIELDS, row)) for row in rows]
+
+
+def test_jsonl_and_columnar_hold_the_same_lines(orders):
+    expected = expected_lines()
+    jsonl_result = dollmart.export_orders("orders.jsonl")
+    columnar_result = dollmart.export_orders("orders.col", "columnar")
+
+    assert jsonl(jsonl_result.path) == expected
+    assert list(export.read_columnar(columnar_result.path)) == expected
+    assert (jsonl_result.orders, jsonl_result.lines) == (50, len(expected))
+    assert columnar_result.bytes < jsonl_result.bytes / 4
+    assert not os.path.exists("orders.jsonl.partial")
+
+
+def test_chunks_split_anywhere(orders):
+    conn = dollmart.connect_db()
+    for chunk_rows in (1, 7):
+        export.export_to_file([("main", conn)], f"orders-{chunk_rows}.col", "columnar", chunk_rows=chunk_rows)
+        assert list(export.read_columnar(f"orders-{chunk_rows}.col")) == expected_lines()
+    conn.close()
+
+
+def test_date_range(orders):
+    result = dollmart.export_orders("june.jsonl", since="2025-05-28", until="2025-05-30 12:00:00")
+    expected = expected_lines("o.order_date >= ? AND o.order_date < ?", ("2025-05-28", "2025-05-30 12:00:00"))
+    assert expected and jsonl(result.path) == expected
+
+
+def test_incremental_exports_only_new_orders(orders):
+    first = dollmart.export_orders("first.jsonl", state_path="state.json")
+    assert first.high_water == {"dollmart.db": 50}
+
+    user_id = dollmart.run_write(dollmart.create_customer, "late", "x", 0)[0]
+    cart = {1: {"name": "Rice", "price": 299, "quantity": 2}}
+    order_id = dollmart.run_write(dollmart.insert_order, user_id, cart, 598)[0]
+
+    second = dollmart.export_orders("second.jsonl", state_path="state.json")
+    assert [(line["order_id"], line["username"], line["quantity"]) for line in jsonl("second.jsonl")] == [(order_id, "late", 2)]
+    assert export.load_high_water("state.json") == {"dollmart.db": order_id}
+
+    third = dollmart.export_orders("third.jsonl", state_path="state.json")
+    assert (third.orders, third.bytes) == (0, 0)
+    assert second.high_water == third.high_water
+
+
+def test_failed_export_leaves_state_and_no_file(orders, monkeypatch):
+    dollmart.export_orders("first.jsonl", state_path="state.json")
+    dollmart.run_write(dollmart.insert_order, 2, {1: {"name": "Rice", "price": 299, "quantity": 1}}, 299)
+
+    def fail(self, rows):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(export.JsonLinesWriter, "write", fail)
+    with pytest.raises(OSError):
+        dollmart.export_orders("second.jsonl", state_path="state.json")
+
+    assert not os.path.exists("second.jsonl") and not os.path.exists("second.jsonl.partial")
+    assert export.load_high_water("state.json") == {"dollmart.db": 50}
+
+
+def test_each_shard_keeps_its_own_mark(fresh_db):
+    dollmart.configure_sharding(2)
+    try:
+        cart = {2: {"name": "Milk", "price": 199, "quantity": 1}}
+        for i in range(6):
+            user_id = dollmart.run_write(dollmart.create_customer, f"shopper{i}", "x", 0)[0]
+            dollmart.run_write(dollmart.insert_order, user_id, cart, 199, user_id=user_id)
+
+        result = dollmart.export_orders("orders.jsonl", state_path="state.json")
+        assert result.orders == 6
+        assert set(result.high_water) == {"shard-000.db", "shard-001.db"}
+        assert {line["username"] for line in jsonl("orders.jsonl")} == {f"shopper{i}" for i in range(6)}
+    finally:
+        dollmart.configure_sharding(0)
+
+
+def test_cli_export_lines(orders):
+    out = io.StringIO()
+    assert cli.main(["orders", "export-lines", "orders.col", "--format", "columnar", "--state", "state.json"], out) == 0
+    assert out.getvalue().startswith("Exported 50 orders")
+    assert len(list(export.read_columnar("orders.col"))) == len(expected_lines())
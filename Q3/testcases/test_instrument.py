@@ -0,0 +1,111 @@
+import pytest
+import json
+import sqlite3
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+from instrument import Histogram, timed
+
+
+@pytest.fixture
+def profiling():
+    instrument.reset()
+    instrument.enable(slow_query_ms=1000, slow_operation_ms=1000)
+    yield instrument
+    instrument.disable()
+    instrument.reset()
+
+def test_timed_records_only_when_enabled():
+    @timed("noop")
+    def noop(x):
+        return x * 2
+
+    instrument.reset()
+    assert noop(2) == 4
+    assert "noop" not in instrument.metrics()["operations"]
+
+    instrument.enable()
+    try:
+        noop(1)
+        with timed("block"):
+            noop(3)
+    finally:
+        instrument.disable()
+
+    operations = instrument.metrics()["operations"]
+    assert operations["noop"]["count"] == 2
+    assert operations["block"]["count"] == 1
+    instrument.reset()
+
+def test_queries_record_sql_and_rows(profiling, fresh_db):
+    assert len(dollmart.find_products("e")) == 4
+
+    data = profiling.metrics()
+    assert data["operations"]["find_products"]["count"] == 1
+    query = "SELECT id, name, category, price, stock FROM products WHERE name LIKE ?"
+    assert data["queries"][query]["rows"] == 4
+
+    conn = dollmart.connect_db()
+    conn.execute("UPDATE products SET stock = stock + 1")
+    conn.commit()
+    conn.close()
+    assert profiling.metrics()["queries"]["UPDATE products SET stock = stock + 1"]["rows"] == 7
+
+def test_slow_log_threshold(profiling, fresh_db, tmp_path):
+    profiling.enable(slow_query_ms=0, slow_log_path=str(tmp_path / "slow.log"))
+    dollmart.search_customers("a")
+
+    assert any(entry["kind"] == "query" for entry in profiling.metrics()["slow_log"])
+    assert "FROM users" in (tmp_path / "slow.log").read_text()
+    assert "Slow log" in profiling.dump_text()
+    assert "search_customers" in json.loads(profiling.dump_json())["operations"]
+
+class YieldingHistogram(Histogram):
+    """Lets other threads run between reading and writing the count"""
+
+    __slots__ = ()
+
+    def record(self, seconds, rows=0):
+        count = self.count
+        time.sleep(0)
+        super().record(seconds, rows)
+        self.count = count + 1
+
+def test_recording_from_many_threads_loses_nothing(profiling, monkeypatch):
+    monkeypatch.setattr(instrument, "Histogram", YieldingHistogram)
+
+    def record(i):
+        for _ in range(200):
+            instrument.record_operation(f"op{i % 2}", 0.001)
+            instrument.record_query("SELECT 1", 0.001, 1)
+
+    threads = [threading.Thread(target=record, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    data = instrument.metrics()
+    assert [data["operations"][name]["count"] for name in ("op0", "op1")] == [800, 800]
+    assert data["queries"]["SELECT 1"]["count"] == 1600
+
+def test_disabled_connections_are_plain_sqlite(fresh_db):
+    conn = dollmart.connect_db()
+    assert isinstance(conn, sqlite3.Connection)
+    conn.close()
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for _ in range(99):
+        histogram.record(0.001)
+    histogram.record(0.5)
+
+    assert histogram.count == 100
+    assert histogram.percentile(0.5) <= 0.002
+    assert histogram.percentile(1.0) == 0.5
+    assert histogram.summary()["max_ms"] == 500
@@ -0,0 +1,118 @@
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import money
+from categories import category_tree
+
+
+def test_to_cents_is_exact_for_input_strings_and_floats():
+    assert money.to_cents("9.99") == 999
+    assert money.to_cents(" 12 ") == 1200
+    assert money.to_cents(5) == 500
+    assert money.to_cents(0.1 + 0.2) == 30
+    assert money.to_cents(2.675) == 268
+    assert money.to_cents("-1.005") == -101
+
+    for bad in ("abc", "", "nan", "inf"):
+        with pytest.raises(ValueError):
+            money.to_cents(bad)
+
+def test_format_cents():
+    assert money.format_cents(0) == "$0.00"
+    assert money.format_cents(5) == "$0.05"
+    assert money.format_cents(123456) == "$1234.56"
+    assert money.format_cents(-250) == "-$2.50"
+
+def test_basis_points_round_half_up():
+    assert money.rate_to_bp(0.1) == 1000
+    assert money.percent_to_bp(12.5) == 1250
+    assert money.apply_bp(1000, 1250) == 125
+    assert money.apply_bp(5, 1000) == 1
+    assert money.apply_bp(4, 1000) == 0
+    assert sum([money.apply_bp(299, 1000)] * 3) == money.apply_bp(299 * 3, 1000)
+
+def test_convert_columns_keeps_indexes_and_autoincrement(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, price REAL NOT NULL)")
+    conn.execute("CREATE INDEX idx_items_price ON items (price)")
+    conn.executemany("INSERT INTO items (name, price) VALUES (?, ?)", [("a", 2.99), ("b", 0.1 + 0.2), ("c", 10.0)])
+    conn.execute("DELETE FROM items WHERE name = 'c'")
+
+    assert money.convert_columns_to_cents(conn, "items", ["price"])
+    assert conn.execute("SELECT id, name, price, typeof(price) FROM items ORDER BY id").fetchall() == [
+        (1, "a", 299, "integer"), (2, "b", 30, "integer")
+    ]
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall() == [("idx_items_price",)]
+    conn.execute("INSERT INTO items (name, price) VALUES ('d', 100)")
+    assert conn.execute("SELECT id FROM items WHERE name = 'd'").fetchone() == (4,)
+
+    assert not money.convert_columns_to_cents(conn, "items", ["price"])
+    conn.close()
+
+def test_convert_columns_rounds_like_to_cents(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, price REAL, refund REAL)")
+    values = [1.005, 2.675, 0.125, -1.005, 1.015, 8.345, 19.99, 3, None]
+    conn.executemany("INSERT INTO items (price, refund) VALUES (?, ?)", [(value, value) for value in values])
+
+    assert money.convert_columns_to_cents(conn, "items", ["price"])
+    expected = [None if value is None else money.to_cents(value) for value in values]
+    assert expected[:4] == [101, 268, 13, -101]
+    assert [row[0] for row in conn.execute("SELECT price FROM items ORDER BY id")] == expected
+    assert [row[0] for row in conn.execute("SELECT refund FROM items ORDER BY id")] == [
+        None if value is None else float(value) for value in values
+    ]
+    conn.close()
+
+def test_ensure_database_migrates_dollar_columns(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect("dollmart.db")
+    conn.executescript("""
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT NOT NULL, category TEXT NOT NULL,
+            price REAL NOT NULL, stock INTEGER NOT NULL, bulk_discount REAL DEFAULT 0);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, order_date TEXT NOT NULL,
+            status TEXT NOT NULL, total_amount REAL NOT NULL, estimated_delivery TEXT);
+        CREATE TABLE order_items (order_id INTEGER NOT NULL, product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL, price REAL NOT NULL, PRIMARY KEY (order_id, product_id));
+        INSERT INTO products VALUES (1, 'Rice', 'Groceries', 2.99, 100, 0.1);
+        INSERT INTO orders VALUES (1, 1, '2024-01-01 00:00:00', 'Delivered', 8.97, NULL);
+        INSERT INTO order_items VALUES (1, 1, 3, 2.99);
+        PRAGMA user_version = 2;
+    """)
+    conn.close()
+
+    dollmart.ensure_database()
+
+    conn = sqlite3.connect("dollmart.db")
+    assert conn.execute("SELECT price, bulk_discount FROM products").fetchone() == (299, 0.1)
+    assert conn.execute("SELECT total_amount FROM orders").fetchone() == (897,)
+    assert conn.execute("SELECT quantity, price FROM order_items").fetchone() == (3, 299)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == dollmart.SCHEMA_VERSION
+    conn.close()
+
+def test_migration_keeps_the_category_triggers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect("dollmart.db")
+    conn.executescript("""
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT NOT NULL, category TEXT NOT NULL,
+            price REAL NOT NULL, stock INTEGER NOT NULL, bulk_discount REAL DEFAULT 0);
+        INSERT INTO products VALUES (1, 'Rice', 'Groceries', 2.99, 100, 0.1);
+        PRAGMA user_version = 2;
+    """)
+    conn.close()
+
+    dollmart.ensure_database()
+
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute("INSERT INTO products (name, category, price, stock, bulk_discount) VALUES ('Kite', 'Toys', 1299, 4, 0)")
+    conn.commit()
+    assert [(node.name, node.product_count, node.in_stock_count) for node in category_tree(conn)] == [
+        ("Groceries", 1, 1), ("Toys", 1, 1)
+    ]
+    triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert {"products_facets_insert", "products_facets_delete", "products_facets_update"} <= triggers
+    conn.close()
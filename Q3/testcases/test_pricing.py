@@ -0,0 +1,191 @@
+import pytest
+import random
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from pricing import PriceBook, TierTable, RETAIL_BULK_MIN_UNITS
+
+
+PRODUCTS = [
+    (1, "Groceries", 299, 0.1),
+    (2, "Groceries", 199, 0.1),
+    (3, "Electronics", 49999, 0.05),
+    (4, "Personal Care", 499, 0.0),
+]
+
+
+def cart_of(quantities):
+    prices = {product_id: price for product_id, _, price, _ in PRODUCTS}
+    return {product_id: {"name": f"P{product_id}", "price": prices[product_id], "quantity": quantity}
+            for product_id, quantity in quantities.items()}
+
+def test_tier_table_uses_best_rate_reached():
+    table = TierTable([(100, 0.05), (10, 0.02), (50, 0.01), (10, 0.03)])
+    assert table.rate(9) == 0.0
+    assert table.rate(10) == 0.03
+    assert table.rate(50) == 0.03
+    assert table.rate(100) == 0.05
+
+def test_retail_bulk_uses_each_products_bulk_discount():
+    book = PriceBook(PRODUCTS)
+    quote = book.quote(cart_of({1: 40, 4: 10}), is_retail=True)
+
+    assert quote.units == RETAIL_BULK_MIN_UNITS
+    assert [line.discount_bp for line in quote.lines] == [1000, 0]
+    assert quote.bulk_discount == 1196
+    assert book.quote(cart_of({1: 40, 4: 10}), is_retail=False).bulk_discount == 0
+    assert book.quote(cart_of({1: 40, 4: 9}), is_retail=True).bulk_discount == 0
+
+def test_product_and_category_tiers_do_not_stack():
+    tiers = [
+        (2, None, "all", 10, 0.04),
+        (None, "Groceries", "individual", 15, 0.06),
+        (None, "Groceries", "retail", 15, 0.5),
+    ]
+    book = PriceBook(PRODUCTS, tiers)
+
+    quote = book.quote(cart_of({1: 5, 2: 10}), is_retail=False)
+    assert [line.discount_bp for line in quote.lines] == [600, 600]
+
+    quote = book.quote(cart_of({1: 1, 2: 10}), is_retail=False)
+    assert [line.discount_bp for line in quote.lines] == [0, 400]
+
+def test_price_list_overrides_cart_price_for_that_customer_type():
+    book = PriceBook(PRODUCTS, price_lists=[("retail", 3, 45000)])
+    assert book.quote(cart_of({3: 1}), is_retail=True).subtotal == 45000
+    assert book.quote(cart_of({3: 1}), is_retail=False).subtotal == 49999
+
+def test_coupon_applies_after_bulk_discount():
+    book = PriceBook(PRODUCTS, [(1, None, "all", 10, 0.1)])
+    quote = book.quote(cart_of({1: 10}), is_retail=False, coupon_percentage=10)
+    assert quote.bulk_discount == 299
+    assert quote.coupon_discount == 269
+    assert quote.total == 2990 - 299 - 269
+
+def test_discounts_round_half_up_to_whole_cents():
+    book = PriceBook([(1, "A", 5, 0.1)], [(1, None, "all", 1, 0.1)])
+    quote = book.quote({1: {"price": 5, "quantity": 1}}, is_retail=False, coupon_percentage=10)
+    assert quote.bulk_discount == 1
+    assert quote.coupon_discount == 0
+    assert quote.total == 4
+
+def test_lines_are_built_in_product_order_when_first_read():
+    book = PriceBook(PRODUCTS, [(2, None, "all", 10, 0.04)])
+    cart = {9: {"price": 100, "quantity": 2}, **cart_of({4: 1, 2: 10})}
+    quote = book.quote(cart, is_retail=False)
+
+    assert quote.lines._lines is None
+    assert [line.product_id for line in quote.lines] == [2, 4, 9]
+    assert quote.lines[-1] == (9, 2, 100, 0, 200, 0)
+    assert len(quote.lines) == 3
+    assert quote == book.quote(dict(reversed(cart.items())), is_retail=False)
+
+def random_book(rng):
+    products = [(pid, rng.choice("ABC"), rng.randint(50, 50000), rng.choice([0, 0.05, 0.1]))
+                for pid in range(1, 41)]
+    tiers = []
+    for _ in range(rng.randint(0, 30)):
+        ctype = rng.choice(["all", "retail", "individual"])
+        if rng.random() < 0.5:
+            tiers.append((rng.randint(1, 40), None, ctype, rng.randint(1, 60), rng.choice([0.01, 0.05, 0.2])))
+        else:
+            tiers.append((None, rng.choice("ABC"), ctype, rng.randint(1, 200), rng.choice([0.02, 0.08, 0.3])))
+    price_lists = [(rng.choice(["retail", "individual"]), rng.randint(1, 40), rng.randint(50, 50000))
+                   for _ in range(rng.randint(0, 10))]
+    return products, PriceBook(products, tiers, price_lists), max([1000] + [round(tier[4] * 10000) for tier in tiers])
+
+def random_cart(rng, products):
+    chosen = rng.sample(products, rng.randint(1, len(products)))
+    return {pid: {"name": str(pid), "price": price, "quantity": rng.randint(1, 40)} for pid, _, price, _ in chosen}
+
+@pytest.mark.parametrize("seed", range(200))
+def test_quote_properties(seed):
+    rng = random.Random(seed)
+    products, book, max_rate = random_book(rng)
+    cart = random_cart(rng, products)
+    is_retail = rng.random() < 0.5
+    coupon = rng.choice([0, 5, 10, 100])
+
+    quote = book.quote(cart, is_retail, coupon)
+
+    # Lines add up to the totals exactly, and every discount stays within its bounds
+    assert all(isinstance(value, int) for value in quote[1:])
+    assert quote.units == sum(item["quantity"] for item in cart.values())
+    assert quote.subtotal == sum(line.subtotal for line in quote.lines)
+    assert quote.bulk_discount == sum(line.discount for line in quote.lines)
+    assert all(0 <= line.discount_bp <= max_rate for line in quote.lines)
+    assert all(abs(line.discount * 10000 - line.subtotal * line.discount_bp) <= 5000 for line in quote.lines)
+    assert 0 <= quote.bulk_discount <= quote.subtotal
+    assert quote.total == quote.subtotal - quote.bulk_discount - quote.coupon_discount
+    assert 0 <= quote.total <= quote.subtotal - quote.bulk_discount
+
+    # Deterministic: insertion order does not matter, and lines come out in product order
+    shuffled = list(cart.items())
+    rng.shuffle(shuffled)
+    assert book.quote(dict(shuffled), is_retail, coupon) == quote
+    assert [line.product_id for line in quote.lines] == sorted(cart)
+
+    # A bigger coupon never costs more; adding a unit never lowers the discount rate on its own line
+    assert book.quote(cart, is_retail, min(coupon + 5, 100)).total <= quote.total
+    product_id = rng.choice(list(cart))
+    more = dict(cart)
+    more[product_id] = dict(cart[product_id], quantity=cart[product_id]["quantity"] + 1)
+    rates = {line.product_id: line.discount_bp for line in book.quote(more, is_retail, coupon).lines}
+    assert rates[product_id] >= {line.product_id: line.discount_bp for line in quote.lines}[product_id]
+
+def test_place_order_charges_the_quote(fresh_db, monkeypatch):
+    dollmart.add_discount_tier(5, 0.2, product_id=2)
+    dollmart.set_price_list_price("individual", 1, 250)
+
+    customer = dollmart.Customer(1, "someone", 0)
+    customer.add_to_cart(1, 2)
+    customer.add_to_cart(2, 5)
+    monkeypatch.setattr('builtins.input', lambda _: 'y')
+    customer.place_order()
+
+    conn = dollmart.connect_db()
+    total = conn.execute("SELECT total_amount FROM orders").fetchone()[0]
+    items = conn.execute("SELECT product_id, price FROM order_items ORDER BY product_id").fetchall()
+    conn.close()
+
+    assert total == 2 * 250 + 5 * 199 - 199
+    assert items == [(1, 250), (2, 199)]
+
+def test_admin_writes_invalidate_cached_price_book(fresh_db):
+    before = dollmart.get_price_book()
+    assert dollmart.get_price_book() is before
+
+    tier_id = dollmart.add_discount_tier(1, 0.5, category="Groceries")
+    assert dollmart.quote_cart(cart_of({1: 1}), False).bulk_discount == 150
+    assert dollmart.remove_discount_tier(tier_id)
+    assert dollmart.quote_cart(cart_of({1: 1}), False).bulk_discount == 0
+    assert not dollmart.remove_discount_tier(tier_id)
+
+    with pytest.raises(ValueError):
+        dollmart.add_discount_tier(1, 0.5, product_id=1, category="Groceries")
+    with pytest.raises(ValueError):
+        dollmart.set_price_list_price("wholesale", 1, 100)
+
+def test_price_book_reloads_after_catalog_writes_from_another_process(fresh_db):
+    def write(sql):
+        conn = sqlite3.connect("dollmart.db")
+        conn.execute(sql)
+        conn.commit()
+        conn.close()
+
+    before = dollmart.get_price_book()
+    # Checkouts only move stock, which prices do not depend on
+    write("UPDATE products SET stock = stock - 1 WHERE id = 1")
+    assert dollmart.get_price_book() is before
+
+    write("INSERT INTO discount_tiers (category, min_quantity, discount) VALUES ('Groceries', 1, 0.5)")
+    assert dollmart.quote_cart(cart_of({1: 1}), False).bulk_discount == 150
+    write("DELETE FROM discount_tiers")
+    assert dollmart.quote_cart(cart_of({1: 1}), False).bulk_discount == 0
+    write("INSERT INTO price_lists (customer_type, product_id, price) VALUES ('individual', 1, 250)")
+    assert dollmart.quote_cart(cart_of({1: 1}), False).subtotal == 250
+    write("UPDATE products SET bulk_discount = 0.2 WHERE id = 1")
+    assert dollmart.get_price_book().retail_rates[1] == 2000
@@ -0,0 +1,79 @@
+import pytest
+import pickle
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+import queries
+
+
+def test_every_statement_prepares_against_the_schema(fresh_db):
+    conn = dollmart.connect_db()
+    plans = queries.explain_all(conn)
+    conn.close()
+
+    assert set(plans) == set(queries.STATEMENTS)
+    assert all(plans[name] for name in plans if queries.sql(name).startswith("SELECT"))
+
+def test_lookups_use_indexes(fresh_db):
+    conn = dollmart.connect_db()
+    assert any("idx_orders_user_date" in line for line in queries.explain(conn, "customer_orders"))
+    assert any("idx_coupons_user" in line for line in queries.explain(conn, "available_coupons"))
+    assert any("USING INTEGER PRIMARY KEY" in line for line in queries.explain(conn, "product_by_id"))
+    conn.close()
+
+def test_rows_are_typed_and_still_index_like_tuples(fresh_db):
+    conn = dollmart.connect_db()
+    product = queries.fetch_one(conn, "product_by_id", (1,))
+    conn.close()
+
+    assert product.name == product[1] == "Rice"
+    assert product.bulk_discount == pytest.approx(0.1)
+    assert product == (1, "Rice", "Groceries", 299, 100, 0.1)
+
+    # Rows cross process boundaries in worker mode
+    assert pickle.loads(pickle.dumps(product)) == product
+
+def test_statement_rows_do_not_leak_into_plain_queries(fresh_db):
+    conn = dollmart.connect_db()
+    queries.fetch_one(conn, "product_by_id", (1,))
+    row = conn.execute("SELECT id FROM products WHERE id = 1").fetchone()
+    conn.close()
+
+    assert type(row) is tuple
+
+def test_typed_rows_through_instrumented_connection(fresh_db):
+    instrument.reset()
+    instrument.enable()
+    try:
+        conn = dollmart.connect_db()
+        categories = queries.fetch_all(conn, "product_categories")
+        conn.close()
+    finally:
+        instrument.disable()
+
+    assert {row.category for row in categories} == {"Groceries", "Electronics", "Personal Care"}
+    assert instrument.metrics()["queries"][queries.sql("product_categories")]["rows"] == 3
+    instrument.reset()
+
+def test_duplicate_statement_names_are_rejected():
+    with pytest.raises(ValueError):
+        queries.statement("product_by_id", "SELECT 1")
+
+def test_customer_and_admin_order_details_share_one_query(fresh_db, capsys):
+    order_id = dollmart.run_write(
+        dollmart.insert_order, 1, {2: {"name": "Milk", "price": 199, "quantity": 3}}, 597
+    )[0]
+
+    customer = dollmart.Customer(1, "someone", 0)
+    customer.view_order_details(order_id)
+    customer_output = capsys.readouterr().out
+
+    dollmart.Admin(1, "admin").view_order_details(order_id)
+    admin_output = capsys.readouterr().out
+
+    assert "Milk" in customer_output and "$5.97" in customer_output
+    assert customer_output == admin_output
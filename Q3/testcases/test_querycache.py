@@ -0,0 +1,187 @@
+import pytest
+import sqlite3
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from querycache import QueryCache, create_schema, estimate_size
+
+
+RICE = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+
+
+def rows(count, width=10):
+    return [(i, "x" * width) for i in range(count)]
+
+def loader(result, calls):
+    def load():
+        calls.append(1)
+        return result
+    return load
+
+def write(sql, params=()):
+    """Change dollmart.db through a connection of its own, as another process would"""
+    conn = sqlite3.connect("dollmart.db")
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+def register(username):
+    return dollmart.run_write(dollmart.create_customer, username, "x", 0)[0]
+
+
+def test_results_are_reused_only_at_the_same_versions():
+    cache = QueryCache(1024 * 1024)
+    calls = []
+    first, second = rows(3), rows(4)
+    assert cache.get("listing", (1,), loader(first, calls)) is first
+    assert cache.get("listing", (1,), loader(second, calls)) is first
+    assert cache.get("listing", (2,), loader(second, calls)) is second
+    assert cache.get("listing", (2,), loader(first, calls)) is second
+    assert (len(calls), cache.hits, cache.misses) == (2, 2, 2)
+    # The result read at version 1 was replaced, not kept alongside
+    assert cache.bytes == estimate_size(second)
+
+
+def test_least_recently_used_results_are_evicted_by_size():
+    size = estimate_size(rows(100))
+    cache = QueryCache(size * 2 + size // 2)
+    calls = []
+    for key in ("a", "b"):
+        cache.get(key, (0,), loader(rows(100), calls))
+    cache.get("a", (0,), loader(rows(100), calls))
+    cache.get("c", (0,), loader(rows(100), calls))
+    assert (cache.evictions, cache.bytes) == (1, size * 2)
+
+    cache.get("a", (0,), loader(rows(100), calls))
+    cache.get("b", (0,), loader(rows(100), calls))
+    assert len(calls) == 4
+
+    # Too big to keep at all
+    big = rows(1000)
+    assert cache.get("big", (0,), loader(big, calls)) is big
+    assert cache.bytes <= cache.max_bytes and cache.evictions == 2
+
+
+def test_every_row_change_moves_the_version():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT)")
+    create_schema(conn.cursor(), ("orders",))
+    version = lambda: conn.execute("SELECT version FROM table_versions WHERE name = 'orders'").fetchone()[0]
+
+    conn.executemany("INSERT INTO orders (status) VALUES (?)", [("Processing",)] * 3)
+    assert version() == 3
+    conn.execute("UPDATE orders SET status = 'Delivered' WHERE id < 3")
+    conn.execute("UPDATE orders SET status = 'Delivered' WHERE id > 10")
+    conn.execute("DELETE FROM orders WHERE id = 3")
+    assert version() == 6
+
+
+def test_listings_come_from_memory_until_their_tables_are_written(fresh_db, capsys, monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda _: "0")
+    admin = dollmart.Admin(1, "admin")
+    cache = dollmart.get_query_cache()
+    user_id = register("first")
+    dollmart.run_write(dollmart.insert_order, user_id, RICE, 299)
+
+    for _ in range(2):
+        admin.view_all_products()
+        admin.view_all_customers()
+        admin.view_all_orders()
+    assert (cache.misses, cache.hits) == (3, 3)
+    capsys.readouterr()
+
+    # Coupons are not listed: nothing changes
+    dollmart.create_coupon(user_id, 5)
+    # A new customer changes the customer listing only; the order listing reads users too
+    register("second")
+    # Written outside the app's write paths
+    write("UPDATE products SET name = 'Basmati' WHERE id = 1")
+
+    admin.view_all_products()
+    admin.view_all_customers()
+    admin.view_all_orders()
+    assert (cache.misses, cache.hits) == (6, 3)
+    out = capsys.readouterr().out
+    assert "Basmati" in out and "second" in out
+
+    dollmart.create_coupon(user_id, 5)
+    admin.view_all_products()
+    admin.view_all_customers()
+    assert (cache.misses, cache.hits) == (6, 5)
+
+
+def test_a_checkout_shows_up_in_every_listing(fresh_db, capsys, monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda _: "0")
+    admin = dollmart.Admin(1, "admin")
+    user_id = register("shopper")
+    admin.view_all_products()
+    admin.view_all_customers()
+    admin.view_all_orders()
+    assert "No orders found." in capsys.readouterr().out
+
+    quote = dollmart.quote_cart(RICE, False)
+    order_id = dollmart.place_bulk_order(user_id, RICE, quote)[0]
+    admin.view_all_products()
+    admin.view_all_customers()
+    admin.view_all_orders()
+    lines = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert ["1", "Rice", "Groceries", "$2.99", "99", "10%"] in lines
+    assert ["2", "shopper", "Individual", "1"] in [line[:4] for line in lines]
+    assert str(order_id) in [line[0] for line in lines if line]
+    assert dollmart.get_query_cache().hits == 0
+
+
+def test_cache_follows_the_replica(fresh_db, capsys):
+    class Clock:
+        now = time.time()
+
+        def __call__(self):
+            return self.now
+
+    clock = Clock()
+    dollmart.configure_replica(60, background=False, clock=clock)
+    admin = dollmart.Admin(1, "admin")
+    cache = dollmart.get_query_cache()
+    register("first")
+    admin.view_all_customers()
+
+    # Not in the replica yet: served from memory, as the replica would serve it
+    register("second")
+    admin.view_all_customers()
+    assert "second" not in capsys.readouterr().out
+    assert cache.hits == 1
+
+    clock.now += 30
+    admin.view_all_customers()
+    assert "second" in capsys.readouterr().out
+    assert cache.hits == 1
+
+
+def test_sharded_orders_are_versioned_per_shard(fresh_db, capsys, monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda _: "0")
+    dollmart.configure_sharding(2, str(fresh_db / "shards"))
+    try:
+        admin = dollmart.Admin(1, "admin")
+        user_id = register("sharded")
+        admin.view_all_orders()
+        admin.view_all_orders()
+        assert dollmart.get_query_cache().hits == 1
+
+        order_id = dollmart.run_write(dollmart.insert_order, user_id, RICE, 299, None, user_id=user_id)[0]
+        capsys.readouterr()
+        admin.view_all_orders()
+        assert str(order_id) in capsys.readouterr().out
+    finally:
+        dollmart.configure_sharding(0)
+
+
+def test_cache_can_be_turned_off(fresh_db, capsys):
+    dollmart.configure_query_cache(0)
+    admin = dollmart.Admin(1, "admin")
+    admin.view_all_products()
+    admin.view_all_products()
+    assert dollmart.QUERY_CACHE is None
+    assert capsys.readouterr().out.count("Rice") == 2
@@ -0,0 +1,161 @@
+import pytest
+import hashlib
+import sqlite3
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+from ratelimit import LoginLimiter, LoginRateLimited, TokenBuckets
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(fresh_db):
+    clock = Clock()
+    dollmart.configure_login_limits(username_burst=3, username_refill_seconds=60, client_burst=10,
+                                    client_refill_seconds=5, lockout_seconds=600, clock=clock)
+    yield clock
+    dollmart.configure_login_limits()
+
+def stored_lockouts():
+    conn = sqlite3.connect('dollmart.db')
+    rows = conn.execute("SELECT username, locked_until FROM login_lockouts").fetchall()
+    conn.close()
+    return rows
+
+def count_queries(function):
+    instrument.reset()
+    instrument.enable()
+    try:
+        function()
+    finally:
+        instrument.disable()
+    return sum(stats["count"] for stats in instrument.metrics()["queries"].values())
+
+def test_buckets_refill_and_evict_least_recently_used():
+    buckets = TokenBuckets(capacity=2, refill_seconds=10, max_entries=3)
+    assert buckets.take("a", 0) == 1
+    assert buckets.take("a", 0) == 0
+    assert buckets.retry_after("a", 4) == pytest.approx(6)
+    assert buckets.tokens("a", 25) == 2
+    assert len(buckets) == 0
+
+    for key in ("a", "b", "c"):
+        buckets.take(key, 0)
+    buckets.take("a", 1)
+    buckets.take("d", 1)
+    assert len(buckets) == 3
+    assert buckets.tokens("b", 1) == 2
+    assert buckets.tokens("a", 1) == pytest.approx(0.1)
+
+def test_limiter_counts_every_failure_across_threads():
+    limiter = LoginLimiter(username_burst=4, username_refill_seconds=1e9, client_burst=10000,
+                           client_refill_seconds=1e9, clock=lambda: 1000.0)
+    lockouts = []
+
+    def fail(client):
+        for _ in range(500):
+            if limiter.check_failure("admin", client) is not None:
+                lockouts.append(client)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=fail, args=(client % 2,)) for client in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert len(lockouts) == 8 * 500 // 4
+    assert limiter.clients.tokens(0, 1000.0) == limiter.clients.tokens(1, 1000.0) == 10000 - 2000
+
+def test_failures_lock_out_and_persist_only_on_breach(clock):
+    assert dollmart.authenticate("admin", "wrong") is None
+    assert dollmart.authenticate("admin", "wrong") is None
+    assert stored_lockouts() == []
+
+    assert dollmart.authenticate("admin", "wrong") is None
+    assert stored_lockouts() == [("admin", clock.now + 600)]
+
+    with pytest.raises(LoginRateLimited) as refused:
+        dollmart.authenticate("admin", "admin123")
+    assert refused.value.retry_after == 600
+    assert dollmart.authenticate("someone_else", "x") is None
+
+    clock.now += 601
+    assert isinstance(dollmart.authenticate("admin", "admin123"), dollmart.Admin)
+    assert stored_lockouts() == []
+
+def test_refused_attempts_make_no_queries(clock):
+    for _ in range(3):
+        dollmart.authenticate("admin", "wrong")
+
+    def hammer():
+        for _ in range(100):
+            with pytest.raises(LoginRateLimited):
+                dollmart.authenticate("admin", "guess")
+
+    assert count_queries(hammer) == 0
+
+def test_success_refills_the_username_budget(clock):
+    for _ in range(5):
+        assert dollmart.authenticate("admin", "wrong") is None
+        assert dollmart.authenticate("admin", "admin123") is not None
+    assert stored_lockouts() == []
+
+def test_client_budget_limits_spraying_many_usernames(clock):
+    for i in range(10):
+        assert dollmart.authenticate(f"user{i}", "password", client="10.0.0.7") is None
+    with pytest.raises(LoginRateLimited) as refused:
+        dollmart.authenticate("admin", "admin123", client="10.0.0.7")
+    assert refused.value.retry_after == pytest.approx(5)
+    assert dollmart.authenticate("admin", "admin123", client="10.0.0.8") is not None
+
+    clock.now += 5
+    assert dollmart.authenticate("admin", "admin123", client="10.0.0.7") is not None
+    assert stored_lockouts() == []
+
+def test_stored_lockouts_survive_a_restart_and_other_processes(clock):
+    for _ in range(3):
+        dollmart.authenticate("admin", "wrong")
+
+    dollmart.configure_login_limits(clock=clock)
+    with pytest.raises(LoginRateLimited):
+        dollmart.authenticate("admin", "admin123")
+
+    dollmart.run_write(dollmart.create_customer, "shopper", hashlib.sha256(b"pw").hexdigest(), 0)
+    dollmart.get_login_limiter()
+    dollmart.run_write(dollmart.save_login_lockout, "shopper", clock.now + 60)
+    with pytest.raises(LoginRateLimited):
+        dollmart.authenticate("shopper", "pw")
+
+def test_limits_off_checks_every_attempt(fresh_db):
+    dollmart.configure_login_limits(False)
+    try:
+        for _ in range(20):
+            assert dollmart.authenticate("admin", "wrong") is None
+        assert dollmart.authenticate("admin", "admin123") is not None
+        assert stored_lockouts() == []
+    finally:
+        dollmart.configure_login_limits()
+
+def test_login_prints_refusal(clock, monkeypatch, capsys):
+    for _ in range(3):
+        dollmart.authenticate("admin", "wrong")
+    answers = iter(["admin", "admin123"])
+    monkeypatch.setattr('builtins.input', lambda _: next(answers))
+    assert dollmart.login() is None
+    assert "Too many failed login attempts; try again in 601 seconds." in capsys.readouterr().out
@@ -0,0 +1,107 @@
+import pytest
+import random
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import recommend
+
+
+def order(user_id, product_ids, user_shard=False):
+    cart = {product_id: {"name": str(product_id), "price": 100, "quantity": 1} for product_id in product_ids}
+    return dollmart.run_write(
+        dollmart.insert_order, user_id, cart, 100 * len(cart), None, user_id=user_id if user_shard else None
+    )
+
+def snapshot():
+    conn = sqlite3.connect('dollmart.db')
+    pairs = conn.execute("SELECT * FROM product_pairs ORDER BY product_id, other_id").fetchall()
+    neighbors = conn.execute("SELECT * FROM product_neighbors ORDER BY product_id, rank").fetchall()
+    conn.close()
+    return pairs, neighbors
+
+def add_stock():
+    conn = sqlite3.connect('dollmart.db')
+    conn.execute("UPDATE products SET stock = 1000000")
+    conn.commit()
+    conn.close()
+
+def test_orders_update_neighbors_incrementally(fresh_db):
+    order(1, [1, 2, 3])
+    order(1, [1, 2])
+    order(1, [1, 6])
+    order(1, [5])
+
+    assert [(p.id, p.score) for p in dollmart.also_bought([1])] == [(2, 2), (3, 1), (6, 1)]
+    assert [(p.id, p.score) for p in dollmart.also_bought([2])] == [(1, 2), (3, 1)]
+    assert [(p.id, p.name) for p in dollmart.also_bought([1], exclude={2: {}})] == [(3, "Bread"), (6, "Shampoo")]
+    assert [(p.id, p.score) for p in dollmart.also_bought([1, 2])] == [(3, 2), (6, 1)]
+    assert dollmart.also_bought([5]) == []
+
+def test_neighbor_lists_keep_top_k(fresh_db):
+    order(1, [1, 2, 3, 4, 5, 6, 7])
+    order(1, [1, 7])
+    _, neighbors = snapshot()
+
+    first = [row for row in neighbors if row[0] == 1]
+    assert len(first) == recommend.TOP_K
+    assert [(rank, neighbor) for _, rank, neighbor, _ in first[:2]] == [(1, 7), (2, 2)]
+    assert all(len([row for row in neighbors if row[0] == p]) <= recommend.TOP_K for p in range(1, 8))
+
+def test_out_of_stock_products_are_not_suggested(fresh_db):
+    order(1, [1, 5])
+    conn = sqlite3.connect('dollmart.db')
+    conn.execute("UPDATE products SET stock = 0 WHERE id = 5")
+    conn.commit()
+    conn.close()
+    assert dollmart.also_bought([1]) == []
+
+def test_large_baskets_are_skipped(fresh_db):
+    conn = sqlite3.connect('dollmart.db')
+    conn.executemany(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, 'Bulk', 100, 100, 0)",
+        [(f"Item {i}",) for i in range(recommend.MAX_BASKET_PRODUCTS)]
+    )
+    conn.commit()
+    conn.close()
+
+    order(1, range(1, recommend.MAX_BASKET_PRODUCTS + 2))
+    assert snapshot() == ([], [])
+    assert dollmart.rebuild_recommendations() == 0
+
+def test_rebuild_matches_incremental_counts(fresh_db):
+    add_stock()
+    rng = random.Random(7)
+    for _ in range(200):
+        order(1, rng.sample(range(1, 8), rng.randint(1, 5)))
+
+    incremental = snapshot()
+    assert dollmart.rebuild_recommendations() * 2 == len(incremental[0])
+    assert snapshot() == incremental
+
+def test_sharded_orders_feed_the_catalog_tables(fresh_db):
+    add_stock()
+    dollmart.configure_sharding(3, str(fresh_db / "shards"))
+    try:
+        users = [dollmart.run_write(dollmart.create_customer, f"shopper{i}", "x", 0)[0] for i in range(6)]
+        for user_id in users:
+            order(user_id, [1, 2, 3], user_shard=True)
+        order(users[0], [3, 4], user_shard=True)
+
+        incremental = snapshot()
+        assert [(p.id, p.score) for p in dollmart.also_bought([3])] == [(1, 6), (2, 6), (4, 1)]
+        dollmart.rebuild_recommendations()
+        assert snapshot() == incremental
+    finally:
+        dollmart.configure_sharding(0)
+
+def test_view_cart_shows_customers_also_bought(fresh_db, capsys):
+    order(1, [1, 2])
+    customer = dollmart.Customer(1, "someone", 0)
+    customer.add_to_cart(1, 1)
+    customer.view_cart()
+
+    out = capsys.readouterr().out
+    assert "Customers also bought:" in out and "[2] Milk - $1.99" in out
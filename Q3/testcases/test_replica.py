@@ -0,0 +1,157 @@
+import pytest
+import sqlite3
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import backup
+from replica import ReadReplica
+
+
+RICE = {1: {"name": "Rice", "price": 299, "quantity": 1}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def usernames(path):
+    conn = sqlite3.connect(path)
+    rows = [row[0] for row in conn.execute("SELECT username FROM users WHERE role = 'customer' ORDER BY id")]
+    conn.close()
+    return rows
+
+def register(username):
+    return dollmart.run_write(dollmart.create_customer, username, "x", 0)[0]
+
+
+def test_reads_get_the_replica_only_within_the_staleness_bound(fresh_db, monkeypatch):
+    clock = Clock()
+    replica = ReadReplica("dollmart.db", max_staleness=60, background=False, clock=clock)
+    assert replica.read_path() == replica.replica_path == "dollmart-replica.db"
+    assert replica.copies == 1
+
+    started = []
+    replica.background = True
+    monkeypatch.setattr(replica, "_start_refresh", lambda: started.append(clock.now))
+
+    clock.now += 29
+    assert replica.read_path() == replica.replica_path and started == []
+    clock.now += 1
+    assert replica.read_path() == replica.replica_path and len(started) == 1
+    # The refresh has not landed yet: past the bound, reads go to the primary
+    clock.now += 31
+    assert replica.read_path() == "dollmart.db"
+    assert (replica.primary_reads, len(started)) == (1, 2)
+    replica.close()
+
+
+def test_refresh_copies_only_when_the_primary_changed(fresh_db):
+    replica = ReadReplica("dollmart.db", max_staleness=60, background=False)
+    register("before")
+    assert replica.refresh() is True
+    mtime = os.stat(replica.replica_path).st_mtime_ns
+
+    assert replica.refresh() is False
+    assert os.stat(replica.replica_path).st_mtime_ns >= mtime
+    assert (replica.copies, replica.unchanged) == (1, 1)
+
+    register("after")
+    assert usernames(replica.replica_path) == ["before"]
+    assert replica.refresh() is True
+    assert usernames(replica.replica_path) == ["before", "after"]
+    assert not [name for name in os.listdir(".") if name.endswith(".copy")]
+    replica.close()
+
+
+def test_background_refresh_keeps_the_replica_fresh_between_reads(fresh_db):
+    replica = ReadReplica("dollmart.db", max_staleness=0.2, idle_after=10)
+    # No replica yet: the first read waits for a copy and starts the refresher
+    assert replica.read_path() == replica.replica_path
+    assert replica._thread is not None
+
+    register("later")
+    for _ in range(200):
+        if os.path.exists(replica.replica_path) and "later" in usernames(replica.replica_path):
+            break
+        time.sleep(0.01)
+    assert usernames(replica.replica_path) == ["later"]
+    assert replica.read_path() == replica.replica_path
+    replica.close()
+    assert replica._thread is None
+
+
+def test_processes_share_the_replica(fresh_db):
+    first = ReadReplica("dollmart.db", max_staleness=60, background=False)
+    first.refresh()
+    # Another process: the file's age says it is fresh, so it does not copy again
+    second = ReadReplica("dollmart.db", max_staleness=60, background=False)
+    assert second.read_path() == second.replica_path
+    assert second.copies == 0
+    first.close()
+    second.close()
+
+
+def test_close_cancels_a_copy_in_progress(fresh_db):
+    stop = threading.Event()
+    stop.set()
+    with pytest.raises(backup.CopyCancelled):
+        backup.copy_database("dollmart.db", "partial.db", pages=1, stop=stop)
+
+    replica = ReadReplica("dollmart.db", max_staleness=60, pages=1)
+    replica.close()
+    with pytest.raises(backup.CopyCancelled):
+        replica.refresh()
+    assert not os.path.exists(replica.replica_path)
+    assert not [name for name in os.listdir(".") if name.endswith(".copy")]
+
+
+def test_admin_listings_read_the_replica_and_writes_go_to_the_primary(fresh_db, capsys, monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda _: "0")
+    clock = Clock()
+    dollmart.configure_replica(60, background=False, clock=clock)
+    admin = dollmart.Admin(1, "admin")
+    user_id = register("first")
+    admin.view_all_customers()
+    assert "first" in capsys.readouterr().out
+
+    register("second")
+    dollmart.run_write(dollmart.insert_order, user_id, RICE, 299)
+    assert usernames("dollmart.db") == ["first", "second"]
+    admin.view_all_customers()
+    admin.view_all_orders()
+    out = capsys.readouterr().out
+    assert "second" not in out and "No orders found." in out
+
+    conn = dollmart.connect_reporting_db()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM users")
+    conn.close()
+
+    clock.now += 30
+    admin.view_all_customers()
+    admin.view_all_orders()
+    out = capsys.readouterr().out
+    assert "second" in out and "No orders found." not in out
+
+
+def test_dashboard_keeps_its_own_orders_across_a_replica_rebuild(fresh_db):
+    dollmart.configure_replica(60, background=False)
+    dollmart.configure_dashboard(background=False)
+    user_id = register("shopper")
+    cache = dollmart.get_kpi_cache()
+    assert cache.replay_seconds == 60
+    assert cache.kpis().orders_today == 0
+
+    quote = dollmart.quote_cart(RICE, False)
+    dollmart.place_bulk_order(user_id, RICE, quote)
+    # The replica predates the order, but the order's event is replayed on top of it
+    cache.refresh()
+    assert cache.kpis().orders_today == 1
@@ -0,0 +1,87 @@
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from sharding import ShardRouter, SHARD_ID_RANGE
+
+
+@pytest.fixture
+def sharded(fresh_db):
+    dollmart.configure_sharding(3, str(fresh_db / "shards"))
+    yield dollmart.SHARD_ROUTER
+    dollmart.configure_sharding(0)
+
+def _register(username):
+    return dollmart.run_write(dollmart.create_customer, username, "x", 0)
+
+def _order(user_id, quantity):
+    cart = {2: {"name": "Milk", "price": 199, "quantity": quantity}}
+    return dollmart.run_write(dollmart.insert_order, user_id, cart, 199 * quantity, None, user_id=user_id)
+
+def test_customer_data_lands_in_its_shard(sharded):
+    user_id, coupon_id, _ = _register("sharded-alice")
+    order_id = _order(user_id, 3)[0]
+
+    shard = sharded.shard_for_user(user_id)
+    assert sharded.shard_for_id(order_id) == shard
+    assert sharded.shard_for_id(coupon_id) == shard
+
+    conn = sqlite3.connect('dollmart.db')
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 0
+    assert conn.execute("SELECT stock FROM products WHERE id = 2").fetchone()[0] == 47
+    assert conn.execute("SELECT orders_count FROM users WHERE id = ?", (user_id,)).fetchone()[0] == 1
+    conn.close()
+
+    details = dollmart.get_customer_360(user_id)
+    assert [order[0] for order in details["orders"]] == [order_id]
+    assert details["coupon_summary"]["available"] == 1
+
+def test_failed_registration_leaves_no_welcome_coupon(sharded):
+    registered = []
+
+    def register_then_fail(conn):
+        registered.append(dollmart.create_customer(conn, "unlucky", "x", 0))
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.OperationalError):
+        dollmart.run_write(register_then_fail)
+    user_id, coupon_id, _ = registered[0]
+
+    shard = sqlite3.connect(sharded.shard_path(sharded.shard_for_user(user_id)))
+    assert shard.execute("SELECT COUNT(*) FROM coupons WHERE id = ?", (coupon_id,)).fetchone()[0] == 0
+    shard.close()
+    # The username is free, and registering again gets a coupon
+    user_id, coupon_id, _ = _register("unlucky")
+    assert dollmart.get_customer_360(user_id)["coupon_summary"]["available"] == 1
+
+def test_scatter_gather_merges_every_shard(sharded):
+    order_ids = set()
+    for i in range(9):
+        user_id = _register(f"customer-{i}")[0]
+        order_ids.add(_order(user_id, 1)[0])
+
+    rows = dollmart.query_customer_data(
+        "SELECT o.id, u.username, o.order_date FROM orders o JOIN users u ON o.user_id = u.id ORDER BY o.order_date DESC",
+        sort_key=lambda row: row[2],
+        reverse=True
+    )
+    assert {row[0] for row in rows} == order_ids
+    assert len({sharded.shard_for_id(order_id) for order_id in order_ids}) > 1
+
+    counts = dollmart.query_customer_data("SELECT COUNT(*) FROM order_items WHERE product_id = 2")
+    assert sum(row[0] for row in counts) == 9
+
+def test_shard_id_blocks_do_not_overlap(tmp_path):
+    router = ShardRouter(2, str(tmp_path / "shards"), str(tmp_path / "catalog.db"))
+    router.setup()
+    router.setup()
+
+    for shard in range(2):
+        conn = router.connect(shard)
+        conn.execute("INSERT INTO coupons (user_id, code, discount_percentage) VALUES (1, 'X', 5)")
+        coupon_id = conn.execute("SELECT MAX(id) FROM coupons").fetchone()[0]
+        conn.close()
+        assert coupon_id == shard * SHARD_ID_RANGE + 1
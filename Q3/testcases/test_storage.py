@@ -0,0 +1,229 @@
+import pytest
+import hashlib
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from storage import MemoryStorage
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, fresh_db):
+    """Each test runs once on dollmart.db and once on an in-memory copy of it"""
+    dollmart.configure_storage(request.param, load=True)
+    yield request.param
+
+
+def register(username, password="pw", is_retail=0):
+    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    return dollmart.run_write(dollmart.create_customer, username, password_hash, is_retail)
+
+def cart(*lines):
+    return {product_id: {"name": f"Product {product_id}", "price": price, "quantity": quantity}
+            for product_id, quantity, price in lines}
+
+def read(function):
+    with dollmart.open_storage() as repos:
+        return function(repos)
+
+
+def test_customer_registers_and_logs_in(backend):
+    user_id, coupon_id, code = register("shopper", "secret")
+
+    user = dollmart.authenticate("shopper", "secret")
+    assert (user.id, user.username, user.orders_count) == (user_id, "shopper", 0)
+    assert dollmart.authenticate("shopper", "wrong") is None
+    assert read(lambda repos: repos.coupons.for_user(user_id)) == [(coupon_id, code, 10)]
+    assert read(lambda repos: repos.users.id_by_username("shopper")) == user_id
+
+
+def test_duplicate_username_rolls_back(backend):
+    register("shopper")
+    with pytest.raises(sqlite3.IntegrityError):
+        register("shopper")
+
+    user_id = read(lambda repos: repos.users.id_by_username("shopper"))
+    assert len(read(lambda repos: repos.coupons.for_user(user_id))) == 1
+    assert register("another")[0] == user_id + 1
+
+
+def test_search_and_category_match_sqlite(backend):
+    assert [row.name for row in dollmart.find_products("OO")] == ["Shampoo", "Toothpaste"]
+    assert dollmart.find_products("laptop") == [(5, "Laptop", "Electronics", 89999, 5)]
+    assert [row.id for row in read(lambda repos: repos.products.in_category("Groceries"))] == [1, 2, 3]
+
+    product_id = dollmart.run_write(lambda repos: dollmart.repositories(repos).products.add("Oats", "Groceries", 349, 20))
+    assert read(lambda repos: repos.products.for_cart(product_id)) == ("Oats", 349, 20)
+    assert [row.id for row in read(lambda repos: repos.products.in_category("Groceries"))] == [1, 2, 3, product_id]
+
+
+def test_order_updates_stock_coupon_and_loyalty(backend):
+    user_id, coupon_id, _ = register("shopper")
+
+    results = [
+        dollmart.run_write(dollmart.insert_order, user_id, cart((1, 2, 299), (4, 1, 49999)), 50000, coupon_id),
+        dollmart.run_write(dollmart.insert_order, user_id, cart((2, 1, 199)), 199),
+        dollmart.run_write(dollmart.insert_order, user_id, cart((2, 1, 199)), 199),
+    ]
+
+    assert [result[3] for result in results] == [1, 2, 3]
+    assert results[2][4].startswith("LOYAL-")
+    assert read(lambda repos: repos.products.for_cart(1)).stock == 98
+    assert read(lambda repos: repos.products.for_cart(2)).stock == 48
+    assert read(lambda repos: repos.coupons.available(coupon_id, user_id)) is None
+    assert [row.discount_percentage for row in read(lambda repos: repos.coupons.for_user(user_id))] == [5]
+
+    orders = read(lambda repos: repos.orders.for_user(user_id))
+    assert sorted(order.id for order in orders) == sorted(result[0] for result in results)
+    assert sorted(read(lambda repos: repos.orders.items(results[0][0]))) == [(1, 2, 299), (4, 1, 49999)]
+
+
+def test_short_stock_rolls_back_the_whole_order(backend):
+    user_id, coupon_id, _ = register("shopper")
+
+    with pytest.raises(ValueError):
+        dollmart.run_write(dollmart.insert_order, user_id, cart((1, 5, 299), (5, 6, 89999)), 1000, coupon_id,
+                           True)
+
+    assert read(lambda repos: repos.products.for_cart(1)).stock == 100
+    assert read(lambda repos: repos.products.for_cart(5)).stock == 5
+    assert read(lambda repos: repos.orders.for_user(user_id)) == []
+    assert read(lambda repos: repos.coupons.available(coupon_id, user_id)) is not None
+    assert dollmart.authenticate("shopper", "pw").orders_count == 0
+
+
+def test_coupon_redeems_once(backend):
+    user_id, coupon_id, code = register("shopper")
+
+    assert dollmart.apply_coupon(user_id, coupon_id, 10000) == (True, 9000, 1000, code, 10)
+    assert dollmart.apply_coupon(user_id, coupon_id, 10000) == (False, 10000, 0, None, None)
+    assert dollmart.apply_coupon(user_id + 1, coupon_id, 10000)[0] is False
+
+
+def test_customer_views_read_the_configured_backend(backend, capsys, monkeypatch):
+    user_id, coupon_id, code = register("shopper")
+    dollmart.apply_coupon(user_id, coupon_id, 299)
+    first = dollmart.run_write(dollmart.insert_order, user_id, cart((1, 2, 299), (2, 1, 199)), 797)[0]
+    dollmart.run_write(dollmart.insert_order, user_id, cart((2, 1, 199)), 199)
+    loyalty = dollmart.run_write(dollmart.insert_order, user_id, cart((3, 1, 99)), 99)[4]
+
+    details = dollmart.get_customer_360(user_id, page=2, page_size=2)
+    assert details["profile"][:4] == (user_id, "shopper", 0, 3)
+    assert [order[0] for order in details["orders"]] == [first] and details["orders"][0][4] == 2
+    assert details["total_orders"] == 3
+    assert details["coupon_summary"] == {"total": 2, "used": 1, "available": 1}
+    assert dollmart.get_customer_360(1) is None
+
+    customer = dollmart.Customer(user_id, "shopper")
+    customer.check_coupons()
+    lines = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert [loyalty, "Available"] in [line[1::2] for line in lines]
+    assert [code, "Used"] in [line[1::2] for line in lines]
+
+    monkeypatch.setattr('builtins.input', lambda _: str(first))
+    customer.view_order_history()
+    out = capsys.readouterr().out
+    assert f"Order #{first} Details" in out and "$5.98" in out
+    customer.view_order_details(first + 100)
+    assert "Order not found" in capsys.readouterr().out
+
+
+def test_lockouts(backend):
+    dollmart.run_write(dollmart.save_login_lockout, "shopper", 2000.0)
+    dollmart.run_write(dollmart.save_login_lockout, "other", 500.0)
+    assert read(lambda repos: repos.users.active_lockouts(1000.0)) == [("shopper", 2000.0)]
+
+    dollmart.run_write(dollmart.clear_login_lockout, "shopper")
+    assert read(lambda repos: repos.users.active_lockouts(1000.0)) == []
+
+
+def test_admin_product_menus(backend, capsys, monkeypatch):
+    admin = dollmart.Admin(1, "admin")
+    answers = iter(["Oats", "Groceries", "3.49", "20", "5"])
+    monkeypatch.setattr('builtins.input', lambda _: next(answers))
+    admin.add_product()
+    product_id = read(lambda repos: repos.products.all())[-1].id
+    assert read(lambda repos: repos.products.by_id(product_id)) == (product_id, "Oats", "Groceries", 349, 20, 0.05)
+
+    answers = iter([str(product_id), "", "Breakfast", "", "15", ""])
+    admin.update_product()
+    assert "Oats" in capsys.readouterr().out
+    assert read(lambda repos: repos.products.by_id(product_id)) == (product_id, "Oats", "Breakfast", 349, 15, 0.05)
+    assert [row.id for row in read(lambda repos: repos.products.in_category("Breakfast"))] == [product_id]
+    assert [row.id for row in read(lambda repos: repos.products.in_category("Groceries"))] == [1, 2, 3]
+
+    user_id = register("shopper")[0]
+    dollmart.run_write(dollmart.insert_order, user_id, cart((1, 1, 299)), 299)
+    answers = iter(["1", "y", str(product_id), "y"])
+    admin.delete_product()
+    admin.delete_product()
+    assert "Cannot delete product" in capsys.readouterr().out
+    assert read(lambda repos: repos.products.by_id(1)) is not None
+    assert read(lambda repos: repos.products.by_id(product_id)) is None
+    assert read(lambda repos: repos.products.in_category("Breakfast")) == []
+
+
+def test_order_statuses_and_order_sheets(backend, monkeypatch):
+    dollmart.configure_delivery(False)
+    monkeypatch.setattr(dollmart, "PROCESSING_TIME_HOURS", 0)
+    monkeypatch.setattr(dollmart, "DELIVERY_TIME_HOURS", 0)
+    user_id = register("shopper")[0]
+    order_id = dollmart.run_write(dollmart.insert_order, user_id, cart((1, 1, 299)), 299)[0]
+
+    assert dollmart.update_order_statuses() == [(order_id, "Processing", "Out for Delivery")]
+    assert dollmart.update_order_statuses() == [(order_id, "Out for Delivery", "Delivered")]
+    assert read(lambda repos: repos.orders.for_user(user_id))[0].status == "Delivered"
+    assert read(lambda repos: repos.orders.open()) == []
+
+    sheet, problems = dollmart.bulk_order_cart({1: 2, 999: 1, 5: 6})
+    assert sheet == {1: {"name": "Rice", "price": 299, "quantity": 2}}
+    assert problems == ["Product 999 not found.", "Product 5 (Laptop): only 5 units available."]
+
+
+def test_memory_backend_prices_from_its_own_catalog(fresh_db):
+    dollmart.add_discount_tier(1, 0.5, category="Groceries")
+    dollmart.configure_storage("memory", load=True)
+    oats = dollmart.run_write(lambda repos: repos.products.add("Oats", "Groceries", 349, 100, 0.2))
+
+    # Retail bulk discounts come from the in-memory products; discount tiers are SQLite-only
+    quote = dollmart.quote_cart(cart((1, 40, 299), (oats, 10, 349), (999, 1, 100)), True)
+    assert [line.discount_bp for line in quote.lines] == [1000, 2000, 0]
+    with pytest.raises(dollmart.StorageUnsupported, match="configure_storage"):
+        dollmart.get_price_book()
+    with pytest.raises(dollmart.StorageUnsupported):
+        dollmart.Customer(1, "shopper").browse_products()
+
+
+def test_memory_backend_leaves_the_database_alone(fresh_db):
+    dollmart.configure_storage("memory", load=True)
+    register("shopper")
+    dollmart.run_write(dollmart.insert_order, 2, cart((1, 3, 299)), 897)
+
+    conn = sqlite3.connect("dollmart.db")
+    assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    assert conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0] == 100
+    conn.close()
+
+
+def test_memory_transactions_nest_and_undo():
+    storage = MemoryStorage()
+    with storage.transaction() as repos:
+        product_id = repos.products.add("Rice", "Groceries", 299, 10)
+
+    with pytest.raises(RuntimeError):
+        with storage.transaction() as repos:
+            repos.products.decrement_stock({product_id: 4})
+            with storage.transaction() as inner:
+                inner.products.add("Milk", "Groceries", 199, 5)
+            raise RuntimeError
+
+    assert storage.repositories.products.for_cart(product_id).stock == 10
+    assert [row.name for row in storage.repositories.products.in_category("Groceries")] == ["Rice"]
+    assert storage.repositories.products.add("Bread", "Groceries", 149, 5) == product_id + 1
+
+
+def test_unknown_backend(fresh_db):
+    with pytest.raises(ValueError):
+        dollmart.configure_storage("postgres")
@@ -0,0 +1,57 @@
+import pytest
+import sqlite3
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+from workers import Supervisor, retry_locked
+
+
+def test_reads_and_writes_through_workers(fresh_db):
+    db_path = str(fresh_db / "dollmart.db")
+    with Supervisor(num_workers=2, db_path=db_path) as supervisor:
+        catalog = supervisor.call("catalog", timeout=10)
+        assert catalog[0][4] == 100
+
+        results = [supervisor.submit("search_products", "i") for _ in range(20)]
+        assert all(len(future.result(timeout=10)) > 0 for future in results)
+
+        cart = {1: {"name": "Rice", "price": 299, "quantity": 4}}
+        supervisor.call("insert_order", 1, cart, 1196, timeout=10)
+        assert supervisor.catalog_version.value == 1
+
+        # Every worker must see the new stock, not its cached catalog
+        stocks = {supervisor.call("catalog", timeout=10)[0][4] for _ in range(10)}
+        assert stocks == {96}
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+def test_errors_are_returned_to_caller(fresh_db):
+    with Supervisor(num_workers=1, db_path=str(fresh_db / "dollmart.db")) as supervisor:
+        supervisor.call("create_customer", "dup", "x", 0, timeout=10)
+        with pytest.raises(sqlite3.IntegrityError):
+            supervisor.call("create_customer", "dup", "x", 0, timeout=10)
+
+    with pytest.raises(ValueError):
+        Supervisor(1).submit("drop_tables")
+
+def test_retry_locked_gives_up_on_other_errors():
+    calls = []
+
+    def locked_then_ok():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return "ok"
+
+    assert retry_locked(locked_then_ok, delay=0) == "ok"
+    assert len(calls) == 3
+
+    def broken():
+        raise sqlite3.OperationalError("no such table: nope")
+
+    with pytest.raises(sqlite3.OperationalError):
+        retry_locked(broken, delay=0)
@@ -0,0 +1,93 @@
+import pytest
+import sqlite3
+import sys
+import os
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+import dollmart
+import instrument
+import queries
+from writequeue import GroupCommitQueue
+
+
+def _insert_product(conn, name):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO products (name, category, price, stock, bulk_discount) VALUES (?, ?, ?, ?, ?)",
+        (name, "Test", 100, 10, 0)
+    )
+    return cursor.lastrowid
+
+def _fail(conn):
+    _insert_product(conn, "never-committed")
+    raise ValueError("boom")
+
+def test_concurrent_writes_share_batches(fresh_db):
+    write_queue = GroupCommitQueue(dollmart.connect_db, max_batch=50, max_delay=0.05)
+    futures = []
+    lock = threading.Lock()
+
+    def submit(i):
+        future = write_queue.submit(_insert_product, f"item-{i}")
+        with lock:
+            futures.append(future)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ids = [future.result(timeout=5) for future in futures]
+    write_queue.close()
+
+    assert len(set(ids)) == 40
+    assert write_queue.operations_committed == 40
+    assert write_queue.batches_committed < 40
+
+def test_failed_operation_does_not_abort_batch(fresh_db):
+    write_queue = GroupCommitQueue(dollmart.connect_db, max_delay=0.05)
+    ok = write_queue.submit(_insert_product, "kept")
+    bad = write_queue.submit(_fail)
+    write_queue.close()
+
+    assert ok.result() is not None
+    with pytest.raises(ValueError):
+        bad.result()
+
+    conn = sqlite3.connect('dollmart.db')
+    names = [row[0] for row in conn.execute("SELECT name FROM products WHERE category = 'Test'")]
+    conn.close()
+    assert names == ["kept"]
+
+def test_checkout_through_group_commit(fresh_db):
+    dollmart.configure_write_queue(True, max_delay=0.001)
+    try:
+        cart = {1: {"name": "Rice", "price": 299, "quantity": 3}}
+        order_id, _, _, orders_count, _ = dollmart.run_write(dollmart.insert_order, 1, cart, 897)
+        user_id, coupon_id, _ = dollmart.run_write(dollmart.create_customer, "queued", "x", 0)
+    finally:
+        dollmart.configure_write_queue(False)
+
+    conn = sqlite3.connect('dollmart.db')
+    cursor = conn.cursor()
+    cursor.execute("SELECT stock FROM products WHERE id = 1")
+    assert cursor.fetchone()[0] == 97
+    cursor.execute("SELECT user_id FROM coupons WHERE id = ?", (coupon_id,))
+    assert cursor.fetchone()[0] == user_id
+    conn.close()
+    assert orders_count == 1
+
+def test_queued_writes_are_profiled(fresh_db):
+    instrument.reset()
+    instrument.enable()
+    try:
+        dollmart.configure_write_queue(True, max_delay=0.001)
+        dollmart.run_write(dollmart.create_customer, "queued", "x", 0)
+    finally:
+        dollmart.configure_write_queue(False)
+        instrument.disable()
+
+    assert queries.sql("insert_user") in instrument.metrics()["queries"]
+    instrument.reset()